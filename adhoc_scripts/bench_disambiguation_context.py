@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark per-gene input loading in CT_DISAMBIGUATION.
+
+Compares the legacy per-gene path (re-read the CAAS metadata table, trait file,
+taxid mapping and species tree for every gene) against lookups in a
+DisambiguationContext built once per run.
+"""
+
+import sys
+import time
+import argparse
+import logging
+from pathlib import Path
+
+# Setup paths
+WORKSPACE_ROOT = Path(__file__).parent.parent
+SUBWORKFLOW_ROOT = WORKSPACE_ROOT / "subworkflows" / "CT_DISAMBIGUATION" / "local"
+
+# Add to path
+sys.path.insert(0, str(SUBWORKFLOW_ROOT))
+
+logging.basicConfig(level=logging.WARNING, format="%(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+
+def legacy_gene_inputs(gene, metadata, traits, tree_file, taxid_file):
+    """Load one gene's inputs the way process_single_gene did before the context."""
+    from src.data.loaders import (
+        list_gene_caas_entries,
+        list_gene_caas_positions,
+        parse_trait_pairs,
+    )
+    from src.phylo.species_mapping import read_taxid_mapping
+    from src.phylo.tree_utils import load_tree
+
+    positions = list_gene_caas_positions(metadata, gene)
+    entries = list_gene_caas_entries(metadata, gene)
+    pairs = parse_trait_pairs(traits) if traits else {}
+    taxids = read_taxid_mapping(taxid_file) if taxid_file else None
+    tree = load_tree(tree_file) if tree_file else None
+    return positions, entries, pairs, taxids, tree
+
+
+def context_gene_inputs(gene, ctx):
+    """Load one gene's inputs from a prebuilt context."""
+    return (
+        ctx.gene_positions(gene),
+        ctx.gene_entries(gene),
+        ctx.trait_pairs,
+        ctx.taxid_mapping,
+        ctx.tree,
+    )
+
+
+def comparable(inputs):
+    """Gene inputs reduced to comparable values (the tree by its tip names)."""
+    positions, entries, pairs, taxids, tree = inputs
+    tips = [tip.name for tip in tree.get_terminals()] if tree is not None else None
+    return positions, entries, pairs, taxids, tips
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark per-gene input loading (legacy vs preloaded context)",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""\
+Examples:
+  python bench_disambiguation_context.py --metadata caas.output --traits traits.tab \\
+      --tree species.nwk --taxid taxid.tsv
+  python bench_disambiguation_context.py --metadata caas.output --genes 200
+        """,
+    )
+    parser.add_argument("--metadata", type=Path, required=True, help="CAAS metadata table")
+    parser.add_argument("--traits", type=Path, default=None, help="Trait file")
+    parser.add_argument("--tree", type=Path, default=None, help="Species tree (newick)")
+    parser.add_argument("--taxid", type=Path, default=None, help="Taxid mapping file")
+    parser.add_argument(
+        "--genes",
+        type=int,
+        default=0,
+        help="Benchmark only the first N genes of the table (default: all)",
+    )
+    args = parser.parse_args()
+
+    from src.data.context import build_disambiguation_context
+
+    t0 = time.perf_counter()
+    ctx = build_disambiguation_context(args.metadata, args.traits, args.tree, args.taxid)
+    build_s = time.perf_counter() - t0
+
+    genes = sorted(ctx.entries_by_gene)
+    if args.genes > 0:
+        genes = genes[: args.genes]
+    if not genes:
+        logger.error("No genes found in %s", args.metadata)
+        return 1
+
+    legacy = {}
+    legacy_s = 0.0
+    for gene in genes:
+        t0 = time.perf_counter()
+        inputs = legacy_gene_inputs(gene, args.metadata, args.traits, args.tree, args.taxid)
+        legacy_s += time.perf_counter() - t0
+        legacy[gene] = comparable(inputs)
+
+    fast = {}
+    context_s = 0.0
+    for gene in genes:
+        t0 = time.perf_counter()
+        inputs = context_gene_inputs(gene, ctx)
+        context_s += time.perf_counter() - t0
+        fast[gene] = comparable(inputs)
+
+    # Sanity check: both paths must yield the same inputs for every gene
+    differing = [gene for gene in genes if legacy[gene] != fast[gene]]
+
+    n = len(genes)
+    print(f"Genes:               {n}")
+    print(f"Context build:       {build_s:.3f} s (once per run)")
+    print(f"Legacy per gene:     {1000 * legacy_s / n:.2f} ms  (total {legacy_s:.3f} s)")
+    print(f"Context per gene:    {1000 * context_s / n:.3f} ms  (total {context_s:.3f} s)")
+    print(f"Speedup (incl. build): {legacy_s / max(build_s + context_s, 1e-9):.1f}x")
+    if differing:
+        print(
+            f"WARNING: context and legacy inputs differ for {len(differing)} genes: "
+            f"{', '.join(differing[:10])}"
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Benchmark the aggregation.sqlite3 result store of CT_DISAMBIGUATION.
+
+Replicates the results of an existing aggregation DB to N rows and compares the
+legacy layout (one sanitized JSON blob per row, one execute per insert, fetchall on read)
+with the columnar schema (executemany batches, fetchmany streaming on read).
+Reports write/read time, DB size and peak Python memory of the read pass
+(measured in a separate, traced pass).
+"""
+
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import logging
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+# Setup paths
+WORKSPACE_ROOT = Path(__file__).parent.parent
+SUBWORKFLOW_ROOT = WORKSPACE_ROOT / "subworkflows" / "CT_DISAMBIGUATION" / "local"
+
+# Add to path
+sys.path.insert(0, str(SUBWORKFLOW_ROOT))
+
+logging.basicConfig(level=logging.WARNING, format="%(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+
+def synthetic_items(templates, n_rows):
+    """Yield n_rows (gene, msa_pos, position, result) tuples cycling over templates."""
+    for i in range(n_rows):
+        result = dict(templates[i % len(templates)])
+        gene = f"G{i // 50:06d}"
+        result["gene"] = gene
+        result["msa_pos"] = i % 50
+        result["position"] = i % 50
+        yield gene, i % 50, i % 50, result
+
+
+def legacy_write(db_path, items):
+    from src.utils.disambiguation_db import _sanitize_for_json
+
+    conn = sqlite3.connect(str(db_path))
+    conn.execute(
+        "CREATE TABLE results (id INTEGER PRIMARY KEY AUTOINCREMENT, gene TEXT, msa_pos INTEGER, "
+        "position INTEGER, pair_count INTEGER, result_json TEXT)"
+    )
+    conn.execute("CREATE INDEX idx_results_gene_msa ON results(gene, msa_pos)")
+    for count, (gene, msa_pos, position, result) in enumerate(items, 1):
+        conn.execute(
+            "INSERT INTO results (gene, msa_pos, position, pair_count, result_json) VALUES (?, ?, ?, ?, ?)",
+            (
+                gene,
+                msa_pos,
+                position,
+                len(result.get("pair_details") or []),
+                json.dumps(_sanitize_for_json(result)),
+            ),
+        )
+        if count % 100 == 0:
+            conn.commit()
+    conn.commit()
+    conn.close()
+
+
+def legacy_read(db_path):
+    conn = sqlite3.connect(str(db_path))
+    cur = conn.execute(
+        "SELECT id, gene, msa_pos, result_json FROM results ORDER BY gene, msa_pos, id"
+    )
+    n = 0
+    for _, _, _, result_json in cur.fetchall():
+        json.loads(result_json)
+        n += 1
+    conn.close()
+    return n
+
+
+def columnar_write(db_path, items, batch_size):
+    from src.utils.disambiguation_db import get_connection, init_db, insert_results
+
+    init_db(db_path)
+    conn = get_connection(db_path)
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            insert_results(conn, batch)
+            conn.commit()
+            batch = []
+    if batch:
+        insert_results(conn, batch)
+    conn.commit()
+    conn.close()
+
+
+def columnar_read(db_path):
+    from src.utils.disambiguation_db import iter_results
+
+    conn = sqlite3.connect(str(db_path))
+    n = sum(1 for _ in iter_results(conn))
+    conn.close()
+    return n
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def peak_memory(fn, *args):
+    """Peak traced Python memory of fn(*args), in a separate pass (tracing slows it down)."""
+    tracemalloc.start()
+    fn(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark legacy JSON vs columnar aggregation DB",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""\
+Examples:
+  python bench_disambiguation_db.py results/aggregation.sqlite3 --rows 100000
+  python bench_disambiguation_db.py results/aggregation.sqlite3 --rows 20000 --batch 1000
+        """,
+    )
+    parser.add_argument("source_db", type=Path, help="Existing aggregation.sqlite3 to sample results from")
+    parser.add_argument("--rows", type=int, default=50000, help="Synthetic result rows (default: 50000)")
+    parser.add_argument("--batch", type=int, default=500, help="executemany batch size (default: 500)")
+    args = parser.parse_args()
+
+    from src.utils.disambiguation_db import iter_results
+
+    src = sqlite3.connect(str(args.source_db))
+    try:
+        templates = [result for _, _, result in iter_results(src) if result]
+    except sqlite3.OperationalError:
+        templates = [
+            json.loads(row[0])
+            for row in src.execute("SELECT result_json FROM results")
+            if row[0]
+        ]
+    src.close()
+    if not templates:
+        logger.error("No results found in %s", args.source_db)
+        return 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_db = Path(tmp) / "legacy.sqlite3"
+        columnar_db = Path(tmp) / "columnar.sqlite3"
+
+        _, legacy_w = timed(legacy_write, legacy_db, synthetic_items(templates, args.rows))
+        _, columnar_w = timed(
+            columnar_write, columnar_db, synthetic_items(templates, args.rows), args.batch
+        )
+        n_legacy, legacy_r = timed(legacy_read, legacy_db)
+        n_columnar, columnar_r = timed(columnar_read, columnar_db)
+        legacy_peak = peak_memory(legacy_read, legacy_db)
+        columnar_peak = peak_memory(columnar_read, columnar_db)
+
+        conn = sqlite3.connect(str(columnar_db))
+        fallbacks = conn.execute("SELECT COUNT(*) FROM results WHERE extras_json IS NOT NULL").fetchone()[0]
+        conn.close()
+
+        print(f"Rows:                {args.rows} (from {len(templates)} templates)")
+        print(f"Write legacy:        {legacy_w:.2f} s")
+        print(f"Write columnar:      {columnar_w:.2f} s")
+        print(f"Read legacy:         {legacy_r:.2f} s  peak {legacy_peak / 2**20:.1f} MiB")
+        print(f"Read columnar:       {columnar_r:.2f} s  peak {columnar_peak / 2**20:.1f} MiB")
+        print(f"DB size legacy:      {legacy_db.stat().st_size / 2**20:.1f} MiB")
+        print(f"DB size columnar:    {columnar_db.stat().st_size / 2**20:.1f} MiB")
+        print(f"JSON fallback rows:  {fallbacks}")
+        if n_legacy != n_columnar:
+            print(f"WARNING: row counts differ ({n_legacy} vs {n_columnar})")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
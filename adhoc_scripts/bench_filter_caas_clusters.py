@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark CAAS cluster ("train") detection in CT_POSTPROC.
+
+Compares the legacy pairwise scan of filter_caas_clusters-param.py (every (l, r)
+interval of a gene's positions, O(n^2) density tests) against the current
+ctrain, on synthetic genes with dense stretches of CAAS positions. Both must
+discard exactly the same positions.
+"""
+
+import sys
+import time
+import argparse
+import importlib.util
+import logging
+from pathlib import Path
+
+import numpy as np
+
+# Setup paths
+WORKSPACE_ROOT = Path(__file__).parent.parent
+FILTER_SCRIPT = (
+    WORKSPACE_ROOT / "subworkflows" / "CT_POSTPROC" / "local" / "filter_caas_clusters-param.py"
+)
+
+logging.basicConfig(level=logging.WARNING, format="%(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+
+def load_filter_module():
+    """Import filter_caas_clusters-param.py (hyphenated name, not importable directly)."""
+    spec = importlib.util.spec_from_file_location("filter_caas_clusters", FILTER_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def legacy_ctrain(position_list, maxcaas, minlen):
+    """Discard set of the legacy pairwise interval scan."""
+    unique = np.sort(np.unique(position_list))
+    n = len(unique)
+    if n < minlen:
+        return []
+    bad_positions = set()
+    for r in range(n):
+        for l in range(r + 1):
+            span = unique[r] - unique[l] + 1
+            if span < minlen:
+                continue
+            if (r - l + 1) / span >= maxcaas:
+                bad_positions.update(unique[l : r + 1].tolist())
+    return sorted(bad_positions)
+
+
+def synthetic_gene(rng, n_positions, length, n_trains):
+    """Scattered positions over ``length`` residues plus ``n_trains`` dense stretches."""
+    background = rng.integers(1, length, size=max(n_positions - 10 * n_trains, 0))
+    trains = [
+        start + rng.choice(30, size=10, replace=False)
+        for start in rng.integers(1, length, size=n_trains)
+    ]
+    return np.concatenate([background] + trains)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark CAAS cluster filtering (legacy pairwise vs linear sweep)",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""\
+Examples:
+  python bench_filter_caas_clusters.py
+  python bench_filter_caas_clusters.py --genes 50 --positions 800 --maxcaas 0.5 --minlen 5
+        """,
+    )
+    parser.add_argument("--genes", type=int, default=20, help="Synthetic genes (default: 20)")
+    parser.add_argument(
+        "--positions", type=int, default=400, help="CAAS positions per gene (default: 400)"
+    )
+    parser.add_argument(
+        "--length", type=int, default=3000, help="Gene length in residues (default: 3000)"
+    )
+    parser.add_argument("--trains", type=int, default=5, help="Dense stretches per gene")
+    parser.add_argument("--maxcaas", type=float, default=0.7, help="Density threshold")
+    parser.add_argument("--minlen", type=int, default=3, help="Minimum interval length")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    module = load_filter_module()
+    rng = np.random.default_rng(args.seed)
+    genes = [
+        synthetic_gene(rng, args.positions, args.length, args.trains)
+        for _ in range(args.genes)
+    ]
+
+    t0 = time.perf_counter()
+    legacy = [legacy_ctrain(gene, args.maxcaas, args.minlen) for gene in genes]
+    legacy_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    fast = [module.ctrain(gene, args.maxcaas, args.minlen) for gene in genes]
+    fast_s = time.perf_counter() - t0
+
+    mismatches = sum(a != b for a, b in zip(legacy, fast))
+    discarded = sum(len(d) for d in fast)
+
+    n = len(genes)
+    print(f"Genes:               {n} x {args.positions} positions")
+    print(f"Positions discarded: {discarded}")
+    print(f"Legacy per gene:     {1000 * legacy_s / n:.2f} ms  (total {legacy_s:.3f} s)")
+    print(f"Sweep per gene:      {1000 * fast_s / n:.3f} ms  (total {fast_s:.3f} s)")
+    print(f"Speedup:             {legacy_s / max(fast_s, 1e-9):.1f}x")
+    if mismatches:
+        print(f"WARNING: discard sets differ for {mismatches} genes")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
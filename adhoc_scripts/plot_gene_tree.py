@@ -115,50 +115,55 @@ Examples:
     
     logger.info(f"Found {len(results)} record(s)")
     
-    # Load node posteriors
-    posteriors_path = args.debug_root / "diagnostics" / "node_dumps" / f"{args.gene.lower()}_posteriors.jsonl"
-    per_node = {}
-    if posteriors_path.exists():
-        with open(posteriors_path) as f:
-            for line in f:
-                if not line.strip():
-                    continue
-                try:
-                    obj = json.loads(line)
-                    if obj.get("__metadata__"):
+    # Load node posteriors (binary site-indexed dump, legacy JSONL as fallback)
+    from src.asr.node_dump import NodePosteriorDump, node_dump_path
+
+    dump_dir = args.debug_root / "diagnostics" / "node_dumps"
+    dump_path = node_dump_path(dump_dir, args.gene)
+    site = args.position + 1  # posteriors are 1-based, input is 0-based
+    site_posteriors = {}
+    if dump_path.exists():
+        site_posteriors = NodePosteriorDump.open(dump_path).site_posteriors(site)
+    else:
+        legacy_path = dump_dir / f"{args.gene.lower()}_posteriors.jsonl"
+        if legacy_path.exists():
+            with open(legacy_path) as f:
+                for line in f:
+                    if not line.strip():
                         continue
-                    nid = obj.get("node_id")
-                    positions = obj.get("positions") or {}
-                    if nid is not None:
-                        nid = int(nid)
-                        for pos_s, aa_map in positions.items():
-                            try:
-                                pos = int(pos_s)
-                            except:
-                                continue
-                            if pos == args.position + 1:  # posteriors are 1-based, input is 0-based
-                                if isinstance(aa_map, dict):
-                                    best_aa = None
-                                    best_prob = -1.0
-                                    for aa, prob in aa_map.items():
-                                        try:
-                                            prob = float(prob)
-                                        except:
-                                            continue
-                                        if prob > best_prob:
-                                            best_prob = prob
-                                            best_aa = aa
-                                    if best_aa:
-                                        per_node[nid] = (best_aa, best_prob)
-                                        per_node[str(nid)] = (best_aa, best_prob)
-                except json.JSONDecodeError:
-                    continue
-        
-        if per_node:
-            logger.info(f"Loaded posteriors for {len(per_node)} nodes")
-            for result in results:
-                result["node_posteriors"] = {"per_node": per_node}
-    
+                    try:
+                        obj = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if obj.get("__metadata__") or obj.get("node_id") is None:
+                        continue
+                    aa_map = (obj.get("positions") or {}).get(str(site))
+                    if isinstance(aa_map, dict):
+                        site_posteriors[int(obj["node_id"])] = aa_map
+        else:
+            logger.warning(f"Node posterior dump not found: {dump_path}")
+
+    per_node = {}
+    for nid, aa_map in site_posteriors.items():
+        best_aa, best_prob = None, -1.0
+        for aa, prob in aa_map.items():
+            try:
+                prob = float(prob)
+            except (TypeError, ValueError):
+                continue
+            if prob > best_prob:
+                best_aa, best_prob = aa, prob
+        if best_aa:
+            per_node[nid] = (best_aa, best_prob)
+            per_node[str(nid)] = (best_aa, best_prob)
+
+    if per_node:
+        logger.info(f"Loaded posteriors for {len(per_node)} nodes")
+        for result in results:
+            result["node_posteriors"] = {"per_node": per_node}
+    elif dump_path.exists():
+        logger.warning(f"No node posteriors for {args.gene} at site {site} in {dump_path}")
+
     # Load tip details
     tip_path = args.debug_root / "diagnostics" / "tip_details" / f"{args.gene.lower()}_tip_details.jsonl"
     if tip_path.exists():
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Validate the native marginal ASR engine against codeml posteriors.
+
+For every asr_{GENE}/ directory of a codeml ASR cache (rst, tree_paml.nwk and
+alignment_paml.phy as written by ASRReconstructor), the same alignment and tree
+are reconstructed with --asr-mode native and the best state / posterior of each
+ancestral node and site are compared with codeml's rst.
+"""
+
+import sys
+import time
+import random
+import argparse
+import logging
+import tempfile
+from pathlib import Path
+
+# Setup paths
+WORKSPACE_ROOT = Path(__file__).parent.parent
+SUBWORKFLOW_ROOT = WORKSPACE_ROOT / "subworkflows" / "CT_DISAMBIGUATION" / "local"
+
+# Add to path
+sys.path.insert(0, str(SUBWORKFLOW_ROOT))
+
+logging.basicConfig(level=logging.WARNING, format="%(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+
+def read_sequential_phylip(path):
+    """Read the sequential Phylip written for codeml (name, whitespace, sequence)."""
+    sequences = {}
+    with open(path) as handle:
+        handle.readline()
+        for line in handle:
+            parts = line.split()
+            if len(parts) >= 2:
+                sequences[parts[0]] = "".join(parts[1:])
+    return sequences
+
+
+def clade_node_ids(rst_file):
+    """Tip-name set -> PAML node id of every internal node of an rst labeled tree."""
+    from src.asr.tree_parser import extract_rst_labeled_tree, parse_newick
+
+    clades = {}
+
+    def _tips(node):
+        if node.is_leaf():
+            return frozenset([node.name.split("_", 1)[-1]])
+        tips = frozenset().union(*(_tips(child) for child in node.children))
+        clades[tips] = int(node.paml_label)
+        return tips
+
+    _tips(parse_newick(extract_rst_labeled_tree(rst_file)))
+    return clades
+
+
+def compare_gene(gene_dir, model, max_sites, rng):
+    from Bio import Phylo
+
+    from src.asr.native import write_native_rst
+    from src.asr.posterior_cache import build_posterior_store
+
+    rst_file = gene_dir / "rst"
+    tree_file = gene_dir / "tree_paml.nwk"
+    sequences = read_sequential_phylip(gene_dir / "alignment_paml.phy")
+    tree = Phylo.read(tree_file, "newick")
+
+    codeml = build_posterior_store(rst_file, tree_file)
+    sites = [int(s) for s in codeml.sites]
+    if max_sites and len(sites) > max_sites:
+        sites = sorted(rng.sample(sites, max_sites))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        native_rst = write_native_rst(
+            gene_dir.name, sequences, tree, Path(tmp), model=model, positions=sites
+        )
+        elapsed = time.perf_counter() - t0
+        native = build_posterior_store(native_rst, Path(tmp) / "tree_paml.nwk")
+        native_post, _ = native.node_posteriors()
+        native_ids = clade_node_ids(native_rst)
+    codeml_post, _ = codeml.node_posteriors(positions=sites)
+
+    # Nodes are matched by descendant tips: codeml numbers tips in alignment order
+    codeml_ids = clade_node_ids(rst_file)
+    if set(codeml_ids) != set(native_ids):
+        return None, "ancestral clades differ from codeml's labeled tree"
+    to_native = {node_id: native_ids[tips] for tips, node_id in codeml_ids.items()}
+
+    agree = total = 0
+    abs_diff = 0.0
+    for node_id, by_site in codeml_post.items():
+        for site, states in by_site.items():
+            (aa_c, p_c), = states.items()
+            (aa_n, p_n), = native_post[to_native[node_id]][site].items()
+            total += 1
+            agree += aa_c == aa_n
+            abs_diff += abs(p_c - p_n) if aa_c == aa_n else 0.0
+    return {
+        "sites": len(sites),
+        "calls": total,
+        "agree": agree,
+        "mean_abs_diff": abs_diff / max(agree, 1),
+        "seconds": elapsed,
+    }, None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare native marginal ASR with codeml rst posteriors",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""\
+Examples:
+  python validate_native_asr.py /path/to/asr_cache --genes TP53 MLPH
+  python validate_native_asr.py /path/to/asr_cache --limit 50 --max-sites 100
+        """,
+    )
+    parser.add_argument("asr_cache", type=Path, help="Directory with asr_{GENE}/ codeml outputs")
+    parser.add_argument("--genes", nargs="*", default=None, help="Genes to validate (default: all)")
+    parser.add_argument("--limit", type=int, default=0, help="Validate at most N genes")
+    parser.add_argument(
+        "--max-sites",
+        type=int,
+        default=200,
+        help="Random sites per gene (0 = all; default: 200)",
+    )
+    parser.add_argument("--model", default="lg", help="Substitution model (default: lg)")
+    parser.add_argument("--seed", type=int, default=1, help="Site sampling seed")
+    args = parser.parse_args()
+
+    if args.genes:
+        gene_dirs = [args.asr_cache / f"asr_{g}" for g in args.genes]
+    else:
+        gene_dirs = sorted(p for p in args.asr_cache.glob("asr_*") if p.is_dir())
+    gene_dirs = [
+        p for p in gene_dirs if (p / "rst").exists() and (p / "alignment_paml.phy").exists()
+    ]
+    if args.limit > 0:
+        gene_dirs = gene_dirs[: args.limit]
+    if not gene_dirs:
+        logger.error("No codeml outputs (rst + alignment_paml.phy) found in %s", args.asr_cache)
+        return 1
+
+    rng = random.Random(args.seed)
+    calls = agree = 0
+    weighted_diff = 0.0
+    seconds = 0.0
+    print("gene\tsites\tagreement\tmean_abs_diff\tseconds")
+    for gene_dir in gene_dirs:
+        try:
+            stats, problem = compare_gene(gene_dir, args.model, args.max_sites, rng)
+        except Exception as exc:
+            problem = f"failed: {exc}"
+            stats = None
+        if stats is None:
+            print(f"{gene_dir.name}\t-\t{problem}")
+            continue
+        print(
+            f"{gene_dir.name}\t{stats['sites']}\t{stats['agree'] / max(stats['calls'], 1):.4f}"
+            f"\t{stats['mean_abs_diff']:.4f}\t{stats['seconds']:.2f}"
+        )
+        calls += stats["calls"]
+        agree += stats["agree"]
+        weighted_diff += stats["mean_abs_diff"] * stats["agree"]
+        seconds += stats["seconds"]
+
+    if calls:
+        print(
+            f"TOTAL\t{calls} node-site calls\t{agree / calls:.4f}"
+            f"\t{weighted_diff / max(agree, 1):.4f}\t{seconds:.2f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
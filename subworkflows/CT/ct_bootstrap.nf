@@ -159,6 +159,7 @@ bash $baseDir/subworkflows/CT/local/scripts/run_ct_bootstrap_batch.sh \\
     --progress-log ${params.progress_log != "none" ? '1' : '0'} \\
     --export-groups ${params.export_groups != null && params.export_groups != "none" ? '1' : '0'} \\
     --export-perm-discovery ${params.export_perm_discovery != null && params.export_perm_discovery != "none" ? '1' : '0'} \\
-    --extra-args-file .ct_bootstrap_batch_args
+    --extra-args-file .ct_bootstrap_batch_args \\
+    --inprocess ${params.ct_bootstrap_batch_inprocess ? '1' : '0'}
 """
 }
@@ -143,6 +143,7 @@ bash $baseDir/subworkflows/CT/local/scripts/run_ct_discovery_batch.sh \\
     --ali-format ${params.ali_format} \\
     --runner-mode ${runnerMode} \\
     --ct-bin ${ctBinary} \\
-    --extra-args-file .ct_discovery_batch_args
+    --extra-args-file .ct_discovery_batch_args \\
+    --inprocess ${params.ct_discovery_batch_inprocess ? '1' : '0'}
 """
 }
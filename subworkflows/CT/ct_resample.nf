@@ -73,16 +73,16 @@ process RESAMPLE {
         fi
 
         mkdir -p ${nw_tree.baseName}.resampled.output
-        /usr/local/bin/_entrypoint.sh Rscript \\
-        '$baseDir/subworkflows/CT/local/permulations.R' \\
-        "${nw_tree}" \\
-        "${caas_config}" \\
-        ${params.cycles} \\
-        ${params.perm_strategy} \\
-        "${trait_val}" \\
-        ${nw_tree.baseName}.resampled.output \\
-        ${params.chunk_size} \\
-        ${params.include_b0}
+        /usr/local/bin/_entrypoint.sh ct resample \\
+        -m bm \\
+        -p "${nw_tree}" \\
+        --bytemp "${caas_config}" \\
+        --traitvalues "${trait_val}" \\
+        -o ${nw_tree.baseName}.resampled.output \\
+        --cycles ${params.cycles} \\
+        --chunk_size ${params.chunk_size} \\
+        --include_b0 ${params.include_b0} \\
+        --workers ${task.cpus}
         """
     } else {
         """
@@ -111,16 +111,16 @@ process RESAMPLE {
         fi
 
         mkdir -p ${nw_tree.baseName}.resampled.output
-        Rscript \\
-        '$baseDir/subworkflows/CT/local/permulations.R' \\
-        "${nw_tree}" \\
-        "${caas_config}" \\
-        ${params.cycles} \\
-        ${params.perm_strategy} \\
-        "${trait_val}" \\
-        ${nw_tree.baseName}.resampled.output \\
-        ${params.chunk_size} \\
-        ${params.include_b0}
+        $baseDir/subworkflows/CT/local/ct resample \\
+        -m bm \\
+        -p "${nw_tree}" \\
+        --bytemp "${caas_config}" \\
+        --traitvalues "${trait_val}" \\
+        -o ${nw_tree.baseName}.resampled.output \\
+        --cycles ${params.cycles} \\
+        --chunk_size ${params.chunk_size} \\
+        --include_b0 ${params.include_b0} \\
+        --workers ${task.cpus}
         """
     }
 }
@@ -0,0 +1,377 @@
+#                      _              _
+#                     | |            | |
+#   ___ __ _  __ _ ___| |_ ___   ___ | |___
+#  / __/ _` |/ _` / __| __/ _ \ / _ \| / __|
+# | (_| (_| | (_| \__ \ || (_) | (_) | \__ \
+#  \___\__,_|\__,_|___/\__\___/ \___/|_|___/
+
+__version__ = "2.0.0-paired"
+
+'''
+A Convergent Amino Acid Substitution identification
+and analysis toolbox
+
+Author:         Fabio Barteri (fabio.barteri@upf.edu)
+
+Contributors:   Alejandro Valenzuela (alejandro.valenzuela@upf.edu)
+                Xavier Farré (xfarrer@igtp.cat),
+                David de Juan (david.juan@upf.edu).
+
+Pair-aware implementation: Miguel Ramon (miguel.ramon@upf.edu)
+
+MODULE NAME: alimatrix.py
+DESCRIPTION: Column-major MSA engine. Loads an alignment once into a 2-D uint8
+             matrix (records x columns) and runs the slicer filter, the gap/missing
+             counts and the CAAS/CAAP pattern checks over all columns at once.
+INPUTS:      Input MSAs, trait config objects from pindex.load_cfg()
+CALLED BY:   disco.py, runslice.py, boot.py
+
+TABLE OF CONTENTS
+------------------------------------------
+load_matrix()               Imports an MSA into an alignment_matrix object
+
+column_filter()             Vectorized filter_position(): boolean mask of the columns
+                            that pass the gap ratio and minimum changes thresholds
+
+slice_matrix()              Matrix counterpart of alimport.slice()
+
+build_trait_index()         Precomputes species -> row and trait -> FG/BG row arrays
+
+trait_filter_mask()         Gap, missing and pair-aware filters of one trait over all columns
+
+pattern_kernel()            CAAS/CAAP overlap and pattern classification over all columns
+
+block_pattern_kernel()      Same classification from symbol count matrices, for many
+                            positions and many resampled traits at once (bootstrap)
+
+'''
+
+import numpy as np
+from Bio import AlignIO
+
+
+# Symbols counted as gapped by process_position(): the gap itself plus the
+# IUPAC ambiguity codes (X, B, Z, J, U), always compared after upper-casing.
+GAP_SYMBOL = ord("-")
+NULL_SYMBOLS = np.frombuffer(b"-XBZJU", dtype=np.uint8)
+
+# Pattern codes returned by pattern_kernel(), as strings in the discovery output
+PATTERN_NAMES = {0: "null", 1: "1", 2: "2", 3: "3", 4: "4"}
+
+_UPPER = np.arange(256, dtype=np.uint8)
+_UPPER[ord("a"):ord("z") + 1] -= 32
+
+
+class alignment_matrix():
+    def __init__(self):
+        self.genename = ""
+        self.ids = []               # Record ids, in alignment order
+        self.species = []           # Unique species (same construction as slice())
+        self.sp2row = {}            # species -> row (last record wins, as in import_position())
+        self.rows = None            # One row per unique species, in first-seen order
+        self.m = None               # uint8 matrix, records x columns, raw symbols
+        self.columns = None         # Surviving column indices after column_filter()
+        self.removed = {}           # Columns removed per slicer criterion
+
+    def upper(self, rows, columns):
+        return _UPPER[self.m[np.ix_(rows, columns)]]
+
+    def position_dict(self, column):
+        # Rebuilds the import_position() dictionary of one column
+        col = self.m[:, column]
+        d = {}
+        for i, rid in enumerate(self.ids):
+            d[rid] = chr(col[i]) + "@" + str(column)
+        return d
+
+
+class trait_rows():
+    def __init__(self):
+        self.trait = ""
+        self.fg_species = []        # FG species present in the alignment
+        self.bg_species = []
+        self.fg_rows = None
+        self.bg_rows = None
+        self.fg_pair_idx = None     # Pair index of every FG row (pair-aware gap sets)
+        self.bg_pair_idx = None
+        self.n_pairs = 0
+
+        self.miss_fg = 0            # Missing species are constant along the alignment
+        self.miss_bg = 0
+        self.miss_pairs_fg = set()
+        self.miss_pairs_bg = set()
+
+
+# FUNCTION load_matrix()
+# Imports an MSA into an alignment_matrix object
+
+def load_matrix(alignment_file, alignment_format):
+
+    z = alignment_matrix()
+    imported_alignment = AlignIO.read(alignment_file, alignment_format)
+    z.genename = alignment_file.split("/")[-1].split(".")[0]
+
+    seqs = []
+    for record in imported_alignment:
+        z.ids.append(record.id)
+        seqs.append(str(record.seq))
+
+    z.species = list(set(z.ids))
+
+    for i, rid in enumerate(z.ids):
+        z.sp2row[rid] = i
+    z.rows = np.fromiter(z.sp2row.values(), dtype=np.intp, count=len(z.sp2row))
+
+    length = imported_alignment.get_alignment_length()
+    z.m = np.frombuffer("".join(seqs).encode("latin-1"), dtype=np.uint8).reshape(len(seqs), length)
+    z.columns = np.arange(length)
+
+    return z
+
+
+# FUNCTION column_filter()
+# Vectorized filter_position(): same gap ratio and minimum changes rules,
+# evaluated on the raw symbols of one row per species.
+
+def column_filter(matrix, changes_threshold, max_gaps_ratio):
+
+    sub = matrix.m[matrix.rows]
+    n = sub.shape[0]
+
+    gaps = (sub == GAP_SYMBOL).sum(axis=0)
+    gap_ok = gaps / float(n) <= max_gaps_ratio
+
+    # Changes = non-gap symbols minus the count of the most frequent one
+    most_common = np.zeros(sub.shape[1], dtype=np.int64)
+    for symbol in np.unique(sub):
+        if symbol == GAP_SYMBOL:
+            continue
+        most_common = np.maximum(most_common, (sub == symbol).sum(axis=0))
+
+    seconds = (n - gaps) - most_common
+    change_ok = seconds >= changes_threshold
+
+    return gap_ok, change_ok
+
+
+# FUNCTION slice_matrix()
+# Matrix counterpart of alimport.slice()
+
+def slice_matrix(alignment_file, alignment_format, column_threshold, max_gaps = 0.5):
+
+    z = load_matrix(alignment_file, alignment_format)
+    gap_ok, change_ok = column_filter(z, column_threshold, max_gaps)
+
+    z.columns = np.flatnonzero(gap_ok & change_ok)
+    z.removed = {
+        "gaps": int((~gap_ok).sum()),
+        "changes": int((gap_ok & ~change_ok).sum()),
+    }
+
+    return z
+
+
+# FUNCTION build_trait_index()
+# Precomputes species -> row and trait -> FG/BG row index arrays from a load_cfg() object
+
+def build_trait_index(multiconfig, matrix):
+
+    from modules.caas_id import _pair_sort_key
+
+    in_alignment = set(matrix.species)
+    missing = set(multiconfig.s2t.keys()) - in_alignment
+
+    index = {}
+
+    for trait in multiconfig.alltraits:
+        if trait not in multiconfig.trait2fg or trait not in multiconfig.trait2bg:
+            continue
+
+        t = trait_rows()
+        t.trait = trait
+
+        fg = [sp for sp in dict.fromkeys(multiconfig.trait2fg[trait]) if sp in in_alignment]
+        bg = [sp for sp in dict.fromkeys(multiconfig.trait2bg[trait]) if sp in in_alignment]
+        fg.sort(key=lambda sp: _pair_sort_key(multiconfig, sp))
+        bg.sort(key=lambda sp: _pair_sort_key(multiconfig, sp))
+
+        t.fg_species = fg
+        t.bg_species = bg
+        t.fg_rows = np.array([matrix.sp2row[sp] for sp in fg], dtype=np.intp)
+        t.bg_rows = np.array([matrix.sp2row[sp] for sp in bg], dtype=np.intp)
+
+        pair_ids = {}
+        for sp in fg + bg:
+            pair = multiconfig.get_pair(sp)
+            if pair and pair not in pair_ids:
+                pair_ids[pair] = len(pair_ids)
+        t.n_pairs = len(pair_ids)
+        t.fg_pair_idx = np.array([pair_ids.get(multiconfig.get_pair(sp), -1) for sp in fg], dtype=np.intp)
+        t.bg_pair_idx = np.array([pair_ids.get(multiconfig.get_pair(sp), -1) for sp in bg], dtype=np.intp)
+
+        miss_fg = set(multiconfig.trait2fg[trait]).intersection(missing)
+        miss_bg = set(multiconfig.trait2bg[trait]).intersection(missing)
+        t.miss_fg = len(miss_fg)
+        t.miss_bg = len(miss_bg)
+        t.miss_pairs_fg = set(p for p in map(multiconfig.get_pair, miss_fg) if p)
+        t.miss_pairs_bg = set(p for p in map(multiconfig.get_pair, miss_bg) if p)
+
+        index[trait] = t
+
+    return index
+
+
+# FUNCTION _pair_sets_differ()
+# True where both sides have gapped pairs and the two pair sets are different
+
+def _pair_sets_differ(fg_flags, bg_flags, fg_pair_idx, bg_pair_idx, n_pairs):
+
+    ncols = fg_flags.shape[1]
+    fg_pairs = np.zeros((n_pairs + 1, ncols), dtype=np.int32)
+    bg_pairs = np.zeros((n_pairs + 1, ncols), dtype=np.int32)
+
+    # Species without a pair land in the extra last row and are ignored
+    np.add.at(fg_pairs, fg_pair_idx, fg_flags)
+    np.add.at(bg_pairs, bg_pair_idx, bg_flags)
+    fg_pairs = fg_pairs[:n_pairs] > 0
+    bg_pairs = bg_pairs[:n_pairs] > 0
+
+    return fg_pairs.any(axis=0) & bg_pairs.any(axis=0) & (fg_pairs != bg_pairs).any(axis=0)
+
+
+# FUNCTION trait_filter_mask()
+# Gap, missing and pair-aware filters of one trait over a set of columns.
+# Thresholds use the "NO" convention of the command line (no filter).
+# Returns (keep mask, FG null flags, BG null flags).
+
+def trait_filter_mask(matrix, t, columns, max_fg_gaps, max_bg_gaps, max_overall_gaps,
+                      max_fg_miss, max_bg_miss, max_overall_miss,
+                      check_miss_pairs=False, check_gap_pairs=False):
+
+    fg = matrix.upper(t.fg_rows, columns)
+    bg = matrix.upper(t.bg_rows, columns)
+
+    fg_null = np.isin(fg, NULL_SYMBOLS)
+    bg_null = np.isin(bg, NULL_SYMBOLS)
+
+    # The trait must have at least one non-gap symbol on each side
+    keep = (fg != GAP_SYMBOL).any(axis=0) & (bg != GAP_SYMBOL).any(axis=0)
+
+    gfg = fg_null.sum(axis=0)
+    gbg = bg_null.sum(axis=0)
+
+    if max_fg_gaps != "NO":
+        keep &= gfg <= int(max_fg_gaps)
+    if max_bg_gaps != "NO":
+        keep &= gbg <= int(max_bg_gaps)
+    if max_overall_gaps != "NO":
+        keep &= gfg + gbg <= int(max_overall_gaps)
+
+    miss_ok = True
+    if max_fg_miss != "NO" and t.miss_fg > int(max_fg_miss):
+        miss_ok = False
+    if max_bg_miss != "NO" and t.miss_bg > int(max_bg_miss):
+        miss_ok = False
+    if max_overall_miss != "NO" and t.miss_fg + t.miss_bg > int(max_overall_miss):
+        miss_ok = False
+    if check_miss_pairs and t.miss_pairs_fg and t.miss_pairs_bg and t.miss_pairs_fg != t.miss_pairs_bg:
+        miss_ok = False
+
+    if not miss_ok:
+        keep[:] = False
+
+    if check_gap_pairs and t.n_pairs > 0:
+        keep &= ~_pair_sets_differ(fg_null, bg_null, t.fg_pair_idx, t.bg_pair_idx, t.n_pairs)
+
+    return keep, fg_null, bg_null
+
+
+# FUNCTION pattern_kernel()
+# Overlap and pattern classification of iscaas() / check_caap_pattern() over all columns.
+# fg_codes and bg_codes are integer matrices (species x columns), -1 marks excluded symbols.
+# Returns (is_convergent mask, pattern code array; 0 = null).
+
+def pattern_kernel(fg_codes, bg_codes, max_conserved=0):
+
+    ncols = fg_codes.shape[1]
+
+    fg_unique = np.zeros(ncols, dtype=np.int64)
+    bg_unique = np.zeros(ncols, dtype=np.int64)
+    shared_fg = np.zeros(ncols, dtype=np.int64)
+    shared_bg = np.zeros(ncols, dtype=np.int64)
+    non_overlapping_fg = np.zeros(ncols, dtype=np.int64)
+    non_overlapping_bg = np.zeros(ncols, dtype=np.int64)
+
+    symbols = np.union1d(np.unique(fg_codes), np.unique(bg_codes))
+
+    for symbol in symbols[symbols >= 0]:
+        cf = (fg_codes == symbol).sum(axis=0)
+        cb = (bg_codes == symbol).sum(axis=0)
+        in_fg = cf > 0
+        in_bg = cb > 0
+
+        fg_unique += in_fg
+        bg_unique += in_bg
+
+        shared = in_fg & in_bg
+        shared_fg += np.where(shared, cf, 0)
+        shared_bg += np.where(shared, cb, 0)
+
+        non_overlapping_fg += np.where(in_bg, 0, cf)
+        non_overlapping_bg += np.where(in_fg, 0, cb)
+
+    overlap = np.minimum(shared_fg, shared_bg)
+    convergent = (overlap <= max_conserved) & ((non_overlapping_fg >= 2) | (non_overlapping_bg >= 2))
+
+    pattern = np.full(ncols, 4, dtype=np.int8)
+    pattern[bg_unique == 1] = 3
+    pattern[fg_unique == 1] = 2
+    pattern[(fg_unique == 1) & (bg_unique == 1)] = 1
+    pattern[(fg_unique == 0) | (bg_unique == 0)] = 0
+
+    return convergent, pattern
+
+
+# FUNCTION admitted_mask()
+# Applies the "pattern in admitted_patterns" check of fetch_caas() to a pattern code array
+
+def admitted_mask(pattern, admitted_patterns):
+
+    out = np.zeros(pattern.shape, dtype=bool)
+    for code, name in PATTERN_NAMES.items():
+        if name in admitted_patterns:
+            out |= pattern == code
+    return out
+
+
+# FUNCTION block_pattern_kernel()
+# Overlap and pattern classification of iscaas() / check_caap_pattern() from symbol counts.
+# fg_counts and bg_counts are (traits x symbols) matrices whose columns are grouped in
+# consecutive blocks, one per position, starting at block_starts (every block non-empty).
+# Returns (is_convergent, pattern code; 0 = null), both (traits x blocks).
+
+def block_pattern_kernel(fg_counts, bg_counts, block_starts, max_conserved=0):
+
+    in_fg = fg_counts > 0
+    in_bg = bg_counts > 0
+    shared = in_fg & in_bg
+
+    def per_block(values):
+        return np.add.reduceat(values, block_starts, axis=1)
+
+    fg_unique = per_block(in_fg.astype(np.int32))
+    bg_unique = per_block(in_bg.astype(np.int32))
+
+    overlap = np.minimum(per_block(np.where(shared, fg_counts, 0)), per_block(np.where(shared, bg_counts, 0)))
+    non_overlapping_fg = per_block(np.where(in_bg, 0, fg_counts))
+    non_overlapping_bg = per_block(np.where(in_fg, 0, bg_counts))
+
+    convergent = (overlap <= max_conserved) & ((non_overlapping_fg >= 2) | (non_overlapping_bg >= 2))
+
+    pattern = np.full(fg_unique.shape, 4, dtype=np.int8)
+    pattern[bg_unique == 1] = 3
+    pattern[fg_unique == 1] = 2
+    pattern[(fg_unique == 1) & (bg_unique == 1)] = 1
+    pattern[(fg_unique == 0) | (bg_unique == 0)] = 0
+
+    return convergent, pattern
@@ -31,13 +31,12 @@ import_position()           Imports a position from a BioPython imported alignme
 filter_position()           This function is designed to exclude those positions that are so conserved
                             that it is impossible (or unlikely) for them to return a CAAS.
 
-slice()                     Filters the alignment and returns the
-
-'''                                                       
+sliced_positions            Lazy sequence of the surviving position dictionaries
 
+slice()                     Filters the alignment and returns the surviving positions, with the
+                            number of columns removed by each filter criterion
 
-from Bio import AlignIO
-import functools
+'''                                                       
 
 
 # FUNCTION import_position()
@@ -100,32 +99,53 @@ def filter_position(imported_position, changes_threshold, max_gaps_ratio):
     return outflag
 
 
+# CLASS sliced_positions
+# Lazy, re-iterable sequence of the position dictionaries that survived the slicer.
+# Each dictionary is built from the packed alignment only when it is consumed.
+
+class sliced_positions():
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+
+    def __len__(self):
+        return len(self.matrix.columns)
+
+    def __iter__(self):
+        for column in self.matrix.columns:
+            yield self.matrix.position_dict(int(column))
+
+
 # FUNCTION slice()
-# Generates a key file per each gene
+# Generates a key file per each gene.
+# The alignment is read once into a packed matrix; filter_position() is applied to all the
+# columns in one vectorized pre-pass and only the surviving columns are turned into
+# import_position() dictionaries, lazily, while they are consumed.
  
 def slice(alignment_file, alignment_format, column_threshold, max_gaps = 0.5):
 
+    from modules.alimatrix import slice_matrix
+
     class slice_object():
         def __init__(self):
             self.d = []
             self.genename = ""
             self.species = []
+            self.length = 0             # Alignment columns before slicing
+            self.removed = {}           # Columns removed per criterion ("gaps", "changes")
     
     z = slice_object()
-    imported_alignment = AlignIO.read(alignment_file, alignment_format)
-    z.genename = alignment_file.split("/")[-1].split(".")[0]
 
-    # SPECIES IN THE ALIGNMENT
+    # FILTERING POSITIONS (vectorized filter_position())
 
-    for x in imported_alignment:
-        z.species.append(x.id)
-    
-    z.species = list(set(z.species))
+    matrix = slice_matrix(alignment_file, alignment_format, column_threshold, max_gaps)
 
-    # IMPORTING POSITIONS
+    z.genename = matrix.genename
+    z.species = matrix.species
+    z.length = matrix.m.shape[1]
+    z.removed = matrix.removed
 
-    imported_positions = list(map(functools.partial(import_position, imported_alignment = imported_alignment), [position for position in range(0,imported_alignment.get_alignment_length())]))
+    # IMPORTING THE SURVIVING POSITIONS (on demand)
 
-    # FILTERING POSITIONS
-    z.d = list(filter(functools.partial(filter_position, changes_threshold = column_threshold, max_gaps_ratio = max_gaps), imported_positions))
-    return z
\ No newline at end of file
+    z.d = sliced_positions(matrix)
+    return z
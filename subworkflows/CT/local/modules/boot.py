@@ -21,7 +21,7 @@ Pair-aware implementation: Miguel Ramon (miguel.ramon@upf.edu)
 
 MODULE NAME: boot.py
 DESCRIPTION: bootstrap function
-DEPENDENCIES: alimport.py, caas_id.py, pindex.py
+DEPENDENCIES: alimport.py, alimatrix.py, caas_id.py, pindex.py
 CALLED BY: ct
 
 '''
@@ -32,8 +32,12 @@ from modules.disco import process_position
 from modules.caas_id import iscaas
 from modules.caap_id import check_caap_pattern, encode_to_groups, US, GS0, GS1, GS2, GS3, GS4
 from modules.alimport import *
+from modules.alimatrix import NULL_SYMBOLS, GAP_SYMBOL, _UPPER, block_pattern_kernel, admitted_mask
 
 from os.path import exists
+import os
+import numpy as np
+import copy
 import functools
 import time
 from datetime import datetime
@@ -516,21 +520,207 @@ def caasboot(processed_position, genename, list_of_traits, maxgaps_fg, maxgaps_b
             
             return outline
 
+# CLASS boot_positions. The tested positions of one alignment, encoded once for caasboot_matrix()
+
+CAAP_SCHEMES = [("US", US), ("GS0", GS0), ("GS1", GS1), ("GS2", GS2), ("GS3", GS3), ("GS4", GS4)]
+
+# caasboot() returns after its first chunk of traits (chunk_size=1000), taken in set order. Files with
+# more cycles than that cannot be reproduced by caasboot_matrix() and go through the legacy path.
+MATRIX_MAX_CYCLES = 1000
+
+class boot_positions():
+    def __init__(self):
+        self.genename = ""
+        self.names = []             # gene@position of every tested position
+        self.schemes = []           # Discovery schemes of every position (None = test all)
+        self.species = []           # Matrix rows: species of the position dictionaries
+        self.sp_index = {}
+        self.nondash = None         # float32 species x positions: present with a non "-" symbol
+        self.null = None            # float32 species x positions: present and gapped ("-", X, B, Z, J, U)
+        self.blocks = {}            # "CAAS" or scheme name -> (symbol matrix, block starts, block positions)
+
+
+# FUNCTION _symbol_blocks()
+# One-hot (species x symbols) matrix of the ungapped symbols, one block of columns per position.
+# codes holds the symbol code of every species/position (-1 = excluded).
+
+def _symbol_blocks(codes):
+
+    species_idx, position_idx = np.nonzero(codes >= 0)
+    keys = position_idx * 256 + codes[species_idx, position_idx]
+
+    symbols = np.unique(keys)
+    onehot = np.zeros((codes.shape[0], len(symbols)), dtype=np.float32)
+    onehot[species_idx, np.searchsorted(symbols, keys)] = 1
+
+    symbol_positions = symbols // 256
+    block_starts = np.flatnonzero(np.r_[True, symbol_positions[1:] != symbol_positions[:-1]]) if len(symbols) else np.zeros(0, dtype=np.intp)
+
+    return onehot, block_starts, symbol_positions[block_starts]
+
+
+# FUNCTION encode_boot_positions()
+# Encodes the residues of the tested positions once per alignment
+
+def encode_boot_positions(positions_with_schemes, species_in_alignment, genename, caap_mode=False):
+
+    z = boot_positions()
+    z.genename = genename
+
+    for pos_dict, schemes in positions_with_schemes:
+        for sp in pos_dict.keys():
+            if sp not in z.sp_index:
+                z.sp_index[sp] = len(z.species)
+                z.species.append(sp)
+
+    n_species = len(z.species)
+    n_positions = len(positions_with_schemes)
+
+    raw = np.zeros((n_species, n_positions), dtype=np.uint8)
+    present = np.zeros((n_species, n_positions), dtype=bool)
+
+    for p, (pos_dict, schemes) in enumerate(positions_with_schemes):
+        position = ""
+        for sp, aa_info in pos_dict.items():
+            aa, position = aa_info.split("@")
+            raw[z.sp_index[sp], p] = ord(aa)
+            present[z.sp_index[sp], p] = True
+        z.names.append(genename + "@" + position)
+        z.schemes.append(schemes)
+
+    upper = _UPPER[raw]
+    null = present & np.isin(upper, NULL_SYMBOLS)
+
+    z.nondash = (present & (upper != GAP_SYMBOL)).astype(np.float32)
+    z.null = null.astype(np.float32)
+
+    # Species missing from the alignment never enter the ungapped FG/BG sets
+    alignment_species = set(species_in_alignment)
+    in_alignment = np.array([sp in alignment_species for sp in z.species], dtype=bool)
+    ungapped = present & ~null & in_alignment[:, None]
+
+    if caap_mode:
+        for scheme_name, scheme_dict in CAAP_SCHEMES:
+            lookup = np.full(256, -1, dtype=np.int64)
+            for aa, group in scheme_dict.items():
+                lookup[ord(aa)] = ord(group)
+            z.blocks[scheme_name] = _symbol_blocks(np.where(ungapped, lookup[raw], -1))
+    else:
+        z.blocks["CAAS"] = _symbol_blocks(np.where(ungapped, raw.astype(np.int64), -1))
+
+    return z
+
+
+# FUNCTION caasboot_matrix()
+# Matrix counterpart of caasboot(): evaluates all the positions of a boot_positions object against
+# all the resampled traits of one multiconfig at once. Returns the caasboot() output of every position.
+
+def caasboot_matrix(encoded, multiconfig, species_in_alignment, maxgaps_fg, maxgaps_bg, maxgaps_all, maxmiss_fg, maxmiss_bg, maxmiss_all, max_conserved=0, admitted_patterns=["1","2","3"], caap_mode=False, chunk_size=1000):
+
+    species, fg, bg = multiconfig.membership()
+    cycles = multiconfig.cycles
+    n_positions = len(encoded.names)
+
+    # Align the species of the resampled traits on the encoded rows
+    in_alignment = set(species_in_alignment)
+    missing = [j for j, sp in enumerate(species) if sp not in in_alignment]
+    cols = [j for j, sp in enumerate(species) if sp in encoded.sp_index]
+    rows = [encoded.sp_index[species[j]] for j in cols]
+
+    fg_m = np.zeros((fg.shape[0], len(encoded.species)), dtype=np.float32)
+    bg_m = np.zeros((bg.shape[0], len(encoded.species)), dtype=np.float32)
+    fg_m[:, rows] = fg[:, cols]
+    bg_m[:, rows] = bg[:, cols]
+
+    # Missing species are constant along the alignment: one check per trait
+    mfg = fg[:, missing].sum(axis=1)
+    mbg = bg[:, missing].sum(axis=1)
+    miss_ok = np.ones(fg.shape[0], dtype=bool)
+    if maxmiss_all != "NO":
+        miss_ok &= mfg + mbg <= int(maxmiss_all)
+    if maxmiss_fg != "NO":
+        miss_ok &= mfg <= int(maxmiss_fg)
+    if maxmiss_bg != "NO":
+        miss_ok &= mbg <= int(maxmiss_bg)
+
+    # Traits with at least one non "-" symbol on both sides (caasboot() valid traits)
+    valid = ((fg_m @ encoded.nondash) > 0) & ((bg_m @ encoded.nondash) > 0)
+
+    gfg = fg_m @ encoded.null
+    gbg = bg_m @ encoded.null
+    keep = valid & miss_ok[:, None]
+    if maxgaps_all != "NO":
+        keep &= gfg + gbg <= int(maxgaps_all)
+    if maxgaps_fg != "NO":
+        keep &= gfg <= int(maxgaps_fg)
+    if maxgaps_bg != "NO":
+        keep &= gbg <= int(maxgaps_bg)
+
+    counts = {}
+    for kernel_name, (onehot, block_starts, block_positions) in encoded.blocks.items():
+        counts[kernel_name] = np.zeros(n_positions, dtype=np.int64)
+
+        # Positions are processed in chunks to bound the traits x symbols matrices
+        for first in range(0, len(block_starts), chunk_size):
+            last = min(first + chunk_size, len(block_starts))
+            col_first = block_starts[first]
+            col_last = block_starts[last] if last < len(block_starts) else onehot.shape[1]
+
+            chunk_onehot = onehot[:, col_first:col_last]
+            convergent, pattern = block_pattern_kernel(fg_m @ chunk_onehot, bg_m @ chunk_onehot, block_starts[first:last] - col_first, max_conserved)
+
+            hits = convergent & admitted_mask(pattern, admitted_patterns)
+            if caap_mode:
+                hits &= pattern != 0
+
+            chunk_positions = block_positions[first:last]
+            counts[kernel_name][chunk_positions] = (hits & keep[:, chunk_positions]).sum(axis=0)
+
+    any_valid = valid.any(axis=0)
+    all_schemes = [name for name, _ in CAAP_SCHEMES]
+
+    outputs = []
+    for p, position_name in enumerate(encoded.names):
+        if not any_valid[p]:
+            if caap_mode:
+                outputs.append("\n".join(["\t".join([position_name, scheme_name, "0", str(cycles), "0.0"]) for scheme_name in all_schemes]))
+            else:
+                outputs.append("\t".join([position_name, "US", "0", str(cycles), "0.0"]))
+            continue
+
+        if caap_mode:
+            schemes = encoded.schemes[p]
+            if schemes and "CAAS" not in schemes:
+                tested = [name for name in all_schemes if name in schemes]
+            else:
+                tested = all_schemes
+            outputs.append("\n".join(["\t".join([position_name, scheme_name, str(int(counts[scheme_name][p])), str(cycles), str(int(counts[scheme_name][p])/cycles)]) for scheme_name in tested]))
+        else:
+            outputs.append("\t".join([position_name, "US", str(int(counts["CAAS"][p])), str(cycles), str(int(counts["CAAS"][p])/cycles)]))
+
+    return outputs
+
 # FUNCTION boot_on_single_alignment()
 # Launches the bootstrap in several lines. Returns a dictionary gene@position --> pvalue
 
-def boot_on_single_alignment(trait_config_file, resampled_traits, sliced_object, max_fg_gaps, max_bg_gaps, max_overall_gaps, max_fg_miss, max_bg_miss, max_overall_miss, the_admitted_patterns, output_file, miss_pair=False, max_conserved=0, discovery_file=None, progress_log=None, caap_mode=False, export_groups=None, export_perm_discovery=None):
+def boot_on_single_alignment(trait_config_file, resampled_traits, sliced_object, max_fg_gaps, max_bg_gaps, max_overall_gaps, max_fg_miss, max_bg_miss, max_overall_miss, the_admitted_patterns, output_file, miss_pair=False, max_conserved=0, discovery_file=None, progress_log=None, caap_mode=False, export_groups=None, export_perm_discovery=None, engine="matrix"):
     """
     Run bootstrap analysis on a single alignment.
     
     Supports both single-file and directory-based resampled traits:
     - Single file: resampled_traits is a multicfg object loaded from one file
     - Directory: resampled_traits is the directory path (string), files loaded sequentially
+    - Preloaded: resampled_traits is a resample_set, parsed once and shared by many alignments
     
     Args:
-        resampled_traits: multicfg object OR directory path (str) containing resample_*.tab files
+        resampled_traits: multicfg object, directory path (str) containing resample_*.tab files,
+                          OR a resample_set preloaded with load_resample_set()
         progress_log: Optional file path for logging progress
         caap_mode: If True, test all CAAP grouping schemes (US, GS0-GS4) instead of classical CAAS
+        engine: "matrix" encodes the tested positions once and evaluates all the cycles of a resample
+                file in one caasboot_matrix() pass; "legacy" runs process_position() + caasboot()
+                per position and file. Debug exports, the b0 file and files with more than
+                MATRIX_MAX_CYCLES cycles always use the legacy path.
         ... (other parameters as before)
     """
     the_genename = sliced_object.genename
@@ -591,15 +781,25 @@ def boot_on_single_alignment(trait_config_file, resampled_traits, sliced_object,
         perm_discovery_handle.write("\t".join(header_fields) + "\n")
 
     try:
-        # Detect if resampled_traits is a directory path or a multicfg object
-        if isinstance(resampled_traits, str) and os.path.isdir(resampled_traits):
+        # A preloaded legacy single file behaves as its multicfg object
+        if isinstance(resampled_traits, resample_set) and not resampled_traits.is_directory:
+            resampled_traits = resampled_traits.file_config(0)
+
+        # Detect if resampled_traits is a directory (path or preloaded resample_set) or a multicfg object
+        if isinstance(resampled_traits, resample_set) or (isinstance(resampled_traits, str) and os.path.isdir(resampled_traits)):
             # Directory mode: sequential processing
             print(f"\n{'='*80}")
             print(f"DIRECTORY-BASED BOOTSTRAP MODE")
             print(f"{'='*80}\n")
             
-            resample_dir = resampled_traits
-            resample_info = get_resample_info(resample_dir)
+            if isinstance(resampled_traits, resample_set):
+                resample_dir = resampled_traits.path
+                resample_info = resampled_traits.info()
+                file_configs = resampled_traits.iter_configs()
+            else:
+                resample_dir = resampled_traits
+                resample_info = get_resample_info(resample_dir)
+                file_configs = simtrait_revive_from_dir(resample_dir)
             
             print(f"Resample directory: {resample_dir}")
             print(f"Total files: {resample_info['num_files']}")
@@ -641,45 +841,75 @@ def boot_on_single_alignment(trait_config_file, resampled_traits, sliced_object,
                 # No discovery file - test all positions with all schemes
                 positions_with_schemes = [(pos, None) for pos in positions_list]
             
+            # Matrix engine: encode the tested positions once for all files
+            # (the per-trait debug exports need the legacy path)
+            encoded_positions = None
+            if engine == "matrix" and groups_handle is None and perm_discovery_handle is None:
+                encoded_positions = encode_boot_positions(positions_with_schemes, sliced_object.species, the_genename, caap_mode)
+
             # Process each file sequentially
             start_time = time.time()
             
-            for file_idx, (file_path, file_config) in enumerate(simtrait_revive_from_dir(resample_dir), 1):
+            for file_idx, (file_path, file_config) in enumerate(file_configs, 1):
                 file_start = time.time()
                 
                 log_progress(file_idx, resample_info['num_files'], start_time, 
                             log_file=progress_log, prefix=f"Processing file {os.path.basename(file_path)}")
                 
                 is_b0 = os.path.basename(file_path) == "resample_000.tab"
-                
-                # Process each position with its specific schemes
-                for pos_dict, schemes in positions_with_schemes:
-                    # Process position
-                    processed_pos = process_position(pos_dict, multiconfig=file_config, species_in_alignment=sliced_object.species)
-                    
-                    # Run bootstrap with position-specific schemes
-                    line_output = caasboot(
-                        processed_pos,
-                        genename=the_genename,
-                        list_of_traits=file_config.alltraits,
+
+                use_matrix = encoded_positions is not None and not is_b0
+                if use_matrix and file_config.cycles > MATRIX_MAX_CYCLES:
+                    print(f"{os.path.basename(file_path)}: {file_config.cycles} cycles > {MATRIX_MAX_CYCLES}, using the legacy engine for this file")
+                    use_matrix = False
+
+                if use_matrix:
+                    line_outputs = caasboot_matrix(
+                        encoded_positions,
+                        file_config,
+                        species_in_alignment=sliced_object.species,
                         maxgaps_fg=max_fg_gaps,
                         maxgaps_bg=max_bg_gaps,
                         maxgaps_all=max_overall_gaps,
                         maxmiss_fg=max_fg_miss,
                         maxmiss_bg=max_bg_miss,
                         maxmiss_all=max_overall_miss,
-                        multiconfig=file_config,
-                        miss_pair=miss_pair,
                         max_conserved=max_conserved,
                         admitted_patterns=the_admitted_patterns,
-                        cycles=file_config.cycles,
-                    caap_mode=caap_mode,
-                    discovery_schemes=schemes,
-                    debug_rejects=is_b0,
-                    groups_out=groups_handle,
-                    perm_discovery_out=perm_discovery_handle
-                )
+                        caap_mode=caap_mode
+                    )
+                else:
+                    line_outputs = []
+                    # Process each position with its specific schemes
+                    for pos_dict, schemes in positions_with_schemes:
+                        # Process position
+                        processed_pos = process_position(pos_dict, multiconfig=file_config, species_in_alignment=sliced_object.species)
                     
+                        # Run bootstrap with position-specific schemes
+                        line_output = caasboot(
+                            processed_pos,
+                            genename=the_genename,
+                            list_of_traits=file_config.alltraits,
+                            maxgaps_fg=max_fg_gaps,
+                            maxgaps_bg=max_bg_gaps,
+                            maxgaps_all=max_overall_gaps,
+                            maxmiss_fg=max_fg_miss,
+                            maxmiss_bg=max_bg_miss,
+                            maxmiss_all=max_overall_miss,
+                            multiconfig=file_config,
+                            miss_pair=miss_pair,
+                            max_conserved=max_conserved,
+                            admitted_patterns=the_admitted_patterns,
+                            cycles=file_config.cycles,
+                        caap_mode=caap_mode,
+                        discovery_schemes=schemes,
+                        debug_rejects=is_b0,
+                        groups_out=groups_handle,
+                        perm_discovery_out=perm_discovery_handle
+                    )
+                        line_outputs.append(line_output)
+
+                for line_output in line_outputs:
                     # Accumulate counts for this position
                     # In CAAP mode, each position returns multiple lines (one per scheme)
                     if caap_mode:
@@ -779,34 +1009,56 @@ def boot_on_single_alignment(trait_config_file, resampled_traits, sliced_object,
                 positions_with_schemes = [(pos, None) for pos in positions_list]
 
             # Step 3 & 4: process positions with their specific schemes and run bootstrap
-            output_lines = []
-            for pos_dict, schemes in positions_with_schemes:
-                # Process position
-                processed_pos = process_position(pos_dict, multiconfig=resampled_traits_obj, species_in_alignment=sliced_object.species)
-                
-                # Run bootstrap with position-specific schemes
-                line_output = caasboot(
-                    processed_pos,
-                    list_of_traits=resampled_traits_obj.alltraits,
-                    genename=the_genename,
+            use_matrix = engine == "matrix" and groups_handle is None and perm_discovery_handle is None
+            if use_matrix and resampled_traits_obj.cycles > MATRIX_MAX_CYCLES:
+                print(f"{resampled_traits_obj.cycles} cycles > {MATRIX_MAX_CYCLES}, using the legacy engine")
+                use_matrix = False
+
+            if use_matrix:
+                encoded_positions = encode_boot_positions(positions_with_schemes, sliced_object.species, the_genename, caap_mode)
+                output_lines = caasboot_matrix(
+                    encoded_positions,
+                    resampled_traits_obj,
+                    species_in_alignment=sliced_object.species,
                     maxgaps_fg=max_fg_gaps,
                     maxgaps_bg=max_bg_gaps,
                     maxgaps_all=max_overall_gaps,
                     maxmiss_fg=max_fg_miss,
                     maxmiss_bg=max_bg_miss,
                     maxmiss_all=max_overall_miss,
-                    multiconfig=resampled_traits_obj,
-                    miss_pair=miss_pair,
                     max_conserved=max_conserved,
                     admitted_patterns=the_admitted_patterns,
-                    cycles=resampled_traits_obj.cycles,
-                caap_mode=caap_mode,
-                discovery_schemes=schemes,
-                debug_rejects=False,
-                groups_out=groups_handle,
-                perm_discovery_out=perm_discovery_handle
-            )
-                output_lines.append(line_output)
+                    caap_mode=caap_mode
+                )
+            else:
+                output_lines = []
+                for pos_dict, schemes in positions_with_schemes:
+                    # Process position
+                    processed_pos = process_position(pos_dict, multiconfig=resampled_traits_obj, species_in_alignment=sliced_object.species)
+                
+                    # Run bootstrap with position-specific schemes
+                    line_output = caasboot(
+                        processed_pos,
+                        list_of_traits=resampled_traits_obj.alltraits,
+                        genename=the_genename,
+                        maxgaps_fg=max_fg_gaps,
+                        maxgaps_bg=max_bg_gaps,
+                        maxgaps_all=max_overall_gaps,
+                        maxmiss_fg=max_fg_miss,
+                        maxmiss_bg=max_bg_miss,
+                        maxmiss_all=max_overall_miss,
+                        multiconfig=resampled_traits_obj,
+                        miss_pair=miss_pair,
+                        max_conserved=max_conserved,
+                        admitted_patterns=the_admitted_patterns,
+                        cycles=resampled_traits_obj.cycles,
+                    caap_mode=caap_mode,
+                    discovery_schemes=schemes,
+                    debug_rejects=False,
+                    groups_out=groups_handle,
+                    perm_discovery_out=perm_discovery_handle
+                )
+                    output_lines.append(line_output)
 
             ooout = open(output_file, "w")
 
@@ -829,6 +1081,96 @@ def boot_on_single_alignment(trait_config_file, resampled_traits, sliced_object,
         if perm_discovery_handle:
             perm_discovery_handle.close()
 
+# FUNCTION boot_batch()
+# Runs the bootstrap on every alignment of a batch manifest, parsing the resample set only once
+
+def boot_batch(manifest_file, resampled_path, options_object, alignment_dir="alignments", discovery_dir="discovery", output_dir=".", progress_log=False, export_groups=False, export_perm_discovery=False):
+    """
+    Run bootstrap analysis on all the alignments listed in a batch manifest.
+
+    The resample set (directory or legacy single file) is loaded once with load_resample_set()
+    and its trait objects are shared by all genes, instead of being re-parsed by one
+    ct bootstrap process per alignment. Per-gene outputs are identical to ct bootstrap.
+
+    Args:
+        manifest_file: Tab-separated file with alignment_id, alignment_name, discovery_name
+                       (NO_FILE when the gene has no discovery output)
+        resampled_path: Resample directory (resample_*.tab files) or legacy single file
+        options_object: Parsed ct bootstrap-batch options (filters, trait config, format)
+        progress_log, export_groups, export_perm_discovery: If True, write the per-gene
+                       {id}.progress.log, {id}.bootstrap.groups.output and
+                       {id}.bootstrap.discovery.output files
+
+    Returns:
+        list: Output files written, in manifest order
+    """
+    from modules.runslice import runslice
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    with open(manifest_file) as manifest_handle:
+        manifest = []
+        for line in manifest_handle.read().splitlines():
+            c = line.split("\t")
+            if len(c) < 2 or c[0].strip() == "":
+                continue
+            discovery_name = c[2] if len(c) > 2 else "NO_FILE"
+            manifest.append((c[0], c[1], discovery_name))
+
+    print(f"Genes in batch: {len(manifest)}")
+
+    batch_start = time.time()
+    resampled_traits = load_resample_set(resampled_path, keep_configs=True)
+    print(f"Resample set loaded once: {len(resampled_traits.cycle_ids)} cycles, {len(resampled_traits.species)} species, {len(resampled_traits.files)} files ({format_time(time.time() - batch_start)})")
+
+    written = []
+
+    for idx, (alignment_id, alignment_name, discovery_name) in enumerate(manifest, 1):
+        print(f"[BOOTSTRAP_BATCHED] Launching {alignment_id} ({idx}/{len(manifest)})")
+
+        gene_options = copy.copy(options_object)
+        gene_options.single_alignment = os.path.join(alignment_dir, alignment_name)
+
+        sliced_alignment = runslice(gene_options)
+
+        def gene_output(suffix):
+            return os.path.join(output_dir, alignment_id + suffix)
+
+        output_file = gene_output(".bootstraped.output")
+
+        boot_on_single_alignment(
+                        trait_config_file = gene_options.config_file,
+                        resampled_traits = resampled_traits,
+                        sliced_object = sliced_alignment,
+
+                        max_fg_gaps = gene_options.max_fg_gaps_string,
+                        max_bg_gaps = gene_options.max_bg_gaps_string,
+                        max_overall_gaps = gene_options.max_gaps_string,
+
+                        max_fg_miss = gene_options.max_fg_miss_string,
+                        max_bg_miss = gene_options.max_bg_miss_string,
+                        max_overall_miss = gene_options.max_miss_string,
+
+                        miss_pair = gene_options.miss_pair,
+                        max_conserved = int(gene_options.max_conserved),
+
+                        the_admitted_patterns = gene_options.patterns_string,
+                        output_file = output_file,
+                        discovery_file = None if discovery_name == "NO_FILE" else os.path.join(discovery_dir, discovery_name),
+                        progress_log = gene_output(".progress.log") if progress_log else None,
+                        caap_mode = gene_options.caap_mode,
+                        export_groups = gene_output(".bootstrap.groups.output") if export_groups else None,
+                        export_perm_discovery = gene_output(".bootstrap.discovery.output") if export_perm_discovery else None,
+                        engine = gene_options.engine
+                        )
+
+        written.append(output_file)
+        print(f"[BOOTSTRAP_BATCHED] Completed {alignment_id}")
+
+    print(f"✓ Batch of {len(manifest)} genes complete in {format_time(time.time() - batch_start)}")
+
+    return written
+
 # FUNCTION pval()
 # Returns a dictionary with the pvalue
 
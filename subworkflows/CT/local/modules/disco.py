@@ -21,7 +21,7 @@ Pair-aware implementation: Miguel Ramon (miguel.ramon@upf.edu)
 
 MODULE NAME: disco.py
 DESCRIPTION: runs the caas discovery on one single alignment. Returns non-validated caas candidate positions.
-DEPENDENCIES: alimport.py, caas_id.py, pindex.py
+DEPENDENCIES: alimport.py, alimatrix.py, caas_id.py, pindex.py
 CALLED BY: CT.
 
 '''
@@ -32,11 +32,15 @@ from modules.alimport import *
 from modules.pindex import *
 import os
 from os.path import exists
+import copy
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 
 ### FUNCTION discovery()
 ### Scans one single alignment to identify the CAAS or CAAP
 
-def discovery(input_cfg, sliced_object, max_fg_gaps, max_bg_gaps, max_overall_gaps, max_fg_miss, max_bg_miss, max_overall_miss, admitted_patterns, output_file, miss_pair=False, max_conserved=0, caap_mode=False, background_output_file=None):
+def discovery(input_cfg, sliced_object, max_fg_gaps, max_bg_gaps, max_overall_gaps, max_fg_miss, max_bg_miss, max_overall_miss, admitted_patterns, output_file, miss_pair=False, max_conserved=0, caap_mode=False, background_output_file=None, trait_object=None):
 
     def _valid_traits_for_position(processed_position, trait_list, multiconfig,
                                    max_fg_gaps, max_bg_gaps, max_overall_gaps,
@@ -97,7 +101,8 @@ def discovery(input_cfg, sliced_object, max_fg_gaps, max_bg_gaps, max_overall_ga
         return valid_traits
 
     # Step 1: import the trait into a trait object (load_cfg from pindex.py)
-    trait_object = load_cfg(input_cfg)
+    if trait_object is None:
+        trait_object = load_cfg(input_cfg)
 
     # Step 2: import the alignment int a processed position object (slice from alimport.py)
     p = sliced_object
@@ -192,16 +197,25 @@ def discovery(input_cfg, sliced_object, max_fg_gaps, max_bg_gaps, max_overall_ga
             if caas_results:
                 results_to_write.extend(caas_results)
     
-    # Step 6: Write background coverage file (positions tested)
+    _write_discovery_output(p.genename, results_to_write, tested_positions, output_file,
+                            background_output_file, caap_mode, max_conserved)
+
+
+### FUNCTION _write_discovery_output()
+### Writes the background coverage file and the CAAS/CAAP discovery table
+
+def _write_discovery_output(genename, results_to_write, tested_positions, output_file, background_output_file, caap_mode, max_conserved):
+
+    # Step 1: Write background coverage file (positions tested)
     if background_output_file:
         if tested_positions:
             positions_sorted = ",".join(map(str, sorted(tested_positions, key=lambda x: int(x))))
         else:
             positions_sorted = "NULL"
         with open(background_output_file, "w") as bkg_out:
-            bkg_out.write(f"{p.genename}\t{positions_sorted}\n")
+            bkg_out.write(f"{genename}\t{positions_sorted}\n")
 
-    # Step 7: Only write output file if CAAS/CAAP were found
+    # Step 2: Only write output file if CAAS/CAAP were found
     if len(results_to_write) > 0:
         # Delete existing file if present
         if exists(output_file):
@@ -274,6 +288,255 @@ def discovery(input_cfg, sliced_object, max_fg_gaps, max_bg_gaps, max_overall_ga
                             result_line = "\t".join(fields)
                 outf.write(result_line + "\n")
         
-        print(f"Discovery complete: {len(results_to_write)} CAAS/CAAP found in {p.genename}")
+        print(f"Discovery complete: {len(results_to_write)} CAAS/CAAP found in {genename}")
+    else:
+        print(f"Discovery complete: No CAAS/CAAP found in {genename} - output file not created")
+
+
+### FUNCTION _pair_rules()
+### Whether the pair-aware missing/gap set comparison applies, following the
+### threshold equality rules of fetch_caas() (CAAS) or fetch_caap() (CAAP)
+
+def _pair_rules(max_fg_gaps, max_bg_gaps, max_overall_gaps, max_fg_miss, max_bg_miss, max_overall_miss, caap_rules=False):
+
+    if caap_rules:
+        miss_equal = max_fg_miss != "NO" and max_bg_miss != "NO" and int(max_fg_miss) == int(max_bg_miss)
+        gap_equal = max_fg_gaps != "NO" and max_bg_gaps != "NO" and int(max_fg_gaps) == int(max_bg_gaps)
     else:
-        print(f"Discovery complete: No CAAS/CAAP found in {p.genename} - output file not created")
+        miss_equal = (max_fg_miss != "NO" and max_bg_miss != "NO" and max_fg_miss == max_bg_miss) or \
+                     (max_fg_miss == "NO" and max_bg_miss == "NO" and max_overall_miss != "NO")
+        gap_equal = (max_fg_gaps != "NO" and max_bg_gaps != "NO" and max_fg_gaps == max_bg_gaps) or \
+                    (max_fg_gaps == "NO" and max_bg_gaps == "NO" and max_overall_gaps != "NO")
+
+    return miss_equal, gap_equal
+
+
+### FUNCTION discovery_matrix()
+### Scans one single alignment loaded as a column-major matrix (alimatrix.slice_matrix()).
+### Filters and pattern checks run over all columns at once; only the columns carrying
+### a CAAS/CAAP are expanded into position objects, so the output is the same as discovery().
+
+def discovery_matrix(input_cfg, matrix_object, max_fg_gaps, max_bg_gaps, max_overall_gaps, max_fg_miss, max_bg_miss, max_overall_miss, admitted_patterns, output_file, miss_pair=False, max_conserved=0, caap_mode=False, background_output_file=None, trait_object=None):
+
+    from modules.alimatrix import build_trait_index, trait_filter_mask, pattern_kernel, admitted_mask
+
+    # Step 1: import the trait (load_cfg from pindex.py) and index it on the matrix rows
+    if trait_object is None:
+        trait_object = load_cfg(input_cfg)
+
+    p = matrix_object
+    columns = p.columns
+    trait_index = build_trait_index(trait_object, p)
+
+    thresholds = (max_fg_gaps, max_bg_gaps, max_overall_gaps, max_fg_miss, max_bg_miss, max_overall_miss)
+    caas_miss_rule, caas_gap_rule = _pair_rules(*thresholds)
+    caap_miss_rule, caap_gap_rule = _pair_rules(*thresholds, caap_rules=True)
+
+    tested = np.zeros(len(columns), dtype=bool)
+    hits = np.zeros(len(columns), dtype=bool)
+
+    if caap_mode:
+        from modules.caap_id import fetch_caap, SCHEMES
+        luts = {}
+        for scheme_name, scheme_dict in SCHEMES.items():
+            lut = np.full(256, -1, dtype=np.int16)
+            groups = {g: i for i, g in enumerate(dict.fromkeys(scheme_dict.values()))}
+            for aa, g in scheme_dict.items():
+                lut[ord(aa)] = groups[g]
+            luts[scheme_name] = lut
+
+    # Step 2: vectorized filters and pattern checks, one trait at a time
+    for trait in trait_object.alltraits:
+        if trait not in trait_index:
+            continue
+        t = trait_index[trait]
+
+        keep, fg_null, bg_null = trait_filter_mask(p, t, columns, *thresholds,
+                                                   check_miss_pairs = miss_pair and caas_miss_rule,
+                                                   check_gap_pairs = miss_pair and caas_gap_rule)
+        tested |= keep
+
+        fg_raw = p.m[np.ix_(t.fg_rows, columns)]
+        bg_raw = p.m[np.ix_(t.bg_rows, columns)]
+
+        if caap_mode:
+            if (caap_miss_rule, caap_gap_rule) != (caas_miss_rule, caas_gap_rule):
+                keep, fg_null, bg_null = trait_filter_mask(p, t, columns, *thresholds,
+                                                           check_miss_pairs = miss_pair and caap_miss_rule,
+                                                           check_gap_pairs = miss_pair and caap_gap_rule)
+            for scheme_name, lut in luts.items():
+                fg_codes = np.where(fg_null, -1, lut[fg_raw])
+                bg_codes = np.where(bg_null, -1, lut[bg_raw])
+                convergent, pattern = pattern_kernel(fg_codes, bg_codes, max_conserved)
+                hits |= keep & convergent & admitted_mask(pattern, admitted_patterns)
+        else:
+            fg_codes = np.where(fg_null, -1, fg_raw.astype(np.int16))
+            bg_codes = np.where(bg_null, -1, bg_raw.astype(np.int16))
+            convergent, pattern = pattern_kernel(fg_codes, bg_codes, max_conserved)
+            hits |= keep & convergent & admitted_mask(pattern, admitted_patterns)
+
+    tested_positions = set(str(c) for c in columns[tested])
+
+    # Step 3: expand only the hit columns and format them with the classical fetchers
+    results_to_write = []
+
+    for column in columns[hits]:
+        position = process_position(p.position_dict(column), multiconfig = trait_object, species_in_alignment = p.species)
+
+        if caap_mode:
+            caap_results = fetch_caap( genename = p.genename,
+                        position_obj = position,
+                        trait_list = trait_object.alltraits,
+
+                        max_fg_gaps = int(max_fg_gaps) if max_fg_gaps != "NO" else 999999,
+                        max_bg_gaps = int(max_bg_gaps) if max_bg_gaps != "NO" else 999999,
+                        max_overall_gaps = int(max_overall_gaps) if max_overall_gaps != "NO" else 999999,
+
+                        max_fg_miss = int(max_fg_miss) if max_fg_miss != "NO" else 999999,
+                        max_bg_miss = int(max_bg_miss) if max_bg_miss != "NO" else 999999,
+                        max_overall_miss = int(max_overall_miss) if max_overall_miss != "NO" else 999999,
+
+                        output_file = None,
+                        miss_pair = miss_pair,
+                        max_conserved = max_conserved,
+                        species_in_alignment = p.species,
+                        allowed_patterns = admitted_patterns,
+                        multiconfig = trait_object,
+                        return_results = True
+                        )
+            if caap_results:
+                results_to_write.extend(caap_results)
+        else:
+            caas_results = fetch_caas( p.genename,
+                        position,
+                        trait_object.alltraits,
+
+                        maxgaps_bg= max_bg_gaps,
+                        maxgaps_fg= max_fg_gaps,
+                        maxgaps_all= max_overall_gaps,
+
+                        maxmiss_bg= max_bg_miss,
+                        maxmiss_fg= max_fg_miss,
+                        maxmiss_all= max_overall_miss,
+
+                        multiconfig= trait_object,
+                        miss_pair= miss_pair,
+                        max_conserved= max_conserved,
+
+                        admitted_patterns=admitted_patterns,
+                        output_file = None,
+                        return_results = True
+                        )
+            if caas_results:
+                results_to_write.extend(caas_results)
+
+    _write_discovery_output(p.genename, results_to_write, tested_positions, output_file,
+                            background_output_file, caap_mode, max_conserved)
+
+
+### FUNCTION discovery_batch()
+### Runs the discovery on every alignment of a manifest with a pool of forked workers.
+### The trait config and the hypergeometric table are loaded once in the parent and
+### inherited by the workers (fork), instead of once per ct discovery process.
+
+_batch_state = {}
+
+def _discovery_batch_gene(job):
+
+    alignment_id, alignment_name = job
+    options_object = copy.copy(_batch_state["options"])
+    options_object.single_alignment = os.path.join(_batch_state["alignment_dir"], alignment_name)
+
+    output_file = os.path.join(_batch_state["output_dir"], alignment_id + ".output")
+    background_output_file = os.path.join(_batch_state["output_dir"], alignment_id + ".background.tsv")
+
+    from modules.runslice import runslice, runslice_matrix
+
+    if options_object.engine == "matrix":
+        discovery_engine = discovery_matrix
+        engine_input = {"matrix_object": runslice_matrix(options_object)}
+    else:
+        discovery_engine = discovery
+        engine_input = {"sliced_object": runslice(options_object)}
+
+    discovery_engine(
+                input_cfg = options_object.config_file,
+                **engine_input,
+
+                max_fg_gaps = options_object.max_fg_gaps_string,
+                max_bg_gaps = options_object.max_bg_gaps_string,
+                max_overall_gaps = options_object.max_gaps_string,
+
+                max_fg_miss = options_object.max_fg_miss_string,
+                max_bg_miss = options_object.max_bg_miss_string,
+                max_overall_miss = options_object.max_miss_string,
+
+                miss_pair = options_object.miss_pair,
+                max_conserved = int(options_object.max_conserved),
+
+                caap_mode = options_object.caap_mode,
+
+                admitted_patterns = options_object.patterns_string,
+                output_file = output_file,
+                background_output_file = background_output_file,
+                trait_object = _batch_state["trait_object"])
+
+    return alignment_id, output_file if exists(output_file) else None
+
+
+def discovery_batch(manifest_file, options_object, alignment_dir="alignments", output_dir=".", workers=1, chunk_size=1, combined_output=None):
+
+    with open(manifest_file) as manifest_handle:
+        jobs = []
+        for line in manifest_handle.read().splitlines():
+            c = line.split("\t")
+            if len(c) < 2 or c[0].strip() == "":
+                continue
+            jobs.append((c[0], c[1]))
+
+    print(f"Genes in batch: {len(jobs)}")
+    print(f"Workers: {workers} (chunk size {chunk_size})")
+
+    # Step 1: parse the trait config once, fill the hypergeometric table for its FG/BG sizes
+    trait_object = load_cfg(options_object.config_file)
+
+    fg_size = max([len(set(v)) for v in trait_object.trait2fg.values()] or [0])
+    bg_size = max([len(set(v)) for v in trait_object.trait2bg.values()] or [0])
+    PMF_TABLE.precompute(fg_size, bg_size, len(trait_object.s2t))
+
+    _batch_state.update({
+        "options": options_object,
+        "trait_object": trait_object,
+        "alignment_dir": alignment_dir,
+        "output_dir": output_dir,
+    })
+
+    # Step 2: run the genes (forked workers inherit the trait object and the table)
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers = workers, mp_context = multiprocessing.get_context("fork")) as executor:
+            results = list(executor.map(_discovery_batch_gene, jobs, chunksize = chunk_size))
+    else:
+        results = list(map(_discovery_batch_gene, jobs))
+
+    written = [output_file for alignment_id, output_file in results if output_file]
+    print(f"Discovery batch complete: {len(written)} of {len(jobs)} genes with CAAS/CAAP")
+
+    # Step 3: optional combined table, sorted by gene and position
+    if combined_output:
+        header = None
+        rows = []
+        for output_file in written:
+            with open(output_file) as table_handle:
+                lines = table_handle.read().splitlines()
+            header = header or lines[0]
+            rows.extend(lines[1:])
+
+        rows.sort(key = lambda row: (row.split("\t")[0], int(row.split("\t")[4])))
+
+        if header:
+            with open(combined_output, "w") as combined_handle:
+                combined_handle.write(header + "\n")
+                for row in rows:
+                    combined_handle.write(row + "\n")
+
+    return written
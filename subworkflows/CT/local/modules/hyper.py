@@ -21,16 +21,89 @@ Pair-aware implementation: Miguel Ramon (miguel.ramon@upf.edu)
 
 MODULE NAME:    hyper.py
 DESCRIPTION:    Pvalue assignment to CAAS prediction based on hypergeometric probability function.
-DEPENDENCIES:   TBD
+DEPENDENCIES:   scipy, numpy
 '''
 
 
 from itertools import combinations
+from collections import OrderedDict
 import functools
+import os
+import numpy as np
 from scipy import stats as ss
 import glob
 
 
+# CLASS pmf_table - Memoized hypergeometric probabilities used by pstate().
+# One row per (population, set_size): P(k = set_size | population, set_size, draws) for
+# every number of draws, filled in a single vectorized scipy call. Rows are kept in a
+# bounded LRU and can be saved to / loaded from an .npz file to share them across runs.
+
+class pmf_table():
+
+    def __init__(self, max_rows = 4096):
+        self.max_rows = max_rows
+        self.rows = OrderedDict()         # (population, set_size) -> float64 array indexed by draws
+        self.dirty = False                # New rows since the last load/save
+
+    def row(self, population, set_size):
+        key = (population, set_size)
+        try:
+            self.rows.move_to_end(key)
+            return self.rows[key]
+        except KeyError:
+            pass
+
+        values = ss.hypergeom.pmf(set_size, population, set_size, np.arange(population + 1))
+        self.rows[key] = values
+        self.dirty = True
+
+        if len(self.rows) > self.max_rows:
+            self.rows.popitem(last = False)
+
+        return values
+
+    def pmf(self, population, set_size, draws):
+        return self.row(population, set_size)[draws]
+
+    def precompute(self, fg_size, bg_size, max_population):
+        # Every row pstate() can request for a trait with these FG/BG sizes
+        # (the sizes shrink when conserved pairs are left out of the p-value)
+        set_sizes = range(1, max(fg_size, bg_size) + 1)
+        self.max_rows = max(self.max_rows, (max_population + 1) * len(set_sizes))
+        for population in range(max_population + 1):
+            for set_size in set_sizes:
+                self.row(population, set_size)
+
+    def save(self, path):
+        # Written aside and renamed, so concurrent readers never see a partial file
+        tmp_path = path + ".tmp.%d" % os.getpid()
+        with open(tmp_path, "wb") as handle:
+            np.savez(handle, **{"%d_%d" % key: values for key, values in self.rows.items()})
+        os.replace(tmp_path, path)
+        self.dirty = False
+
+    def load(self, path):
+        with np.load(path) as stored:
+            for name in stored.files:
+                population, set_size = map(int, name.split("_"))
+                self.rows[(population, set_size)] = stored[name]
+        self.dirty = False
+
+
+PMF_TABLE = pmf_table()
+
+
+# FUNCTION load_pmf_table() / save_pmf_table() - Share the module table between runs
+
+def load_pmf_table(path):
+    PMF_TABLE.load(path)
+    return PMF_TABLE
+
+def save_pmf_table(path):
+    PMF_TABLE.save(path)
+
+
 # FUNCTION count_symbols() - Counts the symbols (AAs) 
 def count_symbols(list1, list2):
     outdict = {}
@@ -66,13 +139,11 @@ def pstate(iterable, freq_dictionary, set_size, contrast_size, mode = "independe
     it_freqs = map(lambda x : freq_dictionary[x], iterable)
     N = functools.reduce(lambda a, b: a+b, it_freqs)
     n = set_size
-    k = set_size
 
     if N > Mn:
         p = 0
     else:
-        l = ss.hypergeom(Mn, n, N)
-        p = l.pmf(k)
+        p = PMF_TABLE.pmf(Mn, n, N)
 
     return p
 
@@ -27,7 +27,9 @@ CALLED BY: ct
 import random
 import os
 import sys
+import json
 import dendropy
+import numpy as np
 
 
 # FUNCTION readtree(). Reads a tree and releases an object with some information (list of species, patristic distances matrix, bins)
@@ -104,7 +106,7 @@ def readtree(tree_file, tree_schema = "newick"):
 
 # FUNCTION simtrait() Resample trait function
 
-def simtrait(fg_len, bg_len, template, tree_file, mode, groupfile, phenotype_values_file, cycles, simtraits_outfile, permulation_selection_strategy = "random", chunk_size = 500):
+def simtrait(fg_len, bg_len, template, tree_file, mode, groupfile, phenotype_values_file, cycles, simtraits_outfile, permulation_selection_strategy = "random", chunk_size = 500, include_b0 = True, seed = None, workers = 1):
     
     # Class multicfg
     class multicfg():
@@ -328,92 +330,105 @@ def simtrait(fg_len, bg_len, template, tree_file, mode, groupfile, phenotype_val
             print("See documentation.")
             exit()
         
-        # Create output directory if it doesn't exist
-        if not os.path.exists(simtraits_outfile):
-            os.makedirs(simtraits_outfile)
-            print(f"Created output directory: {simtraits_outfile}")
-        
-        script_path = os.path.realpath(sys.argv[0]).split("/")
-        script_path.remove(script_path[-1])
-        rscript_path = "/".join(script_path) + "/permulations.r"
+        # In-process BM permulations (formerly permulations.R), one seeded stream per chunk file
+        from modules.permulations import permulate_bm
 
-        os.system("ln -s " + rscript_path)
-        
-        r_line = " ".join([
-            
-            "./permulations.r",                     # Rscript
-            tree_file,                              # args[1]
-            template,                               # args[2]
-            str(cycles),                            # args[3]
-            permulation_selection_strategy,         # args[4]
-            phenotype_values_file,                  # args[5]
-            simtraits_outfile,                      # args[6] - now directory
-            str(chunk_size)                         # args[7] - chunk size
-        ])
-        os.system(r_line)
+        try:
+            permulate_bm(
+                tree_file = tree_file,
+                config_file = template,
+                phenotype_values_file = phenotype_values_file,
+                cycles = cycles,
+                outdir = simtraits_outfile,
+                chunk_size = chunk_size,
+                include_b0 = include_b0,
+                seed = seed,
+                workers = workers
+            )
+        except ValueError as e:
+            print("ERROR:", e)
+            sys.exit(1)
+
+# CLASS resampled_cfg. Trait object of a resampled phenotype file (one trait per cycle)
+
+class resampled_cfg():
+
+    def __init__(self):
+        self.s2t = {}
+        self.alltraits = []
+        self.trait2fg = {}
+        self.trait2bg = {}
+        self.cycles = 0
+        self.paired_mode = True
+
+        # Pair-aware attributes (for compatibility with caas_id.py)
+        self.species2pair = {}
+        self.pair2fg_species = {}
+        self.pair2bg_species = {}
+        self.allpairs = []
+        self._pair_cache = {}
+        self._membership = None
+
+    def get_pair(self, species):
+        """Get the pair for a species (for compatibility with caas_id.py)"""
+        return self.species2pair.get(species, None)
+
+    def update_dictionary(self, traitname, species, group):
+        try:
+            self.s2t[species].append(traitname + "_" + group)
+        except:
+            self.s2t[species] = [traitname + "_" + group]
 
-# FUNCTION simtrait_revive() revive resampled trait from
+        if group == "1":
+            try:
+                self.trait2fg[traitname].append(species)
+            except:
+                self.trait2fg[traitname] = [species]
 
-def simtrait_revive(traitfile):
-    """Load resampled traits from a single file (backward compatibility)"""
-    
-    # Class multicfg
+        if group == "0":
+            try:
+                self.trait2bg[traitname].append(species)
+            except:
+                self.trait2bg[traitname] = [species]
 
-    class multicfg():
+        self.alltraits.append(traitname)
 
-        def __init__(self):
-            self.s2t = {}
-            self.alltraits = []
-            self.trait2fg = {}
-            self.trait2bg = {}
-            self.cycles = 0
-            self.paired_mode = True
-            
-            # Pair-aware attributes (for compatibility with caas_id.py)
-            self.species2pair = {}
-            self.pair2fg_species = {}
-            self.pair2bg_species = {}
-            self.allpairs = []
-            self._pair_cache = {}
 
-        def get_pair(self, species):
-            """Get the pair for a species (for compatibility with caas_id.py)"""
-            return self.species2pair.get(species, None)
+    def membership(self):
+        """FG/BG membership matrices (alltraits x species, bool), built once and cached"""
+        if self._membership is None:
+            species = list(self.s2t.keys())
+            sp_index = {sp: j for j, sp in enumerate(species)}
 
-        def update_dictionary(self, traitname, species, group):
-            try:
-                self.s2t[species].append(traitname + "_" + group)
-            except:
-                self.s2t[species] = [traitname + "_" + group]
-                
-            if group == "1":
-                try:
-                    self.trait2fg[traitname].append(species)
-                except:
-                    self.trait2fg[traitname] = [species]
+            fg = np.zeros((len(self.alltraits), len(species)), dtype=bool)
+            bg = np.zeros((len(self.alltraits), len(species)), dtype=bool)
 
-            if group == "0":
-                try:
-                    self.trait2bg[traitname].append(species)
-                except:
-                    self.trait2bg[traitname] = [species]
-            
-            self.alltraits.append(traitname)
-        
-        
-        def print_traits(self, outfile):
-            o = open(outfile, "w")
-            for x in self.trait2bg.keys():
-                print("\t".join([   x,
-                                    ",".join(self.trait2fg[x]),
-                                    ",".join(self.trait2bg[x])
-                                    ]), file = o)
-            o.close()
+            for i, trait in enumerate(self.alltraits):
+                fg[i, [sp_index[sp] for sp in self.trait2fg.get(trait, [])]] = True
+                bg[i, [sp_index[sp] for sp in self.trait2bg.get(trait, [])]] = True
+
+            self._membership = (species, fg, bg)
+
+        return self._membership
+
+    def print_traits(self, outfile):
+        o = open(outfile, "w")
+        for x in self.trait2bg.keys():
+            print("\t".join([   x,
+                                ",".join(self.trait2fg[x]),
+                                ",".join(self.trait2bg[x])
+                                ]), file = o)
+        o.close()
+
+
+# FUNCTION simtrait_revive() revive resampled trait from
+
+def simtrait_revive(traitfile):
+    """Load resampled traits from a single file (backward compatibility)"""
 
-        
     # Declare multicfg instance
 
-    z = multicfg()
+    z = resampled_cfg()
 
     # Open the traitfile
 
@@ -465,6 +480,12 @@ def simtrait_revive_from_dir(resample_dir):
     import glob
     import re
     
+    if has_resample_store(resample_dir):
+        z = load_resample_store(resample_dir)
+        print(f"Found binary resample store with {len(z.files)} resample files in {resample_dir}")
+        yield from z.iter_configs()
+        return
+
     # Find all resample files
     pattern = os.path.join(resample_dir, "resample_*.tab")
     resample_files = glob.glob(pattern)
@@ -502,6 +523,16 @@ def get_resample_info(resample_path):
     import glob
     import re
     
+    if has_resample_store(resample_path):
+        # Binary store: everything is in the header
+        header = read_resample_store_header(resample_path)
+        return {
+            'total_cycles': sum(f["lines"] for f in header["files"]),
+            'num_files': len(header["files"]),
+            'is_directory': True,
+            'files': [os.path.join(resample_path, f["name"]) for f in header["files"]]
+        }
+
     if os.path.isdir(resample_path):
         # Directory mode: count files and cycles
         pattern = os.path.join(resample_path, "resample_*.tab")
@@ -538,6 +569,292 @@ def get_resample_info(resample_path):
 
 
 
+# CLASS resample_set. Compact, in-memory form of a whole resample set (directory or single file)
+# parsed once: a cycles x species uint8 matrix flagging FG (1) and BG (2) membership.
+# Sets loaded from a binary store keep the bit-packed matrix memory-mapped instead (rows decoded on demand).
+
+RESAMPLE_FG = 1
+RESAMPLE_BG = 2
+
+class resample_set():
+
+    def __init__(self):
+        self.path = ""
+        self.is_directory = True
+        self.species = []               # Matrix columns
+        self.cycle_ids = []             # Matrix rows (one per parsed resample line)
+        self.m = None                   # uint8 cycles x species (RESAMPLE_FG | RESAMPLE_BG flags)
+        self.packed = None              # Binary store: memory-mapped packed FG | BG bits (m stays None)
+        self.files = []                 # Resample files, in bootstrap order
+        self.file_rows = []             # (first, last + 1) matrix rows of every file
+        self.file_lines = []            # Lines per file (cycle count as seen by simtrait_revive())
+        self.keep_configs = False
+        self._configs = {}
+
+    def info(self):
+        """Same dictionary as get_resample_info(), without touching the disk"""
+        return {
+            'total_cycles': sum(self.file_lines),
+            'num_files': len(self.files),
+            'is_directory': self.is_directory,
+            'files': list(self.files)
+        }
+
+    def flags(self, first, last):
+        """uint8 RESAMPLE_FG | RESAMPLE_BG flags of matrix rows first..last - 1"""
+        if self.packed is None:
+            return self.m[first:last]
+
+        n = len(self.species)
+        nbytes = (n + 7) // 8
+        block = np.asarray(self.packed[first:last])
+        fg = np.unpackbits(block[:, :nbytes], axis=1, count=n)
+        bg = np.unpackbits(block[:, nbytes:], axis=1, count=n)
+        return fg * np.uint8(RESAMPLE_FG) | bg * np.uint8(RESAMPLE_BG)
+
+    def file_config(self, i):
+        """Trait object of the i-th resample file, equivalent to simtrait_revive(self.files[i])"""
+        if i in self._configs:
+            return self._configs[i]
+
+        z = resampled_cfg()
+        z.cycles = self.file_lines[i]
+
+        first, last = self.file_rows[i]
+        rows = self.flags(first, last)
+        for r in range(first, last):
+            cycleid = self.cycle_ids[r]
+            row = rows[r - first]
+            for j in np.flatnonzero(row & RESAMPLE_FG):
+                z.update_dictionary(cycleid, self.species[j], "1")
+            for j in np.flatnonzero(row & RESAMPLE_BG):
+                z.update_dictionary(cycleid, self.species[j], "0")
+
+        z.alltraits = list(dict.fromkeys(z.alltraits))
+
+        # One row per trait: the membership matrices are the decoded rows (no rebuild from the dictionaries)
+        if z.alltraits == self.cycle_ids[first:last]:
+            z._membership = (list(self.species), (rows & RESAMPLE_FG) > 0, (rows & RESAMPLE_BG) > 0)
+
+        if self.keep_configs:
+            self._configs[i] = z
+        return z
+
+    def iter_configs(self):
+        """Drop-in replacement of simtrait_revive_from_dir(): yields (file_path, trait object)"""
+        for i, file_path in enumerate(self.files):
+            yield file_path, self.file_config(i)
+
+
+# FUNCTION load_resample_set() Parse a resample directory (or legacy single file) once into a resample_set.
+# A directory with a current binary store is mapped from the store instead (use_store = False forces the text files).
+
+def load_resample_set(resample_path, keep_configs = False, use_store = True):
+    import glob
+    import re
+
+    if use_store and has_resample_store(resample_path):
+        return load_resample_store(resample_path, keep_configs = keep_configs)
+
+    z = resample_set()
+    z.path = resample_path
+    z.keep_configs = keep_configs
+
+    if os.path.isdir(resample_path):
+        z.files = glob.glob(os.path.join(resample_path, "resample_*.tab"))
+
+        def extract_number(filepath):
+            match = re.search(r'resample_(\d+)\.tab$', filepath)
+            return int(match.group(1)) if match else 0
+
+        z.files.sort(key=extract_number)
+
+        if len(z.files) == 0:
+            print(f"ERROR: No resample files found in {resample_path}")
+            print("Expected files matching pattern: resample_*.tab")
+            exit()
+    else:
+        z.is_directory = False
+        z.files = [resample_path]
+
+    species_index = {}
+    fg_rows = []
+    bg_rows = []
+
+    def index_of(species):
+        try:
+            return species_index[species]
+        except KeyError:
+            species_index[species] = len(species_index)
+            return species_index[species]
+
+    for file_path in z.files:
+        first = len(z.cycle_ids)
+
+        with open(file_path) as tf_handle:
+            tf = tf_handle.read().splitlines()
+
+        for line in tf:
+            c = line.split("\t")
+            if len(c) < 3:
+                continue
+            z.cycle_ids.append(c[0])
+            fg_rows.append([index_of(sp) for sp in c[1].split(",")])
+            bg_rows.append([index_of(sp) for sp in c[2].split(",")])
+
+        z.file_rows.append((first, len(z.cycle_ids)))
+        z.file_lines.append(len(tf))
+
+    z.species = list(species_index.keys())
+    z.m = np.zeros((len(z.cycle_ids), len(z.species)), dtype=np.uint8)
+
+    for r in range(len(z.cycle_ids)):
+        z.m[r, fg_rows[r]] |= RESAMPLE_FG
+        z.m[r, bg_rows[r]] |= RESAMPLE_BG
+
+    return z
+
+
+
+# BINARY RESAMPLE STORE. Bit-packed copy of a whole resample set, written next to (or instead of)
+# the resample_*.tab files of a directory by write_resample_store() (ct resample-pack):
+#   resample_store.npy   uint8, cycles x 2*ceil(species/8): np.packbits() rows of FG bits, then of BG bits
+#   resample_store.json  species (bit order) and, per resample file: name, lines, matrix rows, cycle ids
+#                        (first cycle number when they are b_N consecutive) and size:mtime stamp
+# Loaders map the .npy read-only (np.load mmap_mode), so concurrent bootstrap processes share its pages.
+# A store is ignored when a resample_*.tab file next to it changed or is not in its header.
+
+RESAMPLE_STORE = "resample_store"
+RESAMPLE_STORE_VERSION = 1
+
+
+def resample_store_paths(resample_dir):
+    base = os.path.join(resample_dir, RESAMPLE_STORE)
+    return base + ".json", base + ".npy"
+
+
+def _file_stamp(file_path):
+    st = os.stat(file_path)
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def read_resample_store_header(resample_dir):
+    with open(resample_store_paths(resample_dir)[0]) as header_handle:
+        header = json.load(header_handle)
+    if header.get("version") != RESAMPLE_STORE_VERSION:
+        raise ValueError(f"Unsupported resample store version in {resample_dir}: {header.get('version')}")
+    return header
+
+
+# FUNCTION has_resample_store() True if resample_path is a directory with a complete, current binary store
+
+def has_resample_store(resample_path):
+    import glob
+
+    if not os.path.isdir(resample_path):
+        return False
+    if not all(os.path.exists(p) for p in resample_store_paths(resample_path)):
+        return False
+
+    stamps = {f["name"]: f.get("stamp") for f in read_resample_store_header(resample_path)["files"]}
+    for file_path in glob.glob(os.path.join(resample_path, "resample_*.tab")):
+        name = os.path.basename(file_path)
+        if name not in stamps or stamps[name] != _file_stamp(file_path):
+            print(f"WARNING: binary resample store in {resample_path} is out of date ({name} changed); reading the text files")
+            return False
+    return True
+
+
+# FUNCTION write_resample_store() Write a resample_set (parsed from text) as a binary store in outdir
+
+def write_resample_store(z, outdir):
+
+    if z.m is None:
+        raise ValueError("write_resample_store() needs a resample set parsed from text files")
+
+    if not os.path.exists(outdir):
+        os.makedirs(outdir)
+
+    packed = np.concatenate([
+        np.packbits((z.m & RESAMPLE_FG) > 0, axis=1),
+        np.packbits((z.m & RESAMPLE_BG) > 0, axis=1),
+    ], axis=1)
+
+    files = []
+    for file_path, (first, last), lines in zip(z.files, z.file_rows, z.file_lines):
+        entry = {
+            "name": os.path.basename(file_path),
+            "lines": lines,
+            "rows": [first, last],
+            "stamp": _file_stamp(file_path),
+        }
+        ids = z.cycle_ids[first:last]
+        try:
+            first_cycle = int(ids[0][2:]) if ids and ids[0].startswith("b_") else None
+        except ValueError:
+            first_cycle = None
+        if first_cycle is not None and ids == ["b_" + str(first_cycle + k) for k in range(len(ids))]:
+            entry["first_cycle"] = first_cycle
+        else:
+            entry["cycle_ids"] = ids
+        files.append(entry)
+
+    header_path, matrix_path = resample_store_paths(outdir)
+
+    # Matrix first, header last: a store is only picked up once both are complete
+    with open(matrix_path + ".tmp", "wb") as matrix_handle:
+        np.save(matrix_handle, packed)
+    os.replace(matrix_path + ".tmp", matrix_path)
+
+    with open(header_path + ".tmp", "w") as header_handle:
+        json.dump({"version": RESAMPLE_STORE_VERSION, "species": z.species, "files": files}, header_handle)
+    os.replace(header_path + ".tmp", header_path)
+
+    return header_path, matrix_path
+
+
+# FUNCTION load_resample_store() Map a binary store into a resample_set (no text parsing)
+
+def load_resample_store(resample_dir, keep_configs = False):
+
+    header = read_resample_store_header(resample_dir)
+
+    z = resample_set()
+    z.path = resample_dir
+    z.keep_configs = keep_configs
+    z.species = header["species"]
+    z.packed = np.load(resample_store_paths(resample_dir)[1], mmap_mode="r")
+
+    for f in header["files"]:
+        first, last = f["rows"]
+        z.files.append(os.path.join(resample_dir, f["name"]))
+        z.file_rows.append((first, last))
+        z.file_lines.append(f["lines"])
+        if "cycle_ids" in f:
+            z.cycle_ids.extend(f["cycle_ids"])
+        else:
+            z.cycle_ids.extend(["b_" + str(f["first_cycle"] + k) for k in range(last - first)])
+
+    if z.packed.shape[0] != len(z.cycle_ids):
+        raise ValueError(f"Corrupt resample store in {resample_dir}: {z.packed.shape[0]} rows for {len(z.cycle_ids)} cycles")
+
+    return z
+
+
+# FUNCTION pack_resample_dir() Converter: parse the resample_*.tab files of a directory and write their binary store
+
+def pack_resample_dir(resample_dir, outdir = None, remove_text = False):
+
+    z = load_resample_set(resample_dir, use_store = False)
+    header_path, matrix_path = write_resample_store(z, outdir or resample_dir)
+
+    if remove_text:
+        for file_path in z.files:
+            os.remove(file_path)
+
+    return z, header_path, matrix_path
+
+
 '''
 # Test
 species_path = "_tests/sp2fam.210727.tab"
@@ -0,0 +1,288 @@
+#                      _              _
+#                     | |            | |
+#   ___ __ _  __ _ ___| |_ ___   ___ | |___
+#  / __/ _` |/ _` / __| __/ _ \ / _ \| / __|
+# | (_| (_| | (_| \__ \ || (_) | (_) | \__ \
+#  \___\__,_|\__,_|___/\__\___/ \___/|_|___/
+
+__version__ = "2.0.0-paired"
+
+'''
+A Convergent Amino Acid Substitution identification
+and analysis toolbox
+
+Author:         Fabio Barteri (fabio.barteri@upf.edu)
+
+Contributors:   Alejandro Valenzuela (alejandro.valenzuela@upf.edu)
+                Xavier Farré (xfarrer@igtp.cat),
+                David de Juan (david.juan@upf.edu).
+
+Pair-aware implementation: Miguel Ramon (miguel.ramon@upf.edu)
+
+MODULE NAME:    permulations.py
+DESCRIPTION:    Brownian motion permulations (RERconverge simpermvec), in process and vectorized.
+                Replaces permulations.R for ct resample --mode bm: the BM covariance of the tree
+                (pruned to the species with trait values) is factorized once, the traits of a whole
+                chunk of cycles are drawn as one matrix, the real trait values are assigned by rank
+                and FG/BG species are sampled among those with FG/BG values. Chunks are written as
+                resample_NNN.tab files (resample_000.tab = b_0), as the R script did.
+DEPENDENCIES:   dendropy, numpy
+CALLED BY:      init_bootstrap.py (simtrait)
+'''
+
+
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import dendropy
+import numpy as np
+
+# Cycles drawn at a time inside one chunk (bounds memory for very large chunks)
+BLOCK_CYCLES = 10000
+
+NA_STRINGS = ("", "NA", "NaN", "nan", "NULL", "null")
+
+
+### FUNCTION read_template()
+### FG and BG species of a trait config file (species<TAB>1/0), in file order
+
+def read_template(config_file):
+
+    fg = []
+    bg = []
+
+    with open(config_file) as cfg_handle:
+        for line in cfg_handle.read().splitlines():
+            c = line.split("\t")
+            if len(c) < 2:
+                continue
+            if c[1] == "1":
+                fg.append(c[0])
+            elif c[1] == "0":
+                bg.append(c[0])
+
+    return fg, bg
+
+
+### FUNCTION read_trait_values()
+### Species -> numeric trait value; missing and non-finite values are dropped (first row wins)
+
+def read_trait_values(phenotype_values_file):
+
+    values = {}
+
+    with open(phenotype_values_file) as pv_handle:
+        for line in pv_handle.read().splitlines():
+            c = line.split("\t")
+            if len(c) < 2 or c[0] in NA_STRINGS or c[1].strip() in NA_STRINGS:
+                continue
+            try:
+                value = float(c[1])
+            except ValueError:
+                continue
+            if np.isfinite(value) and c[0] not in values:
+                values[c[0]] = value
+
+    return values
+
+
+### FUNCTION bm_covariance()
+### Brownian motion covariance of the tips of a dendropy tree in species (shared root-to-MRCA path lengths).
+### Tips not in species are ignored, which is the same as pruning them from the tree.
+
+def bm_covariance(tree, species):
+
+    index = {s: i for i, s in enumerate(species)}
+    cov = np.zeros((len(species), len(species)))
+
+    depth = {}
+    for node in tree.preorder_node_iter():
+        parent = node.parent_node
+        depth[node] = 0.0 if parent is None else depth[parent] + (node.edge.length or 0.0)
+
+    # Tips under each node; pairs split by a node share the path down to it
+    below = {}
+    for node in tree.postorder_node_iter():
+        if node.is_leaf():
+            label = node.taxon.label.replace(" ", "_") if node.taxon is not None else None
+            i = index.get(label)
+            below[node] = [] if i is None else [i]
+            if i is not None:
+                cov[i, i] = depth[node]
+            continue
+
+        tips = []
+        for child in node.child_node_iter():
+            child_tips = below.pop(child)
+            if tips and child_tips:
+                cov[np.ix_(tips, child_tips)] = depth[node]
+                cov[np.ix_(child_tips, tips)] = depth[node]
+            tips.extend(child_tips)
+        below[node] = tips
+
+    return cov
+
+
+### FUNCTION covariance_factor()
+### F with F @ F.T == cov (Cholesky; eigendecomposition if cov is singular, e.g. zero-length tips)
+
+def covariance_factor(cov):
+
+    try:
+        return np.linalg.cholesky(cov)
+    except np.linalg.LinAlgError:
+        eigenvalues, eigenvectors = np.linalg.eigh(cov)
+        return eigenvectors * np.sqrt(np.clip(eigenvalues, 0.0, None))
+
+
+### FUNCTION permulate_block()
+### simpermvec + FG/BG sampling for n_cycles cycles at once.
+### Returns the (n_cycles x fg_size) and (n_cycles x bg_size) sampled species indices.
+
+def permulate_block(rng, factor, sorted_values, fg_values, bg_values, fg_size, bg_size, n_cycles):
+
+    n_species = factor.shape[0]
+
+    # BM traits of every cycle (rows), then the real values assigned by rank (simpermvec)
+    simulated = rng.standard_normal((n_cycles, n_species)) @ factor.T
+    ranks = np.argsort(simulated, axis=1)
+    permulated = np.empty_like(simulated)
+    np.put_along_axis(permulated, ranks, np.broadcast_to(sorted_values, simulated.shape), axis=1)
+
+    # sample(): random keys, species outside the candidates sort last
+    def sample(candidates, size):
+        keys = rng.random(simulated.shape)
+        keys[~candidates] = 2.0
+        return np.argsort(keys, axis=1)[:, :size]
+
+    fg = sample(np.isin(permulated, fg_values), fg_size)
+    bg = sample(np.isin(permulated, bg_values), bg_size)
+
+    return fg, bg
+
+
+### FUNCTION _permulate_chunk()
+### Worker: draws one resample_NNN.tab file from its own seed sequence
+
+_perm_state = {}
+
+def _permulate_chunk(job):
+
+    file_number, first_cycle, n_cycles, seed_sequence = job
+    s = _perm_state
+    rng = np.random.default_rng(seed_sequence)
+    names = s["species"]
+
+    lines = []
+    done = 0
+    while done < n_cycles:
+        block = min(BLOCK_CYCLES, n_cycles - done)
+        fg, bg = permulate_block(rng, s["factor"], s["sorted_values"], s["fg_values"], s["bg_values"],
+                                 s["fg_size"], s["bg_size"], block)
+        for k in range(block):
+            lines.append("\t".join([
+                "b_" + str(first_cycle + done + k),
+                ",".join([names[i] for i in fg[k]]),
+                ",".join([names[i] for i in bg[k]]),
+            ]))
+        done += block
+
+    filename = "resample_%03d.tab" % file_number
+    with open(os.path.join(s["outdir"], filename), "w") as out_handle:
+        out_handle.write("\n".join(lines) + "\n")
+
+    return file_number, filename, first_cycle, first_cycle + n_cycles - 1
+
+
+### FUNCTION permulate_bm()
+### ct resample --mode bm: writes resample_000.tab (b_0, optional) and resample_NNN.tab chunks
+
+def permulate_bm(tree_file, config_file, phenotype_values_file, cycles, outdir, chunk_size=500, include_b0=True, seed=None, workers=1):
+
+    if not os.path.exists(outdir):
+        os.makedirs(outdir)
+        print("[INFO]", time.strftime("%Y-%m-%d %H:%M:%S"), "Created output directory:", outdir)
+
+    # Step 1: FG/BG species and trait values (species without values are dropped)
+    template_fg, template_bg = read_template(config_file)
+    values = read_trait_values(phenotype_values_file)
+    if not values:
+        raise ValueError("No valid (non-missing) phenotype rows remain after filtering NA values")
+
+    foreground_species = [s for s in dict.fromkeys(template_fg) if s in values]
+    background_species = [s for s in dict.fromkeys(template_bg) if s in values]
+    if not foreground_species or not background_species:
+        raise ValueError("Foreground/background groups become empty after removing species with missing trait values")
+
+    fg_values = np.array([values[s] for s in foreground_species])
+    bg_values = np.array([values[s] for s in background_species])
+
+    # Step 2: species in the tree, BM covariance of the pruned tree and its factor
+    tree = dendropy.Tree.get(path=tree_file, schema="newick", preserve_underscores=True)
+    tree_species = {leaf.taxon.label.replace(" ", "_") for leaf in tree.leaf_node_iter() if leaf.taxon is not None}
+    species = [s for s in values if s in tree_species]
+
+    if len(species) < 2:
+        raise ValueError("Pruned tree has fewer than 2 tips after NA filtering; cannot run resampling")
+    if len(species) < len(values):
+        print("[WARN]", len(values) - len(species), "phenotype species are absent from tree and will be ignored")
+
+    starting_values = np.array([values[s] for s in species])
+    for group, group_values, size in (("foreground", fg_values, len(foreground_species)), ("background", bg_values, len(background_species))):
+        if np.isin(starting_values, group_values).sum() < size:
+            raise ValueError(f"Fewer tree species carry {group} trait values than the {group} size ({size})")
+
+    factor = covariance_factor(bm_covariance(tree, species))
+
+    # Step 3: b_0, the original configuration
+    start_time = time.time()
+    print("[START]", time.strftime("%Y-%m-%d %H:%M:%S"), "Beginning permulation generation...")
+    print("[INFO] Total cycles:", cycles, "| Chunk size:", chunk_size, "| Workers:", workers)
+
+    if include_b0:
+        b0_filepath = os.path.join(outdir, "resample_000.tab")
+        with open(b0_filepath, "w") as b0_handle:
+            b0_handle.write("\t".join(["b_0", ",".join(foreground_species), ",".join(background_species)]) + "\n")
+        print("[COMPLETE] b_0 written to:", b0_filepath)
+
+    # Step 4: one job per chunk file, each with an independent random stream
+    seed_sequence = np.random.SeedSequence(seed)
+    print("[INFO] Seed:", seed_sequence.entropy)
+
+    n_files = (cycles + chunk_size - 1) // chunk_size
+    jobs = [
+        (k + 1, k * chunk_size + 1, min(chunk_size, cycles - k * chunk_size), child)
+        for k, child in enumerate(seed_sequence.spawn(n_files))
+    ]
+
+    _perm_state.update({
+        "species": species,
+        "factor": factor,
+        "sorted_values": np.sort(starting_values),
+        "fg_values": fg_values,
+        "bg_values": bg_values,
+        "fg_size": len(foreground_species),
+        "bg_size": len(background_species),
+        "outdir": outdir,
+    })
+
+    def report(results):
+        for file_number, filename, first, last in results:
+            elapsed = time.time() - start_time
+            eta = (cycles - last) / (last / elapsed) if elapsed > 0 else 0.0
+            print("[%s] File %d: %s | Cycles %d-%d | Progress: %.1f%% | Elapsed: %.1f min | ETA: %.1f min" % (
+                time.strftime("%H:%M:%S"), file_number, filename, first, last,
+                100.0 * last / cycles, elapsed / 60, eta / 60))
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers = workers, mp_context = multiprocessing.get_context("fork")) as executor:
+            report(executor.map(_permulate_chunk, jobs))
+    else:
+        report(map(_permulate_chunk, jobs))
+
+    total_elapsed = (time.time() - start_time) / 60
+    print("[COMPLETE]", time.strftime("%Y-%m-%d %H:%M:%S"), "|", cycles, "cycles in", round(total_elapsed, 2), "minutes")
+    print("[OUTPUT] Generated", n_files, "permuted trait files" + (" + 1 original (b_0)" if include_b0 else ""), "in:", outdir)
+
+    return outdir
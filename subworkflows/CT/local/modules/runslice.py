@@ -21,17 +21,13 @@ Pair-aware implementation: Miguel Ramon (miguel.ramon@upf.edu)
 
 MODULE NAME:    runslice.py
 DESCRIPTION:    The slicer function.
-DEPENDENCIES:   TBD
+DEPENDENCIES:   alimport.py, alimatrix.py
 '''
 from modules.alimport import *
 
-### Function runslice (collects the slicer inputs and runs it)
-def runslice(options_object):
+### Function column_threshold (minimum changes a column needs to be able to return a CAAS)
+def column_threshold(options_object):
 
-    # Inputs (transferring parsed options_object to variables)
-    the_alignment = options_object.single_alignment
-    alignment_format = options_object.ali_format
-    
     # Alignment slice: 1- Calculate column treshold
 
     with open(options_object.config_file) as cfg_handle:
@@ -77,9 +73,34 @@ def runslice(options_object):
 
     c_threshold = min(fg_threshold, bg_threshold)
 
+    return c_threshold
+
+### Function runslice (collects the slicer inputs and runs it)
+def runslice(options_object):
+
+    # Inputs (transferring parsed options_object to variables)
+    the_alignment = options_object.single_alignment
+    alignment_format = options_object.ali_format
+
+    c_threshold = column_threshold(options_object)
 
     # Alignment slice: 2- Filter positions (slice alignment)
 
     out = slice(the_alignment, alignment_format, c_threshold, float(options_object.max_gaps_pos_string))
 
+    print("Slicer:", len(out.d), "of", out.length, "columns kept (removed:", out.removed["gaps"], "by gap ratio,", out.removed["changes"], "by minimum changes)")
+
+    return out
+
+### Function runslice_matrix (same inputs, returns a column-major alimatrix object)
+def runslice_matrix(options_object):
+
+    from modules.alimatrix import slice_matrix
+
+    c_threshold = column_threshold(options_object)
+
+    out = slice_matrix(options_object.single_alignment, options_object.ali_format, c_threshold, float(options_object.max_gaps_pos_string))
+
+    print("Slicer:", len(out.columns), "of", out.m.shape[1], "columns kept (removed:", out.removed["gaps"], "by gap ratio,", out.removed["changes"], "by minimum changes)")
+
     return out
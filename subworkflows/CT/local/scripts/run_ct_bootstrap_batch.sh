@@ -13,6 +13,7 @@ progress_log="0"
 export_groups="0"
 export_perm_discovery="0"
 extra_args_file=""
+inprocess="0"
 
 while [[ $# -gt 0 ]]; do
     case "$1" in
@@ -64,6 +65,10 @@ while [[ $# -gt 0 ]]; do
             extra_args_file="$2"
             shift 2
             ;;
+        --inprocess)
+            inprocess="$2"
+            shift 2
+            ;;
         *)
             echo "Unknown argument: $1" >&2
             exit 1
@@ -88,10 +93,13 @@ if [[ -n "$extra_args_file" && -s "$extra_args_file" ]]; then
 fi
 
 declare -a base_cmd
+declare -a batch_cmd
 if [[ "$runner_mode" == "container" ]]; then
     base_cmd=("$ct_bin" "ct" "bootstrap")
+    batch_cmd=("$ct_bin" "ct" "bootstrap-batch")
 else
     base_cmd=("$ct_bin" "bootstrap")
+    batch_cmd=("$ct_bin" "bootstrap-batch")
 fi
 
 gene_count="$(grep -cve '^[[:space:]]*$' "$manifest" || true)"
@@ -128,6 +136,50 @@ wait_for_all() {
     done
 }
 
+if [[ "$inprocess" == "1" ]]; then
+    # In-process mode: one ct bootstrap-batch per worker, each loading the resample set once
+    # and bootstrapping its round-robin shard of the manifest.
+    shard_count="$workers"
+    if [[ "$gene_count" -lt "$shard_count" ]]; then
+        shard_count="$gene_count"
+    fi
+
+    awk -v n="$shard_count" -v prefix="${batch_id}.shard" 'NF { print > (prefix "_" (i++ % n) ".tsv") }' "$manifest"
+
+    for ((shard = 0; shard < shard_count; shard++)); do
+        shard_manifest="${batch_id}.shard_${shard}.tsv"
+        echo "[BOOTSTRAP_BATCHED] Launching shard $((shard + 1))/$shard_count ($(wc -l < "$shard_manifest" | tr -d ' ') genes)"
+
+        declare -a cmd=(
+            "${batch_cmd[@]}"
+            -m "$shard_manifest"
+            -t "$caas_config"
+            -s "$resampled_path"
+            --fmt "$ali_format"
+            --alignment_dir alignments
+            --discovery_dir discovery
+        )
+
+        if [[ "$progress_log" == "1" ]]; then
+            cmd+=(--progress_log)
+        fi
+        if [[ "$export_groups" == "1" ]]; then
+            cmd+=(--export_groups)
+        fi
+        if [[ "$export_perm_discovery" == "1" ]]; then
+            cmd+=(--export_perm_discovery)
+        fi
+
+        (
+            "${cmd[@]}" "${extra_args[@]}"
+            echo "[BOOTSTRAP_BATCHED] Completed shard $((shard + 1))/$shard_count"
+        ) &
+    done
+
+    wait_for_all
+    exit 0
+fi
+
 idx=0
 while IFS=$'\t' read -r alignment_id alignment_name discovery_name; do
     [[ -z "${alignment_id:-}" ]] && continue
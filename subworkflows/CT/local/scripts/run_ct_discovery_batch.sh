@@ -9,6 +9,7 @@ ali_format=""
 runner_mode=""
 ct_bin=""
 extra_args_file=""
+inprocess="0"
 
 while [[ $# -gt 0 ]]; do
     case "$1" in
@@ -44,6 +45,10 @@ while [[ $# -gt 0 ]]; do
             extra_args_file="$2"
             shift 2
             ;;
+        --inprocess)
+            inprocess="$2"
+            shift 2
+            ;;
         *)
             echo "Unknown argument: $1" >&2
             exit 1
@@ -68,10 +73,13 @@ if [[ -n "$extra_args_file" && -s "$extra_args_file" ]]; then
 fi
 
 declare -a base_cmd
+declare -a batch_cmd
 if [[ "$runner_mode" == "container" ]]; then
     base_cmd=("$ct_bin" "ct" "discovery")
+    batch_cmd=("$ct_bin" "ct" "discovery-batch")
 else
     base_cmd=("$ct_bin" "discovery")
+    batch_cmd=("$ct_bin" "discovery-batch")
 fi
 
 gene_count="$(grep -cve '^[[:space:]]*$' "$manifest" || true)"
@@ -108,6 +116,19 @@ wait_for_all() {
     done
 }
 
+if [[ "$inprocess" == "1" ]]; then
+    # In-process mode: a single ct discovery-batch parses the trait config once and
+    # runs the genes on its own pool of worker processes.
+    "${batch_cmd[@]}" \
+        -m "$manifest" \
+        -t "$caas_config" \
+        --fmt "$ali_format" \
+        --alignment_dir alignments \
+        --workers "$workers" \
+        "${extra_args[@]}"
+    exit 0
+fi
+
 idx=0
 while IFS=$'\t' read -r alignment_id alignment_name; do
     [[ -z "${alignment_id:-}" ]] && continue
@@ -9,7 +9,7 @@ process CT_ACCUMULATION_AGGREGATE {
     label 'process_long_compute'
 
     publishDir path: "${params.outdir}/accumulation/aggregation", mode: 'copy', overwrite: true,
-               pattern: '*.csv'
+               pattern: '*.{csv,parquet}'
 
     input:
     val  alignment_dir
@@ -19,7 +19,8 @@ process CT_ACCUMULATION_AGGREGATE {
     path bg_caas
 
     output:
-    path "*_global.csv",    emit: global_csv
+    // With accumulation_global_parquet the randomize step reads the memory-mapped Parquet copy
+    path "*_global.${params.accumulation_global_parquet ? 'parquet' : 'csv'}", emit: global_csv
     path "*_deciles.csv",   emit: deciles, optional: true
 
     script:
@@ -27,6 +28,10 @@ process CT_ACCUMULATION_AGGREGATE {
     def ali_fmt      = params.ali_format
     def out_pfx      = 'accumulation'
     def log_level    = params.accumulation_log_level ?: 'INFO'
+    def parquet_flag = params.accumulation_global_parquet ? '--global-parquet' : ''
+    def agg_workers  = "--workers ${params.accumulation_workers ?: task.cpus}"
+    // Lives outside the work directory so a resubmitted job only aggregates the missing genes
+    def ckpt_flag    = params.accumulation_checkpoint_dir ? "--checkpoint-dir '${params.accumulation_checkpoint_dir}'" : ''
 
     if (params.use_singularity || params.use_apptainer) {
         """
@@ -42,7 +47,8 @@ process CT_ACCUMULATION_AGGREGATE {
             --species-list '${species_list}' \\
             --metadata-caas '${metadata_caas}' \\
             --bg-caas '${bg_caas}' \\
-            --output-prefix '${out_pfx}' \\
+            --output-prefix '${out_pfx}' ${parquet_flag} \\
+            ${agg_workers} ${ckpt_flag} \\
             --log-level '${log_level}'
         """
     } else {
@@ -59,7 +65,8 @@ process CT_ACCUMULATION_AGGREGATE {
             --species-list '${species_list}' \\
             --metadata-caas '${metadata_caas}' \\
             --bg-caas '${bg_caas}' \\
-            --output-prefix '${out_pfx}' \\
+            --output-prefix '${out_pfx}' ${parquet_flag} \\
+            ${agg_workers} ${ckpt_flag} \\
             --log-level '${log_level}'
         """
     }
@@ -94,6 +101,7 @@ process CT_ACCUMULATION_RANDOMIZE {
     // (which reads the full hardware CPU count of the node, not the Slurm allocation).
     def workers_flag = "--workers ${params.accumulation_workers ?: task.cpus}"
     def seed_flag    = params.accumulation_seed    ? "--global-seed ${params.accumulation_seed}"   : ''
+    def compat_flag  = params.accumulation_rng_compat ? '--rng-compat' : ''
 
     if (params.use_singularity || params.use_apptainer) {
         """
@@ -109,7 +117,7 @@ process CT_ACCUMULATION_RANDOMIZE {
             --randomization-type '${rand_type}' \\
             --n-randomizations ${n_rands} \\
             --change-side '${change_side_arg}' \\
-            ${workers_flag} ${seed_flag} \\
+            ${workers_flag} ${seed_flag} ${compat_flag} \\
             --log-level '${log_level}'
         """
     } else {
@@ -126,7 +134,7 @@ process CT_ACCUMULATION_RANDOMIZE {
             --randomization-type '${rand_type}' \\
             --n-randomizations ${n_rands} \\
             --change-side '${change_side_arg}' \\
-            ${workers_flag} ${seed_flag} \\
+            ${workers_flag} ${seed_flag} ${compat_flag} \\
             --log-level '${log_level}'
         """
     }
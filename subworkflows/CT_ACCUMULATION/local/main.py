@@ -50,17 +50,24 @@ def main():
     parser.add_argument("--metadata-caas",    help="Meta-CAAS file (global_meta_caas.tsv or original format)")
     parser.add_argument("--bg-caas",          help="Cleaned background gene list (no header)")
     parser.add_argument("--alignment-format", default="phylip-relaxed")
+    parser.add_argument("--checkpoint-dir",   default=None,
+                        help="Per-gene aggregation checkpoints; a rerun only computes missing genes")
+    parser.add_argument("--global-parquet",   action="store_true",
+                        help="Also write <prefix>_global.parquet for the randomize phase")
 
     # Randomization args
-    parser.add_argument("--global-csv",                 help="Path to _global.csv from aggregation (contains masked + iscaas)")
+    parser.add_argument("--global-csv",                 help="Path to _global.csv (or _global.parquet) from aggregation (contains masked + iscaas)")
     parser.add_argument("--caas-csv",                   help="Meta-CAAS file (global_meta_caas.tsv or CAAS CSV)")
     parser.add_argument("--randomization-type",         choices=["naive", "cons_decile"])
     parser.add_argument("--n-randomizations",           type=int, default=10000)
-    parser.add_argument("--workers",                    type=int, default=None)
+    parser.add_argument("--workers",                    type=int, default=None,
+                        help="Worker processes (aggregate: genes in parallel; randomize: chunks)")
     parser.add_argument("--compress",                   action="store_true")
     parser.add_argument("--export-individual-rand",     action="store_true")
     parser.add_argument("--decile-bins",                type=str, default=None)
     parser.add_argument("--global-seed",                type=int, default=None)
+    parser.add_argument("--rng-compat",                 action="store_true",
+                        help="Reproduce the legacy np.random.choice draws for a given seed (slow)")
     parser.add_argument("--precompute-masks",           dest="precompute_masks", action="store_true")
     parser.add_argument("--no-precompute-masks",        dest="precompute_masks", action="store_false")
     parser.set_defaults(precompute_masks=True)
@@ -100,6 +107,9 @@ def main():
                 metadata_caas=args.metadata_caas,
                 bg_caas=args.bg_caas,
                 output_prefix=args.output_prefix,
+                global_parquet=args.global_parquet,
+                workers=args.workers,
+                checkpoint_dir=args.checkpoint_dir,
                 log_level=args.log_level,
             )
             timed_execution(aggregate_fn, agg_args, "Aggregation Phase")
@@ -116,6 +126,7 @@ def main():
                 export_individual_rand=args.export_individual_rand,
                 decile_bins=args.decile_bins,
                 global_seed=args.global_seed,
+                rng_compat=args.rng_compat,
                 precompute_masks=args.precompute_masks,
                 change_side=args.change_side,
                 log_level=args.log_level,
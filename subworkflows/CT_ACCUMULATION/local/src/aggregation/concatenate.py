@@ -13,18 +13,26 @@ Changes vs. original to_integrate version:
       top_change_type, bottom_change_type, change_side, low_confidence_nodes,
       asr_is_conserved, comments, ..., Trait
     No fallback to legacy formats.
+  - aggregate(): per-gene columns (cons_idx, masked) are computed on a uint8
+    matrix, optionally by --workers processes, and written in genomic order by
+    a single chunked writer. --checkpoint-dir keeps one .npz per finished gene
+    so an interrupted run only recomputes the missing genes.
 """
 
 import argparse
 import os
 import glob
-import gc
 import csv
+import hashlib
 
 import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import logging
 from Bio import AlignIO
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
 
 # --------------------------
@@ -252,34 +260,181 @@ def validate_species(alignment, required_species):
         raise ValueError(f"Missing species in alignment: {', '.join(sorted(missing))}")
 
 
-def calculate_conservation(alignment, group_species=None):
+GAP_SYMBOL = ord('-')
+
+# Rows buffered before each columnar write of the _global table
+GLOBAL_CHUNK_ROWS = 1 << 20
+
+
+def alignment_matrix(alignment):
+    """uint8 matrix (records x columns) of the raw alignment symbols."""
+    seqs = [str(rec.seq) for rec in alignment]
     seq_len = alignment.get_alignment_length()
-    general_counts = [defaultdict(int) for _ in range(seq_len)]
-    for record in alignment:
-        for pos in range(seq_len):
-            aa = record.seq[pos]
-            if aa != '-':
-                general_counts[pos][aa] += 1
-    results = {}
-    for pos in range(seq_len):
-        g_counts = general_counts[pos]
-        g_total  = sum(g_counts.values()) or 1
-        max_val  = max(g_counts.values(), default=0)
-        cons_idx = (max_val / g_total) * 100
-        results[pos] = {'cons_idx': cons_idx}
-    return results
-
-
-def calculate_masked_positions(alignment, target_species):
+    return np.frombuffer(''.join(seqs).encode('latin-1'), dtype=np.uint8).reshape(len(seqs), seq_len)
+
+
+def calculate_conservation(matrix):
+    """Per-column cons_idx: share (%) of the most frequent non-gap symbol over all records."""
+    totals = (matrix != GAP_SYMBOL).sum(axis=0)
+    max_val = np.zeros(matrix.shape[1], dtype=np.int64)
+    for symbol in np.unique(matrix):
+        if symbol == GAP_SYMBOL:
+            continue
+        np.maximum(max_val, (matrix == symbol).sum(axis=0), out=max_val)
+    totals[totals == 0] = 1
+    return (max_val / totals) * 100
+
+
+def calculate_masked_positions(matrix, record_ids, target_species):
+    """Per-column flag: True where any record of a target species has a gap."""
     target_set = set(target_species)
-    seq_len = alignment.get_alignment_length()
-    masked = set()
-    for pos in range(seq_len):
-        for rec in alignment:
-            if rec.id in target_set and rec.seq[pos] == '-':
-                masked.add(pos)
-                break
-    return masked
+    rows = [i for i, rid in enumerate(record_ids) if rid in target_set]
+    if not rows:
+        return np.zeros(matrix.shape[1], dtype=bool)
+    return (matrix[rows] == GAP_SYMBOL).any(axis=0)
+
+
+def caas_positions_by_gene(metadata_dict):
+    """Union over groups of the CAAS MSA positions of every gene: dict[gene] -> set(msa_pos)."""
+    by_gene = defaultdict(set)
+    for group in metadata_dict:
+        for gene, positions in metadata_dict[group].items():
+            by_gene[gene].update(positions.keys())
+    return by_gene
+
+
+class GlobalWriter:
+    """Chunked columnar writer for the _global table (CSV, plus optional Parquet)."""
+
+    FIELDNAMES = ['gene', 'position', 'chr', 'start', 'end', 'msa_pos', 'cons_idx', 'masked', 'iscaas']
+
+    def __init__(self, csv_path, parquet_path=None, chunk_rows=GLOBAL_CHUNK_ROWS):
+        self.csv_path = csv_path
+        self.parquet_path = parquet_path
+        self.chunk_rows = chunk_rows
+        self._csv = open(csv_path, 'w', newline='')
+        self._parquet = None
+        self._frames = []
+        self._buffered = 0
+        self._header = True
+
+    def append(self, frame):
+        self._frames.append(frame)
+        self._buffered += len(frame)
+        if self._buffered >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._frames:
+            return
+        chunk = pd.concat(self._frames, ignore_index=True)
+        chunk.to_csv(self._csv, header=self._header, index=False, lineterminator='\r\n')
+        self._header = False
+        if self.parquet_path:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.parquet_path, table.schema, compression='snappy')
+            self._parquet.write_table(table)
+        self._frames = []
+        self._buffered = 0
+
+    def close(self):
+        self.flush()
+        if self._header:
+            # No rows at all: keep a header-only CSV, as the row writer did
+            self._csv.write(','.join(self.FIELDNAMES) + '\r\n')
+        self._csv.close()
+        if self.parquet_path:
+            if self._parquet is None:
+                empty = pd.DataFrame({name: pd.Series(dtype=dtype) for name, dtype in (
+                    ('gene', object), ('position', np.int64), ('chr', object), ('start', np.int64),
+                    ('end', np.int64), ('msa_pos', np.int64), ('cons_idx', np.float64),
+                    ('masked', bool), ('iscaas', bool),
+                )})
+                pq.write_table(pa.Table.from_pandas(empty, preserve_index=False), self.parquet_path)
+            else:
+                self._parquet.close()
+
+
+def gene_columns(gene_name, alignment_file, alignment_format, msa_length, target_species):
+    """Alignment-derived columns of one gene: (cons_idx, masked), one entry per MSA column.
+
+    Module-level so that aggregation workers can run it in a process pool.
+    """
+    alignment = AlignIO.read(alignment_file, alignment_format)
+    seq_len   = alignment.get_alignment_length()
+    if seq_len != msa_length:
+        logging.warning(
+            f"MSA length mismatch for {gene_name}: observed {seq_len} "
+            f"vs metadata {msa_length}"
+        )
+    matrix = alignment_matrix(alignment)
+    cons   = calculate_conservation(matrix)
+    masked = calculate_masked_positions(matrix, [rec.id for rec in alignment], target_species)
+    return cons, masked
+
+
+def _gene_columns_job(job):
+    """Pool wrapper around gene_columns(): errors are returned, not raised."""
+    gene_name = job[0]
+    try:
+        return gene_name, gene_columns(*job), None
+    except Exception as e:
+        return gene_name, None, str(e)
+
+
+# --------------------------
+# Per-gene checkpoints
+# --------------------------
+
+def _source_stamp(alignment_file):
+    st = os.stat(alignment_file)
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def checkpoint_fingerprint(target_species, alignment_format):
+    """Identifies the inputs that per-gene checkpoints depend on, besides the alignment itself."""
+    h = hashlib.sha1()
+    h.update(alignment_format.encode())
+    for sp in sorted(target_species):
+        h.update(b'\0' + sp.encode())
+    return h.hexdigest()
+
+
+def open_checkpoints(checkpoint_dir, fingerprint):
+    """Prepare the checkpoint directory; returns False when existing checkpoints must be ignored."""
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    stamp = os.path.join(checkpoint_dir, 'FINGERPRINT')
+    previous = open(stamp).read().strip() if os.path.exists(stamp) else None
+    if previous != fingerprint:
+        if previous is not None:
+            logging.warning(f"Checkpoints in {checkpoint_dir} were made with other inputs; recomputing all genes")
+        with open(stamp + '.tmp', 'w') as f:
+            f.write(fingerprint + '\n')
+        os.replace(stamp + '.tmp', stamp)
+        return False
+    return True
+
+
+def load_checkpoint(checkpoint_dir, gene_name, alignment_file):
+    path = os.path.join(checkpoint_dir, f"{gene_name}.npz")
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as z:
+            if str(z['source']) != _source_stamp(alignment_file):
+                return None
+            return z['cons_idx'], z['masked']
+    except Exception as e:
+        logging.warning(f"Unreadable checkpoint for {gene_name} ({e}); recomputing")
+        return None
+
+
+def save_checkpoint(checkpoint_dir, gene_name, alignment_file, cons, masked):
+    path = os.path.join(checkpoint_dir, f"{gene_name}.npz")
+    with open(path + '.tmp', 'wb') as f:
+        np.savez(f, cons_idx=cons, masked=masked, source=np.array(_source_stamp(alignment_file)))
+    os.replace(path + '.tmp', path)
 
 
 def aggregate(args):
@@ -289,6 +444,7 @@ def aggregate(args):
     gene_info_list = read_genomic_info(args.genomic_info)
     bg_list        = read_bg_info(args.bg_caas)
     metadata_dict  = read_metadata_caas(args.metadata_caas) if args.metadata_caas else {}
+    caas_by_gene   = caas_positions_by_gene(metadata_dict)
 
     # Filter gene_info_list to background genes only
     if bg_list:
@@ -308,13 +464,11 @@ def aggregate(args):
     all_species = set(species_data.keys())
     logging.info(f"Total species for accumulation: {len(all_species)}")
 
-    # Output: single enriched global CSV
+    # Output: single enriched global CSV (optionally mirrored as Parquet)
     # Columns: gene, position, chr, start, end, msa_pos, cons_idx, masked, iscaas
     aggregated_filename = f"{args.output_prefix}_global.csv"
-    aggregated_fieldnames = ['gene', 'position', 'chr', 'start', 'end', 'msa_pos', 'cons_idx', 'masked', 'iscaas']
-    aggregated_file = open(aggregated_filename, 'w', newline='')
-    aggregated_writer = csv.DictWriter(aggregated_file, fieldnames=aggregated_fieldnames)
-    aggregated_writer.writeheader()
+    parquet_filename = f"{args.output_prefix}_global.parquet" if getattr(args, 'global_parquet', False) else None
+    aggregated_writer = GlobalWriter(aggregated_filename, parquet_filename)
 
     overall_caas_cons = []
 
@@ -333,52 +487,78 @@ def aggregate(args):
             "Check --alignment-dir path and --alignment-format."
         )
 
-    genes_written = 0
+    # Genes to aggregate, in genomic order
+    jobs, job_infos = [], []
     for gene_info in gene_info_list:
         gene_name = gene_info['gene']
         if gene_name not in alignment_files:
             logging.warning(f"No alignment file for gene {gene_name}, skipping")
             continue
-        try:
-            alignment = AlignIO.read(alignment_files[gene_name], args.alignment_format)
-            seq_len   = alignment.get_alignment_length()
-            if seq_len != gene_info['msa_length']:
-                logging.warning(
-                    f"MSA length mismatch for {gene_name}: observed {seq_len} "
-                    f"vs metadata {gene_info['msa_length']}"
-                )
-            general_cons = calculate_conservation(alignment)
-            masked_pos   = calculate_masked_positions(alignment, all_species)
-
-            for msa_pos in range(seq_len):
-                global_pos = gene_offsets[gene_name] + msa_pos
-                is_caas    = any(
-                    msa_pos in metadata_dict.get(g, {}).get(gene_name, {})
-                    for g in metadata_dict
-                ) if metadata_dict else False
-                aggregated_writer.writerow({
-                    'gene':     gene_name,
-                    'msa_pos':  msa_pos,
-                    'position': global_pos,
-                    'chr':      gene_info['chr'],
-                    'start':    gene_info['start'],
-                    'end':      gene_info['end'],
-                    'cons_idx': general_cons[msa_pos]['cons_idx'],
-                    'masked':   (msa_pos in masked_pos),
-                    'iscaas':   is_caas,
-                })
-                if is_caas:
-                    overall_caas_cons.append(general_cons[msa_pos]['cons_idx'])
+        jobs.append((gene_name, alignment_files[gene_name], args.alignment_format,
+                     gene_info['msa_length'], all_species))
+        job_infos.append(gene_info)
+
+    # Reuse finished genes from an interrupted run
+    checkpoint_dir = getattr(args, 'checkpoint_dir', None)
+    done = {}
+    if checkpoint_dir:
+        if open_checkpoints(checkpoint_dir, checkpoint_fingerprint(all_species, args.alignment_format)):
+            for job in jobs:
+                cols = load_checkpoint(checkpoint_dir, job[0], job[1])
+                if cols is not None:
+                    done[job[0]] = cols
+        logging.info(f"Checkpoints: {len(done)} of {len(jobs)} genes already aggregated in {checkpoint_dir}")
+    pending = [job for job in jobs if job[0] not in done]
+
+    # Workers compute the per-gene columns; this process writes them in genomic order
+    workers = max(1, int(getattr(args, 'workers', None) or 1))
+    executor = None
+    if workers > 1 and len(pending) > 1:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        computed = executor.map(_gene_columns_job, pending, chunksize=max(1, min(64, len(pending) // (workers * 8))))
+        logging.info(f"Aggregating {len(pending)} genes on {workers} workers")
+    else:
+        computed = map(_gene_columns_job, pending)
 
+    genes_written = 0
+    try:
+        for job, gene_info in zip(jobs, job_infos):
+            gene_name = job[0]
+            if gene_name in done:
+                general_cons, masked_pos = done[gene_name]
+            else:
+                _, cols, error = next(computed)
+                if error is not None:
+                    logging.error(f"Error processing gene {gene_name}: {error}")
+                    continue
+                general_cons, masked_pos = cols
+                if checkpoint_dir:
+                    save_checkpoint(checkpoint_dir, gene_name, job[1], general_cons, masked_pos)
+
+            seq_len = len(general_cons)
+            is_caas = np.zeros(seq_len, dtype=bool)
+            caas_pos = [p for p in caas_by_gene.get(gene_name, ()) if 0 <= p < seq_len]
+            is_caas[caas_pos] = True
+
+            msa_pos = np.arange(seq_len, dtype=np.int64)
+            aggregated_writer.append(pd.DataFrame({
+                'gene':     gene_name,
+                'position': gene_offsets[gene_name] + msa_pos,
+                'chr':      gene_info['chr'],
+                'start':    gene_info['start'],
+                'end':      gene_info['end'],
+                'msa_pos':  msa_pos,
+                'cons_idx': general_cons,
+                'masked':   masked_pos,
+                'iscaas':   is_caas,
+            }, columns=GlobalWriter.FIELDNAMES))
+            overall_caas_cons.extend(general_cons[is_caas].tolist())
             genes_written += 1
-            del alignment
-            gc.collect()
-
-        except Exception as e:
-            logging.error(f"Error processing gene {gene_name}: {str(e)}")
-            continue
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
 
-    aggregated_file.close()
+    aggregated_writer.close()
 
     if genes_written == 0:
         logging.error(
@@ -388,6 +568,8 @@ def aggregate(args):
         )
     else:
         logging.info(f"Aggregation wrote {genes_written} genes to {aggregated_filename}.")
+        if parquet_filename:
+            logging.info(f"Columnar copy written to {parquet_filename}.")
 
     # Deciles
     decile_file = f"{args.output_prefix}_deciles.csv"
@@ -415,6 +597,12 @@ if __name__ == "__main__":
     parser.add_argument('-m', '--metadata-caas',   help='Meta-CAAS file (original or global_meta_caas.tsv format)')
     parser.add_argument('-b', '--bg-caas',         help='Cleaned background gene list (one gene per line, no header)')
     parser.add_argument('-o', '--output-prefix',   required=True, help='Prefix for output files')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes computing per-gene columns (default: 1)')
+    parser.add_argument('--checkpoint-dir', default=None,
+                        help='Keep one checkpoint per finished gene here; a rerun only computes missing genes')
+    parser.add_argument('--global-parquet', action='store_true',
+                        help='Also write <prefix>_global.parquet (memory-mapped by the randomize step)')
     parser.add_argument('--log-level', default='INFO')
 
     args = parser.parse_args()
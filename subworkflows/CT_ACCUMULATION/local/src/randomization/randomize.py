@@ -13,13 +13,17 @@ This simplified version only exports aggregated randomization outputs for:
 
 No significance/convergence/divergence category families are exported.
 No FDR or gene-list outputs are generated.
+
+Each chunk draws whole blocks of replicates at once with a numpy Generator
+and counts per gene with a flat 2-D bincount. --rng-compat keeps the legacy
+per-replicate np.random.choice loop (same draws as earlier releases).
 """
 
 import argparse
 import os
 import numpy as np
 import pandas as pd
-from collections import defaultdict
+from collections import Counter, defaultdict
 import pyarrow as pa
 import pyarrow.parquet as pq
 from concurrent.futures import ProcessPoolExecutor, as_completed
@@ -75,6 +79,18 @@ def _remap_caas_df(df):
 # Worker class
 # ---------------------------
 
+# Upper bound on replicates x width cells held per vectorized block
+# (width = number of genes or the largest draw per key, whichever is larger).
+_BLOCK_CELLS = 1 << 22
+
+_INDIVIDUAL_SCHEMA = pa.schema([
+    ('rand_id', pa.string()),
+    ('caas_position', pa.int64()),
+    ('tag', pa.string()),
+    ('randomized_position', pa.int64()),
+    ('randomized_gene_id', pa.int32()),
+])
+
 class RandomizationWorker:
     def __init__(
         self,
@@ -93,6 +109,7 @@ class RandomizationWorker:
         caas_data,
         position_to_tag,
         actual_counts,          # dict: category_name -> np.ndarray(n_genes, int64)
+        rng_compat=False,
     ):
         self.randomization_type = randomization_type
         self.decile_bins = np.array(decile_bins) if decile_bins is not None else None
@@ -105,6 +122,7 @@ class RandomizationWorker:
         self.caas_data = caas_data
         self.position_to_tag = position_to_tag or {}
         self.actual_counts = {k: v.astype(np.int64, copy=False) for k, v in actual_counts.items()}
+        self.rng_compat = rng_compat
 
         if self.global_seed is not None:
             np.random.seed(self.global_seed)
@@ -156,8 +174,108 @@ class RandomizationWorker:
             return
         raise ValueError(f"Unknown randomization_type: {self.randomization_type}")
 
+    def _block_size(self, chunk_size):
+        """Replicates drawn per vectorized block, bounded by _BLOCK_CELLS."""
+        widest = max([self.n_genes] + [
+            n for cinfo in self.caas_by_key_counts.values() for n in cinfo.values()
+        ])
+        return int(max(1, min(chunk_size, _BLOCK_CELLS // max(1, widest))))
+
     def process_chunk(self, chunk_size, chunk_idx):
+        if self.rng_compat:
+            return self.process_chunk_compat(chunk_size, chunk_idx)
         logging.info(f"Starting chunk {chunk_idx} with {chunk_size} randomizations in PID {os.getpid()}")
+
+        # One Generator stream per chunk; reproducible for a given seed and chunk plan.
+        rng = np.random.default_rng(
+            None if self.global_seed is None else [self.global_seed, chunk_idx]
+        )
+
+        # Genes of the eligible rows, per key: draws index straight into these.
+        genes_by_key = {
+            key: self.genes[elig] for key, elig in self.eligible_by_key.items() if elig.size > 0
+        }
+        draws = [
+            (key, cinfo, genes_by_key[key])
+            for key, cinfo in self.caas_by_key_counts.items() if key in genes_by_key
+        ]
+
+        S = {
+            cat: [
+                np.zeros(self.n_genes, dtype=np.int64),
+                np.zeros(self.n_genes, dtype=np.float64),
+                np.zeros(self.n_genes, dtype=np.int64),
+            ]
+            for cat in self.actual_counts
+        }
+
+        writer = None
+        if self.export_individual:
+            os.makedirs(self.output_dir, exist_ok=True)
+            chunk_file = os.path.join(self.output_dir, f"chunk_{chunk_idx}_{os.getpid()}.parquet")
+            writer = pq.ParquetWriter(chunk_file, _INDIVIDUAL_SCHEMA, compression='snappy')
+
+        block = self._block_size(chunk_size)
+        for start in range(0, chunk_size, block):
+            R = min(block, chunk_size - start)
+            # Row offsets turn (replicate, gene) pairs into one flat bincount.
+            offsets = (np.arange(R, dtype=np.int64) * self.n_genes)[:, None]
+
+            for cat, Sv in S.items():
+                name = f'n_{cat}'
+                counts = np.zeros(R * self.n_genes, dtype=np.int64)
+                for key, cinfo, elig_genes in draws:
+                    n = cinfo.get(name, 0)
+                    if n > 0:
+                        picked = elig_genes[rng.integers(0, elig_genes.size, size=(R, n))]
+                        counts += np.bincount((picked + offsets).ravel(), minlength=R * self.n_genes)
+                counts = counts.reshape(R, self.n_genes)
+                Sv[0] += counts.sum(axis=0)
+                Sv[1] += (counts.astype(np.float64) ** 2).sum(axis=0)
+                Sv[2] += (counts >= self.actual_counts[cat]).sum(axis=0)
+
+            if writer is not None:
+                self._write_individual(writer, rng, draws, chunk_idx, start, R)
+
+        if writer is not None:
+            writer.close()
+
+        def _pack(Sv):
+            return {'sum': Sv[0], 'sum_sq': Sv[1], 'count_above': Sv[2]}
+        return {
+            'chunk_idx': chunk_idx, 'n_rands': chunk_size,
+            **{cat: _pack(S[cat]) for cat in S},
+        }
+
+    def _write_individual(self, writer, rng, draws, chunk_idx, start, R):
+        """Columnar export of one block of replicates (one record per CAAS per replicate)."""
+        uids = np.array([f"{os.getpid()}_{chunk_idx}_{r}" for r in range(start, start + R)], dtype=object)
+        for key, _, _ in draws:
+            caas_list = self.caas_by_key_lists.get(key, [])
+            if not caas_list:
+                continue
+            elig = self.eligible_by_key[key]
+            idx_ind = elig[rng.integers(0, elig.size, size=(R, len(caas_list)))].ravel()
+            caas_pos = np.array([int(rec['position']) for rec in caas_list], dtype=np.int64)
+            tags = np.array(
+                [rec.get('tag', self.position_to_tag.get(rec['position'], '')) for rec in caas_list],
+                dtype=object,
+            )
+            table = pa.Table.from_arrays([
+                pa.array(np.repeat(uids, len(caas_list)), type=pa.string()),
+                pa.array(np.tile(caas_pos, R), type=pa.int64()),
+                pa.array(np.tile(tags, R), type=pa.string()),
+                pa.array(self.positions[idx_ind], type=pa.int64()),
+                pa.array(self.genes[idx_ind], type=pa.int32()),
+            ], schema=_INDIVIDUAL_SCHEMA)
+            writer.write_table(table)
+
+    def process_chunk_compat(self, chunk_size, chunk_idx):
+        """Per-replicate loop with the global np.random state (--rng-compat).
+
+        Reproduces the draws of earlier releases for a given --global-seed.
+        """
+        logging.info(f"Starting chunk {chunk_idx} with {chunk_size} randomizations in PID {os.getpid()} (rng-compat)")
         if self.global_seed is not None:
             np.random.seed(((self.global_seed or 0) + 9973 * chunk_idx) & 0x7FFFFFFF)
 
@@ -252,6 +370,7 @@ def init_worker(
     precompute_masks, n_rows, n_genes, shm_names, shapes, dtypes, extra_key_sizes,
     caas_data, position_to_tag,
     actual_counts,              # dict: category_name -> np.ndarray
+    rng_compat=False,
 ):
     global worker
     worker = RandomizationWorker(
@@ -259,6 +378,7 @@ def init_worker(
         precompute_masks, n_rows, n_genes, shm_names, shapes, dtypes, extra_key_sizes,
         caas_data, position_to_tag,
         actual_counts,
+        rng_compat,
     )
 
 def process_wrapper(ch):
@@ -273,20 +393,37 @@ def process_wrapper(ch):
 def _compute_bins_from_series(series):
     return np.percentile(series.dropna(), np.arange(0, 101, 10))
 
+def _row_keys(merged_df, randomization_type, decile_bins):
+    """Randomization key of every row: 'global' (naive) or the cons_idx decile."""
+    if randomization_type == 'naive':
+        return np.full(len(merged_df), 'global', dtype=object)
+    if randomization_type == 'cons_decile':
+        if decile_bins is None:
+            raise ValueError("decile_bins is required for cons_decile randomization")
+        dec = np.digitize(merged_df['cons_idx'].to_numpy(dtype=np.float64), bins=decile_bins[:-1], right=False)
+        return np.array([int(d) for d in dec], dtype=object)
+    return None
+
 def _build_caas_payload(merged_df, randomization_type, decile_bins, pool_mask):
-    caas_data = []
-    for _, row in merged_df.loc[pool_mask].iterrows():
-        if randomization_type == 'naive':
-            key = 'global'
-        elif randomization_type == 'cons_decile':
-            key = int(np.digitize([row['cons_idx']], bins=decile_bins[:-1], right=False)[0])
-        else:
-            continue
-        caas_data.append({'position': row['position'], 'key': key})
+    keys = _row_keys(merged_df, randomization_type, decile_bins)
+    if keys is None:
+        return [], []
+    sel = np.asarray(pool_mask, dtype=bool)
+    caas_data = [
+        {'position': pos, 'key': key}
+        for pos, key in zip(merged_df['position'].to_numpy()[sel], keys[sel])
+    ]
     unique_keys = list({item['key'] for item in caas_data})
     return unique_keys, caas_data
 
 
+def _read_global(path):
+    """Load the aggregation _global table; Parquet files are memory-mapped."""
+    if str(path).endswith('.parquet'):
+        return pq.read_table(path, memory_map=True).to_pandas()
+    return pd.read_csv(path)
+
+
 def _write_empty_outputs_and_exit(args):
     """Write empty-but-valid outputs when no rows are available for randomization."""
     categories = ['full_pool', 'us', 'gs0', 'gs1', 'gs2', 'gs3', 'gs4']
@@ -329,7 +466,7 @@ def _write_empty_outputs_and_exit(args):
 def main(args):
     logging.info("Loading data")
     # global_csv now contains both positional data (cons_idx) and group data (masked, iscaas)
-    global_df = pd.read_csv(args.global_csv)
+    global_df = _read_global(args.global_csv)
     import os as _os
     if _os.path.getsize(args.caas_csv) == 0:
         logging.warning("CAAS input file is empty — no positions passed the filter; proceeding with all-null CAAS join")
@@ -486,24 +623,14 @@ def main(args):
 
     _, caas_data = _build_caas_payload(merged_df, args.randomization_type, decile_bins, pool_mask)
 
-    def _key_of(row):
-        if args.randomization_type == 'naive':
-            return 'global'
-        if decile_bins is None:
-            raise ValueError("decile_bins is required for cons_decile randomization")
-        return int(np.digitize([row['cons_idx']], bins=decile_bins[:-1], right=False)[0])
-
+    # Draws per key and category; keys keep first-seen order (category order, then rows)
+    row_keys = _row_keys(merged_df, args.randomization_type, decile_bins)
     extra_key_sizes = {}
     for cat, m in actual_counts_masks.items():
         name = f'n_{cat}'
-        sub = merged_df.loc[m]
-        for _, row in sub.iterrows():
-            try:
-                k = _key_of(row)
-            except Exception:
-                continue
+        for k, n in Counter(row_keys[np.asarray(m, dtype=bool)].tolist()).items():
             d = extra_key_sizes.setdefault(k, {})
-            d[name] = d.get(name, 0) + 1
+            d[name] = d.get(name, 0) + int(n)
 
     position_to_tag = dict(zip(merged_df['position'].to_numpy(),
                                merged_df['tag'].astype(str).fillna('').to_numpy()))
@@ -531,6 +658,7 @@ def main(args):
                 n_rows, n_genes, shm_names, shapes, dtypes, extra_key_sizes,
                 caas_data, position_to_tag if args.export_individual_rand else None,
                 actual_counts,
+                getattr(args, 'rng_compat', False),
             ),
         ) as executor:
             futures = [executor.submit(process_wrapper, ch) for ch in chunks]
@@ -606,6 +734,9 @@ if __name__ == "__main__":
     parser.add_argument('--export-individual-rand', action='store_true')
     parser.add_argument('--decile-bins',  type=str, default=None)
     parser.add_argument('--global-seed',  type=int, default=None)
+    parser.add_argument('--rng-compat',   action='store_true',
+                        help='Use the legacy per-replicate np.random.choice loop, reproducing the '
+                             'draws of earlier releases for a given --global-seed (slow).')
     parser.add_argument('--precompute-masks', dest='precompute_masks', action='store_true')
     parser.add_argument('--no-precompute-masks', dest='precompute_masks', action='store_false')
     parser.set_defaults(precompute_masks=True)
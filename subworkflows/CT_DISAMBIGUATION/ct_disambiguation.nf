@@ -43,8 +43,8 @@ process CT_DISAMBIGUATION_RUN {
     echo "  trait_file=${trait_file}"
     echo "  tree_file=${tree_file}"
 
-    # Validate ASR mode / cache dir combination
-    if [ -z "${asr_cache_dir}" ]; then
+    # Validate ASR mode / cache dir combination (native mode writes its rst files under the output dir)
+    if [ -z "${asr_cache_dir}" ] && [ "${asr_mode}" != "native" ]; then
       echo "ERROR: ct_disambig_asr_cache_dir must be set (current asr_mode: '${params.ct_disambig_asr_mode}')" >&2
       exit 1
     fi
@@ -90,6 +90,9 @@ process CT_DISAMBIGUATION_RUN {
       --max-tasks-per-child ${params.ct_disambig_max_tasks_per_child} \
       ${params.ct_disambig_include_non_significant ? '--include-non-significant' : ''} \
       ${params.ct_disambig_run_diagnostics ? '--run-diagnostics' : ''} \
+      --n-gene-trees ${params.ct_disambig_n_gene_trees} \
+      --plot-selection ${params.ct_disambig_plot_selection} \
+      ${params.ct_disambig_plot_thumbnails ? '--plot-thumbnails' : ''} \
       ${params.ct_disambig_skip_gene_lists ? '--skip-gene-lists' : ''} \
       ${params.ct_disambig_verbose ? '--verbose' : ''} \
       ${asr_cache_dir ? "--asr-cache-dir ${asr_cache_dir}" : ''} \
@@ -20,6 +20,7 @@ from src.reporting.disambiguation_json import (
     export_gene_summaries_json,
 )
 from src.plots.bulk_plots import generate_bulk_plots
+from src.plots.gene_trees_bulk import GENE_TREE_SELECTIONS
 from src.utils.logger import configure_logging
 
 logger = logging.getLogger(__name__)
@@ -63,9 +64,10 @@ def parse_arguments():
     # ASR configuration
     parser.add_argument(
         "--asr-mode",
-        choices=["compute", "precomputed"],
+        choices=["compute", "precomputed", "native"],
         default="precomputed",
-        help="ASR mode (default: precomputed)",
+        help="ASR mode: run codeml, reuse codeml results, or reconstruct the CAAS "
+        "sites in-process (default: precomputed)",
     )
     parser.add_argument(
         "--asr-model", default="lg", help="Substitution model for ASR (default: lg)"
@@ -116,6 +118,24 @@ def parse_arguments():
         default=None,
         help="Max tasks per worker process before restart (maxtasksperchild). Overrides CAAS_MAX_TASKS_PER_CHILD env var if set.",
     )
+    parser.add_argument(
+        "--max-threads-per-gene",
+        type=int,
+        default=None,
+        help="Upper bound of codeml threads for the largest genes in compute mode (default: 4x --threads)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Reuse the stored results of genes whose inputs (alignment, tree, CAAS metadata rows, "
+        "ASR rst, parameters) are unchanged since the previous run in --output-dir; "
+        "without it aggregation.sqlite3 is rebuilt from scratch",
+    )
+    parser.add_argument(
+        "--no-adaptive-threads",
+        action="store_true",
+        help="Run every codeml job with --threads instead of retuning threads by expected gene cost",
+    )
 
     # Filters and options
     parser.add_argument(
@@ -128,6 +148,30 @@ def parse_arguments():
         action="store_true",
         help="Continue with warnings on low ASR confidence",
     )
+    # Plots
+    parser.add_argument(
+        "--n-gene-trees",
+        type=int,
+        default=5,
+        help="Gene tree plots per plot suite (default: 5)",
+    )
+    parser.add_argument(
+        "--plot-selection",
+        choices=GENE_TREE_SELECTIONS,
+        default="random",
+        help="Gene tree positions: random sample or top N by p-value (default: random)",
+    )
+    parser.add_argument(
+        "--plot-workers",
+        type=int,
+        default=None,
+        help="Plotting processes (default: --workers, else available CPUs)",
+    )
+    parser.add_argument(
+        "--plot-thumbnails",
+        action="store_true",
+        help="Also write low-DPI PNG thumbnails of the gene tree plots",
+    )
     # Diagnostics output
     parser.add_argument(
         "--run-diagnostics",
@@ -256,6 +300,9 @@ def main():
             output_dir=output_dir,
             ensembl_genes_file=args.ensembl_genes_file,
             max_codeml=args.codeml_concurrency,
+            adaptive_threads=not args.no_adaptive_threads,
+            max_threads_per_gene=args.max_threads_per_gene,
+            incremental=args.incremental,
         )
         # process_all_genes now returns (caas_results, export_info)
         if isinstance(proc_res, tuple) and len(proc_res) == 2:
@@ -315,7 +362,9 @@ def main():
                 logger.warning(f"JSON export skipped: {e}")
 
         asr_root = (
-            Path(args.asr_cache_dir) if args.asr_cache_dir else output_dir / "asr"
+            Path(args.asr_cache_dir)
+            if args.asr_cache_dir and args.asr_mode != "native"
+            else output_dir / "asr"
         )
         node_dumps_root = output_dir / "diagnostics" / "node_dumps"
 
@@ -339,8 +388,16 @@ def main():
                     output_dir=output_dir / "plots_bulk",
                     ensembl_csv=ensembl_path,
                     include_non_significant=args.include_non_significant,
+                    n_gene_trees=args.n_gene_trees,
                     asr_root=asr_root,
                     node_dumps_root=node_dumps_root,
+                    workers=(
+                        args.plot_workers
+                        if args.plot_workers is not None
+                        else args.workers
+                    ),
+                    selection=args.plot_selection,
+                    thumbnails=args.plot_thumbnails,
                 )
             else:
                 logger.info(f"Skipping bulk plots; master CSV not found: {master_csv}")
@@ -5,6 +5,11 @@ from .posterior import (
     parse_paml_rst,
     parse_paml_rst_node_level,
 )
+from .posterior_cache import (
+    PosteriorStore,
+    build_posterior_store,
+    load_posterior_store,
+)
 from .tree_parser import (
     TreeNode,
     parse_newick,
@@ -14,6 +19,7 @@ from .tree_parser import (
     find_node_by_name,
     get_mrca,
 )
+from .tree_index import TreeIndex, get_tree_index
 from .node_identification import (
     identify_convergence_nodes,
     identify_convergence_nodes_from_file,
@@ -23,16 +29,21 @@ from .node_identification import (
 __all__ = [
     "ASRConfig",
     "ASRReconstructor",
+    "PosteriorStore",
+    "TreeIndex",
     "TreeNode",
     "build_node_mapping",
+    "build_posterior_store",
     "find_node_by_name",
     "get_mrca",
     "identify_convergence_nodes_from_file",
     "identify_convergence_nodes",
+    "load_posterior_store",
     "parse_newick",
     "parse_paml_rst",
     "parse_paml_rst_node_level",
     "get_node_order",
+    "get_tree_index",
     "get_tip_labels",
     "validate_node_mapping",
 ]
@@ -12,6 +12,7 @@ import argparse
 import logging
 import json
 import sys
+import time
 
 from src.asr.asr_single import (
     run_asr_pipeline,
@@ -40,9 +41,15 @@ def _run_gene_asr(
     run_diagnostics: bool,
     skip_if_exists: bool,
     ensembl_genes,
+    alignment_path: Path = None,
 ):
-    """Worker-friendly wrapper to run ASR for a single gene."""
-    alignment_path = find_gene_alignment(alignment_dir, gene, ensembl_genes)
+    """Worker-friendly wrapper to run ASR for a single gene.
+
+    The returned summary includes the wall-clock ``seconds`` spent in the ASR pipeline,
+    the ``threads`` it ran with and whether existing outputs were reused (``cached``).
+    """
+    if alignment_path is None:
+        alignment_path = find_gene_alignment(alignment_dir, gene, ensembl_genes)
 
     gene_out = output_dir
     gene_out.mkdir(parents=True, exist_ok=True)
@@ -63,13 +70,21 @@ def _run_gene_asr(
     logger.info(f"Running ASR for {gene} -> {gene_out}")
     from src.utils.concurrency import codeml_slot
 
+    gene_asr_dir = gene_out / f"asr_{gene}"
+    cached = skip_if_exists and (gene_asr_dir / "rst").exists() and (gene_asr_dir / "rst1").exists()
+
     with codeml_slot():
+        started = time.perf_counter()
         result = run_asr_pipeline(
             gene=gene, config=config, skip_if_exists=skip_if_exists
         )
+        seconds = time.perf_counter() - started
     return {
         "gene": gene,
         "success": bool(result),
+        "seconds": round(seconds, 3),
+        "threads": threads,
+        "cached": cached,
         "rst_file": str(result.rst_file) if result and result.rst_file else None,
         "tree_file": str(result.tree_file) if result and result.tree_file else None,
         "node_id_map": (
@@ -124,6 +139,24 @@ def parse_args():
         default=None,
         help="Max concurrent codeml runs (default: auto)",
     )
+    parser.add_argument(
+        "--max-threads-per-gene",
+        type=int,
+        default=None,
+        help="Upper bound of OMP threads for the largest genes (default: 4x --threads)",
+    )
+    parser.add_argument(
+        "--no-adaptive-threads",
+        action="store_true",
+        help="Run every gene with --threads instead of retuning threads by expected cost",
+    )
+    parser.add_argument(
+        "--runtime-history",
+        type=Path,
+        default=None,
+        help="JSON file of past per-gene runtimes used for scheduling "
+        "(default: <output_dir>/asr_runtime_history.json)",
+    )
     parser.add_argument(
         "--posterior-threshold",
         type=float,
@@ -167,8 +200,6 @@ def main():
 
     args.output_dir.mkdir(parents=True, exist_ok=True)
 
-    summaries = []
-
     ensembl_genes = None
     if args.ensembl_genes_file:
         try:
@@ -182,11 +213,69 @@ def main():
             logger.error(f"Failed to load Ensembl genes file: {exc}")
             sys.exit(1)
 
-    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from concurrent.futures import ProcessPoolExecutor
     from src.utils.concurrency import plan_concurrency, init_worker
+    from src.utils.io_utils import index_gene_alignments
+    from src.utils.scheduling import (
+        RUNTIME_HISTORY_NAME,
+        RuntimeHistory,
+        dispatch_by_cost,
+        plan_gene_jobs,
+    )
     import multiprocessing as mp
 
     effective_workers, threads = plan_concurrency(args.workers, args.threads, logger)
+    cpu_budget = effective_workers * threads
+    adaptive = not args.no_adaptive_threads
+
+    # Longest-expected-first order and per-gene threads from alignment shape + past runtimes
+    alignment_index = index_gene_alignments(args.alignment_dir)
+    alignment_paths = {
+        gene: alignment_index[gene]
+        for gene in args.genes
+        if gene in alignment_index and (ensembl_genes is None or gene in ensembl_genes)
+    }
+    history = RuntimeHistory.load(
+        args.runtime_history or args.output_dir / RUNTIME_HISTORY_NAME
+    )
+    jobs = plan_gene_jobs(
+        args.genes,
+        alignment_paths,
+        history,
+        cpu_budget=cpu_budget,
+        base_threads=threads,
+        max_threads=args.max_threads_per_gene,
+        adaptive_threads=adaptive,
+    )
+    logger.info(
+        f"Scheduling {len(jobs)} genes longest-expected-first "
+        f"(cpu budget {cpu_budget}, {len(history.entries)} genes with runtime history, "
+        f"adaptive threads: {adaptive})"
+    )
+
+    def _job_args(job, job_threads):
+        return (
+            job.gene,
+            args.alignment_dir,
+            args.tree,
+            args.taxid_mapping,
+            args.output_dir,
+            args.asr_model,
+            job_threads,
+            args.posterior_threshold,
+            args.run_diagnostics,
+            args.skip_if_exists,
+            ensembl_genes,
+            job.alignment_path,
+        )
+
+    results = {}
+
+    def _collect(job, summary):
+        summary["expected_cost"] = job.cost
+        results[job.index] = summary
+        if summary["success"] and not summary["cached"]:
+            history.record(job.gene, summary["seconds"], summary["threads"], job.cost)
 
     if effective_workers > 1:
         manager = mp.Manager()
@@ -195,58 +284,45 @@ def main():
             if args.codeml_concurrency
             else None
         )
+        # Small genes may run on fewer threads than requested, so more of them fit the budget
+        pool_size = min(cpu_budget, len(jobs)) if adaptive else effective_workers
         with ProcessPoolExecutor(
-            max_workers=effective_workers,
+            max_workers=max(1, pool_size),
             initializer=init_worker,
             initargs=(threads, codeml_sem),
         ) as executor:
-            future_to_gene = {
-                executor.submit(
-                    _run_gene_asr,
-                    gene,
-                    args.alignment_dir,
-                    args.tree,
-                    args.taxid_mapping,
-                    args.output_dir,
-                    args.asr_model,
-                    threads,
-                    args.posterior_threshold,
-                    args.run_diagnostics,
-                    args.skip_if_exists,
-                    ensembl_genes,
-                ): gene
-                for gene in args.genes
-            }
-            for fut in as_completed(future_to_gene):
-                gene = future_to_gene[fut]
+
+            def _submit(job, job_threads, on_done):
+                future = executor.submit(_run_gene_asr, *_job_args(job, job_threads))
+                future.add_done_callback(lambda _fut: on_done())
+                return future
+
+            handles = dispatch_by_cost(
+                jobs, _submit, cpu_budget, args.max_threads_per_gene, logger
+            )
+            for job in jobs:
+                future, _ = handles[job.index]
                 try:
-                    summaries.append(fut.result())
+                    _collect(job, future.result())
                 except FileNotFoundError as e:
                     logger.error(f"{e}")
                 except Exception as exc:
-                    logger.error(f"ASR failed for {gene}: {exc}", exc_info=True)
+                    logger.error(f"ASR failed for {job.gene}: {exc}", exc_info=True)
     else:
-        for gene in args.genes:
+        for job in jobs:
             try:
-                summaries.append(
-                    _run_gene_asr(
-                        gene,
-                        args.alignment_dir,
-                        args.tree,
-                        args.taxid_mapping,
-                        args.output_dir,
-                        args.asr_model,
-                        threads,
-                        args.posterior_threshold,
-                        args.run_diagnostics,
-                        args.skip_if_exists,
-                        ensembl_genes,
-                    )
-                )
+                _collect(job, _run_gene_asr(*_job_args(job, threads)))
             except FileNotFoundError as e:
                 logger.error(f"{e}")
             except Exception as exc:
-                logger.error(f"ASR failed for {gene}: {exc}", exc_info=True)
+                logger.error(f"ASR failed for {job.gene}: {exc}", exc_info=True)
+
+    summaries = [results[index] for index in sorted(results)]
+
+    try:
+        history.save()
+    except OSError as exc:
+        logger.warning(f"Could not write runtime history {history.path}: {exc}")
 
     summary_path = args.output_dir / "asr_only_summary.json"
     summary_path.write_text(json.dumps(summaries, indent=2))
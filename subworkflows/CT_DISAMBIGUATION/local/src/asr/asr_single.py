@@ -13,9 +13,10 @@ Author: Refactored from test_nutm2a_real_caas.py
 Date: 2025-11-24
 """
 
+import copy
 import sys
 from pathlib import Path
-from typing import Dict, Optional, Mapping
+from typing import Dict, Optional, Mapping, Set, Tuple
 from dataclasses import dataclass
 import logging
 import json
@@ -30,7 +31,7 @@ sys.path.insert(0, str(project_root / "src"))
 # Core imports
 from src.utils.io_utils import read_alignment
 from src.asr.reconstruct import ASRReconstructor, ASRConfig
-from src.asr.posterior import parse_paml_rst, parse_paml_rst_node_level
+from src.asr.posterior_cache import PosteriorStore, load_posterior_store
 from src.asr.tree_parser import (
     get_tip_labels,
     parse_newick,
@@ -39,6 +40,7 @@ from src.asr.tree_parser import (
 )
 from src.phylo.species_mapping import match_tree_alignment_by_taxid, read_taxid_mapping
 from src.phylo.tree_utils import load_tree
+from src.phylo.tree_cache import PrunedTreeCache
 
 logger = logging.getLogger(__name__)
 
@@ -55,6 +57,8 @@ class SingleGeneASRConfig:
     posterior_threshold: float = 0.7
     threads: int = 1
     run_diagnostics: bool = False
+    # 1-based sites to materialise from the posterior store (None = all sites)
+    posterior_positions: Optional[Set[int]] = None
 
 
 @dataclass
@@ -95,6 +99,35 @@ class ASRResults:
     tree_file: Optional[Path] = None
     taxid_to_species: Optional[Dict[str, str]] = None
     node_id_map: Optional[Dict[int, int]] = None
+    posterior_store: Optional[PosteriorStore] = None
+
+
+def _load_posteriors(
+    rst_file: Path, tree_file: Optional[Path], config: SingleGeneASRConfig
+) -> Tuple[
+    Dict[int, Dict[str, float]],
+    Optional[Dict[int, Dict[int, Dict[str, float]]]],
+    Optional[Dict[int, int]],
+    PosteriorStore,
+]:
+    """
+    Site- and node-level posteriors from the binary store of ``rst_file``.
+
+    The rst is parsed at most once (the store is cached next to it); only the
+    sites in ``config.posterior_positions`` are materialised when it is set.
+    """
+    has_tree = tree_file is not None and tree_file.exists()
+    store = load_posterior_store(rst_file, tree_file if has_tree else None)
+    positions = config.posterior_positions
+
+    posteriors_node = None
+    node_id_map = None
+    if has_tree:
+        posteriors_node, node_id_map = store.node_posteriors(
+            threshold=config.posterior_threshold, positions=positions
+        )
+    posteriors_site = store.site_posteriors(positions=positions)
+    return posteriors_site, posteriors_node, node_id_map, store
 
 
 def _write_node_id_map(
@@ -112,7 +145,10 @@ def _write_node_id_map(
 
 
 def load_alignment_and_mappings(
-    alignment_path: Path, taxid_path: Optional[Path] = None, gene_name: str = "unknown"
+    alignment_path: Path,
+    taxid_path: Optional[Path] = None,
+    gene_name: str = "unknown",
+    taxid_mapping: Optional[Dict[str, str]] = None,
 ) -> AlignmentData:
     """
     Load alignment and create lookup mappings.
@@ -121,6 +157,9 @@ def load_alignment_and_mappings(
         alignment_path: Path to the input alignment file
         taxid_path: Optional path to taxid-species mapping file
         gene_name: Name of the gene for logging
+        taxid_mapping: Optional preloaded species -> taxid mapping (skips reading taxid_path)
+        tree_cache: Optional PrunedTreeCache of ``tree``, reused across genes
+            (pruned topologies are cached by species set)
 
     Returns:
         AlignmentData object with loaded alignment and mappings
@@ -147,9 +186,13 @@ def load_alignment_and_mappings(
 
     species_to_taxid: Dict[str, str] = {}
     taxid_to_species: Dict[str, str] = {}
-    if taxid_path and taxid_path.exists():
+    if taxid_mapping is not None or (taxid_path and taxid_path.exists()):
         logger.debug("Loading TaxID to species mappings")
-        species_to_taxid = read_taxid_mapping(taxid_path)  # species -> taxid
+        species_to_taxid = (
+            dict(taxid_mapping)
+            if taxid_mapping is not None
+            else read_taxid_mapping(taxid_path)
+        )  # species -> taxid
         taxid_to_species = {
             taxid: species for species, taxid in species_to_taxid.items()
         }
@@ -174,7 +217,12 @@ def load_alignment_and_mappings(
 
 
 def load_and_match_tree(
-    tree_path: Path, alignment_data: AlignmentData, taxid_path: Optional[Path] = None
+    tree_path: Path,
+    alignment_data: AlignmentData,
+    taxid_path: Optional[Path] = None,
+    tree: Optional[Phylo.BaseTree.Tree] = None,
+    taxid_mapping: Optional[Dict[str, str]] = None,
+    tree_cache: Optional[PrunedTreeCache] = None,
 ) -> TreeData:
     """
     Load phylogenetic tree and match to alignment species.
@@ -183,22 +231,31 @@ def load_and_match_tree(
         tree_path: Path to newick/nexus tree file
         alignment_data: Alignment data with mappings
         taxid_path: Optional TaxID mapping path
+        tree: Optional preloaded tree (left untouched; a pruned copy is used)
+        taxid_mapping: Optional preloaded species -> taxid mapping (skips reading taxid_path)
 
     Returns:
         TreeData object with matched tree and phylogenetic context
     """
     logger.debug(f"Loading tree: {tree_path}")
 
-    if not tree_path.exists():
-        raise FileNotFoundError(f"Tree file not found: {tree_path}")
+    if taxid_mapping is None and taxid_path and taxid_path.exists():
+        taxid_mapping = read_taxid_mapping(taxid_path)
 
-    tree = load_tree(tree_path)
-    logger.debug(f"Tree loaded: {len(tree.get_terminals())} tips")
+    if tree is None:
+        if not tree_path.exists():
+            raise FileNotFoundError(f"Tree file not found: {tree_path}")
+        tree = load_tree(tree_path)
+    elif taxid_mapping is None:
+        # Without taxid matching the tree is modified below: work on a copy
+        tree = tree_cache.full_tree() if tree_cache is not None else copy.deepcopy(tree)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Tree loaded: {len(tree.get_terminals())} tips")
 
     # Build taxid mapping
-    taxid_mapping = {}
-    if taxid_path and taxid_path.exists():
-        taxid_mapping = read_taxid_mapping(taxid_path)
+    if taxid_mapping is None:
+        taxid_mapping = {}
+    else:
         logger.debug("Attempting tree-alignment matching via TaxID...")
 
         # Match tree to alignment
@@ -208,7 +265,9 @@ def load_and_match_tree(
             tree_taxid_to_sp,
             aln_taxid_to_sp,
             synthetic_taxids,
-        ) = match_tree_alignment_by_taxid(tree, alignment_data.alignment, taxid_mapping)
+        ) = match_tree_alignment_by_taxid(
+            tree, alignment_data.alignment, taxid_mapping, tree_cache=tree_cache
+        )
 
         tree = matched_tree
 
@@ -235,10 +294,11 @@ def load_and_match_tree(
 
         taxid_mapping = aln_taxid_to_sp
 
-        logger.debug(
-            f"After matching: {len(tree.get_terminals())} tips, "
-            f"{len(synthetic_taxids)} synthetic taxids created"
-        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f"After matching: {len(tree.get_terminals())} tips, "
+                f"{len(synthetic_taxids)} synthetic taxids created"
+            )
 
     # Build tree structure data (use matched tree tips as valid taxids)
     taxid_mapping_dict = taxid_mapping
@@ -359,25 +419,9 @@ def run_asr_pipeline(
                 "No tree_paml.nwk found; posterior parsing may lack node remap"
             )
 
-    node_id_map = None
-    if tree_paml_file.exists():
-        parsed = parse_paml_rst_node_level(
-            rst_file,
-            tree_paml_file,
-            threshold=config.posterior_threshold,
-            return_mapping=True,
-        )
-        if isinstance(parsed, tuple):
-            posteriors_node, node_id_map = parsed
-        else:
-            posteriors_node = parsed
-            node_id_map = None
-    else:
-        posteriors_node = None
-        node_id_map = None
-
-    # Always parse site-level for backward compatibility
-    posteriors_site = parse_paml_rst(rst_file)
+    posteriors_site, posteriors_node, node_id_map, store = _load_posteriors(
+        rst_file, tree_paml_file, config
+    )
 
     logger.debug(
         "Posteriors parsed "
@@ -393,6 +437,58 @@ def run_asr_pipeline(
         tree_file=tree_paml_file if tree_paml_file.exists() else None,
         taxid_to_species=None,  # Will be set by caller if needed
         node_id_map=node_id_map if isinstance(node_id_map, dict) else None,
+        posterior_store=store,
+    )
+
+
+def run_native_asr(
+    gene: str,
+    config: SingleGeneASRConfig,
+    alignment_data: AlignmentData,
+    tree_data: TreeData,
+) -> ASRResults:
+    """
+    Reconstruct ancestral states in-process instead of running codeml.
+
+    Only ``config.posterior_positions`` are reconstructed (all sites when None).
+    The result is written as ``asr_{GENE}/rst`` + ``tree_paml.nwk`` in the same
+    format codeml produces, so downstream node mapping and plots are unchanged.
+
+    Args:
+        gene: Gene name
+        config: ASR configuration
+        alignment_data: Alignment matched to the tree
+        tree_data: Tree matched to the alignment
+
+    Returns:
+        ASRResults object with parsed posteriors
+    """
+    from src.asr.native import write_native_rst
+
+    gene_dir = config.output_dir / f"asr_{gene}"
+    rst_file = write_native_rst(
+        gene,
+        alignment_data.seq_by_id,
+        tree_data.tree,
+        gene_dir,
+        model=config.model,
+        positions=config.posterior_positions,
+    )
+    tree_file = gene_dir / "tree_paml.nwk"
+
+    posteriors_site, posteriors_node, node_id_map, store = _load_posteriors(
+        rst_file, tree_file, config
+    )
+
+    return ASRResults(
+        gene=gene,
+        posteriors_site=posteriors_site,
+        posteriors_node=posteriors_node if isinstance(posteriors_node, dict) else None,
+        rst_file=rst_file,
+        tree_file=tree_file,
+        taxid_to_species=alignment_data.taxid_to_species,
+        node_id_map=node_id_map if isinstance(node_id_map, dict) else None,
+        posterior_store=store,
     )
 
 
@@ -432,22 +528,10 @@ def load_precomputed_asr(
 
     logger.debug(f"Found RST file at: {rst_file}")
 
-    # Parse posteriors
-    posteriors_site = parse_paml_rst(rst_file)
-
-    posteriors_node = None
-    node_id_map = None
-    if tree_file.exists():
-        parsed = parse_paml_rst_node_level(
-            rst_file,
-            tree_file,
-            threshold=config.posterior_threshold,
-            return_mapping=True,
-        )
-        if isinstance(parsed, tuple):
-            posteriors_node, node_id_map = parsed
-        else:
-            posteriors_node = parsed
+    # Parse posteriors (binary store next to the rst, rebuilt when stale)
+    posteriors_site, posteriors_node, node_id_map, store = _load_posteriors(
+        rst_file, tree_file, config
+    )
 
     logger.debug("Pre-computed ASR results loaded")
 
@@ -464,6 +548,7 @@ def load_precomputed_asr(
         tree_file=tree_file if tree_file.exists() else None,
         taxid_to_species=alignment_data.taxid_to_species,
         node_id_map=node_id_map if isinstance(node_id_map, dict) else None,
+        posterior_store=store,
     )
 
 
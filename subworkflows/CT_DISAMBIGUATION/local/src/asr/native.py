@@ -0,0 +1,433 @@
+"""
+Native Marginal ASR
+===================
+
+In-process marginal ancestral state reconstruction for amino acid alignments,
+used by ``--asr-mode native`` as a fast alternative to running ``codeml`` on
+the whole alignment.
+
+The engine mirrors the codeml set-up written by
+:meth:`src.asr.reconstruct.ASRReconstructor._create_control_file`:
+
+- Empirical exchangeabilities read from the same PAML ``.dat`` files
+  (``lg.dat``, ``wag.dat``, ``jtt.dat``, ...); equilibrium frequencies
+  observed in the alignment (model 3, "Empirical+F").
+- Discrete gamma rate heterogeneity (``ncatG = 8``, category means). codeml
+  estimates ``alpha``; here it is fixed (default 1.0, codeml's starting value).
+- Branch lengths fixed from the species tree (``fix_blength = 2``).
+- Gaps and ambiguous residues are treated as missing data (``cleandata = 0``).
+
+Posteriors are computed with one post-order (Felsenstein pruning) and one
+pre-order pass, only for the requested alignment columns, with identical
+column patterns collapsed. The result is written as a PAML-style ``rst``
+(labeled tree, node range and "Prob of best state at each node" table) plus
+``tree_paml.nwk`` so that every downstream consumer (posterior store, node
+mapping, gene tree plots) reads it exactly like codeml output. Like codeml
+(``clock = 0``), a bifurcating root is first collapsed into a trifurcation
+(:func:`collapse_root`). Node numbers follow PAML: tips 1..n in tree order,
+internal nodes n+1.. in pre-order.
+
+Usage Example
+-------------
+::
+
+    rst_file = write_native_rst(
+        gene, alignment_data.seq_by_id, tree_data.tree, gene_dir,
+        model="lg", positions={649, 1203},
+    )
+
+Author
+------
+Miguel Ramon Alonso
+Evolutionary Genomics Lab - IBE-UPF
+
+Date
+----
+2026-10
+"""
+
+import copy
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+from Bio import Phylo
+from Bio.Phylo.BaseTree import Clade, Tree
+
+from .reconstruct import MODEL_SPECS, normalize_model_key, resolve_rate_file
+
+logger = logging.getLogger(__name__)
+
+# PAML amino acid order (rows/columns of the .dat rate files)
+AA_ORDER = "ARNDCQEGHILKMFPSTWYV"
+NATIVE_GAMMA_ALPHA = 1.0
+NATIVE_GAMMA_CATEGORIES = 8
+# Column patterns processed per block (bounds memory for whole-alignment runs)
+_PATTERN_BLOCK = 512
+
+_AA_INDEX = np.full(256, len(AA_ORDER), dtype=np.int8)
+for _i, _aa in enumerate(AA_ORDER):
+    _AA_INDEX[ord(_aa)] = _i
+    _AA_INDEX[ord(_aa.lower())] = _i
+
+
+def read_paml_rate_file(rate_file: Path) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Read a PAML amino acid rate file.
+
+    The file holds the 190 exchangeabilities as a lower triangle (19 rows)
+    followed by 20 equilibrium frequencies, both in :data:`AA_ORDER`.
+
+    Returns:
+        (exchangeabilities [20, 20] symmetric, frequencies [20])
+    """
+    values: List[float] = []
+    with open(rate_file, "r") as f:
+        for line in f:
+            for token in line.split():
+                try:
+                    values.append(float(token))
+                except ValueError:
+                    break
+            if len(values) >= 210:
+                break
+    if len(values) < 210:
+        raise ValueError(f"Rate file {rate_file} has {len(values)} values, expected 210")
+
+    exch = np.zeros((20, 20))
+    rows, cols = np.tril_indices(20, k=-1)
+    exch[rows, cols] = values[:190]
+    exch = exch + exch.T
+    freqs = np.asarray(values[190:210])
+    return exch, freqs / freqs.sum()
+
+
+def discrete_gamma_rates(alpha: float, ncat: int) -> np.ndarray:
+    """Mean rates of ``ncat`` equal-probability gamma categories (PAML DiscreteGamma)."""
+    if alpha <= 0 or ncat <= 1:
+        return np.ones(1)
+    from scipy.special import gammainc
+    from scipy.stats import gamma
+
+    cuts = gamma.ppf(np.arange(1, ncat) / ncat, a=alpha, scale=1.0 / alpha)
+    cdf = np.concatenate([[0.0], gammainc(alpha + 1.0, cuts * alpha), [1.0]])
+    rates = np.diff(cdf) * ncat
+    return rates / rates.mean()
+
+
+@dataclass
+class SubstitutionModel:
+    """Reversible amino acid model in eigen-decomposed form."""
+
+    freqs: np.ndarray
+    eigvals: np.ndarray
+    left: np.ndarray
+    right: np.ndarray
+
+    @classmethod
+    def from_exchangeabilities(
+        cls, exch: np.ndarray, freqs: np.ndarray
+    ) -> "SubstitutionModel":
+        q = exch * freqs[None, :]
+        np.fill_diagonal(q, 0.0)
+        np.fill_diagonal(q, -q.sum(axis=1))
+        q /= -np.dot(freqs, np.diag(q))  # one expected substitution per unit time
+
+        sqrt_pi = np.sqrt(freqs)
+        sym = sqrt_pi[:, None] * q / sqrt_pi[None, :]
+        eigvals, vecs = np.linalg.eigh((sym + sym.T) / 2.0)
+        return cls(
+            freqs=freqs,
+            eigvals=eigvals,
+            left=vecs / sqrt_pi[:, None],
+            right=vecs.T * sqrt_pi[None, :],
+        )
+
+    def transition_matrices(self, lengths: np.ndarray, rates: np.ndarray) -> np.ndarray:
+        """P(t * r) for every branch length t and rate r; shape [B, K, 20, 20]."""
+        scaled = np.exp(
+            self.eigvals[None, None, :] * (lengths[:, None] * rates[None, :])[..., None]
+        )
+        probs = np.einsum("ij,bkj,jl->bkil", self.left, scaled, self.right)
+        return np.clip(probs, 0.0, None)
+
+
+def observed_frequencies(sequences: Iterable[str]) -> np.ndarray:
+    """Amino acid frequencies of the alignment (unambiguous residues only)."""
+    counts = np.zeros(len(AA_ORDER) + 1, dtype=np.int64)
+    for seq in sequences:
+        codes = _AA_INDEX[np.frombuffer(seq.encode("ascii", "replace"), dtype=np.uint8)]
+        counts += np.bincount(codes, minlength=len(AA_ORDER) + 1)
+    freqs = counts[: len(AA_ORDER)].astype(float)
+    if freqs.sum() == 0:
+        return np.full(len(AA_ORDER), 1.0 / len(AA_ORDER))
+    # Floor unobserved residues so the model stays reversible and invertible
+    freqs = np.maximum(freqs / freqs.sum(), 1e-6)
+    return freqs / freqs.sum()
+
+
+def build_model(model: str, sequences: Iterable[str]) -> SubstitutionModel:
+    """Substitution model as codeml would set it up for ``model`` (see MODEL_SPECS)."""
+    key = normalize_model_key(model)
+    spec = MODEL_SPECS[key]
+    paml_model = spec["paml_model"]
+
+    if spec.get("aa_rate_file"):
+        exch, file_freqs = read_paml_rate_file(resolve_rate_file(spec["aa_rate_file"]))
+    else:
+        exch, file_freqs = np.ones((20, 20)), np.full(20, 1.0 / 20)
+
+    if paml_model in (0, 2):
+        freqs = file_freqs
+    else:
+        freqs = observed_frequencies(sequences)
+    return SubstitutionModel.from_exchangeabilities(exch, freqs)
+
+
+def collapse_root(tree: Tree) -> Tree:
+    """
+    Collapse a bifurcating root into a trifurcation, as codeml does without a clock.
+
+    The first internal child of the root becomes the new root and its sibling
+    is attached to it as the last child, over the two root branches (lengths
+    summed). The input tree is not modified.
+
+    Returns:
+        A collapsed copy of ``tree``, or ``tree`` itself when its root is not
+        bifurcating (or has two tips)
+    """
+    if len(tree.root.clades) != 2 or all(c.is_terminal() for c in tree.root.clades):
+        return tree
+
+    tree = copy.deepcopy(tree)
+    first, second = tree.root.clades
+    new_root, sibling = (second, first) if first.is_terminal() else (first, second)
+    if sibling.branch_length is not None or new_root.branch_length is not None:
+        sibling.branch_length = (sibling.branch_length or 0.0) + (new_root.branch_length or 0.0)
+    new_root.branch_length = tree.root.branch_length
+    new_root.clades.append(sibling)
+    tree.root = new_root
+    tree.rooted = False
+    return tree
+
+
+def paml_node_numbering(tree: Tree) -> Tuple[List[Clade], List[Clade]]:
+    """
+    Tips and internal clades in PAML numbering order.
+
+    The tree is numbered as given; collapse a bifurcating root first
+    (:func:`collapse_root`) to match codeml.
+
+    Returns:
+        (tips, internal) where tips[i] is PAML node i + 1 and internal[j] is
+        PAML node len(tips) + 1 + j (root first, then pre-order).
+    """
+    tips = list(tree.get_terminals())
+    internal = [c for c in tree.find_clades(order="preorder") if not c.is_terminal()]
+    return tips, internal
+
+
+def labeled_tree_string(tree: Tree) -> str:
+    """Newick string with PAML node labels ("((1_a, 2_b) 5 , 3_c) 4;")."""
+    tips, internal = paml_node_numbering(tree)
+    tip_ids = {id(c): i + 1 for i, c in enumerate(tips)}
+    node_ids = {id(c): len(tips) + 1 + j for j, c in enumerate(internal)}
+
+    def _render(clade: Clade) -> str:
+        if clade.is_terminal():
+            return f"{tip_ids[id(clade)]}_{clade.name}"
+        children = ", ".join(_render(child) for child in clade.clades)
+        return f"({children}) {node_ids[id(clade)]}"
+
+    return _render(tree.root) + ";"
+
+
+def marginal_posteriors(
+    tree: Tree,
+    sequences: Mapping[str, str],
+    columns: np.ndarray,
+    model: SubstitutionModel,
+    alpha: float = NATIVE_GAMMA_ALPHA,
+    ncat: int = NATIVE_GAMMA_CATEGORIES,
+) -> np.ndarray:
+    """
+    Marginal posteriors at every internal node for the given alignment columns.
+
+    Args:
+        tree: Rooted/bifurcating or multifurcating tree with branch lengths
+        sequences: Tip name -> aligned sequence (missing tips count as gaps)
+        columns: Zero-based alignment columns to reconstruct
+        model: Substitution model
+        alpha: Gamma shape (<= 0 for constant rates)
+        ncat: Number of gamma categories
+
+    Returns:
+        Array [internal nodes (PAML order), len(columns), 20] of posteriors
+    """
+    tips, internal = paml_node_numbering(tree)
+    n_states = len(AA_ORDER)
+
+    # Tip states for the requested columns; identical column patterns collapse
+    tip_codes = np.full((len(tips), len(columns)), n_states, dtype=np.int8)
+    for t, clade in enumerate(tips):
+        seq = sequences.get(str(clade.name))
+        if not seq:
+            continue
+        raw = np.frombuffer(seq.encode("ascii", "replace"), dtype=np.uint8)
+        valid = columns < raw.size
+        tip_codes[t, valid] = _AA_INDEX[raw[columns[valid]]]
+    patterns, inverse = np.unique(tip_codes, axis=1, return_inverse=True)
+    inverse = np.asarray(inverse).reshape(-1)
+
+    # Partial likelihood of a tip: one-hot, or all ones for missing data
+    tip_vectors = np.vstack([np.eye(n_states), np.ones((1, n_states))])
+
+    rates = discrete_gamma_rates(alpha, ncat)
+    nodes = list(tree.find_clades(order="preorder"))
+    index = {id(c): i for i, c in enumerate(nodes)}
+    lengths = np.array([max(float(c.branch_length or 0.0), 0.0) for c in nodes])
+    trans = model.transition_matrices(lengths, rates)  # [nodes, K, 20, 20]
+    trans_t = np.swapaxes(trans, -1, -2)
+    internal_rows = [index[id(c)] for c in internal]
+    tip_rows = {index[id(c)]: t for t, c in enumerate(tips)}
+    children = [[index[id(ch)] for ch in c.clades] for c in nodes]
+
+    out = np.empty((len(internal), patterns.shape[1], n_states))
+    for start in range(0, patterns.shape[1], _PATTERN_BLOCK):
+        block = patterns[:, start : start + _PATTERN_BLOCK]
+        n_pat = block.shape[1]
+
+        # Post-order: conditional likelihoods and messages to the parent.
+        # Every vector is rescaled per pattern (uniformly across rate
+        # categories), which cancels in the normalised posteriors.
+        lower: List[Optional[np.ndarray]] = [None] * len(nodes)
+        up_msg: List[Optional[np.ndarray]] = [None] * len(nodes)
+        for i in reversed(range(len(nodes))):
+            if i in tip_rows:
+                vec = np.broadcast_to(
+                    tip_vectors[block[tip_rows[i]]], (len(rates), n_pat, n_states)
+                )
+            else:
+                vec = np.ones((len(rates), n_pat, n_states))
+                for ch in children[i]:
+                    vec = vec * up_msg[ch]
+                vec = vec / vec.max(axis=(0, 2), keepdims=True)
+            lower[i] = vec
+            up_msg[i] = np.matmul(vec, trans_t[i])
+
+        # Pre-order: probability of everything outside each subtree
+        upper: List[Optional[np.ndarray]] = [None] * len(nodes)
+        upper[0] = np.broadcast_to(model.freqs, (len(rates), n_pat, n_states))
+        for i in range(len(nodes)):
+            kids = children[i]
+            for ch in kids:
+                if ch in tip_rows:
+                    continue
+                vec = upper[i]
+                for sib in kids:
+                    if sib != ch:
+                        vec = vec * up_msg[sib]
+                vec = np.matmul(vec, trans[ch])
+                upper[ch] = vec / vec.max(axis=(0, 2), keepdims=True)
+
+        for j, row in enumerate(internal_rows):
+            post = (lower[row] * upper[row]).sum(axis=0)
+            out[j, start : start + n_pat] = post / post.sum(axis=1, keepdims=True)
+
+    return out[:, inverse, :]
+
+
+def write_native_rst(
+    gene: str,
+    sequences: Mapping[str, str],
+    tree: Tree,
+    gene_dir: Path,
+    model: str = "lg",
+    positions: Optional[Iterable[int]] = None,
+    alpha: float = NATIVE_GAMMA_ALPHA,
+    ncat: int = NATIVE_GAMMA_CATEGORIES,
+) -> Path:
+    """
+    Reconstruct ``positions`` natively and write a PAML-style rst to ``gene_dir``.
+
+    Args:
+        gene: Gene name (logging only)
+        sequences: Tip name -> aligned sequence, tip names as in ``tree``
+        tree: Tree matched to the alignment (tips relabeled to taxids); a
+            bifurcating root is collapsed for the reconstruction, and the
+            tree is written unchanged to ``tree_paml.nwk`` as codeml's input
+        gene_dir: Output directory (``asr_{GENE}``)
+        model: Substitution model name (MODEL_SPECS key)
+        positions: 1-based alignment sites to reconstruct (None = all)
+        alpha: Gamma shape parameter
+        ncat: Number of gamma categories
+
+    Returns:
+        Path to the written rst file
+    """
+    gene_dir.mkdir(parents=True, exist_ok=True)
+    length = max((len(s) for s in sequences.values()), default=0)
+    if positions is None:
+        sites = np.arange(1, length + 1)
+    else:
+        sites = np.array(sorted({int(p) for p in positions if 1 <= int(p) <= length}))
+    if sites.size == 0:
+        raise ValueError(f"No alignment sites to reconstruct for {gene}")
+
+    substitution_model = build_model(model, sequences.values())
+    paml_tree = collapse_root(tree)
+    tips, internal = paml_node_numbering(paml_tree)
+    posteriors = marginal_posteriors(
+        paml_tree, sequences, sites - 1, substitution_model, alpha=alpha, ncat=ncat
+    )
+    best = posteriors.argmax(axis=2)  # [internal, sites]
+    best_prob = np.take_along_axis(posteriors, best[..., None], axis=2)[..., 0]
+
+    tip_seqs = [sequences.get(str(c.name), "") for c in tips]
+    data_rows = [
+        "".join(s[col] if col < len(s) else "-" for s in tip_seqs) for col in sites - 1
+    ]
+    pattern_freq: Dict[str, int] = {}
+    for row in data_rows:
+        pattern_freq[row] = pattern_freq.get(row, 0) + 1
+
+    n_tips = len(tips)
+    lines = [
+        f"Supplemental results for native marginal reconstruction ({gene})",
+        f"model = {normalize_model_key(model)}+F, gamma alpha = {alpha}, ncatG = {ncat}, "
+        "fixed branch lengths",
+        "",
+        "tree with node labels for Rod Page's TreeView",
+        labeled_tree_string(paml_tree),
+        "",
+        f"Nodes {n_tips + 1} to {n_tips + len(internal)} are ancestral",
+        "",
+        "(1) Marginal reconstruction of ancestral sequences",
+        "(eqn. 4 in Yang et al. 1995 Genetics 141:1641-1650).",
+        "",
+        "Prob of best state at each node, listed by site",
+        "",
+        "   site   Freq   Data:",
+        "",
+    ]
+    for s_idx, site in enumerate(sites):
+        tokens = " ".join(
+            f"{AA_ORDER[best[n, s_idx]]}({best_prob[n, s_idx]:.3f})"
+            for n in range(len(internal))
+        )
+        data = data_rows[s_idx]
+        lines.append(f"{int(site):7d} {pattern_freq[data]:6d}   {data}: {tokens}")
+    lines.append("")
+
+    rst_file = gene_dir / "rst"
+    rst_file.write_text("\n".join(lines) + "\n")
+
+    tree_file = gene_dir / "tree_paml.nwk"
+    Phylo.write(tree, tree_file, "newick")
+
+    logger.debug(
+        f"Native ASR for {gene}: {sites.size} sites, {len(internal)} ancestral nodes -> {rst_file}"
+    )
+    return rst_file
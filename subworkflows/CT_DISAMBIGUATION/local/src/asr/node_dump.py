@@ -0,0 +1,288 @@
+"""
+Indexed Node Posterior Dumps
+============================
+
+Binary, site-indexed replacement for the ``{gene}_posteriors.jsonl`` node
+dumps written in diagnostics mode.
+
+The JSONL dumps hold one line per node with every site, so fetching the
+posteriors of a single position meant reading and ``json.loads``-ing the whole
+file. The binary dump stores the same ``node_id -> site -> {AA: posterior}``
+mapping grouped by site, with a sorted site index; a reader memory-maps the
+index and the entries and touches only the pages of the sites it asks for.
+
+Layout of ``{gene}_posteriors.bin``::
+
+    magic      8 bytes   b"CTNPOST\\0"
+    version    uint32    dump format version
+    header_len uint32    length of the JSON header
+    header     JSON      node_ids, alphabet, node_id_map, n_sites, n_entries,
+                         index_offset, data_offset
+    index      [n_sites]   (site int64, start int64, count int64), sorted by site
+    entries    [n_entries] (node int32, code int16, prob float64)
+
+``node`` indexes ``node_ids`` and ``code`` indexes ``alphabet``. Entries of a
+site are ordered by node id and keep the state order of the source mapping.
+Probabilities are stored as float64, so values round-trip exactly.
+
+Usage Example
+-------------
+::
+
+    export_posteriors_to_dump(posteriors, Path("brca2_posteriors.bin"), node_id_map)
+
+    dump = NodePosteriorDump.open(Path("brca2_posteriors.bin"))
+    site = dump.site_posteriors(650)        # {node_id: {AA: posterior}}
+
+    # Inspect as JSONL (same lines as export_posteriors_to_jsonl)
+    python -m src.asr.node_dump brca2_posteriors.bin > brca2_posteriors.jsonl
+
+Author
+------
+Miguel Ramon Alonso
+Evolutionary Genomics Lab - IBE-UPF
+
+Date
+----
+2026-10
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NODE_DUMP_SUFFIX = "_posteriors.bin"
+NODE_DUMP_VERSION = 1
+
+_MAGIC = b"CTNPOST\0"
+_INDEX_DTYPE = np.dtype([("site", "<i8"), ("start", "<i8"), ("count", "<i8")])
+_ENTRY_DTYPE = np.dtype([("node", "<i4"), ("code", "<i2"), ("prob", "<f8")])
+
+
+def node_dump_path(dump_dir: Path, gene: str) -> Path:
+    """Path of the binary node dump of ``gene`` inside ``dump_dir``."""
+    return Path(dump_dir) / f"{gene.lower()}{NODE_DUMP_SUFFIX}"
+
+
+def export_posteriors_to_dump(
+    posteriors: Dict[int, Dict[int, Dict[str, float]]],
+    output_file: Path,
+    node_id_map: Optional[Dict[int, int]] = None,
+) -> None:
+    """
+    Write node posteriors as an indexed binary dump (atomically).
+
+    Args:
+        posteriors: Posteriors dict mapping node_id -> position -> AA -> prob
+        output_file: Output dump path (``{gene}_posteriors.bin``)
+        node_id_map: Optional mapping of node_id -> PAML node number
+    """
+    node_ids = sorted(int(node_id) for node_id in posteriors)
+    alphabet: List[str] = []
+    alphabet_index: Dict[str, int] = {}
+    by_site: Dict[int, List[Tuple[int, int, float]]] = {}
+
+    for node_idx, node_id in enumerate(node_ids):
+        positions = posteriors.get(node_id)
+        if positions is None:
+            positions = posteriors.get(str(node_id)) or {}
+        for pos, aa_map in positions.items():
+            if not isinstance(aa_map, dict):
+                continue
+            entries = by_site.setdefault(int(pos), [])
+            for aa, prob in aa_map.items():
+                aa = str(aa)
+                code = alphabet_index.get(aa)
+                if code is None:
+                    code = alphabet_index[aa] = len(alphabet)
+                    alphabet.append(aa)
+                entries.append((node_idx, code, float(prob)))
+
+    sites = sorted(by_site)
+    index = np.zeros(len(sites), dtype=_INDEX_DTYPE)
+    entries = np.zeros(sum(len(v) for v in by_site.values()), dtype=_ENTRY_DTYPE)
+    start = 0
+    for row, site in enumerate(sites):
+        site_entries = by_site[site]
+        index[row] = (site, start, len(site_entries))
+        if site_entries:
+            entries[start : start + len(site_entries)] = site_entries
+        start += len(site_entries)
+
+    header = {
+        "node_ids": node_ids,
+        "alphabet": alphabet,
+        "node_id_map": (
+            {str(k): int(v) for k, v in node_id_map.items()} if node_id_map else None
+        ),
+        "n_sites": len(sites),
+        "n_entries": int(len(entries)),
+    }
+    # Offsets depend on the header length; reserve room for them before encoding
+    header["index_offset"] = header["data_offset"] = 0
+    base_len = len(json.dumps(header).encode("utf-8")) + 64
+    index_offset = _align(16 + base_len)
+    header["index_offset"] = index_offset
+    header["data_offset"] = _align(index_offset + index.nbytes)
+    header_bytes = json.dumps(header).encode("utf-8").ljust(base_len)
+
+    output_file = Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = output_file.with_name(output_file.name + ".tmp")
+    with open(tmp, "wb") as handle:
+        handle.write(_MAGIC)
+        handle.write(np.array([NODE_DUMP_VERSION, len(header_bytes)], dtype="<u4").tobytes())
+        handle.write(header_bytes)
+        handle.write(b"\0" * (index_offset - handle.tell()))
+        handle.write(index.tobytes())
+        handle.write(b"\0" * (header["data_offset"] - handle.tell()))
+        handle.write(entries.tobytes())
+    os.replace(tmp, output_file)
+    logger.info(f"Exported node posterior dump to {output_file}")
+
+
+def _align(offset: int, boundary: int = 8) -> int:
+    return (offset + boundary - 1) // boundary * boundary
+
+
+@dataclass
+class NodePosteriorDump:
+    """Read-only view of a binary node dump; index and entries are memory-mapped."""
+
+    path: Path
+    node_ids: List[int]
+    alphabet: List[str]
+    node_id_map: Optional[Dict[int, int]]
+    index: np.ndarray
+    entries: np.ndarray
+
+    @classmethod
+    def open(cls, path: Path) -> "NodePosteriorDump":
+        """
+        Open a dump written by :func:`export_posteriors_to_dump`.
+
+        Raises:
+            FileNotFoundError: If the dump does not exist
+            ValueError: If the file is not a node dump of a supported version
+        """
+        path = Path(path)
+        with open(path, "rb") as handle:
+            if handle.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"Not a node posterior dump: {path}")
+            version, header_len = np.frombuffer(handle.read(8), dtype="<u4")
+            if int(version) != NODE_DUMP_VERSION:
+                raise ValueError(
+                    f"Unsupported node dump version {int(version)} in {path}"
+                )
+            header = json.loads(handle.read(int(header_len)).decode("utf-8"))
+
+        def _map(offset: int, dtype: np.dtype, count: int) -> np.ndarray:
+            if count == 0:
+                return np.zeros(0, dtype=dtype)
+            return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+
+        node_id_map = header.get("node_id_map")
+        return cls(
+            path=path,
+            node_ids=[int(n) for n in header["node_ids"]],
+            alphabet=list(header["alphabet"]),
+            node_id_map=(
+                {int(k): int(v) for k, v in node_id_map.items()} if node_id_map else None
+            ),
+            index=_map(header["index_offset"], _INDEX_DTYPE, header["n_sites"]),
+            entries=_map(header["data_offset"], _ENTRY_DTYPE, header["n_entries"]),
+        )
+
+    @property
+    def sites(self) -> np.ndarray:
+        """Sites (1-based positions) present in the dump, sorted."""
+        return self.index["site"]
+
+    def _entries(self, site: int) -> Optional[np.ndarray]:
+        sites = self.index["site"]
+        row = int(np.searchsorted(sites, site))
+        if row >= len(sites) or int(sites[row]) != site:
+            return None
+        start, count = int(self.index["start"][row]), int(self.index["count"][row])
+        return self.entries[start : start + count]
+
+    def site_posteriors(self, site: int) -> Dict[int, Dict[str, float]]:
+        """
+        Posteriors of every node at one site.
+
+        Returns:
+            Dict node_id -> {AA: posterior} (empty if the site is not in the dump)
+        """
+        out: Dict[int, Dict[str, float]] = {}
+        entries = self._entries(int(site))
+        if entries is None:
+            return out
+        for node_idx, code, prob in zip(
+            entries["node"].tolist(), entries["code"].tolist(), entries["prob"].tolist()
+        ):
+            out.setdefault(self.node_ids[node_idx], {})[self.alphabet[code]] = prob
+        return out
+
+    def node_posteriors(
+        self, positions: Optional[Iterable[int]] = None
+    ) -> Dict[int, Dict[int, Dict[str, float]]]:
+        """
+        Full ``node_id -> site -> {AA: posterior}`` mapping, optionally for some sites.
+
+        Nodes without posteriors at the requested sites map to an empty dict, as
+        in the JSONL dump.
+        """
+        wanted = self.sites.tolist() if positions is None else sorted(set(positions))
+        posteriors: Dict[int, Dict[int, Dict[str, float]]] = {
+            node_id: {} for node_id in self.node_ids
+        }
+        for site in wanted:
+            for node_id, aa_map in self.site_posteriors(site).items():
+                posteriors[node_id][int(site)] = aa_map
+        return posteriors
+
+    def iter_jsonl(self) -> Iterable[str]:
+        """Lines of the equivalent ``export_posteriors_to_jsonl`` output."""
+        if self.node_id_map:
+            yield json.dumps(
+                {"__metadata__": {"node_id_map": self.node_id_map}}, ensure_ascii=False
+            )
+        for node_id, positions in self.node_posteriors().items():
+            yield json.dumps(
+                {
+                    "node_id": node_id,
+                    "positions": {str(pos): probs for pos, probs in positions.items()},
+                },
+                ensure_ascii=False,
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Print a binary node posterior dump as JSONL"
+    )
+    parser.add_argument("dump", type=Path, help="Node dump ({gene}_posteriors.bin)")
+    parser.add_argument(
+        "--site", type=int, help="Only print the posteriors of this 1-based site"
+    )
+    args = parser.parse_args()
+
+    dump = NodePosteriorDump.open(args.dump)
+    if args.site is not None:
+        print(json.dumps({str(k): v for k, v in dump.site_posteriors(args.site).items()}))
+        return
+    for line in dump.iter_jsonl():
+        sys.stdout.write(line + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -49,23 +49,12 @@ import logging
 from .tree_parser import (
     TreeNode,
     parse_newick,
-    get_mrca,
-    find_node_by_name,
-    get_tip_labels,
 )
+from .tree_index import get_tree_index
 
 logger = logging.getLogger(__name__)
 
 
-def get_descendants(root: TreeNode) -> List[TreeNode]:
-    """Return all descendant nodes under ``root`` (excluding ``root``)."""
-    descendants: List[TreeNode] = []
-    for child in root.children:
-        descendants.append(child)
-        descendants.extend(get_descendants(child))
-    return descendants
-
-
 def identify_convergence_nodes(
     root: TreeNode,
     focal_pairs: List[List[str]],
@@ -118,8 +107,11 @@ def identify_convergence_nodes(
     if root.node_id is None:
         logger.warning("Root node has no node_id set - node IDs may not be available")
 
+    # MRCA, lookup and clade queries share the tree's cached index
+    index = get_tree_index(root)
+
     # Get all tip labels in tree (format typically lineage_taxid); also capture taxid suffixes
-    all_tips = get_tip_labels(root)
+    all_tips = index.tip_labels()
     tip_set = set(all_tips)
     tip_taxid_set = set(label.split("_")[-1] for label in all_tips if label)
 
@@ -176,7 +168,7 @@ def identify_convergence_nodes(
 
     # MRCA of all tips
     if len(all_tips) > 1:
-        mrca_all = get_mrca(root, all_tips)
+        mrca_all = index.mrca(all_tips)
         if mrca_all and mrca_all.node_id is not None:
             node_mapping["mrca_all"] = mrca_all.node_id
             logger.debug(f"MRCA all tips: node {mrca_all.node_id}")
@@ -185,7 +177,7 @@ def identify_convergence_nodes(
     focal_node_ids = []
     for idx, group_present in enumerate(focal_pairs_present, 1):
         if len(group_present) >= 2:
-            mrca_focal = get_mrca(root, group_present)
+            mrca_focal = index.mrca(group_present)
             if mrca_focal and mrca_focal.node_id is not None:
                 focal_node_ids.append(mrca_focal.node_id)
                 logger.debug(f"MRCA focal pair {idx}: node {mrca_focal.node_id}")
@@ -194,7 +186,7 @@ def identify_convergence_nodes(
                 focal_node_ids.append(None)
         elif len(group_present) == 1:
             # Single species - use the tip node itself or its parent
-            node = find_node_by_name(root, group_present[0])
+            node = index.find_by_name(group_present[0])
             if node and node.node_id is not None:
                 focal_node_ids.append(node.node_id)
                 logger.debug(f"Focal pair {idx} (single species): node {node.node_id}")
@@ -213,19 +205,20 @@ def identify_convergence_nodes(
 
     if len(valid_focal_ids) >= 2:
         # Find nodes corresponding to focal IDs
-        focal_nodes_objs = []
-        for node in [root] + list(get_descendants(root)):
-            if node.node_id in valid_focal_ids:
-                focal_nodes_objs.append(node)
+        focal_nodes_objs = [
+            node
+            for node in map(index.node_by_id, set(valid_focal_ids))
+            if node is not None
+        ]
 
         if len(focal_nodes_objs) >= 2:
-            # Get all tip labels under these focal nodes
-            all_focal_tips = []
+            # Union of the tips under these focal nodes
+            all_focal_tips = 0
             for fnode in focal_nodes_objs:
-                all_focal_tips.extend(get_tip_labels(fnode))
+                all_focal_tips |= index.clade(fnode)
 
             # Compute MRCA of all these tips
-            mrca_contrast = get_mrca(root, all_focal_tips)
+            mrca_contrast = index.mrca_of_clade(all_focal_tips)
             if mrca_contrast and mrca_contrast.node_id is not None:
                 node_mapping["mrca_contrast"] = mrca_contrast.node_id
                 logger.debug(
@@ -0,0 +1,396 @@
+"""
+Binary Posterior Store
+======================
+
+Position-indexed binary cache of the marginal reconstruction section of a
+PAML ``rst`` file, written once as ``posteriors.npz`` next to the ``rst``.
+
+The ``rst`` text is parsed a single time into flat arrays (one row per site,
+one column per internal node, in PAML order). Later runs load the arrays and
+materialise only the sites that are asked for, instead of regex-scanning the
+whole file for the site-level table, again for the node-level table and once
+more for the CAAS-filtered posteriors.
+
+The store is rebuilt automatically when the ``rst`` (or the PAML tree used for
+node ordering) changes size or modification time, or when the store format
+version changes.
+
+Layout of ``posteriors.npz``::
+
+    version   int      store format version
+    source    str      "<size>:<mtime_ns>" stamps of rst and tree
+    sites     int32    [S]       site numbers (1-based, file order)
+    n_tokens  int32    [S]       posterior tokens per site
+    codes     int16    [S, T]    index into ``alphabet``; -1 = malformed/padding
+    probs     float64  [S, T]    posterior of the best state
+    alphabet  str      [A]       state symbols
+    node_ids  int64    [N]       PAML node ids in posterior order (empty: no tree)
+
+Probabilities are kept as float64 so that threshold comparisons give exactly
+the same result as parsing the text.
+
+Usage Example
+-------------
+::
+
+    store = load_posterior_store(rst_file, tree_file)
+    node_post, node_id_map = store.node_posteriors(positions={649, 1203})
+    site_post = store.site_posteriors(positions={649, 1203})
+
+Author
+------
+Miguel Ramon Alonso
+Evolutionary Genomics Lab - IBE-UPF
+
+Date
+----
+2026-10
+"""
+
+import logging
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+POSTERIOR_CACHE_NAME = "posteriors.npz"
+POSTERIOR_CACHE_VERSION = 1
+
+_SITE_RE = re.compile(r"^\s*(\d+)\s+(\d+)\s+(.*)")
+
+
+def _file_stamp(path: Optional[Path]) -> str:
+    """Return ``size:mtime_ns`` of ``path`` ("-" when absent)."""
+    if path is None or not path.exists():
+        return "-"
+    st = path.stat()
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def _source_stamp(rst_file: Path, tree_file: Optional[Path]) -> str:
+    return f"rst={_file_stamp(rst_file)};tree={_file_stamp(tree_file)}"
+
+
+def iter_marginal_sites(rst_file: Path) -> Iterator[Tuple[int, str, List[str]]]:
+    """
+    Yield ``(site, consensus, tokens)`` for every site of the marginal section.
+
+    Section boundaries, line continuation and token truncation follow
+    :func:`src.asr.posterior.parse_paml_rst`: tokens are cut to the length of
+    the consensus string and entries without a ``:`` separator are skipped.
+
+    Raises:
+        ValueError: If the marginal reconstruction section is missing
+    """
+    with open(rst_file, "r") as f:
+        content = f.read()
+
+    start_marker = "(1) Marginal reconstruction"
+    start_idx = content.find(start_marker)
+    if start_idx == -1:
+        raise ValueError(
+            f"Could not find '{start_marker}' in {rst_file}. "
+            f"This may not be a valid PAML rst file."
+        )
+
+    prob_marker = "Prob of best state at each node"
+    prob_idx = content.find(prob_marker, start_idx)
+    if prob_idx == -1:
+        raise ValueError(f"Could not find '{prob_marker}' section in {rst_file}")
+
+    data_header_marker = "site   Freq   Data:"
+    data_start_idx = content.find(data_header_marker, prob_idx)
+    if data_start_idx == -1:
+        raise ValueError(
+            f"Could not find data header '{data_header_marker}' in {rst_file}"
+        )
+
+    data_section_start = data_start_idx + len(data_header_marker)
+    end_markers = ["(2)", "List of extant", "TREE #", "Nodes", "tree with node"]
+    data_section_end = len(content)
+    for marker in end_markers:
+        idx = content.find(marker, data_section_start)
+        if idx != -1:
+            data_section_end = min(data_section_end, idx)
+
+    lines = content[data_section_start:data_section_end].split("\n")
+
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if not line.strip():
+            i += 1
+            continue
+
+        match = _SITE_RE.match(line)
+        if not match:
+            i += 1
+            continue
+
+        site_num = int(match.group(1))
+        site_data = match.group(3)
+        i += 1
+        while i < len(lines) and ":" not in site_data:
+            site_data += lines[i]
+            i += 1
+
+        if ":" not in site_data:
+            logger.warning(f"Site {site_num}: No colon separator found in entry")
+            i += 1
+            continue
+
+        consensus_str, posterior_str = site_data.split(":", 1)
+        consensus_str = consensus_str.strip()
+        tokens = posterior_str.strip().rstrip("$").strip().split()
+        if len(tokens) != len(consensus_str):
+            min_len = min(len(consensus_str), len(tokens))
+            tokens = tokens[:min_len]
+            consensus_str = consensus_str[:min_len]
+        yield site_num, consensus_str, tokens
+
+
+def _parse_token(token: str) -> Optional[Tuple[str, float]]:
+    """Parse ``"F(0.995)"`` into ``("F", 0.995)``; None when malformed."""
+    if not token or "(" not in token or ")" not in token:
+        return None
+    try:
+        paren_idx = token.find("(")
+        return token[:paren_idx], float(token[paren_idx + 1 : -1])
+    except (ValueError, IndexError):
+        return None
+
+
+@dataclass
+class PosteriorStore:
+    """Marginal posteriors of one gene as site x node arrays."""
+
+    sites: np.ndarray
+    n_tokens: np.ndarray
+    codes: np.ndarray
+    probs: np.ndarray
+    alphabet: List[str]
+    node_ids: List[int]
+    rst_file: Optional[Path] = None
+
+    def _rows(self, positions: Optional[Iterable[int]]) -> np.ndarray:
+        """Row indices (file order) of the requested 1-based sites."""
+        if positions is None:
+            return np.arange(len(self.sites))
+        wanted = np.fromiter((int(p) for p in positions), dtype=np.int64)
+        return np.flatnonzero(np.isin(self.sites, wanted))
+
+    def site_posteriors(
+        self,
+        threshold: float = 0.0,
+        positions: Optional[Iterable[int]] = None,
+    ) -> Dict[int, Dict[str, float]]:
+        """Site-level posteriors, as returned by ``parse_paml_rst``."""
+        posteriors: Dict[int, Dict[str, float]] = {}
+        for row in self._rows(positions):
+            site = int(self.sites[row])
+            n = int(self.n_tokens[row])
+            entry: Dict[str, float] = {}
+            posteriors[site] = entry
+            for code, prob in zip(
+                self.codes[row, :n].tolist(), self.probs[row, :n].tolist()
+            ):
+                if code >= 0 and prob >= threshold:
+                    entry[self.alphabet[code]] = prob
+        return posteriors
+
+    def node_posteriors(
+        self,
+        threshold: float = 0.0,
+        positions: Optional[Iterable[int]] = None,
+    ) -> Tuple[Dict[int, Dict[int, Dict[str, float]]], Dict[int, int]]:
+        """
+        Node-level posteriors and PAML index map, as ``parse_paml_rst_node_level``.
+
+        Returns:
+            (posteriors, node_id_map) where posteriors maps node_id -> site ->
+            {AA: posterior} and node_id_map maps posterior index -> node_id
+        """
+        if not self.node_ids:
+            raise ValueError(
+                f"Posterior store for {self.rst_file} has no node ordering "
+                "(built without a PAML tree)"
+            )
+        node_ids = self.node_ids
+        num_internal = len(node_ids)
+        posteriors: Dict[int, Dict[int, Dict[str, float]]] = {
+            node_id: {} for node_id in node_ids
+        }
+        for row in self._rows(positions):
+            site = int(self.sites[row])
+            n = min(int(self.n_tokens[row]), num_internal)
+            for idx, (code, prob) in enumerate(
+                zip(self.codes[row, :n].tolist(), self.probs[row, :n].tolist())
+            ):
+                if code < 0:
+                    continue
+                site_entry = posteriors[node_ids[idx]].setdefault(site, {})
+                # Always keep the modal/best state; threshold only prunes secondary AAs
+                if prob >= threshold or not site_entry:
+                    site_entry[self.alphabet[code]] = prob
+        node_id_map = {idx: node_id for idx, node_id in enumerate(node_ids)}
+        return posteriors, node_id_map
+
+
+def _internal_node_order(tree_file: Path, rst_file: Path) -> List[int]:
+    """PAML node ids of the internal nodes, in the order posteriors are listed."""
+    from .tree_parser import build_node_mapping
+
+    ordered_nodes, _ = build_node_mapping(tree_file=tree_file, rst_file=rst_file)
+    internal_nodes = [node for node in ordered_nodes if not node.is_leaf()]
+    if not all(node.node_id is not None for node in internal_nodes):
+        raise ValueError(
+            "All internal nodes must have PAML node IDs for posterior parsing."
+        )
+    return sorted(int(node.node_id) for node in internal_nodes)
+
+
+def build_posterior_store(
+    rst_file: Path, tree_file: Optional[Path] = None
+) -> PosteriorStore:
+    """
+    Parse ``rst_file`` once into a :class:`PosteriorStore`.
+
+    Args:
+        rst_file: PAML rst file with a marginal reconstruction section
+        tree_file: Optional PAML tree; required for node-level posteriors
+
+    Raises:
+        FileNotFoundError: If rst file doesn't exist
+        ValueError: If the file has no parsable sites
+    """
+    if not rst_file.exists():
+        raise FileNotFoundError(f"RST file not found: {rst_file}")
+
+    sites: List[int] = []
+    rows: List[List[Tuple[int, float]]] = []
+    alphabet: List[str] = []
+    alphabet_index: Dict[str, int] = {}
+    for site_num, _, tokens in iter_marginal_sites(rst_file):
+        row: List[Tuple[int, float]] = []
+        for token in tokens:
+            parsed = _parse_token(token)
+            if parsed is None:
+                row.append((-1, 0.0))
+                continue
+            aa, prob = parsed
+            code = alphabet_index.get(aa)
+            if code is None:
+                code = alphabet_index[aa] = len(alphabet)
+                alphabet.append(aa)
+            row.append((code, prob))
+        sites.append(site_num)
+        rows.append(row)
+
+    if not sites:
+        raise ValueError(
+            f"No posteriors parsed from {rst_file}. "
+            f"Ensure this is a PAML rst file with marginal reconstruction. "
+            f"Expected section: '(1) Marginal reconstruction of ancestral sequences'"
+        )
+
+    width = max(len(row) for row in rows)
+    codes = np.full((len(rows), width), -1, dtype=np.int16)
+    probs = np.zeros((len(rows), width), dtype=np.float64)
+    for r, row in enumerate(rows):
+        if row:
+            codes[r, : len(row)] = [c for c, _ in row]
+            probs[r, : len(row)] = [p for _, p in row]
+
+    node_ids: List[int] = []
+    if tree_file is not None and tree_file.exists():
+        node_ids = _internal_node_order(tree_file, rst_file)
+
+    return PosteriorStore(
+        sites=np.asarray(sites, dtype=np.int32),
+        n_tokens=np.asarray([len(row) for row in rows], dtype=np.int32),
+        codes=codes,
+        probs=probs,
+        alphabet=alphabet,
+        node_ids=node_ids,
+        rst_file=rst_file,
+    )
+
+
+def save_posterior_store(store: PosteriorStore, path: Path, source: str) -> None:
+    """Write ``store`` to ``path`` atomically (temporary file + rename)."""
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as handle:
+        np.savez(
+            handle,
+            version=np.int64(POSTERIOR_CACHE_VERSION),
+            source=np.array(source),
+            sites=store.sites,
+            n_tokens=store.n_tokens,
+            codes=store.codes,
+            probs=store.probs,
+            alphabet=np.array(store.alphabet, dtype=str),
+            node_ids=np.asarray(store.node_ids, dtype=np.int64),
+        )
+    os.replace(tmp, path)
+
+
+def read_posterior_store(path: Path, source: Optional[str] = None) -> Optional[PosteriorStore]:
+    """
+    Read a store written by :func:`save_posterior_store`.
+
+    Returns None when the file is missing, unreadable, of another format
+    version, or (if ``source`` is given) built from a different rst/tree.
+    """
+    if not path.exists():
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["version"]) != POSTERIOR_CACHE_VERSION:
+                return None
+            if source is not None and str(data["source"]) != source:
+                return None
+            return PosteriorStore(
+                sites=data["sites"],
+                n_tokens=data["n_tokens"],
+                codes=data["codes"],
+                probs=data["probs"],
+                alphabet=[str(a) for a in data["alphabet"]],
+                node_ids=[int(n) for n in data["node_ids"]],
+            )
+    except Exception as exc:
+        logger.debug(f"Ignoring unreadable posterior store {path}: {exc}")
+        return None
+
+
+def load_posterior_store(
+    rst_file: Path, tree_file: Optional[Path] = None
+) -> PosteriorStore:
+    """
+    Return the posterior store of ``rst_file``, building it when stale.
+
+    The store lives next to the rst as ``posteriors.npz``. If it cannot be
+    written (e.g. read-only ASR cache) the freshly parsed store is still
+    returned.
+    """
+    cache_path = rst_file.parent / POSTERIOR_CACHE_NAME
+    source = _source_stamp(rst_file, tree_file)
+
+    store = read_posterior_store(cache_path, source)
+    if store is not None:
+        store.rst_file = rst_file
+        logger.debug(f"Loaded posterior store {cache_path}")
+        return store
+
+    store = build_posterior_store(rst_file, tree_file)
+    try:
+        save_posterior_store(store, cache_path, source)
+        logger.debug(f"Wrote posterior store {cache_path}")
+    except OSError as exc:
+        logger.debug(f"Could not write posterior store {cache_path}: {exc}")
+    return store
+
@@ -33,6 +33,44 @@ MODEL_SPECS = {
 }
 DEFAULT_MODEL = "lg"
 
+# CT_DISAMBIGUATION/local (holds the bundled dat/ rate files)
+_PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+
+def normalize_model_key(model_name: Optional[str]) -> str:
+    """Map a model name such as "LG+G" to a MODEL_SPECS key (default: lg)."""
+    if not model_name:
+        return DEFAULT_MODEL
+    token = str(model_name).lower().split("+")[0].strip()
+    if token not in MODEL_SPECS:
+        logger.warning(
+            f"Unrecognized substitution model '{model_name}', falling back to '{DEFAULT_MODEL}'"
+        )
+        return DEFAULT_MODEL
+    return token
+
+
+def resolve_rate_file(filename: str) -> Path:
+    """Locate a PAML amino acid rate file (bundled dat/ first, then $CONDA_PREFIX)."""
+    search_paths = [
+        _PROJECT_ROOT / "dat" / filename,
+    ]
+    conda_prefix = os.environ.get("CONDA_PREFIX")
+    if conda_prefix:
+        conda_path = Path(conda_prefix)
+        search_paths.extend(
+            [
+                conda_path / "dat" / filename,
+                conda_path / "share" / "paml" / "dat" / filename,
+            ]
+        )
+    for path in search_paths:
+        if path.exists():
+            return path
+    raise FileNotFoundError(
+        f"Rate file '{filename}' not found. Searched: {', '.join(str(p) for p in search_paths)}"
+    )
+
 
 @dataclass
 class ASRConfig:
@@ -380,35 +418,10 @@ method = 0 * Optimization method 0: simultaneous; 1: one branch a time
                 f.write(f"{name} {seq_str}\n")
 
     def _normalize_model_key(self, model_name: Optional[str]) -> str:
-        if not model_name:
-            return DEFAULT_MODEL
-        token = str(model_name).lower().split("+")[0].strip()
-        if token not in MODEL_SPECS:
-            logger.warning(
-                f"Unrecognized substitution model '{model_name}', falling back to '{DEFAULT_MODEL}'"
-            )
-            return DEFAULT_MODEL
-        return token
+        return normalize_model_key(model_name)
 
     def _resolve_rate_file(self, filename: str) -> Path:
-        search_paths = [
-            self._project_root / "dat" / filename,
-        ]
-        conda_prefix = os.environ.get("CONDA_PREFIX")
-        if conda_prefix:
-            conda_path = Path(conda_prefix)
-            search_paths.extend(
-                [
-                    conda_path / "dat" / filename,
-                    conda_path / "share" / "paml" / "dat" / filename,
-                ]
-            )
-        for path in search_paths:
-            if path.exists():
-                return path
-        raise FileNotFoundError(
-            f"Rate file '{filename}' not found. Searched: {', '.join(str(p) for p in search_paths)}"
-        )
+        return resolve_rate_file(filename)
 
     # Implement _find_paml_binary method
     def _find_paml_binary(self) -> Path:
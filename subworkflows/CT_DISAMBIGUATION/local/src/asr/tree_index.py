@@ -0,0 +1,279 @@
+"""
+Tree Index for Constant-Time MRCA, Path and Clade Queries
+=========================================================
+
+Precomputed index over a parsed :class:`~src.asr.tree_parser.TreeNode` tree.
+Disambiguation queries the same gene tree for every CAAS position and trait
+pair (pair MRCAs, contrast MRCA, MRCA-to-tip paths); walking parent pointers
+and searching the tree for tip labels on each query dominated per-position
+profiles. The index is built once per tree in linear time (plus
+``O(n log n)`` for the sparse table) and answers:
+
+- **MRCA**: Euler tour + sparse table of minimum depths (constant-time LCA);
+- **paths**: root-to-node paths, sliced for ancestor-to-node paths;
+- **clades**: descendant tips of each node as an integer bitset (bit ``i`` is
+  the ``i``-th tip in preorder), so clade membership and unions are bit
+  operations;
+- **lookups**: nodes by tip name, by taxid suffix (``lineage_taxid`` tips) and
+  by PAML node id.
+
+Lookups keep the semantics of :func:`~src.asr.tree_parser.find_node_by_name`
+and :func:`~src.asr.tree_parser.find_node_by_taxid` (first match in preorder).
+The index assumes the tree is not modified after it is built.
+
+Usage Example
+-------------
+::
+
+    index = get_tree_index(root)            # built once, cached on the root
+    mrca = index.mrca(["9541", "9544"])     # TreeNode (same as get_mrca)
+    path = index.path(mrca, index.find("9541"))
+    index.clade_contains(mrca, "9541")      # True
+
+Author
+------
+Miguel Ramon Alonso
+Evolutionary Genomics Lab - IBE-UPF
+
+Date
+----
+2026-10
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+from .tree_parser import TreeNode
+
+_INDEX_ATTR = "_tree_index"
+
+
+class TreeIndex:
+    """Constant-time MRCA, path and clade queries over one TreeNode tree.
+
+    Nodes are numbered in preorder; ``parent``, ``depth`` and ``clades`` are
+    indexed by that number.
+    """
+
+    def __init__(self, root: TreeNode):
+        self.root = root
+        self.nodes: List[TreeNode] = []
+        self.parent: List[int] = []
+        self.depth: List[int] = []
+        self._order: Dict[TreeNode, int] = {}
+        self._size: List[int] = []
+
+        # Preorder numbering, parents and depths (iterative: trees can be deep)
+        stack = [(root, -1)]
+        while stack:
+            node, parent_idx = stack.pop()
+            idx = len(self.nodes)
+            self._order[node] = idx
+            self.nodes.append(node)
+            self.parent.append(parent_idx)
+            self.depth.append(0 if parent_idx < 0 else self.depth[parent_idx] + 1)
+            for child in reversed(node.children):
+                stack.append((child, idx))
+
+        n = len(self.nodes)
+        self._size = [1] * n
+        for idx in range(n - 1, 0, -1):
+            self._size[self.parent[idx]] += self._size[idx]
+
+        # Tips (named leaves, as get_tip_labels) and descendant tip bitsets
+        self.tips: List[TreeNode] = []
+        self.clades: List[int] = [0] * n
+        for idx, node in enumerate(self.nodes):
+            if node.is_leaf() and node.name:
+                self.clades[idx] = 1 << len(self.tips)
+                self.tips.append(node)
+        for idx in range(n - 1, 0, -1):
+            self.clades[self.parent[idx]] |= self.clades[idx]
+
+        # Lookups: first node in preorder wins
+        self._by_name: Dict[str, TreeNode] = {}
+        self._by_taxid: Dict[str, TreeNode] = {}
+        self._by_id: Dict[int, TreeNode] = {}
+        for node in self.nodes:
+            if node.name is not None:
+                self._by_name.setdefault(node.name, node)
+            if node.is_leaf() and node.name:
+                self._by_taxid.setdefault(node.name.strip().split("_")[-1], node)
+            if node.node_id is not None:
+                self._by_id.setdefault(node.node_id, node)
+
+        # Root-to-node paths share their prefix with the parent's path
+        self._paths: List[tuple] = [()] * n
+        for idx in range(n):
+            parent_idx = self.parent[idx]
+            prefix = self._paths[parent_idx] if parent_idx >= 0 else ()
+            self._paths[idx] = prefix + (idx,)
+
+        # Euler tour (node visited on entry and after each child) + sparse table
+        euler: List[int] = []
+        first = [0] * n
+        stack_iter = [(0, iter(self.nodes[0].children))]
+        euler.append(0)
+        while stack_iter:
+            idx, children = stack_iter[-1]
+            child = next(children, None)
+            if child is None:
+                stack_iter.pop()
+                if stack_iter:
+                    euler.append(stack_iter[-1][0])
+                continue
+            child_idx = self._order[child]
+            first[child_idx] = len(euler)
+            euler.append(child_idx)
+            stack_iter.append((child_idx, iter(child.children)))
+        self._first = first
+
+        depth = self.depth
+        table = [euler]
+        span = 1
+        while 2 * span <= len(euler):
+            prev = table[-1]
+            table.append(
+                [
+                    a if depth[a] <= depth[b] else b
+                    for a, b in zip(prev, prev[span:])
+                ]
+            )
+            span *= 2
+        self._sparse = table
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def index_of(self, node: TreeNode) -> int:
+        """Preorder number of ``node`` (KeyError if it is not in the tree)."""
+        return self._order[node]
+
+    def find_by_name(self, name: str) -> Optional[TreeNode]:
+        """Node with exactly this name (as :func:`~src.asr.tree_parser.find_node_by_name`)."""
+        return self._by_name.get(name)
+
+    def find(self, name: str) -> Optional[TreeNode]:
+        """Node by exact name, falling back to tip taxid (``lineage_taxid`` tips)."""
+        name_str = str(name).strip()
+        node = self._by_name.get(name_str)
+        if node is None:
+            node = self._by_taxid.get(name_str)
+        return node
+
+    def node_by_id(self, node_id: Optional[int]) -> Optional[TreeNode]:
+        """Node with the given PAML node id, or None."""
+        if node_id is None:
+            return None
+        return self._by_id.get(node_id)
+
+    # ------------------------------------------------------------------
+    # MRCA
+    # ------------------------------------------------------------------
+
+    def _lca(self, a: int, b: int) -> int:
+        left, right = self._first[a], self._first[b]
+        if left > right:
+            left, right = right, left
+        level = (right - left + 1).bit_length() - 1
+        row = self._sparse[level]
+        x, y = row[left], row[right - (1 << level) + 1]
+        return x if self.depth[x] <= self.depth[y] else y
+
+    def lca(self, a: TreeNode, b: TreeNode) -> TreeNode:
+        """Lowest common ancestor of two nodes."""
+        return self.nodes[self._lca(self._order[a], self._order[b])]
+
+    def mrca_of_nodes(self, nodes: Iterable[TreeNode]) -> Optional[TreeNode]:
+        """Lowest common ancestor of any number of nodes (None if empty)."""
+        current = None
+        for node in nodes:
+            idx = self._order[node]
+            current = idx if current is None else self._lca(current, idx)
+        return None if current is None else self.nodes[current]
+
+    def mrca(self, tip_names: Iterable[str]) -> Optional[TreeNode]:
+        """MRCA of tips given by name or taxid; None if fewer than 2 are found.
+
+        Same result as :func:`~src.asr.tree_parser.get_mrca`.
+        """
+        found = [node for node in map(self.find, tip_names) if node is not None]
+        if len(found) < 2:
+            return None
+        return self.mrca_of_nodes(found)
+
+    def mrca_of_clade(self, bits: int) -> Optional[TreeNode]:
+        """MRCA of the tips in a clade bitset; None if it holds fewer than 2 tips."""
+        if bits & (bits - 1) == 0:
+            return None
+        low = self.tips[(bits & -bits).bit_length() - 1]
+        high = self.tips[bits.bit_length() - 1]
+        # In preorder, the MRCA of a tip set is the MRCA of its first and last tips
+        return self.lca(low, high)
+
+    # ------------------------------------------------------------------
+    # Paths and clades
+    # ------------------------------------------------------------------
+
+    def is_ancestor(self, ancestor: TreeNode, node: TreeNode) -> bool:
+        """True if ``ancestor`` is ``node`` or one of its ancestors."""
+        a, b = self._order[ancestor], self._order[node]
+        return a <= b < a + self._size[a]
+
+    def root_path(self, node: TreeNode) -> List[TreeNode]:
+        """Nodes from the root down to ``node`` (inclusive)."""
+        return [self.nodes[idx] for idx in self._paths[self._order[node]]]
+
+    def path(self, ancestor: TreeNode, node: TreeNode) -> List[TreeNode]:
+        """Nodes from ``ancestor`` down to ``node`` (inclusive).
+
+        If ``ancestor`` is not an ancestor of ``node`` the full root path is returned.
+        """
+        path = self._paths[self._order[node]]
+        if self.is_ancestor(ancestor, node):
+            path = path[self.depth[self._order[ancestor]] :]
+        return [self.nodes[idx] for idx in path]
+
+    def clade(self, node: TreeNode) -> int:
+        """Bitset of the tips descending from ``node``."""
+        return self.clades[self._order[node]]
+
+    def tip_bits(self, tip_names: Iterable[str]) -> int:
+        """Bitset of the named tips (by name or taxid) that are in the tree."""
+        bits = 0
+        for name in tip_names:
+            node = self.find(name)
+            if node is not None:
+                bits |= self.clades[self._order[node]]
+        return bits
+
+    def clade_contains(self, node: TreeNode, name: str) -> bool:
+        """True if tip ``name`` (name or taxid) descends from ``node``."""
+        tip = self.find(name)
+        return tip is not None and bool(self.clade(node) & self.clade(tip))
+
+    def clade_tips(self, bits: int) -> List[TreeNode]:
+        """Tips of a clade bitset, in preorder."""
+        tips = []
+        while bits:
+            low = bits & -bits
+            tips.append(self.tips[low.bit_length() - 1])
+            bits ^= low
+        return tips
+
+    def tip_labels(self) -> List[str]:
+        """Tip labels in preorder (as :func:`~src.asr.tree_parser.get_tip_labels`)."""
+        return [tip.name for tip in self.tips]
+
+
+def get_tree_index(root: TreeNode) -> TreeIndex:
+    """Return the index of the tree rooted at ``root``, building it on first use.
+
+    The index is cached on the root node, so every query against the same tree
+    (all positions and pairs of a gene) shares one index.
+    """
+    index = getattr(root, _INDEX_ATTR, None)
+    if index is None:
+        index = TreeIndex(root)
+        setattr(root, _INDEX_ATTR, index)
+    return index
@@ -14,6 +14,8 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+_NEWICK_TOKEN = re.compile(r"[(),:]|[^(),:]+")
+
 
 class TreeNode:
     """Represents a node in a phylogenetic tree."""
@@ -65,8 +67,9 @@ def parse_newick(tree_string: str) -> TreeNode:
     reading_length = False
     reading_node_label = False  # True after ')' to read label for internal node
 
-    for char in tree_string:
-        if char == "(":
+    # Structural characters are single tokens; labels and lengths are read as whole runs
+    for token in _NEWICK_TOKEN.findall(tree_string):
+        if token == "(":
             # Before starting new internal node, finalize any pending label
             if reading_node_label and current_node and current_label:
                 current_node.paml_label = current_label
@@ -84,7 +87,7 @@ def parse_newick(tree_string: str) -> TreeNode:
             current_length = ""
             reading_length = False
 
-        elif char == ")":
+        elif token == ")":
             # Before finalizing, check if we need to assign a pending label
             if reading_node_label and current_node and current_label:
                 current_node.paml_label = current_label
@@ -111,7 +114,7 @@ def parse_newick(tree_string: str) -> TreeNode:
             reading_length = False
             reading_node_label = True  # Next text is label for the node just closed
 
-        elif char == ",":
+        elif token == ",":
             # Finalize leaf or assign internal node label
             if reading_node_label:
                 # Assign label to the node we just closed (current_node)
@@ -137,7 +140,7 @@ def parse_newick(tree_string: str) -> TreeNode:
             current_length = ""
             reading_length = False
 
-        elif char == ":":
+        elif token == ":":
             # Assign any accumulated label before starting branch length
             if reading_node_label and current_node and current_label:
                 current_node.paml_label = current_label
@@ -147,9 +150,9 @@ def parse_newick(tree_string: str) -> TreeNode:
 
         else:
             if reading_length:
-                current_length += char
+                current_length += token
             else:
-                current_label += char
+                current_label += token
 
     # Handle final label (root node label after last ')')
     if reading_node_label and current_node and current_label:
@@ -506,56 +509,10 @@ def get_mrca(root: TreeNode, tip_names: List[str]) -> Optional[TreeNode]:
 
     Returns:
         MRCA node, or None if not found
+
+    The lookups and the MRCA are answered by the tree's cached
+    :class:`~src.asr.tree_index.TreeIndex`, built on the first call for ``root``.
     """
-    # Find all tip nodes - try exact match first, then taxid match
-    tip_nodes = []
-    for name in tip_names:
-        name_str = str(name).strip()
-        # Try exact match first
-        node = find_node_by_name(root, name_str)
-        if not node:
-            # Try taxid match (for PAML trees with 'lineage_taxid' format)
-            node = find_node_by_taxid(root, name_str)
-        if node:
-            tip_nodes.append(node)
-
-    if len(tip_nodes) < 2:
-        return None
-
-    def _ancestors(node: Optional[TreeNode]) -> List[TreeNode]:
-        anc = []
-        while node:
-            anc.append(node)
-            node = node.parent
-        return anc
-
-    # Intersect ancestor sets by object identity
-    common: Optional[set] = None
-    for tip in tip_nodes:
-        anc_set = set(_ancestors(tip))
-        if common is None:
-            common = anc_set
-        else:
-            common &= anc_set
-        if not common:
-            return None
-
-    # Compute depth from root (root depth = 0)
-    depth_cache: Dict[TreeNode, int] = {}
-
-    def depth_from_root(node: TreeNode) -> int:
-        if node in depth_cache:
-            return depth_cache[node]
-        d = 0
-        cur = node
-        while cur.parent is not None:
-            d += 1
-            cur = cur.parent
-        depth_cache[node] = d
-        return d
-
-    # Choose the deepest common ancestor (max depth from root)
-    if common is None:
-        return None
-    deepest = max(common, key=depth_from_root)
-    return deepest
+    from .tree_index import get_tree_index
+
+    return get_tree_index(root).mrca(tip_names)
@@ -429,6 +429,7 @@ def analyze_gene_disambiguation(
     caas_entries: Optional[List[CAASPosition]] = None,
     caas_metadata_path: Optional[Path] = None,
     trait_file_path: Optional[Path] = None,
+    trait_pairs: Optional[Dict[int, List[Tuple[str, str]]]] = None,
     taxid_mapping: Optional[Dict[str, str]] = None,
     posterior_data: Optional[Dict[int, Dict[int, Dict[str, float]]]] = None,
     posterior_threshold: float = 0.7,
@@ -447,6 +448,7 @@ def analyze_gene_disambiguation(
         caas_positions: List of CAAS positions to analyze
         caas_metadata_path: Optional path to CAAS metadata
         trait_file_path: Optional path to trait file
+        trait_pairs: Optional pre-parsed trait pairs (skips reading trait_file_path)
         taxid_mapping: Optional species to taxid mapping
         posterior_data: Optional ASR posterior data
         posterior_threshold: Posterior probability threshold for node state extraction
@@ -475,7 +477,9 @@ def analyze_gene_disambiguation(
         tip_dir = Path(diagnostics_dir) / "tip_details"
         tip_dir.mkdir(parents=True, exist_ok=True)
         tip_file_path = tip_dir / f"{gene.lower()}_tip_details.jsonl"
-        # We open lazily when the first record is ready so we avoid creating empty files
+        # We open lazily when the first record is ready so we avoid creating empty files;
+        # a file left by a previous run of this gene is replaced
+        tip_file_path.unlink(missing_ok=True)
 
     # Load row-wise CAAS metadata entries
     if caas_entries is None:
@@ -499,8 +503,12 @@ def analyze_gene_disambiguation(
     # Load all trait pairs once for uniform processing
     trait_pairs_all: Dict[int, List[Tuple[str, str]]] = {}
     flattened_pairs: List[Tuple[str, str]] = []
-    if trait_file_path:
-        trait_pairs_all = parse_trait_pairs(Path(trait_file_path))
+    if trait_pairs is not None or trait_file_path:
+        trait_pairs_all = (
+            trait_pairs
+            if trait_pairs is not None
+            else parse_trait_pairs(Path(trait_file_path))
+        )
         seen_pairs = set()
         for contrast_num in sorted(trait_pairs_all.keys()):
             for pair in trait_pairs_all[contrast_num]:
@@ -660,7 +668,7 @@ def analyze_gene_disambiguation(
                     if tip_file_handle is None:
                         if tip_file_path is None:
                             raise ValueError("tip_file_path is None")
-                        tip_file_handle = open(tip_file_path, "a", encoding="utf-8")
+                        tip_file_handle = open(tip_file_path, "w", encoding="utf-8")
                         diagnostics["tip_dump_file"] = str(tip_file_path)
                     tip_file_handle.write(json.dumps(record) + "\n")
                     tip_file_handle.flush()
@@ -63,7 +63,7 @@ def build_convergence_node_mapping(
     Build node → state mapping for a contrast, showing the phylogenetic context.
 
     Args:
-        tree: Bio.Phylo tree object
+        tree: Root TreeNode of the PAML-labelled gene tree (or its TreeIndex)
         contrast: ContrastDefinition with mrca node_id and taxa
         node_posteriors: Optional ASR posterior probabilities
         paml_site: Optional 1-based PAML site index
@@ -71,7 +71,10 @@ def build_convergence_node_mapping(
     Returns:
         Dictionary with node_map (node_id → state/label) and path diagnostics
     """
-    from src.phylo.tree_utils import find_node_by_id
+    from src.asr.tree_index import TreeIndex, get_tree_index
+
+    # Node lookups and MRCA-to-tip paths come from the tree's cached index
+    index = tree if isinstance(tree, TreeIndex) else get_tree_index(tree)
 
     def get_modal_state(node_id: Optional[int]) -> Optional[str]:
         """Extract modal AA from ASR posteriors"""
@@ -91,7 +94,7 @@ def build_convergence_node_mapping(
     node_map: Dict[int, str] = {}
 
     # Map MRCA
-    mrca_node = find_node_by_id(tree, contrast.node_id) if contrast.node_id else None
+    mrca_node = index.node_by_id(contrast.node_id) if contrast.node_id else None
     if mrca_node and mrca_node.node_id is not None:
         mrca_state = get_modal_state(mrca_node.node_id)
         node_map[mrca_node.node_id] = mrca_state or f"MRCA_{contrast.pair_id}"
@@ -102,34 +105,26 @@ def build_convergence_node_mapping(
 
     # Map all taxa tips
     for taxid in contrast.all_taxa:
-        node = find_node_by_id(tree, taxid)
+        node = index.find(taxid)
         if node and node.node_id is not None:
             side = "top" if taxid in contrast.top_taxa else "bottom"
             node_map[node.node_id] = f"tip_{side}_{taxid}"
 
     # Build path from MRCA to each tip
-    def build_path_to_node(target_id: int) -> List[int]:
-        """Build path from MRCA to target node"""
-        if mrca_node is None or target_id is None:
+    def build_path_to_node(taxid: str) -> List[int]:
+        """Build path from MRCA to the tip of ``taxid``"""
+        if mrca_node is None or taxid is None:
             return []
 
-        target_node = find_node_by_id(tree, target_id)
+        target_node = index.find(taxid)
         if not target_node:
             return []
 
-        # Build path from target to root
-        path_to_root = []
-        current = target_node
-        while current:
-            if current.node_id is not None:
-                path_to_root.append(current.node_id)
-            if current == mrca_node:
-                break
-            current = (
-                tree.get_path(current)[-2] if len(tree.get_path(current)) > 1 else None
-            )
-
-        return list(reversed(path_to_root))
+        return [
+            node.node_id
+            for node in index.path(mrca_node, target_node)
+            if node.node_id is not None
+        ]
 
     # Build paths for each side
     top_paths = [build_path_to_node(taxid) for taxid in contrast.top_taxa]
@@ -4,19 +4,26 @@ from .models import BiochemResults, CAASPosition, ContrastDefinition, Convergenc
 from .loaders import (
     build_caas_positions_map,
     get_caas_position_info,
+    index_caas_metadata,
+    list_gene_caas_entries,
     list_gene_caas_positions,
     load_ensembl_genes,
     parse_trait_pairs,
     read_caas_metadata_table,
 )
+from .context import DisambiguationContext, build_disambiguation_context
 
 __all__ = [
     "BiochemResults",
     "CAASPosition",
     "ContrastDefinition",
     "ConvergenceResult",
+    "DisambiguationContext",
     "build_caas_positions_map",
+    "build_disambiguation_context",
     "get_caas_position_info",
+    "index_caas_metadata",
+    "list_gene_caas_entries",
     "list_gene_caas_positions",
     "load_ensembl_genes",
     "parse_trait_pairs",
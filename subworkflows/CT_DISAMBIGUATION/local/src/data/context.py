@@ -0,0 +1,125 @@
+"""
+Run-wide Disambiguation Context
+===============================
+
+Inputs that are identical for every gene of a disambiguation run — the CAAS
+metadata table, the trait pairs, the taxid mapping and the species tree — are
+read once in :func:`build_disambiguation_context` and indexed by gene, so a
+per-gene lookup is a dict access instead of a file read. The species tree is
+also kept in parent-array form (:class:`~src.phylo.tree_cache.PrunedTreeCache`)
+so each worker prunes it in linear time and reuses pruned topologies across
+genes with the same species set.
+
+The context is built in the parent process before the worker pool starts and
+reaches the workers through the pool initializer: with the default ``fork``
+start method it is inherited without pickling; with ``spawn`` it is pickled
+once per worker, not once per gene.
+
+Usage Example
+-------------
+::
+
+    ctx = build_disambiguation_context(meta_file, trait_file, tree_file, taxid_file)
+    positions = ctx.gene_positions("NUTM2A")
+    entries = ctx.gene_entries("NUTM2A")
+
+Author
+------
+Miguel Ramon Alonso
+Evolutionary Genomics Lab - IBE-UPF
+
+Date
+----
+2026-10
+"""
+
+import copy
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from Bio.Phylo.BaseTree import Tree
+
+from src.phylo.tree_cache import DEFAULT_PRUNED_TREE_CACHE_SIZE, PrunedTreeCache
+
+from .loaders import index_caas_metadata, parse_trait_pairs
+from .models import CAASPosition
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DisambiguationContext:
+    """Gene-indexed inputs shared by every gene of a run."""
+
+    positions_by_gene: Dict[str, List[int]] = field(default_factory=dict)
+    entries_by_gene: Dict[str, List[CAASPosition]] = field(default_factory=dict)
+    trait_pairs: Dict[int, List[Tuple[str, str]]] = field(default_factory=dict)
+    taxid_mapping: Optional[Dict[str, str]] = None
+    tree: Optional[Tree] = None
+    tree_cache: Optional[PrunedTreeCache] = None
+
+    def gene_positions(self, gene: str) -> List[int]:
+        """Zero-based CAAS positions of ``gene`` (as list_gene_caas_positions)."""
+        return self.positions_by_gene.get(gene, [])
+
+    def gene_entries(self, gene: str) -> List[CAASPosition]:
+        """Metadata rows of ``gene`` (as list_gene_caas_entries); fresh copies per call."""
+        return [copy.copy(entry) for entry in self.entries_by_gene.get(gene, [])]
+
+
+def build_disambiguation_context(
+    caas_metadata_path: Path,
+    trait_file_path: Optional[Path] = None,
+    tree_file: Optional[Path] = None,
+    taxid_mapping_path: Optional[Path] = None,
+    tree_cache_size: int = DEFAULT_PRUNED_TREE_CACHE_SIZE,
+) -> DisambiguationContext:
+    """
+    Read the run-wide inputs once and return them indexed by gene.
+
+    Args:
+        caas_metadata_path: CAAS metadata table (all genes)
+        trait_file_path: Optional trait file (species, trait, pair)
+        tree_file: Optional species tree (newick)
+        taxid_mapping_path: Optional taxid mapping file
+        tree_cache_size: Pruned trees cached per worker (least recently used evicted)
+
+    Returns:
+        DisambiguationContext
+    """
+    from src.phylo.species_mapping import read_taxid_mapping
+    from src.phylo.tree_utils import load_tree
+
+    positions_by_gene, entries_by_gene = index_caas_metadata(Path(caas_metadata_path))
+
+    trait_pairs: Dict[int, List[Tuple[str, str]]] = {}
+    if trait_file_path:
+        trait_pairs = parse_trait_pairs(Path(trait_file_path))
+
+    taxid_mapping = None
+    if taxid_mapping_path and Path(taxid_mapping_path).exists():
+        taxid_mapping = read_taxid_mapping(Path(taxid_mapping_path))
+
+    tree = None
+    tree_cache = None
+    if tree_file and Path(tree_file).exists():
+        tree = load_tree(Path(tree_file))
+        tree_cache = PrunedTreeCache(tree, max_entries=tree_cache_size)
+
+    logger.info(
+        "Disambiguation context: %d genes with CAAS, %d trait contrasts, taxids=%s, tree=%s",
+        len(entries_by_gene),
+        len(trait_pairs),
+        len(taxid_mapping) if taxid_mapping is not None else "none",
+        "loaded" if tree is not None else "none",
+    )
+    return DisambiguationContext(
+        positions_by_gene=positions_by_gene,
+        entries_by_gene=entries_by_gene,
+        trait_pairs=trait_pairs,
+        taxid_mapping=taxid_mapping,
+        tree=tree,
+        tree_cache=tree_cache,
+    )
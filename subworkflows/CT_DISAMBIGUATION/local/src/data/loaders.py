@@ -10,6 +10,7 @@ Workflow
 --------
 1. **read_caas_metadata_table**: Load CAAS metadata from file, normalize columns, filter by gene if specified
 2. **list_gene_caas_positions**: Extract all CAAS positions for a gene from metadata
+   (**index_caas_metadata** does the same for every gene in one read)
 3. **get_caas_position_info**: Retrieve metadata for a single CAAS position
 4. **build_caas_positions_map**: Build CAASPosition objects for selected positions
 5. **parse_trait_pairs**: Parse trait file into species pairs grouped by contrast
@@ -242,6 +243,61 @@ def list_gene_caas_positions(caas_metadata_path: Path, gene: str) -> List[int]:
     return sorted(set(positions))
 
 
+def _caas_entry_from_row(row: pd.Series) -> Optional[CAASPosition]:
+    """Build one CAASPosition from a metadata row; None when it has no usable position."""
+    gene_pos = str(row.get("GenePos", ""))
+    _, pos0 = _parse_gene_pos_token(gene_pos)
+    if pos0 is None:
+        pos_raw = row.get("Position")
+        if pd.notna(pos_raw):
+            try:
+                pos0 = int(pos_raw) - 1
+            except Exception:
+                pos0 = None
+    if pos0 is None:
+        return None
+
+    caas = str(row.get("AminoConv", "") or "")
+    parts = caas.split("/") if caas else []
+    trait1 = normalize_amino_list(list(parts[0])) if len(parts) == 2 else []
+    trait0 = normalize_amino_list(list(parts[1])) if len(parts) == 2 else []
+
+    def _b(v: Any) -> bool:
+        if isinstance(v, bool):
+            return v
+        if v is None:
+            return False
+        return str(v).strip().lower() in {"true", "1", "yes", "y"}
+
+    return CAASPosition(
+        position=pos0,
+        position_zero_based=pos0,
+        position_one_based=pos0 + 1,
+        tag=str(row.get("Tag", f"POS{pos0}")),
+        caas=caas,
+        trait1_aa=trait1,
+        trait0_aa=trait0,
+        pvalue=(
+            float(row["Pvalue"])
+            if "Pvalue" in row.index and pd.notna(row["Pvalue"])
+            else None
+        ),
+        pvalue_boot=(
+            float(row["Pvalue.boot"])
+            if "Pvalue.boot" in row.index and pd.notna(row["Pvalue.boot"])
+            else None
+        ),
+        is_significant=_b(row.get("isSignificant")),
+        caap_group=str(row.get("CAAP_Group", "US") or "US"),
+        amino_encoded=str(row.get("AminoEncoded", "") or ""),
+        is_conserved_meta=_b(row.get("IsConserved")),
+        conserved_pair=_parse_conserved_pair(str(row.get("ConservedPair", "") or "")),
+        sig_hyp=_b(row.get("sig_hyp")) if pd.notna(row.get("sig_hyp")) else None,
+        sig_perm=_b(row.get("sig_perm")) if pd.notna(row.get("sig_perm")) else None,
+        sig_both=_b(row.get("sig_both")) if pd.notna(row.get("sig_both")) else None,
+    )
+
+
 def list_gene_caas_entries(caas_metadata_path: Path, gene: str) -> List[CAASPosition]:
     """
     Load CAAS metadata rows for a gene as independent CAASPosition entries.
@@ -254,63 +310,57 @@ def list_gene_caas_entries(caas_metadata_path: Path, gene: str) -> List[CAASPosi
 
     entries: List[CAASPosition] = []
     for _, row in df.iterrows():
-        gene_pos = str(row.get("GenePos", ""))
-        _, pos0 = _parse_gene_pos_token(gene_pos)
-        if pos0 is None:
-            pos_raw = row.get("Position")
-            if pd.notna(pos_raw):
-                try:
-                    pos0 = int(pos_raw) - 1
-                except Exception:
-                    pos0 = None
-        if pos0 is None:
-            continue
-
-        caas = str(row.get("AminoConv", "") or "")
-        parts = caas.split("/") if caas else []
-        trait1 = normalize_amino_list(list(parts[0])) if len(parts) == 2 else []
-        trait0 = normalize_amino_list(list(parts[1])) if len(parts) == 2 else []
-
-        def _b(v: Any) -> bool:
-            if isinstance(v, bool):
-                return v
-            if v is None:
-                return False
-            return str(v).strip().lower() in {"true", "1", "yes", "y"}
-
-        entry = CAASPosition(
-            position=pos0,
-            position_zero_based=pos0,
-            position_one_based=pos0 + 1,
-            tag=str(row.get("Tag", f"POS{pos0}")),
-            caas=caas,
-            trait1_aa=trait1,
-            trait0_aa=trait0,
-            pvalue=(
-                float(row["Pvalue"])
-                if "Pvalue" in row.index and pd.notna(row["Pvalue"])
-                else None
-            ),
-            pvalue_boot=(
-                float(row["Pvalue.boot"])
-                if "Pvalue.boot" in row.index and pd.notna(row["Pvalue.boot"])
-                else None
-            ),
-            is_significant=_b(row.get("isSignificant")),
-            caap_group=str(row.get("CAAP_Group", "US") or "US"),
-            amino_encoded=str(row.get("AminoEncoded", "") or ""),
-            is_conserved_meta=_b(row.get("IsConserved")),
-            conserved_pair=_parse_conserved_pair(str(row.get("ConservedPair", "") or "")),
-            sig_hyp=_b(row.get("sig_hyp")) if pd.notna(row.get("sig_hyp")) else None,
-            sig_perm=_b(row.get("sig_perm")) if pd.notna(row.get("sig_perm")) else None,
-            sig_both=_b(row.get("sig_both")) if pd.notna(row.get("sig_both")) else None,
-        )
-        entries.append(entry)
+        entry = _caas_entry_from_row(row)
+        if entry is not None:
+            entries.append(entry)
 
     logger.info("Loaded %d metadata rows for %s", len(entries), gene)
     return entries
 
 
+def index_caas_metadata(
+    caas_metadata_path: Path,
+) -> Tuple[Dict[str, List[int]], Dict[str, List[CAASPosition]]]:
+    """
+    Read the CAAS metadata once and index it by gene.
+
+    Returns ``(positions_by_gene, entries_by_gene)`` where each value equals what
+    :func:`list_gene_caas_positions` / :func:`list_gene_caas_entries` return for
+    that gene. Genes absent from the metadata are absent from both dicts.
+    """
+    df = read_caas_metadata_table(caas_metadata_path)
+
+    positions: Dict[str, Set[int]] = defaultdict(set)
+    entries: Dict[str, List[CAASPosition]] = defaultdict(list)
+    has_gene_col = "Gene" in df.columns
+
+    for _, row in df.iterrows():
+        gene_pos = row["GenePos"]
+        parsed_gene, pos = _parse_gene_pos_token(gene_pos)
+        if has_gene_col:
+            genes = [str(row["Gene"])]
+        else:
+            # Same rows read_caas_metadata_table() selects with GenePos.startswith(f"{gene}_")
+            token = str(gene_pos)
+            genes = [token[:i] for i, ch in enumerate(token) if ch == "_"]
+
+        for gene in genes:
+            if parsed_gene == gene and pos is not None:
+                positions[gene].add(pos)
+            entry = _caas_entry_from_row(row)
+            if entry is not None:
+                entries[gene].append(entry)
+
+    positions_by_gene = {gene: sorted(pos_set) for gene, pos_set in positions.items()}
+    logger.info(
+        "Indexed CAAS metadata from %s: %d genes, %d rows",
+        caas_metadata_path,
+        len(entries),
+        len(df),
+    )
+    return positions_by_gene, dict(entries)
+
+
 def get_caas_position_info(
     metadata_file: Path, gene_name: str, position: int
 ) -> Optional[Dict[str, Any]]:
@@ -11,6 +11,7 @@ from .tree_utils import (
     build_tree_node_mapping,
     extract_tip_labels,
 )
+from .tree_cache import CompactTree, PrunedTreeCache
 from .species_mapping import (
     read_taxid_mapping,
     validate_taxids_in_tree,
@@ -18,6 +19,8 @@ from .species_mapping import (
 )
 
 __all__ = [
+    "CompactTree",
+    "PrunedTreeCache",
     "load_tree",
     "prune_tree",
     "label_nodes",
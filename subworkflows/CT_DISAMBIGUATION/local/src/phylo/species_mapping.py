@@ -7,7 +7,7 @@ to numeric taxon IDs (used in phylogenetic trees).
 
 import logging
 from pathlib import Path
-from typing import Dict, List, Tuple, Set
+from typing import Dict, List, Optional, Tuple, Set
 from collections import defaultdict
 
 import pandas as pd
@@ -15,6 +15,7 @@ from Bio.Align import MultipleSeqAlignment
 from Bio.Phylo.BaseTree import Tree
 from Bio.SeqRecord import SeqRecord
 
+from src.phylo.tree_cache import PrunedTreeCache
 from src.phylo.tree_utils import prune_tree
 
 logger = logging.getLogger(__name__)
@@ -124,6 +125,7 @@ def match_tree_alignment_by_taxid(
     tree: Tree,
     alignment: MultipleSeqAlignment,
     tax_mapping: Dict[str, str],
+    tree_cache: Optional[PrunedTreeCache] = None,
 ) -> Tuple[
     Tree,
     MultipleSeqAlignment,
@@ -144,6 +146,8 @@ def match_tree_alignment_by_taxid(
         tree: Input phylogenetic tree
         alignment: Input multiple sequence alignment
         tax_mapping: Dict mapping species_name → tax_id
+        tree_cache: Optional PrunedTreeCache of ``tree``; pruned topologies are
+            reused across genes with the same species set
 
     Returns:
         Tuple of:
@@ -160,7 +164,10 @@ def match_tree_alignment_by_taxid(
 
     logger.info("Matching tree and alignment species using tax_id mapping...")
 
-    tree_species = {tip.name for tip in tree.get_terminals()}
+    if tree_cache is not None:
+        tree_species = set(tree_cache.tip_names)
+    else:
+        tree_species = {tip.name for tip in tree.get_terminals()}
     aln_species = {rec.id for rec in alignment}
 
     tree_sp_to_taxid: Dict[str, str] = {}
@@ -339,10 +346,11 @@ def match_tree_alignment_by_taxid(
         tree_taxid_to_sp[taxid] for taxid in common_taxids if taxid in tree_taxid_to_sp
     ]
 
-    pruned_tree = prune_tree(tree, species_to_keep_in_tree)
+    pruned_tree = prune_tree(tree, species_to_keep_in_tree, cache=tree_cache)
     logger.info("Pruned tree to %d species", len(species_to_keep_in_tree))
 
-    for tip in pruned_tree.get_terminals():
+    pruned_terminals = pruned_tree.get_terminals()
+    for tip in pruned_terminals:
         original_name = tip.name
         if original_name in tree_sp_to_taxid:
             tip.name = tree_sp_to_taxid[original_name]
@@ -384,7 +392,7 @@ def match_tree_alignment_by_taxid(
     filtered_alignment = MultipleSeqAlignment(filtered_records)
     logger.info("Filtered alignment to %d sequences", len(filtered_records))
 
-    tree_terminal_count = len(pruned_tree.get_terminals())
+    tree_terminal_count = len(pruned_terminals)
     aln_seq_count = len(filtered_alignment)
 
     if tree_terminal_count != aln_seq_count:
@@ -0,0 +1,233 @@
+"""
+Compact Species Tree and Pruned-Subtree Cache
+=============================================
+
+Every gene of a disambiguation run is matched against the same species tree,
+pruned to the species present in its alignment. Pruning a BioPython tree
+(``copy.deepcopy`` plus one ``Tree.prune`` search per removed species) was the
+bulk of per-gene tree preparation, and many genes share the same species set.
+
+:class:`CompactTree` stores a tree as parallel arrays in preorder
+(``parent[i]`` is the index of node ``i``'s parent, -1 at the root), so it is
+cheap to pickle to workers and prunes in linear time.
+:class:`PrunedTreeCache` keeps the master tree in that form and caches pruned
+topologies keyed by the frozenset of kept species (least recently used
+entries are evicted). Each call materializes a fresh BioPython tree, so
+callers may relabel or modify it.
+
+Pruning follows ``Bio.Phylo`` semantics: internal nodes left with a single
+child (the root included) are collapsed into that child, whose branch length
+absorbs theirs.
+
+Usage Example
+-------------
+::
+
+    cache = PrunedTreeCache(load_tree(Path("species.nwk")), max_entries=128)
+    pruned = cache.pruned(["Homo_sapiens", "Pan_troglodytes", "Mus_musculus"])
+    print(cache.hits, cache.misses)
+
+Author
+------
+Miguel Ramon Alonso
+Evolutionary Genomics Lab - IBE-UPF
+
+Date
+----
+2026-10
+"""
+
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import AbstractSet, FrozenSet, Iterable, List, Optional
+
+from Bio.Phylo import Newick
+from Bio.Phylo.BaseTree import Tree
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRUNED_TREE_CACHE_SIZE = 128
+
+
+@dataclass
+class CompactTree:
+    """Parent-array form of a tree; nodes are in preorder, so ``parent[i] < i``."""
+
+    parent: List[int]
+    names: List[Optional[str]]
+    branch_lengths: List[Optional[float]]
+    confidences: List[Optional[float]] = field(default_factory=list)
+    comments: List[Optional[str]] = field(default_factory=list)
+    rooted: bool = False
+    weight: float = 1.0
+
+    @classmethod
+    def from_phylo(cls, tree: Tree) -> "CompactTree":
+        """Convert a BioPython tree (left untouched)."""
+        compact = cls([], [], [], [], [], bool(getattr(tree, "rooted", False)))
+        compact.weight = getattr(tree, "weight", 1.0)
+        stack = [(tree.root, -1)]
+        while stack:
+            clade, parent_idx = stack.pop()
+            idx = len(compact.parent)
+            compact.parent.append(parent_idx)
+            compact.names.append(clade.name)
+            compact.branch_lengths.append(clade.branch_length)
+            compact.confidences.append(getattr(clade, "confidence", None))
+            compact.comments.append(getattr(clade, "comment", None))
+            for child in reversed(clade.clades):
+                stack.append((child, idx))
+        return compact
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def _n_children(self) -> List[int]:
+        counts = [0] * len(self.parent)
+        for parent_idx in self.parent[1:]:
+            counts[parent_idx] += 1
+        return counts
+
+    def tip_names(self) -> List[Optional[str]]:
+        """Names of the terminal nodes, in preorder."""
+        counts = self._n_children()
+        return [name for name, n in zip(self.names, counts) if n == 0]
+
+    def prune(self, keep: AbstractSet[str]) -> "CompactTree":
+        """
+        Keep only the terminals named in ``keep`` (``Bio.Phylo`` pruning semantics).
+
+        Args:
+            keep: Terminal names to retain
+
+        Returns:
+            New CompactTree
+
+        Raises:
+            ValueError: If no terminal of the tree is in ``keep``
+        """
+        n = len(self.parent)
+        n_children = self._n_children()
+        kept_children = [0] * n
+        kept = [False] * n
+        for idx in range(n - 1, -1, -1):
+            if n_children[idx] == 0:
+                kept[idx] = self.names[idx] in keep
+            else:
+                kept[idx] = kept_children[idx] > 0
+            if kept[idx] and idx > 0:
+                kept_children[self.parent[idx]] += 1
+        if not kept[0]:
+            raise ValueError("No terminal of the tree is in the species to keep")
+
+        def collapsed(idx: int) -> bool:
+            # Lost children and left with one: replaced by its only child
+            return kept_children[idx] == 1 and n_children[idx] > 1
+
+        # The root moves down while it is left with a single child
+        root = 0
+        root_carried = 0.0
+        while collapsed(root):
+            root_carried += self.branch_lengths[root] or 0.0
+            root = next(
+                child
+                for child in range(root + 1, n)
+                if self.parent[child] == root and kept[child]
+            )
+
+        out = CompactTree([], [], [], [], [], self.rooted, self.weight)
+        # Original index -> output index of the node itself or, for collapsed
+        # nodes, of their nearest surviving ancestor
+        anchor = {}
+        # Summed branch lengths of collapsed chains, added to the surviving child
+        carried = {}
+        for idx in range(root, n):
+            if not kept[idx]:
+                continue
+            branch_length = self.branch_lengths[idx]
+            if idx == root:
+                parent_out = -1
+                extra = root_carried
+            else:
+                parent_idx = self.parent[idx]
+                if parent_idx not in anchor:
+                    continue  # outside the subtree of the new root
+                extra = carried.get(parent_idx, 0.0)
+                if collapsed(idx):
+                    anchor[idx] = anchor[parent_idx]
+                    carried[idx] = extra + (branch_length or 0.0)
+                    continue
+                parent_out = anchor[parent_idx]
+            if branch_length is not None:
+                branch_length += extra
+
+            anchor[idx] = len(out.parent)
+            out.parent.append(parent_out)
+            out.names.append(self.names[idx])
+            out.branch_lengths.append(branch_length)
+            out.confidences.append(self.confidences[idx])
+            out.comments.append(self.comments[idx])
+        return out
+
+    def to_phylo(self) -> Tree:
+        """Materialize a new ``Bio.Phylo.Newick.Tree``."""
+        clades = []
+        for idx, parent_idx in enumerate(self.parent):
+            clade = Newick.Clade(
+                branch_length=self.branch_lengths[idx],
+                name=self.names[idx],
+                confidence=self.confidences[idx],
+                comment=self.comments[idx],
+            )
+            clades.append(clade)
+            if parent_idx >= 0:
+                clades[parent_idx].clades.append(clade)
+        return Newick.Tree(root=clades[0], rooted=self.rooted, weight=self.weight)
+
+
+class PrunedTreeCache:
+    """Master species tree in compact form plus an LRU cache of pruned topologies."""
+
+    def __init__(
+        self,
+        tree: Tree,
+        max_entries: int = DEFAULT_PRUNED_TREE_CACHE_SIZE,
+    ):
+        self.master = CompactTree.from_phylo(tree)
+        self.tip_names: FrozenSet[Optional[str]] = frozenset(self.master.tip_names())
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._pruned: "OrderedDict[FrozenSet[str], CompactTree]" = OrderedDict()
+
+    def full_tree(self) -> Tree:
+        """Fresh BioPython copy of the unpruned master tree."""
+        return self.master.to_phylo()
+
+    def pruned(self, species_to_keep: Iterable[str]) -> Tree:
+        """
+        Fresh BioPython tree pruned to ``species_to_keep``.
+
+        Raises:
+            ValueError: If no species of the tree is in ``species_to_keep``
+        """
+        key = frozenset(species_to_keep) & self.tip_names
+        compact = self._pruned.get(key)
+        if compact is not None:
+            self.hits += 1
+            self._pruned.move_to_end(key)
+        else:
+            self.misses += 1
+            compact = self.master if key == self.tip_names else self.master.prune(key)
+            self._pruned[key] = compact
+            if len(self._pruned) > self.max_entries:
+                self._pruned.popitem(last=False)
+        return compact.to_phylo()
+
+    def __getstate__(self):
+        # Workers start with an empty cache
+        state = dict(self.__dict__)
+        state["_pruned"] = OrderedDict()
+        state["hits"] = state["misses"] = 0
+        return state
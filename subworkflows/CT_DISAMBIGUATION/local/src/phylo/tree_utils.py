@@ -23,6 +23,7 @@ from Bio.Phylo.BaseTree import Tree, Clade
 logger = logging.getLogger(__name__)
 
 from src.asr.tree_parser import build_node_mapping, get_tip_labels
+from src.phylo.tree_cache import CompactTree, PrunedTreeCache
 
 
 def has_polytomies(tree: Tree) -> bool:
@@ -63,13 +64,22 @@ def load_tree(tree_file: Path, format: str = "newick") -> Tree:
         raise ValueError(f"Failed to load tree from {tree_file}: {e}")
 
 
-def prune_tree(tree: Tree, species_to_keep: List[str]) -> Tree:
+def prune_tree(
+    tree: Tree,
+    species_to_keep: List[str],
+    cache: Optional[PrunedTreeCache] = None,
+) -> Tree:
     """
     Prune tree to keep only specified species.
 
+    Pruning runs on the parent-array form of the tree (linear time, no deep
+    copy); with a ``cache`` of the same tree, pruned topologies are reused
+    across calls with the same species set.
+
     Args:
         tree: BioPython Tree object
         species_to_keep: List of species names to retain
+        cache: Optional PrunedTreeCache built from ``tree``
 
     Returns:
         Pruned Tree object (new copy)
@@ -77,13 +87,11 @@ def prune_tree(tree: Tree, species_to_keep: List[str]) -> Tree:
     Raises:
         ValueError: If no species match or all species would be removed
     """
-    import copy
-
-    # Create a deep copy to avoid modifying original
-    pruned_tree = copy.deepcopy(tree)
-
     # Get all terminal names
-    all_terminals = {term.name for term in pruned_tree.get_terminals()}
+    if cache is not None:
+        all_terminals = set(cache.tip_names)
+    else:
+        all_terminals = {term.name for term in tree.get_terminals()}
     species_set = set(species_to_keep)
 
     # Check overlap
@@ -97,19 +105,19 @@ def prune_tree(tree: Tree, species_to_keep: List[str]) -> Tree:
     # Species to remove
     to_remove = all_terminals - species_set
 
+    if cache is not None:
+        pruned_tree = cache.pruned(matching_species)
+    elif not to_remove:
+        pruned_tree = CompactTree.from_phylo(tree).to_phylo()
+    else:
+        pruned_tree = CompactTree.from_phylo(tree).prune(matching_species).to_phylo()
+
     if not to_remove:
         logger.debug("No pruning needed, all species already in tree")
         return pruned_tree
 
-    # Prune terminals
-    for species in to_remove:
-        try:
-            pruned_tree.prune(species)
-        except Exception as e:
-            logger.warning(f"Failed to prune {species}: {e}")
-
     logger.info(
-        f"Pruned tree from {len(all_terminals)} to {pruned_tree.count_terminals()} species "
+        f"Pruned tree from {len(all_terminals)} to {len(matching_species)} species "
         f"({len(matching_species)} kept, {len(to_remove)} removed)"
     )
 
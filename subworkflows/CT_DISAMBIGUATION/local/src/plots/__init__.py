@@ -1,9 +1,15 @@
 """Public plotting exports for bulk and per-gene visualizations."""
 
 from .bulk_plots import generate_bulk_plots
-from .gene_trees_bulk import create_gene_tree_state_plot
+from .gene_trees_bulk import (
+    GeneTreeSuite,
+    create_gene_tree_state_plot,
+    plot_gene_tree_suites,
+)
 
 __all__ = [
+    "GeneTreeSuite",
     "create_gene_tree_state_plot",
     "generate_bulk_plots",
+    "plot_gene_tree_suites",
 ]
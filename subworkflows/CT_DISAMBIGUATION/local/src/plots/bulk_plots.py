@@ -38,7 +38,12 @@ from typing import Optional
 import pandas as pd
 import matplotlib.pyplot as plt
 
-from src.plots.gene_trees_bulk import plot_random_gene_trees
+from src.asr.node_dump import node_dump_path
+from src.plots.gene_trees_bulk import (
+    GENE_TREE_SELECTIONS,
+    GeneTreeSuite,
+    plot_gene_tree_suites,
+)
 
 from src.plots.plot_utils import (
     load_df,
@@ -66,8 +71,8 @@ def _generate_plot_suite(
     asr_root: Path,
     node_dumps_root: Path,
     tip_details_root: Path,
-):
-    """Generate the full suite of bulk plots."""
+) -> GeneTreeSuite:
+    """Prepare the full suite of bulk plots (rendered later, with every other suite)."""
     # Gene trees
     gene_trees_dir = output_dir / "gene_tree_samples"
     # Provide additional per-gene debug logging so users can see why gene trees
@@ -85,7 +90,9 @@ def _generate_plot_suite(
                     tree_path = None
                     logger.debug("find_tree_file raised for %s: %s", g, e)
 
-                post_path = node_dumps_root / f"{str(g).lower()}_posteriors.jsonl"
+                post_path = node_dump_path(node_dumps_root, str(g))
+                if not post_path.exists():
+                    post_path = node_dumps_root / f"{str(g).lower()}_posteriors.jsonl"
                 logger.debug(
                     "Gene %s: tree=%s posteriors=%s",
                     g,
@@ -102,14 +109,7 @@ def _generate_plot_suite(
     except Exception as exc:  # defensive - don't stop plotting on logging failure
         logger.debug("Could not emit per-gene debug info: %s", exc)
 
-    plot_random_gene_trees(
-        df,
-        gene_trees_dir,
-        asr_root=asr_root,
-        node_dumps_root=node_dumps_root,
-        tip_details_root=tip_details_root,
-        n=n_gene_trees,
-    )
+    return GeneTreeSuite(df, gene_trees_dir, n_gene_trees)
 
 
 def generate_bulk_plots(
@@ -121,8 +121,17 @@ def generate_bulk_plots(
     asr_root: Optional[Path] = None,
     node_dumps_root: Optional[Path] = None,
     tip_details_root: Optional[Path] = None,
+    workers: Optional[int] = None,
+    selection: str = "random",
+    thumbnails: bool = False,
 ):
-    """Generate comprehensive bulk plots from CAAS aggregation outputs."""
+    """Generate comprehensive bulk plots from CAAS aggregation outputs.
+
+    The significant and (optional) all suites are rendered through one process pool
+    of ``workers`` Agg plotting processes (None: available CPUs). ``selection`` picks
+    ``n_gene_trees`` random positions or the ``top`` ones by p-value; ``thumbnails``
+    also writes low-DPI PNG copies of the gene trees.
+    """
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
 
@@ -165,14 +174,16 @@ def generate_bulk_plots(
     significant_dir = output_dir / "significant"
     significant_dir.mkdir(parents=True, exist_ok=True)
     logger.info("Generating plots for significant results in %s...", significant_dir)
-    _generate_plot_suite(
-        df_significant,  # type : ignore
-        significant_dir,
-        n_gene_trees,
-        asr_root,
-        node_dumps_root,
-        tip_details_root,
-    )
+    suites = [
+        _generate_plot_suite(
+            df_significant,  # type : ignore
+            significant_dir,
+            n_gene_trees,
+            asr_root,
+            node_dumps_root,
+            tip_details_root,
+        )
+    ]
 
     # If requested, also generate plots for ALL results in 'all' subdirectory
     if include_non_significant:
@@ -182,15 +193,27 @@ def generate_bulk_plots(
             "Generating plots for all results (including non-significant) in %s...",
             all_dir,
         )
-        _generate_plot_suite(
-            df_full,
-            all_dir,
-            n_gene_trees,
-            asr_root,
-            node_dumps_root,
-            tip_details_root,
+        suites.append(
+            _generate_plot_suite(
+                df_full,
+                all_dir,
+                n_gene_trees,
+                asr_root,
+                node_dumps_root,
+                tip_details_root,
+            )
         )
-        
+
+    plot_gene_tree_suites(
+        suites,
+        asr_root=asr_root,
+        node_dumps_root=node_dumps_root,
+        tip_details_root=tip_details_root,
+        workers=workers,
+        selection=selection,
+        thumbnails=thumbnails,
+    )
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -209,6 +232,23 @@ def main():
     parser.add_argument(
         "--n-gene-trees", type=int, default=5, help="Number of gene trees to plot"
     )
+    parser.add_argument(
+        "--selection",
+        choices=GENE_TREE_SELECTIONS,
+        default="random",
+        help="Gene tree positions: random sample or top N by p-value (default: random)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Plotting processes (default: available CPUs)",
+    )
+    parser.add_argument(
+        "--thumbnails",
+        action="store_true",
+        help="Also write low-DPI PNG thumbnails of the gene trees",
+    )
 
     parser.add_argument("--debug", action="store_true", help="Enable debug logging")
 
@@ -225,6 +265,9 @@ def main():
         args.output_dir,
         args.include_non_significant,
         args.n_gene_trees,
+        workers=args.workers,
+        selection=args.selection,
+        thumbnails=args.thumbnails,
     )
 
 
@@ -1,78 +1,329 @@
 #!/usr/bin/env python3
+"""
+Gene tree state plots for sampled CAAS positions.
+
+Rendering is split into planning and drawing: the parent process picks the
+(gene, position) jobs, attaches node posteriors and tip details, and fans the
+jobs out over a process pool whose workers force the Agg backend. Each worker
+caches the tree layout (node coordinates and edge segments) per gene, so every
+further position of the same gene only draws its annotations.
+
+Usage Example
+-------------
+::
+
+    plot_random_gene_trees(df, Path("plots_bulk/significant/gene_tree_samples"),
+                           asr_root, node_dumps_root, tip_details_root,
+                           n=20, selection="top", workers=4, thumbnails=True)
+
+Author
+------
+Miguel Ramon Alonso
+Evolutionary Genomics Lab - IBE-UPF
+
+Date
+----
+2026-10
+"""
 
 from pathlib import Path
 import logging
+import os
 import pandas as pd
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
 from collections import defaultdict
+from dataclasses import dataclass
 import json
 
 import matplotlib
 
 matplotlib.use("Agg")  # Use non-interactive backend
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 
 from src.plots.plot_utils import build_result_from_row, find_tree_file
 from src.asr.tree_parser import build_node_mapping
+from src.asr.node_dump import NODE_DUMP_SUFFIX, NodePosteriorDump, node_dump_path
 
 logger = logging.getLogger(__name__)
 
 HAS_MATPLOTLIB = True
 HAS_SEABORN = True
 
+GENE_TREE_SELECTIONS = ("random", "top")
+PLOT_DPI = 300
+THUMBNAIL_DPI = 48
+THUMBNAIL_DIRNAME = "thumbnails"
 
-def plot_random_gene_trees(
-    df: pd.DataFrame,
-    output_dir: Path,
-    asr_root: Path,
-    node_dumps_root: Path,
-    tip_details_root: Path,
-    n: int = 5,
-):
-    """Render gene tree plots for N random positions using existing ASR outputs."""
-    if df.empty:
-        logger.warning("No rows available for gene tree plotting")
-        return
 
-    # Check for required columns
-    if "gene" not in df.columns:
-        logger.warning("No 'gene' column in dataframe; skipping gene tree plots")
-        return
-    if "position" not in df.columns and "msa_pos" not in df.columns:
-        logger.warning(
-            "No 'position' or 'msa_pos' column in dataframe; skipping gene tree plots"
-        )
-        return
+@dataclass
+class TreeLayout:
+    """Drawing coordinates of a gene tree, shared by every position of the gene."""
 
-    output_dir = Path(output_dir)
-    output_dir.mkdir(parents=True, exist_ok=True)
+    root: Any
+    positions_by_node: Dict[object, Tuple[float, float]]
+    positions: Dict[int, Tuple[float, float]]
+    edges: List[Tuple[Tuple[float, float], Tuple[float, float]]]
+    leaf_count: int
+    max_x: float
 
-    # Cache per-gene result entries assembled from CSV rows
-    gene_results_cache: Dict[str, list] = {}
-    gene_posteriors_cache: Dict[str, Optional[Dict]] = {}
+
+@dataclass
+class GeneTreeSuite:
+    """Rows to sample gene tree plots from and where to write up to ``n`` of them."""
+
+    df: pd.DataFrame
+    output_dir: Path
+    n: int = 5
+
+
+@dataclass
+class GeneTreeJob:
+    """One gene tree plot: results of the position with their posteriors and tip details."""
+
+    gene: str
+    position: int
+    results: List[Dict[str, Any]]
+    tree_file: Path
+    output_dir: Path
+    thumbnails: bool = False
+    suite: int = 0
+
+
+# Per-process layout cache keyed by (rst path, mtime_ns)
+_LAYOUT_CACHE: Dict[Tuple[str, int], TreeLayout] = {}
+
+
+def compute_tree_layout(rst_file: Path) -> TreeLayout:
+    """
+    Lay out the PAML tree of ``rst_file`` (leaves on integer rows, depth on x).
+
+    Raises:
+        Exception: Any error raised while parsing the RST tree
+    """
+    # Build tree with PAML node IDs from RST (consistent with analysis)
+    ordered_nodes, _ = build_node_mapping(rst_file=rst_file)
+    root = ordered_nodes[-1]  # Last node in postorder is root
+
+    # Use node object as key to handle leaves (which have node_id=None)
+    positions_by_node: Dict[object, Tuple[float, float]] = {}
+    leaf_counter = [0]
+
+    def layout(node, depth=0):
+        if node.is_leaf():
+            y = leaf_counter[0]
+            leaf_counter[0] += 1
+        else:
+            child_ys = [layout(child, depth + 1) for child in node.children]
+            y = sum(child_ys) / len(child_ys) if child_ys else leaf_counter[0]
+        positions_by_node[node] = (depth, y)
+        return y
+
+    layout(root, depth=0)
+
+    scale_factor = 1.2
+    for node, (x, y) in list(positions_by_node.items()):
+        positions_by_node[node] = (x * scale_factor, y)
+
+    # Build positions dict by node_id (only for nodes with IDs)
+    positions: Dict[int, Tuple[float, float]] = {
+        getattr(node, "node_id"): pos
+        for node, pos in positions_by_node.items()
+        if hasattr(node, "node_id") and getattr(node, "node_id") is not None
+    }
+
+    edges: List[Tuple[Tuple[float, float], Tuple[float, float]]] = []
+
+    def draw_edges(node):
+        for child in node.children:
+            edges.append((positions_by_node[node], positions_by_node[child]))
+            draw_edges(child)
+
+    draw_edges(root)
+
+    return TreeLayout(
+        root=root,
+        positions_by_node=positions_by_node,
+        positions=positions,
+        edges=edges,
+        leaf_count=max(leaf_counter[0], 1),
+        max_x=max(coord[0] for coord in positions_by_node.values()),
+    )
+
+
+def get_tree_layout(rst_file: Path) -> TreeLayout:
+    """Cached :func:`compute_tree_layout`; recomputed when the RST file changes."""
+    key = (str(Path(rst_file).resolve()), Path(rst_file).stat().st_mtime_ns)
+    tree_layout = _LAYOUT_CACHE.get(key)
+    if tree_layout is None:
+        tree_layout = _LAYOUT_CACHE[key] = compute_tree_layout(rst_file)
+    return tree_layout
+
+
+def _modal_state(aa_map: Dict[str, Any]) -> Tuple[Optional[str], float]:
+    best_aa = None
+    best_prob = -1.0
+    for aa, prob in aa_map.items():
+        try:
+            prob = float(prob)
+        except Exception:
+            continue
+        if prob > best_prob:
+            best_prob = prob
+            best_aa = aa
+    return best_aa, best_prob
+
+
+def _matches_position(result: Dict[str, Any], focus_position: int) -> bool:
+    pos0 = result.get("position")
+    pos1 = result.get("position_one_based")
+    return (pos0 is not None and pos0 == focus_position) or (
+        pos1 is not None and pos0 is not None and pos1 == focus_position + 1
+    )
+
+
+def _row_position(row: pd.Series) -> Optional[int]:
+    # Try both position and msa_pos columns
+    if "position" in row and pd.notna(row["position"]):
+        return int(row["position"])
+    if "msa_pos" in row and pd.notna(row["msa_pos"]):
+        return int(row["msa_pos"])
+    return None
+
+
+def _ordered_rows(df: pd.DataFrame, selection: str) -> pd.DataFrame:
+    """Rows in plotting order: shuffled (``random``) or most significant first (``top``)."""
+    if selection == "top":
+        keys = [col for col in ("pvalue", "pvalue_boot") if col in df.columns]
+        if keys:
+            ranked = df.assign(
+                **{f"__rank_{col}": pd.to_numeric(df[col], errors="coerce") for col in keys}
+            )
+            ranked = ranked.sort_values(
+                [f"__rank_{col}" for col in keys], kind="mergesort", na_position="last"
+            )
+            return ranked[df.columns]
+        logger.warning("No p-value column for top-N gene tree selection; sampling randomly")
+    # Shuffle all rows to improve chances, stop after n saved
+    return df.sample(frac=1, random_state=42)
+
+
+class _GeneTreeInputs:
+    """Per-gene inputs of the plot jobs (results, tree, posteriors, tip details), cached."""
+
+    def __init__(self, asr_root: Path, node_dumps_root: Path, tip_details_root: Path):
+        self.asr_root = asr_root
+        self.node_dumps_root = Path(node_dumps_root)
+        self.tip_details_root = Path(tip_details_root)
+        self._trees: Dict[str, Optional[Path]] = {}
+        self._posteriors: Dict[Tuple[str, int], Optional[Dict]] = {}
+        self._tips: Dict[str, Dict[Any, List[Dict[str, Any]]]] = {}
+        self._dumps: Dict[Path, NodePosteriorDump] = {}
+
+    def tree_file(self, gene: str) -> Optional[Path]:
+        if gene not in self._trees:
+            self._trees[gene] = find_tree_file(gene, self.asr_root)
+        return self._trees[gene]
+
+    def node_posteriors(
+        self, gene: str, pos: int, results: List[Dict[str, Any]]
+    ) -> Optional[Dict[str, Any]]:
+        # NOTE: dumps contain 1-based PAML positions, so convert from CAAS 0-based
+        if (gene, pos) not in self._posteriors:
+            # Try default node_dumps_root first
+            post = self._load_node_posteriors(gene, focus_pos=pos + 1)
+            # If missing, try to find explicit path in results (e.g., prior DB export added posterior_dump_path)
+            if not post:
+                dump_path = None
+                for r in results:
+                    if isinstance(r, dict) and (
+                        r.get("posterior_dump") or r.get("posterior_dump_jsonl")
+                    ):
+                        posterior_dump = r.get("posterior_dump") or r.get(
+                            "posterior_dump_jsonl"
+                        )
+                        if posterior_dump is not None:
+                            dump_path = Path(posterior_dump)
+                        break
+                if dump_path:
+                    post = self._load_node_posteriors(
+                        gene, focus_pos=pos + 1, explicit_path=dump_path
+                    )
+            self._posteriors[(gene, pos)] = post
+        return self._posteriors[(gene, pos)]
+
+    def tip_details(self, gene: str, pos: int) -> Optional[List[Dict[str, Any]]]:
+        """Tip detail records of one position (None if the gene has no tip details file).
+
+        The JSONL file (0-based CAAS positions) is read once per gene.
+        """
+        tip_jsonl_path = self.tip_details_root / f"{gene.lower()}_tip_details.jsonl"
+        if gene not in self._tips:
+            if not tip_jsonl_path.exists():
+                return None
+            by_position: Dict[Any, List[Dict[str, Any]]] = defaultdict(list)
+            try:
+                with open(tip_jsonl_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        try:
+                            obj = json.loads(line)
+                            by_position[obj.get("position")].append(obj)
+                        except Exception:
+                            continue
+            except Exception as e:
+                logger.debug(f"Failed to load tip details for {gene}: {e}")
+                return None
+            self._tips[gene] = by_position
+        return list(self._tips[gene].get(pos, []))
 
     def _load_node_posteriors(
-        gene: str, focus_pos: Optional[int] = None, explicit_path: Optional[Path] = None
+        self, gene: str, focus_pos: Optional[int] = None, explicit_path: Optional[Path] = None
     ) -> Optional[Dict[str, Any]]:
-        """Load per-node posterior states from JSONL for a gene.
+        """Load per-node posterior states for a gene from its node dump.
 
-        JSONL format expected: one JSON object per line: {"node_id": int, "positions": {"1": {"A":0.99}}}
+        Binary dumps (``{gene}_posteriors.bin``, see :mod:`src.asr.node_dump`) are read
+        for ``focus_pos`` only. Legacy JSONL dumps are scanned line by line:
+        one JSON object per line: {"node_id": int, "positions": {"1": {"A":0.99}}}
         Optional metadata line: {"__metadata__": {"node_id_map": {...}}}
         """
-        dump_path = Path(node_dumps_root) / f"{gene.lower()}_posteriors.jsonl"
+        dump_path = node_dump_path(self.node_dumps_root, gene)
+        if not dump_path.exists():
+            dump_path = self.node_dumps_root / f"{gene.lower()}_posteriors.jsonl"
         # Allow explicit per-gene dump path override (e.g., from DB alignment_extras)
         if explicit_path:
             dump_path = explicit_path
         if not dump_path.exists():
             return None
         # tip_details may be JSON or JSONL; try JSON first then JSONL
-        tip_jsonl_path = Path(tip_details_root) / f"{gene.lower()}_tip_details.jsonl"
+        tip_jsonl_path = self.tip_details_root / f"{gene.lower()}_tip_details.jsonl"
         if not tip_jsonl_path.exists():
             return None
 
-        import json
-
         per_node: Dict = {}
+        if dump_path.name.endswith(NODE_DUMP_SUFFIX):
+            try:
+                dump = self._dumps.get(dump_path)
+                if dump is None:
+                    dump = self._dumps[dump_path] = NodePosteriorDump.open(dump_path)
+                sites = [focus_pos] if focus_pos is not None else dump.sites.tolist()
+                for site in sites:
+                    for nid, aa_map in dump.site_posteriors(site).items():
+                        best_aa, best_prob = _modal_state(aa_map)
+                        if best_aa is not None:
+                            per_node[nid] = (best_aa, best_prob)
+                            per_node[str(nid)] = (best_aa, best_prob)
+            except Exception as err:
+                logger.debug("Failed to load node posteriors for %s: %s", gene, err)
+                return None
+            if per_node:
+                logger.info(
+                    f"Loaded node posterior dump for {gene}: {len(per_node)} nodes (including string keys)"
+                )
+                return {"per_node": per_node}
+            return None
+
         try:
             with open(dump_path, "r", encoding="utf-8") as handle:
                 for line in handle:
@@ -101,16 +352,7 @@ def plot_random_gene_trees(
                         # pick modal amino acid for this node/pos from aa_map
                         if not isinstance(aa_map, dict):
                             continue
-                        best_aa = None
-                        best_prob = -1.0
-                        for aa, prob in aa_map.items():
-                            try:
-                                prob = float(prob)
-                            except Exception:
-                                continue
-                            if prob > best_prob:
-                                best_prob = prob
-                                best_aa = aa
+                        best_aa, best_prob = _modal_state(aa_map)
                         if best_aa is not None:
                             per_node[nid] = (best_aa, best_prob)
                             per_node[str(nid)] = (best_aa, best_prob)
@@ -124,120 +366,232 @@ def plot_random_gene_trees(
             logger.debug("Failed to load node posteriors for %s: %s", gene, err)
             return None
 
-    saved = 0
-    # Shuffle all rows to improve chances, stop after n saved
-    for _, row in df.sample(frac=1, random_state=42).iterrows():
-        if saved >= n:
-            break
-
-        gene = str(row["gene"])
 
-        # Try both position and msa_pos columns
-        pos = None
-        if "position" in row and pd.notna(row["position"]):
-            pos = int(row["position"])
-        elif "msa_pos" in row and pd.notna(row["msa_pos"]):
-            pos = int(row["msa_pos"])
+def _plan_suite_jobs(
+    suite: GeneTreeSuite,
+    suite_index: int,
+    inputs: _GeneTreeInputs,
+    selection: str,
+    thumbnails: bool,
+) -> Iterator[GeneTreeJob]:
+    """Yield the plot jobs of a suite lazily, in selection order, one per (gene, position)."""
+    df = suite.df
+    rows_by_gene = {str(gene): rows for gene, rows in df.groupby(df["gene"].astype(str), sort=False)}
+    # Cache per-gene result entries assembled from CSV rows
+    gene_results_cache: Dict[str, list] = {}
+    seen = set()
 
-        if pos is None:
+    for _, row in _ordered_rows(df, selection).iterrows():
+        gene = str(row["gene"])
+        pos = _row_position(row)
+        if pos is None or (gene, pos) in seen:
             continue
+        seen.add((gene, pos))
 
         if gene not in gene_results_cache:
-            results: list = []
             # Build minimal candidates from aggregated CSV rows
-            for _, gene_row in df[df["gene"] == gene].iterrows():
+            results: list = []
+            for _, gene_row in rows_by_gene[gene].iterrows():
                 built = build_result_from_row(gene_row)
                 if built:
                     results.append(built)
-
             gene_results_cache[gene] = results
 
         results = gene_results_cache.get(gene) or []
         if not results:
             continue
 
-        tree_file = find_tree_file(gene, asr_root)
+        tree_file = inputs.tree_file(gene)
         if not tree_file:
             continue
 
-        # Load node posteriors from JSONL and attach to results
-        # NOTE: JSONL contains 1-based PAML positions, so convert from CAAS 0-based
-        if gene not in gene_posteriors_cache:
-            # Try default node_dumps_root first
-            post = _load_node_posteriors(
-                gene, focus_pos=pos + 1 if pos is not None else None
-            )
-            # If missing, try to find explicit path in results (e.g., prior DB export added posterior_dump_path)
-            if not post:
-                dump_path = None
-                for r in results:
-                    if isinstance(r, dict) and r.get("posterior_dump_jsonl"):
-                        posterior_dump = r.get("posterior_dump_jsonl")
-                        if posterior_dump is not None:
-                            dump_path = Path(posterior_dump)
-                        break
-                if dump_path:
-                    post = _load_node_posteriors(
-                        gene,
-                        focus_pos=pos + 1 if pos is not None else None,
-                        explicit_path=dump_path,
-                    )
-            gene_posteriors_cache[gene] = post
-
-        node_posteriors = gene_posteriors_cache[gene]
+        # Attach node posteriors and tip details to copies of this position's results
+        attached: Dict[str, Any] = {}
+        node_posteriors = inputs.node_posteriors(gene, pos, results)
         if node_posteriors:
-            for result in results:
-                result["node_posteriors"] = node_posteriors
+            attached["node_posteriors"] = node_posteriors
+
+        tip_details = inputs.tip_details(gene, pos)
+        if tip_details is not None:
+            # Optional light pre-flattening to help downstream code
+            flattened_pairs: List[Dict[str, Any]] = []
+            for rec in tip_details:
+                if isinstance(rec, dict) and "pair_details" in rec:
+                    flattened_pairs.extend(rec.get("pair_details") or [])
+            attached["tip_details"] = tip_details
+            if flattened_pairs:
+                attached["pair_details"] = flattened_pairs
+
+        yield GeneTreeJob(
+            gene=gene,
+            position=pos,
+            results=[dict(r, **attached) for r in results if _matches_position(r, pos)],
+            tree_file=tree_file,
+            output_dir=suite.output_dir,
+            thumbnails=thumbnails,
+            suite=suite_index,
+        )
 
-        # Load tip details from JSON and attach to results
-        # NOTE: JSONL contains 0-based CAAS positions
-        tip_jsonl_path = tip_details_root / f"{gene.lower()}_tip_details.jsonl"
-        if tip_jsonl_path.exists():
-            try:
-                tip_details = []
-                with open(tip_jsonl_path, "r", encoding="utf-8") as f:
-                    for line in f:
-                        if not line.strip():
-                            continue
-                        try:
-                            obj = json.loads(line)
-                            if obj.get("position") == pos:
-                                tip_details.append(obj)
-                        except Exception:
-                            continue
 
-                # Optional light pre-flattening to help downstream code
-                flattened_pairs: List[Dict[str, Any]] = []
-                if isinstance(tip_details, list):
-                    for rec in tip_details:
-                        if isinstance(rec, dict) and "pair_details" in rec:
-                            flattened_pairs.extend(rec.get("pair_details") or [])
-                elif isinstance(tip_details, dict):
-                    flattened_pairs = tip_details.get("pair_details") or []
+def _init_plot_worker() -> None:
+    """Pool initializer: force the non-interactive Agg backend, one thread per worker."""
+    os.environ["MPLBACKEND"] = "Agg"
+    os.environ["OMP_NUM_THREADS"] = "1"
+    matplotlib.use("Agg", force=True)
 
-                for result in results:
-                    result["tip_details"] = tip_details
-                    if flattened_pairs:
-                        result["pair_details"] = flattened_pairs
 
-            except Exception as e:
-                logger.debug(f"Failed to load tip details for {gene}: {e}")
+def _render_job(job: GeneTreeJob) -> Optional[Path]:
+    return create_gene_tree_state_plot(
+        results=job.results,
+        output_dir=job.output_dir,
+        gene_name=job.gene,
+        tree_file=job.tree_file,
+        focus_position=job.position,
+        thumbnails=job.thumbnails,
+    )
 
-        plot_path = create_gene_tree_state_plot(
-            results=results,
-            output_dir=output_dir,
-            gene_name=gene,
-            tree_file=tree_file,
-            focus_position=pos,
-        )
-        if plot_path:
-            saved += 1
-            logger.info("✓ Saved gene tree plot for %s:%s -> %s", gene, pos, plot_path)
 
-    if saved == 0:
+def _usable_suite(suite: GeneTreeSuite) -> bool:
+    df = suite.df
+    if df.empty:
+        logger.warning("No rows available for gene tree plotting")
+        return False
+
+    # Check for required columns
+    if "gene" not in df.columns:
+        logger.warning("No 'gene' column in dataframe; skipping gene tree plots")
+        return False
+    if "position" not in df.columns and "msa_pos" not in df.columns:
         logger.warning(
-            "Gene tree plotting skipped: no eligible genes with ASR details and tree files"
+            "No 'position' or 'msa_pos' column in dataframe; skipping gene tree plots"
         )
+        return False
+    return True
+
+
+def plot_gene_tree_suites(
+    suites: Sequence[GeneTreeSuite],
+    asr_root: Path,
+    node_dumps_root: Path,
+    tip_details_root: Path,
+    workers: Optional[int] = None,
+    selection: str = "random",
+    thumbnails: bool = False,
+) -> List[List[Path]]:
+    """
+    Render gene tree plots for several suites through one process pool.
+
+    Jobs are planned lazily per suite and kept in flight until each suite has ``n``
+    saved plots or runs out of candidates; posteriors and tip details are loaded
+    once per gene (or position) for all suites.
+
+    Args:
+        suites: Row sets and output directories (e.g. significant/ and all/)
+        asr_root: Root of the per-gene ASR outputs (tree_paml.nwk + rst)
+        node_dumps_root: Directory of the per-gene node posterior dumps
+        tip_details_root: Directory of the per-gene tip details JSONL files
+        workers: Plotting processes (None: available CPUs; 1: render in-process)
+        selection: ``random`` (shuffled rows) or ``top`` (lowest p-value first)
+        thumbnails: Also save low-DPI PNG thumbnails under ``thumbnails/``
+
+    Returns:
+        Saved plot paths per suite
+
+    Raises:
+        ValueError: If ``selection`` is unknown
+    """
+    if selection not in GENE_TREE_SELECTIONS:
+        raise ValueError(
+            f"Unknown gene tree selection '{selection}' (expected one of {GENE_TREE_SELECTIONS})"
+        )
+    from src.utils.concurrency import _cpu_available
+
+    saved: List[List[Path]] = [[] for _ in suites]
+    inputs = _GeneTreeInputs(asr_root, node_dumps_root, tip_details_root)
+    planners: Dict[int, Iterator[GeneTreeJob]] = {}
+    for index, suite in enumerate(suites):
+        if suite.n > 0 and _usable_suite(suite):
+            Path(suite.output_dir).mkdir(parents=True, exist_ok=True)
+            planners[index] = _plan_suite_jobs(suite, index, inputs, selection, thumbnails)
+
+    def _record(job: GeneTreeJob, plot_path: Optional[Path]) -> None:
+        if plot_path:
+            saved[job.suite].append(plot_path)
+            logger.info("✓ Saved gene tree plot for %s:%s -> %s", job.gene, job.position, plot_path)
+
+    def _next_job(index: int, in_flight: int) -> Optional[GeneTreeJob]:
+        if index not in planners or len(saved[index]) + in_flight >= suites[index].n:
+            return None
+        job = next(planners[index], None)
+        if job is None:
+            del planners[index]
+        return job
+
+    n_workers = max(1, workers if workers is not None else _cpu_available())
+    if n_workers == 1:
+        for index in list(planners):
+            while (job := _next_job(index, 0)) is not None:
+                try:
+                    _record(job, _render_job(job))
+                except Exception as exc:
+                    logger.warning(f"Gene tree plot failed for {job.gene}:{job.position}: {exc}")
+    else:
+        from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_plot_worker) as executor:
+            pending: Dict[Any, GeneTreeJob] = {}
+            in_flight = [0] * len(suites)
+            while True:
+                # Keep every worker busy, never queueing more than a suite still needs
+                progressed = True
+                while len(pending) < 2 * n_workers and progressed:
+                    progressed = False
+                    for index in list(planners):
+                        job = _next_job(index, in_flight[index])
+                        if job is not None:
+                            pending[executor.submit(_render_job, job)] = job
+                            in_flight[index] += 1
+                            progressed = True
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = pending.pop(future)
+                    in_flight[job.suite] -= 1
+                    try:
+                        _record(job, future.result())
+                    except Exception as exc:
+                        logger.warning(f"Gene tree plot failed for {job.gene}:{job.position}: {exc}")
+
+    for index, suite in enumerate(suites):
+        if suite.n > 0 and not saved[index]:
+            logger.warning(
+                "Gene tree plotting skipped: no eligible genes with ASR details and tree files"
+            )
+    return saved
+
+
+def plot_random_gene_trees(
+    df: pd.DataFrame,
+    output_dir: Path,
+    asr_root: Path,
+    node_dumps_root: Path,
+    tip_details_root: Path,
+    n: int = 5,
+    workers: Optional[int] = 1,
+    selection: str = "random",
+    thumbnails: bool = False,
+) -> List[Path]:
+    """Render gene tree plots for N random (or top-N most significant) positions using existing ASR outputs."""
+    return plot_gene_tree_suites(
+        [GeneTreeSuite(df, Path(output_dir), n)],
+        asr_root=asr_root,
+        node_dumps_root=node_dumps_root,
+        tip_details_root=tip_details_root,
+        workers=workers,
+        selection=selection,
+        thumbnails=thumbnails,
+    )[0]
 
 
 def create_gene_tree_state_plot(
@@ -246,9 +600,12 @@ def create_gene_tree_state_plot(
     gene_name: str,
     tree_file: Path,
     focus_position: Optional[int] = None,
+    thumbnails: bool = False,
 ) -> Optional[Path]:
     """
     Plot annotated gene tree for a specific position (or first available) using ASR states.
+
+    With ``thumbnails`` a low-DPI PNG copy is also saved under ``thumbnails/``.
     """
     if not HAS_MATPLOTLIB:
         logger.warning("Matplotlib not available, skipping gene tree plot")
@@ -258,17 +615,8 @@ def create_gene_tree_state_plot(
     if focus_position is not None:
         # First try to find a result with tip_details (JSON-loaded results are preferred)
         for r in results:
-            pos0 = r.get("position")
-            pos1 = r.get("position_one_based")
             if (
-                (
-                    (pos0 is not None and pos0 == focus_position)
-                    or (
-                        pos1 is not None
-                        and pos0 is not None
-                        and pos1 == focus_position + 1
-                    )
-                )
+                _matches_position(r, focus_position)
                 and r.get("node_mapping")
                 and r.get("node_state_details")
                 and r.get("tip_details")
@@ -311,53 +659,31 @@ def create_gene_tree_state_plot(
         return None
 
     try:
-        # Build tree with PAML node IDs from RST (consistent with analysis)
-        ordered_nodes, id_mapping = build_node_mapping(rst_file=rst_file)
-        root = ordered_nodes[-1]  # Last node in postorder is root
+        tree_layout = get_tree_layout(rst_file)
     except Exception as e:
         logger.warning(f"Could not build tree from RST for gene tree plot: {e}")
         return None
 
-    # Use node object as key to handle leaves (which have node_id=None)
-    positions_by_node: Dict[object, Tuple[float, float]] = {}
-    leaf_counter = [0]
+    root = tree_layout.root
+    positions_by_node = tree_layout.positions_by_node
+    positions = tree_layout.positions
 
-    def layout(node, depth=0):
-        if node.is_leaf():
-            y = leaf_counter[0]
-            leaf_counter[0] += 1
-        else:
-            child_ys = [layout(child, depth + 1) for child in node.children]
-            y = sum(child_ys) / len(child_ys) if child_ys else leaf_counter[0]
-        positions_by_node[node] = (depth, y)
-        return y
-
-    layout(root, depth=0)
-
-    scale_factor = 1.2
-    for node, (x, y) in list(positions_by_node.items()):
-        positions_by_node[node] = (x * scale_factor, y)
-
-    # Build positions dict by node_id (only for nodes with IDs)
-    positions: Dict[int, Tuple[float, float]] = {
-        getattr(node, "node_id"): pos
-        for node, pos in positions_by_node.items()
-        if hasattr(node, "node_id") and getattr(node, "node_id") is not None
-    }
-
-    leaf_count = max(leaf_counter[0], 1)
+    leaf_count = tree_layout.leaf_count
     fig_height = min(15, max(5.5, leaf_count * 0.25))
     fig_width = min(14, max(8, leaf_count * 0.22 + 6))
     fig, ax = plt.subplots(figsize=(fig_width, fig_height))
 
-    def draw_edges(node):
-        x1, y1 = positions_by_node[node]
-        for child in node.children:
-            x2, y2 = positions_by_node[child]
-            ax.plot([x1, x2], [y1, y2], color="#444444", linewidth=1)
-            draw_edges(child)
-
-    draw_edges(root)
+    # All edges in one artist instead of one Line2D per branch
+    ax.add_collection(
+        LineCollection(
+            tree_layout.edges,
+            colors="#444444",
+            linewidths=1,
+            capstyle="projecting",
+            zorder=2,
+        )
+    )
+    ax.autoscale_view()
 
     node_state_details = candidate.get("node_state_details", {})
     node_posteriors = candidate.get("node_posteriors") or {}
@@ -588,7 +914,7 @@ def create_gene_tree_state_plot(
         )
 
     # Annotate tip states (residues derived from trait groups)
-    max_x = max(coord[0] for coord in positions_by_node.values())
+    max_x = tree_layout.max_x
 
     def annotate_tips(node):
         if node.is_leaf():
@@ -694,7 +1020,13 @@ def create_gene_tree_state_plot(
     ax.axis("off")
 
     fig.tight_layout()
-    fig.savefig(plot_path, bbox_inches="tight", dpi=300)
+    fig.savefig(plot_path, bbox_inches="tight", dpi=PLOT_DPI)
+    if thumbnails:
+        thumb_dir = output_dir / THUMBNAIL_DIRNAME
+        thumb_dir.mkdir(parents=True, exist_ok=True)
+        fig.savefig(
+            thumb_dir / f"{plot_path.stem}_thumb.png", bbox_inches="tight", dpi=THUMBNAIL_DPI
+        )
     if plt is not None:
         plt.close(fig)
 
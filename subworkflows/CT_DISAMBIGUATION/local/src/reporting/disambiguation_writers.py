@@ -21,7 +21,7 @@ import sqlite3
 from typing import Tuple
 import json as _json
 
-from src.utils.disambiguation_db import fetch_alignment_for_gene
+from src.utils.disambiguation_db import fetch_alignment_for_gene, iter_results
 from src.utils.gene_wrapper import convert_convergence_result_to_dict
 
 logger = logging.getLogger(__name__)
@@ -259,7 +259,8 @@ def export_from_db(
     """
     Export CAAS convergence master CSV, no_change debug CSV, and per-gene JSONs directly from the aggregation SQLite DB.
 
-    Streams rows from DB to avoid loading all results into memory.
+    Streams rows from DB in fetchmany batches (see :func:`iter_results`), so memory
+    stays constant in the number of results.
 
     Returns:
         (list_of_caas_files, summary_json)
@@ -271,6 +272,9 @@ def export_from_db(
     no_change_filename = output_dir / "no_change_debug.csv"
     json_dir = output_dir / "json_summaries"
     json_dir.mkdir(parents=True, exist_ok=True)
+    # Per-gene files are rewritten from the DB (an incremental run may also drop genes)
+    for stale in json_dir.glob("*_convergence_positions.jsonl"):
+        stale.unlink()
 
     conn = sqlite3.connect(str(db_path))
     try:
@@ -310,32 +314,29 @@ def export_from_db(
 
         # Iterate rows ordered by gene, msa_pos, id and write rows one-by-one.
         # This preserves Tag-level hypotheses even when they share the same msa_pos.
-        cur = conn.cursor()
-
         current_gene = None
         gene_file = None
         per_gene_counts = {}
         total_positions = 0
 
-        cur.execute(
-            "SELECT id, gene, msa_pos, result_json FROM results ORDER BY gene, msa_pos, id"
-        )
-        for _, gene, msa_pos, result_json in cur.fetchall():
-            if not result_json:
-                continue
-            try:
-                result = _json.loads(result_json)
-            except Exception:
+        align_gene = None
+        align_data = {}
+        for gene, msa_pos, result in iter_results(conn):
+            if not result:
                 continue
 
-            align_data = fetch_alignment_for_gene(conn, gene) or {}
+            # Rows arrive grouped by gene: decode its alignment metadata once
+            if gene != align_gene:
+                align_data = fetch_alignment_for_gene(conn, gene) or {}
+                align_gene = gene
             alignment = align_data.get("alignment")
             taxid_to_species = align_data.get("taxid_to_species")
             seq_by_id = align_data.get("seq_by_id")
             seq_by_species = align_data.get("seq_by_species")
             alignment_extras = align_data.get("alignment_extras")
-            posterior_dump_jsonl = None
+            posterior_dump = posterior_dump_jsonl = None
             if alignment_extras:
+                posterior_dump = alignment_extras.get("posterior_dump")
                 posterior_dump_jsonl = alignment_extras.get("posterior_dump_jsonl")
 
             caas_dict = convert_convergence_result_to_dict(
@@ -368,7 +369,7 @@ def export_from_db(
                     gene_file.close()
                 gene_file = open(
                     json_dir / f"{gene.lower()}_convergence_positions.jsonl",
-                    "a",
+                    "w",
                     encoding="utf-8",
                 )
                 current_gene = gene
@@ -380,6 +381,8 @@ def export_from_db(
                 summary = extract_convergence_summary(caas_dict, max_pairs)
             except Exception:
                 summary = {"gene": gene, "msa_pos": msa_pos}
+            if posterior_dump:
+                summary["posterior_dump"] = posterior_dump
             if posterior_dump_jsonl:
                 summary["posterior_dump_jsonl"] = posterior_dump_jsonl
             if gene_file is not None:
@@ -22,6 +22,7 @@ from src.reporting.disambiguation_json import (
 )
 # Optional: if you want plots as part of the report run
 from src.plots.bulk_plots import generate_bulk_plots
+from src.plots.gene_trees_bulk import GENE_TREE_SELECTIONS
 
 logger = logging.getLogger(__name__)
 
@@ -66,6 +67,9 @@ def orchestrate(
     trait_pairs_json: Optional[Path] = None,
     include_non_significant: bool = False,
     n_gene_trees: int = 5,
+    plot_workers: Optional[int] = None,
+    plot_selection: str = "random",
+    plot_thumbnails: bool = False,
     run_plots: bool = True,
     run_json: bool = True,
 ) -> Dict[str, Any]:
@@ -174,6 +178,9 @@ def orchestrate(
             output_dir=plots_out,
             include_non_significant=include_non_significant,
             n_gene_trees=n_gene_trees,
+            workers=plot_workers,
+            selection=plot_selection,
+            thumbnails=plot_thumbnails,
         )
 
     return {
@@ -205,6 +212,23 @@ def main():
 
     parser.add_argument("--include-non-significant", action="store_true")
     parser.add_argument("--n-gene-trees", type=int, default=5)
+    parser.add_argument(
+        "--plot-selection",
+        choices=GENE_TREE_SELECTIONS,
+        default="random",
+        help="Gene tree positions: random sample or top N by p-value",
+    )
+    parser.add_argument(
+        "--plot-workers",
+        type=int,
+        default=None,
+        help="Plotting processes (default: available CPUs)",
+    )
+    parser.add_argument(
+        "--plot-thumbnails",
+        action="store_true",
+        help="Also write low-DPI PNG thumbnails of the gene trees",
+    )
     parser.add_argument("--no-plots", action="store_true")
     parser.add_argument(
         "--debug-json-fields",
@@ -224,6 +248,9 @@ def main():
         trait_pairs_json=args.trait_pairs_json,
         include_non_significant=args.include_non_significant,
         n_gene_trees=args.n_gene_trees,
+        plot_workers=args.plot_workers,
+        plot_selection=args.plot_selection,
+        plot_thumbnails=args.plot_thumbnails,
         run_plots=not args.no_plots,
         run_json=args.debug_json_fields,
     )
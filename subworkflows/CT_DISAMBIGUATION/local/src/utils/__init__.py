@@ -2,6 +2,7 @@
 
 from .io_utils import (
     find_gene_alignment,
+    index_gene_alignments,
     read_alignment,
 )
 from .logger import (
@@ -13,14 +14,28 @@ from .concurrency import (
     init_worker,
     codeml_slot,
 )
+from .scheduling import (
+    RuntimeHistory,
+    plan_gene_jobs,
+    dispatch_by_cost,
+)
 from .disambiguation_db import (
     init_db,
     get_connection,
     insert_gene_alignment,
     insert_result,
+    insert_results,
     fetch_alignment_for_gene,
     iter_group_keys,
+    iter_results,
     iter_results_for_group,
+    delete_gene_results,
+    fetch_gene_fingerprints,
+    store_gene_fingerprints,
+)
+from .fingerprints import (
+    FileDigests,
+    GeneFingerprinter,
 )
 
 
@@ -61,19 +76,30 @@ def process_all_genes(*args, **kwargs):
 
 __all__ = [
     "find_gene_alignment",
+    "index_gene_alignments",
     "read_alignment",
     "configure_logging",
     "get_logger",
     "plan_concurrency",
     "init_worker",
     "codeml_slot",
+    "RuntimeHistory",
+    "plan_gene_jobs",
+    "dispatch_by_cost",
     "init_db",
     "get_connection",
     "insert_gene_alignment",
     "insert_result",
+    "insert_results",
     "fetch_alignment_for_gene",
     "iter_group_keys",
+    "iter_results",
     "iter_results_for_group",
+    "delete_gene_results",
+    "fetch_gene_fingerprints",
+    "store_gene_fingerprints",
+    "FileDigests",
+    "GeneFingerprinter",
     "convert_convergence_result_to_dict",
     "convert_biochem_result_to_dict",
     "merge_multi_hypothesis_results",
@@ -4,13 +4,29 @@ SQLite helpers for disambiguation storage
 =========================================
 
 Small SQLite helpers to store alignment metadata and per-position per-hypothesis
-result dictionaries (as JSON). This module is intentionally lightweight and
-does not perform heavy biological normalization; consolidations and merging
-should occur upstream (worker) or downstream (export writers).
+results. This module is intentionally lightweight and does not perform heavy
+biological normalization; consolidations and merging should occur upstream
+(worker) or downstream (export writers).
 
 Schema
 ------
-The module maintains two tables: `gene_alignment` and `results`.
+`gene_alignment` holds one row of alignment metadata per gene. Results are
+columnar (schema version 2, ``PRAGMA user_version``):
+
+- `results`: one row per CAAS hypothesis with typed columns (gene, msa_pos,
+  pattern, change/parallel classification, consolidated multiset ``caas``,
+  root/MRCA node states, ...);
+- `result_pairs`: one row per contrast pair (focal node, ASR state, tip summary
+  and the per-tip taxid/species/residue of both sides as separated lists).
+
+The flat ``mrca_{N}_*`` keys of a result are derived on read. Results the
+columns cannot reproduce exactly keep their full JSON in ``extras_json``.
+Write in batches with :func:`insert_results`; read with :func:`iter_results`.
+
+Incremental runs keep one input fingerprint per gene in `gene_fingerprints`
+(see :mod:`src.utils.fingerprints`) and a ``size:mtime_ns`` -> SHA-256 cache of
+hashed input files in `file_digests`; :func:`delete_gene_results` drops the
+rows of genes that are recomputed.
 
 Usage Example
 -------------
@@ -40,30 +56,26 @@ import logging
 import sqlite3
 import pickle
 from pathlib import Path
-from typing import Any, Dict, Iterator, Optional, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
 
 def _sanitize_for_json(obj: Any) -> Any:
     """Recursively convert common non-JSON types to JSON-safe values."""
-    from pathlib import Path as _Path
-
-    if obj is None:
-        return None
-    if isinstance(obj, (str, int, float, bool)):
+    if obj is None or isinstance(obj, (str, int, float, bool)):
         return obj
+    if isinstance(obj, dict):
+        return {str(k): _sanitize_for_json(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple, set)):
+        return [_sanitize_for_json(v) for v in obj]
     if isinstance(obj, bytes):
         try:
             return obj.decode("utf-8")
         except Exception:
             return str(obj)
-    if isinstance(obj, _Path):
+    if isinstance(obj, Path):
         return str(obj)
-    if isinstance(obj, dict):
-        return {str(k): _sanitize_for_json(v) for k, v in obj.items()}
-    if isinstance(obj, (list, tuple, set)):
-        return [_sanitize_for_json(v) for v in obj]
     try:
         return str(obj)
     except Exception:
@@ -128,9 +140,495 @@ def _load_posteriors_from_jsonl(
     return result
 
 
+SCHEMA_VERSION = 2
+
+# Rows per executemany / fetchmany batch (also bounds "IN (...)" parameter lists)
+BATCH_SIZE = 500
+
+# (dict key, SQL type, kind) of the scalar fields of a result, one typed column each
+_RESULT_FIELDS = (
+    ("tag", "TEXT", "text"),
+    ("caas", "TEXT", "text"),  # consolidated multiset (e.g. "A/E")
+    ("is_significant", "INTEGER", "bool"),
+    ("pvalue", "REAL", "real"),
+    ("pvalue_boot", "REAL", "real"),
+    ("caap_group", "TEXT", "text"),
+    ("amino_encoded", "TEXT", "text"),
+    ("is_conserved_meta", "INTEGER", "bool"),
+    ("conserved_pair", "TEXT", "text"),
+    ("sig_hyp", "INTEGER", "bool"),
+    ("sig_perm", "INTEGER", "bool"),
+    ("sig_both", "INTEGER", "bool"),
+    ("multi_hypothesis", "TEXT", "text"),
+    ("pattern_type", "TEXT", "text"),
+    ("change_top", "TEXT", "text"),
+    ("change_bottom", "TEXT", "text"),
+    ("change_side", "TEXT", "text"),
+    ("parallel_top", "TEXT", "text"),
+    ("parallel_bottom", "TEXT", "text"),
+    ("parallel_type", "TEXT", "text"),
+    ("low_confidence_nodes", "TEXT", "text"),
+    ("asr_is_conserved", "INTEGER", "bool"),
+    ("asr_root_conserved", "INTEGER", "bool"),
+    ("ambiguous", "INTEGER", "bool"),
+)
+
+# node_mapping / node_state_details roles stored on the result row
+_NODE_FIELDS = (
+    ("root_node", "INTEGER", "int"),
+    ("mrca_node", "INTEGER", "int"),
+    ("root_state", "TEXT", "text"),
+    ("root_prob", "REAL", "real"),
+    ("mrca_state", "TEXT", "text"),
+    ("mrca_prob", "REAL", "real"),
+    ("low_confidence_roles", "TEXT", "list"),
+)
+
+# One row per contrast pair: focal node (node_mapping), its ASR state
+# (node_state_details) and the scalar part of pair_details
+_PAIR_FIELDS = (
+    ("focal_node", "INTEGER", "int"),
+    ("asr_state", "TEXT", "text"),
+    ("asr_prob", "REAL", "real"),
+    ("pair_id", "INTEGER", "int"),
+    ("node_id", "INTEGER", "int"),
+    ("focal_state", "TEXT", "text"),
+    ("focal_prob", "REAL", "real"),
+    ("mrca_modal_aa", "TEXT", "text"),
+    ("top_taxa", "TEXT", "list"),
+    ("bottom_taxa", "TEXT", "list"),
+    ("top_species", "TEXT", "list"),
+    ("bottom_species", "TEXT", "list"),
+    ("top_tip_mode", "TEXT", "text"),
+    ("bottom_tip_mode", "TEXT", "text"),
+    ("top_tip_residue", "TEXT", "text"),
+    ("bottom_tip_residue", "TEXT", "text"),
+    # pair_details[*].{top,bottom}_tip_residues records, one list per record key
+    ("top_tips_taxid", "TEXT", "optlist"),
+    ("top_tips_species", "TEXT", "optlist"),
+    ("top_tips_residue", "TEXT", "optlist"),
+    ("bottom_tips_taxid", "TEXT", "optlist"),
+    ("bottom_tips_species", "TEXT", "optlist"),
+    ("bottom_tips_residue", "TEXT", "optlist"),
+)
+_TIPS_COL = [key for key, _, _ in _PAIR_FIELDS].index("top_tips_taxid")
+_TIP_KEYS = ("taxid", "species", "residue")
+_PAIR_SCALAR_KEYS = tuple(key for key, _, _ in _PAIR_FIELDS[3:_TIPS_COL])
+_PAIR_DETAIL_KEYS = _PAIR_SCALAR_KEYS + ("top_tip_residues", "bottom_tip_residues")
+
+# Bits of results.payloads: which nested structures the result carries
+_HAS_NODE_MAPPING = 1
+_HAS_NODE_STATES = 2
+_HAS_PAIR_DETAILS = 4
+
+_LIST_SEP = "\x1f"
+_NONE_ITEM = "\x1e"  # None inside an "optlist" column
+
+_RESULT_COLUMNS = (
+    ("id", "INTEGER PRIMARY KEY"),
+    ("gene", "TEXT NOT NULL"),
+    ("msa_pos", "INTEGER"),
+    ("position", "INTEGER"),
+    ("pair_count", "INTEGER"),
+    *((key, sql_type) for key, sql_type, _ in _RESULT_FIELDS),
+    ("payloads", "INTEGER"),
+    *((key, sql_type) for key, sql_type, _ in _NODE_FIELDS),
+    ("extras_json", "TEXT"),
+)
+_RESULT_SELECT = ", ".join(name for name, _ in _RESULT_COLUMNS)
+_PAYLOADS_COL = [name for name, _ in _RESULT_COLUMNS].index("payloads")
+
+# Column offsets and per-kind positions used to decode rows without per-value dispatch
+_FIELDS_START = 5
+_NODES_START = _PAYLOADS_COL + 1
+_RESULT_KEYS = tuple(key for key, _, _ in _RESULT_FIELDS)
+_RESULT_BOOL_KEYS = tuple(key for key, _, kind in _RESULT_FIELDS if kind == "bool")
+_NODE_KEYS = tuple(key for key, _, _ in _NODE_FIELDS)
+_PAIR_LIST_COLS = tuple(i for i, (_, _, kind) in enumerate(_PAIR_FIELDS) if kind == "list")
+_PAIR_OPTLIST_COLS = tuple(
+    i for i, (_, _, kind) in enumerate(_PAIR_FIELDS) if kind == "optlist"
+)
+
+
+class _IrregularResult(ValueError):
+    """A result whose shape the columnar codec does not reproduce exactly."""
+
+
+def _fits(kind: str, value: Any) -> bool:
+    if value is None:
+        return True
+    if kind == "text":
+        return type(value) is str
+    if kind == "bool":
+        return type(value) is bool
+    if kind == "int":
+        return type(value) is int
+    if kind == "real":
+        # SQLite stores NaN as NULL
+        return type(value) is float and value == value
+    if kind == "list":
+        return isinstance(value, list) and all(
+            type(v) is str and _LIST_SEP not in v for v in value
+        )
+    if kind == "optlist":
+        return isinstance(value, list) and all(
+            v is None or (type(v) is str and _LIST_SEP not in v and _NONE_ITEM not in v)
+            for v in value
+        )
+    return False
+
+
+def _encode(kind: str, value: Any) -> Any:
+    """Column value of a field that passed :func:`_fits`."""
+    if value is None:
+        return None
+    if kind == "bool":
+        return int(value)
+    if kind == "list":
+        return _LIST_SEP.join(value)
+    if kind == "optlist":
+        return _LIST_SEP.join(_NONE_ITEM if v is None else v for v in value)
+    return value
+
+
+def _decode(kind: str, value: Any) -> Any:
+    if value is None:
+        return None
+    if kind == "bool":
+        return bool(value)
+    if kind == "list":
+        return value.split(_LIST_SEP) if value else []
+    if kind == "optlist":
+        return [None if v == _NONE_ITEM else v for v in value.split(_LIST_SEP)] if value else []
+    return value
+
+
+def _checked(kind: str, value: Any) -> Any:
+    if value is None or (kind == "text" and type(value) is str):
+        return value
+    if not _fits(kind, value):
+        raise _IrregularResult(f"unexpected {type(value).__name__} for {kind} field")
+    return _encode(kind, value)
+
+
+def _extract_pair_count(r: Any) -> int:
+    try:
+        if isinstance(r, dict):
+            if r.get("pair_details"):
+                return int(len(r.get("pair_details") or []))
+            ns = r.get("node_state_details") or {}
+            if isinstance(ns, dict) and ns.get("focal_states") is not None:
+                return int(len(ns.get("focal_states") or []))
+            nm = r.get("node_mapping") or {}
+            if isinstance(nm, dict):
+                focal_nodes = nm.get("focal_nodes")
+                if isinstance(focal_nodes, (list, tuple)):
+                    return int(len(focal_nodes))
+                count = sum(1 for k in nm.keys() if str(k).startswith("focal_"))
+                return int(count) if count else 1
+            return 1
+
+        if getattr(r, "pair_details", None):
+            return int(len(getattr(r, "pair_details") or [])) or 1
+        if getattr(r, "node_state_details", None):
+            ns = getattr(r, "node_state_details") or {}
+            if isinstance(ns, dict):
+                return int(len(ns.get("focal_states") or [])) or 1
+        if getattr(r, "node_mapping", None):
+            nm = getattr(r, "node_mapping") or {}
+            if isinstance(nm, dict):
+                focal_nodes = nm.get("focal_nodes")
+                if isinstance(focal_nodes, (list, tuple)):
+                    return int(len(focal_nodes))
+                count = sum(1 for k in nm.keys() if str(k).startswith("focal_"))
+                return int(count) if count else 1
+        return 1
+    except Exception:
+        return 1
+
+
+def _as_result_dict(result_obj: Any) -> Dict[str, Any]:
+    if not isinstance(result_obj, dict):
+        try:
+            result_obj = dict(getattr(result_obj, "__dict__", {}) or {})
+        except Exception as e:
+            raise TypeError(
+                "insert_result expects a dict or an object with a __dict__. "
+                "Upstream code should pre-convert results before DB insertion."
+            ) from e
+    return _sanitize_for_json(result_obj)
+
+
+def _encode_structures(
+    result: Dict[str, Any],
+) -> Tuple[int, Dict[str, Any], List[List[Any]]]:
+    """Split node_mapping / node_state_details / pair_details into typed columns.
+
+    Returns (payload bits, node columns, per-pair values in ``_PAIR_FIELDS`` order).
+    Raises
+    :class:`_IrregularResult` for shapes the decoder would not rebuild.
+    """
+    payloads = 0
+    node_cols: Dict[str, Any] = {key: None for key, _, _ in _NODE_FIELDS}
+    pair_lists: List[Tuple[int, str, List[Any]]] = []
+
+    node_mapping = result.get("node_mapping")
+    if node_mapping:
+        if not isinstance(node_mapping, dict) or list(node_mapping) != [
+            "root",
+            "mrca_contrast",
+            "focal_nodes",
+        ]:
+            raise _IrregularResult("node_mapping layout")
+        payloads |= _HAS_NODE_MAPPING
+        node_cols["root_node"] = _checked("int", node_mapping["root"])
+        node_cols["mrca_node"] = _checked("int", node_mapping["mrca_contrast"])
+        pair_lists.append((0, "int", node_mapping["focal_nodes"]))
+
+    states = result.get("node_state_details")
+    if states:
+        if not isinstance(states, dict):
+            raise _IrregularResult("node_state_details layout")
+        payloads |= _HAS_NODE_STATES
+        node_cols["root_state"] = _checked("text", states.get("root"))
+        node_cols["root_prob"] = _checked("real", states.get("root_prob"))
+        node_cols["mrca_state"] = _checked("text", states.get("mrca_contrast"))
+        node_cols["mrca_prob"] = _checked("real", states.get("mrca_contrast_prob"))
+        if "low_confidence_nodes" in states:
+            roles = states["low_confidence_nodes"]
+            if roles is None:
+                raise _IrregularResult("null low_confidence_nodes")
+            node_cols["low_confidence_roles"] = _checked("list", roles)
+        pair_lists.append((1, "text", states.get("focal_states")))
+        pair_lists.append((2, "real", states.get("focal_probs")))
+
+    details = result.get("pair_details")
+    if details:
+        if not isinstance(details, list):
+            raise _IrregularResult("pair_details layout")
+        payloads |= _HAS_PAIR_DETAILS
+
+    lengths = {len(values) for _, _, values in pair_lists if isinstance(values, list)}
+    if details:
+        lengths.add(len(details))
+    if len(lengths) > 1 or any(not isinstance(v, list) for _, _, v in pair_lists):
+        raise _IrregularResult("pair structures of different lengths")
+    n_pairs = lengths.pop() if lengths else 0
+
+    pairs: List[List[Any]] = [[None] * len(_PAIR_FIELDS) for _ in range(n_pairs)]
+    for col, kind, values in pair_lists:
+        for pair, value in zip(pairs, values):
+            pair[col] = _checked(kind, value)
+
+    for pair, detail in zip(pairs, details or []):
+        if not isinstance(detail, dict) or tuple(detail) != _PAIR_DETAIL_KEYS:
+            raise _IrregularResult("pair_details entry layout")
+        for col in range(3, _TIPS_COL):
+            key, _, kind = _PAIR_FIELDS[col]
+            pair[col] = _checked(kind, detail[key])
+        for col, side in ((_TIPS_COL, "top"), (_TIPS_COL + 3, "bottom")):
+            records = detail[f"{side}_tip_residues"]
+            if not isinstance(records, list) or any(
+                not isinstance(record, dict) or tuple(record) != _TIP_KEYS for record in records
+            ):
+                raise _IrregularResult("tip records layout")
+            for offset, key in enumerate(_TIP_KEYS):
+                pair[col + offset] = _checked("optlist", [record[key] for record in records])
+    return payloads, node_cols, pairs
+
+
+def _decode_pair(values: Iterable[Any]) -> List[Any]:
+    """Stored result_pairs values (``_PAIR_FIELDS`` order) -> Python values."""
+    pair = list(values)
+    for col in _PAIR_LIST_COLS:
+        if pair[col] is not None:
+            pair[col] = pair[col].split(_LIST_SEP) if pair[col] else []
+    for col in _PAIR_OPTLIST_COLS:
+        value = pair[col]
+        if value is not None:
+            items = value.split(_LIST_SEP) if value else []
+            if _NONE_ITEM in value:
+                items = [None if v == _NONE_ITEM else v for v in items]
+            pair[col] = items
+    return pair
+
+
+def _tip_records(columns: List[List[Any]]) -> List[Dict[str, Any]]:
+    """Per-key tip lists (taxid, species, residue) -> tip record dicts."""
+    return [
+        {"taxid": taxid, "species": species, "residue": residue}
+        for taxid, species, residue in zip(*columns)
+    ]
+
+
+def _decode_structures(
+    payloads: int,
+    node_cols: Dict[str, Any],
+    pairs: List[List[Any]],
+) -> Dict[str, Any]:
+    """Inverse of :func:`_encode_structures` (nested payloads of one result).
+
+    ``node_cols`` holds stored node column values and ``pairs`` the decoded pair
+    values (see :func:`_decode_pair`).
+    """
+    out: Dict[str, Any] = {}
+    if payloads & _HAS_PAIR_DETAILS:
+        details = []
+        for pair in pairs:
+            detail = dict(zip(_PAIR_SCALAR_KEYS, pair[3:_TIPS_COL]))
+            detail["top_tip_residues"] = _tip_records(pair[_TIPS_COL : _TIPS_COL + 3])
+            detail["bottom_tip_residues"] = _tip_records(pair[_TIPS_COL + 3 : _TIPS_COL + 6])
+            details.append(detail)
+        out["pair_details"] = details
+
+    if payloads & _HAS_NODE_MAPPING:
+        out["node_mapping"] = {
+            "root": node_cols["root_node"],
+            "mrca_contrast": node_cols["mrca_node"],
+            "focal_nodes": [pair[0] for pair in pairs],
+        }
+
+    if payloads & _HAS_NODE_STATES:
+        states: Dict[str, Any] = {
+            "root": node_cols["root_state"],
+            "root_prob": node_cols["root_prob"],
+            "mrca_contrast": node_cols["mrca_state"],
+            "mrca_contrast_prob": node_cols["mrca_prob"],
+            "focal_states": [pair[1] for pair in pairs],
+            "focal_probs": [pair[2] for pair in pairs],
+        }
+        for idx, pair in enumerate(pairs, 1):
+            states[f"focal_{idx}"] = pair[1]
+            states[f"focal_{idx}_prob"] = pair[2]
+        if node_cols["low_confidence_roles"] is not None:
+            states["low_confidence_nodes"] = _decode("list", node_cols["low_confidence_roles"])
+        out["node_state_details"] = states
+    return out
+
+
+def _rebuild_result(
+    gene: str, msa_pos: Any, position: Any, fields: Dict[str, Any], nested: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Full result dict from stored fields; derived mrca_* keys are recomputed."""
+    from src.utils.gene_wrapper import convert_convergence_result_to_dict
+
+    source = {"gene": gene, "msa_pos": msa_pos, "position": position, **fields, **nested}
+    return convert_convergence_result_to_dict(
+        source, multi_hypothesis=fields.get("multi_hypothesis")
+    )
+
+
+def _encode_result(
+    result_id: int, gene: str, msa_pos: int, position: Optional[int], result_obj: Any
+) -> Tuple[Tuple, List[Tuple]]:
+    """Result object -> (results row, result_pairs rows).
+
+    The encoding is verified by decoding it again; results it cannot reproduce
+    exactly keep their full JSON in ``extras_json``.
+    """
+    pair_count = _extract_pair_count(result_obj)
+    result = _as_result_dict(result_obj)
+
+    fields: Dict[str, Any] = {}
+    extras: Dict[str, Any] = {}
+    for key, _, kind in _RESULT_FIELDS:
+        value = result.get(key)
+        if _fits(kind, value):
+            fields[key] = value
+        else:
+            fields[key] = None
+            extras[key] = value
+
+    try:
+        payloads, node_cols, pairs = _encode_structures(result)
+        rebuilt = _rebuild_result(
+            gene,
+            msa_pos,
+            position,
+            {**fields, **extras},
+            _decode_structures(payloads, node_cols, [_decode_pair(p) for p in pairs]),
+        )
+        if json.dumps(rebuilt) != json.dumps(result):
+            raise _IrregularResult("round trip differs")
+    except _IrregularResult:
+        payloads, node_cols, pairs = 0, {k: None for k, _, _ in _NODE_FIELDS}, []
+        extras = {"__full__": result}
+
+    row = (
+        result_id,
+        gene,
+        msa_pos,
+        position,
+        pair_count,
+        *(_encode(kind, fields[key]) for key, _, kind in _RESULT_FIELDS),
+        payloads,
+        *(node_cols[key] for key, _, _ in _NODE_FIELDS),
+        json.dumps(extras) if extras else None,
+    )
+    pair_rows = [(result_id, idx, *pair) for idx, pair in enumerate(pairs, 1)]
+    return row, pair_rows
+
+
+def _create_result_tables(cur: sqlite3.Cursor) -> None:
+    columns = ",\n                ".join(f"{name} {sql_type}" for name, sql_type in _RESULT_COLUMNS)
+    cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS results (
+                {columns}
+            )
+            """)
+
+    pair_columns = ",\n                ".join(
+        f"{key} {sql_type}" for key, sql_type, _ in _PAIR_FIELDS
+    )
+    cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS result_pairs (
+                result_id INTEGER NOT NULL,
+                pair_idx INTEGER NOT NULL,
+                {pair_columns},
+                PRIMARY KEY (result_id, pair_idx)
+            ) WITHOUT ROWID
+            """)
+
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_results_gene_msa ON results(gene, msa_pos);"
+    )
+
+
+def _migrate_legacy_results(conn: sqlite3.Connection) -> None:
+    """Rewrite a version-1 ``results`` table (one JSON blob per row) into the columnar schema."""
+    cur = conn.cursor()
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(results)")}
+    if "result_json" not in columns:
+        return
+
+    logger.info("Migrating legacy JSON results table to the columnar schema")
+    cur.execute("DROP INDEX IF EXISTS idx_results_gene_msa")
+    cur.execute("ALTER TABLE results RENAME TO results_v1")
+    _create_result_tables(cur)
+
+    read = conn.cursor()
+    read.execute("SELECT gene, msa_pos, position, result_json FROM results_v1 ORDER BY id")
+    while True:
+        rows = read.fetchmany(BATCH_SIZE)
+        if not rows:
+            break
+        batch = []
+        for gene, msa_pos, position, result_json in rows:
+            try:
+                obj = json.loads(result_json) if result_json else {}
+            except Exception:
+                obj = {}
+            batch.append((gene, msa_pos, None if position == -1 else position, obj))
+        insert_results(conn, batch)
+    cur.execute("DROP TABLE results_v1")
+
+
 def init_db(db_path: Path) -> None:
     """Create the SQLite database schema if needed.
 
+    Databases written with the legacy one-JSON-blob-per-row ``results`` table are
+    migrated to the columnar schema in place.
+
     :param db_path: Path to the SQLite database file to initialize.
     :type db_path: Path
     :returns: None
@@ -157,24 +655,155 @@ def init_db(db_path: Path) -> None:
             """)
 
         cur.execute("""
-            CREATE TABLE IF NOT EXISTS results (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                gene TEXT,
-                msa_pos INTEGER,
-                position INTEGER,
-                pair_count INTEGER,
-                result_json TEXT
+            CREATE TABLE IF NOT EXISTS gene_fingerprints (
+                gene TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                components_json TEXT
+            )
+            """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS file_digests (
+                path TEXT PRIMARY KEY,
+                stamp TEXT NOT NULL,
+                digest TEXT NOT NULL
             )
             """)
 
-        cur.execute(
-            "CREATE INDEX IF NOT EXISTS idx_results_gene_msa ON results(gene, msa_pos);"
-        )
+        _migrate_legacy_results(conn)
+        _create_result_tables(cur)
+        cur.execute(f"PRAGMA user_version={SCHEMA_VERSION};")
         conn.commit()
     finally:
         conn.close()
 
 
+def insert_result(
+    conn: sqlite3.Connection,
+    gene: str,
+    msa_pos: int,
+    position: int,
+    result_obj: Any,
+) -> None:
+    """Insert a single result into the `results` table (and its pairs).
+
+    The preferred input is a JSON-serializable dict produced by upstream code. As a
+    fallback, objects with a `__dict__` attribute will be shallowly serialized.
+    Writers with many results should prefer :func:`insert_results`.
+
+    :param conn: Open SQLite connection to use for insertion.
+    :type conn: sqlite3.Connection
+    :param gene: Gene name.
+    :type gene: str
+    :param msa_pos: Zero-based integer position in the MSA.
+    :type msa_pos: int
+    :param position: One-based position (or None if unknown).
+    :type position: int
+    :param result_obj: JSON-serializable data structure or object with __dict__.
+    :type result_obj: Any
+    :returns: None
+    :rtype: None
+    :raises TypeError: If result_obj is not serializable and no __dict__ can be obtained.
+    """
+    insert_results(conn, [(gene, msa_pos, position, result_obj)])
+
+
+def insert_results(
+    conn: sqlite3.Connection,
+    items: Iterable[Tuple[str, int, Optional[int], Any]],
+) -> int:
+    """Insert a batch of results with one ``executemany`` per table.
+
+    Each item is ``(gene, msa_pos, position, result_obj)`` as for :func:`insert_result`.
+    Row ids are assigned here (the connection must be the only writer), so the pair and
+    tip rows of a batch can reference their result without a round trip per row.
+
+    :param conn: Open SQLite connection (the caller commits).
+    :type conn: sqlite3.Connection
+    :param items: Results to insert.
+    :type items: Iterable[Tuple[str, int, Optional[int], Any]]
+    :returns: Number of results inserted.
+    :rtype: int
+    """
+    cur = conn.cursor()
+    (next_id,) = cur.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM results").fetchone()
+
+    result_rows: List[Tuple] = []
+    pair_rows: List[Tuple] = []
+    for gene, msa_pos, position, result_obj in items:
+        row, pairs = _encode_result(
+            next_id,
+            gene,
+            int(msa_pos),
+            int(position) if position is not None else None,
+            result_obj,
+        )
+        result_rows.append(row)
+        pair_rows.extend(pairs)
+        next_id += 1
+
+    if result_rows:
+        cur.executemany(
+            f"INSERT INTO results ({_RESULT_SELECT}) "
+            f"VALUES ({', '.join('?' * len(_RESULT_COLUMNS))})",
+            result_rows,
+        )
+    if pair_rows:
+        cur.executemany(
+            f"INSERT INTO result_pairs VALUES ({', '.join('?' * (len(_PAIR_FIELDS) + 2))})",
+            pair_rows,
+        )
+    return len(result_rows)
+
+
+def _decode_rows(conn: sqlite3.Connection, rows: List[Tuple]) -> List[Optional[Dict[str, Any]]]:
+    """Rebuild the result dicts of a batch of ``results`` rows (one query for their pairs)."""
+    pairs_by_id: Dict[int, List[List[Any]]] = {}
+    need_children = [row[0] for row in rows if row[_PAYLOADS_COL]]
+    if need_children:
+        marks = ", ".join("?" * len(need_children))
+        cur = conn.cursor()
+        for pair_row in cur.execute(
+            f"SELECT * FROM result_pairs WHERE result_id IN ({marks}) "
+            "ORDER BY result_id, pair_idx",
+            need_children,
+        ):
+            pairs_by_id.setdefault(pair_row[0], []).append(_decode_pair(pair_row[2:]))
+
+    decoded: List[Optional[Dict[str, Any]]] = []
+    for row in rows:
+        result_id, gene, msa_pos, position = row[:4]
+        extras = json.loads(row[-1]) if row[-1] else {}
+        if "__full__" in extras:
+            decoded.append(_unwrap_legacy(extras["__full__"], gene, msa_pos))
+            continue
+        fields = dict(zip(_RESULT_KEYS, row[_FIELDS_START:_PAYLOADS_COL]))
+        for key in _RESULT_BOOL_KEYS:
+            if fields[key] is not None:
+                fields[key] = bool(fields[key])
+        fields.update(extras)
+        nested = _decode_structures(
+            row[_PAYLOADS_COL] or 0,
+            dict(zip(_NODE_KEYS, row[_NODES_START:-1])),
+            pairs_by_id.get(result_id, []),
+        )
+        decoded.append(_rebuild_result(gene, msa_pos, position, fields, nested))
+    return decoded
+
+
+def _unwrap_legacy(obj: Any, gene: str, msa_pos: int) -> Optional[Dict[str, Any]]:
+    """Full-JSON results, including the legacy pickled envelope ``{"__pickled": true, "blob": "<hex>"}``."""
+    if isinstance(obj, dict) and obj.get("__pickled") and obj.get("blob"):
+        try:
+            return_obj = pickle.loads(bytes.fromhex(obj["blob"]))
+            if isinstance(return_obj, dict):
+                return return_obj
+            return dict(getattr(return_obj, "__dict__", {}) or {})
+        except Exception:
+            logger.warning(f"Failed to unpickle result for gene {gene} at msa_pos {msa_pos}")
+            return obj
+    return obj if obj else None
+
+
 def get_connection(db_path: Path) -> sqlite3.Connection:
     """Open and return a SQLite connection with WAL pragmas enabled.
 
@@ -272,94 +901,6 @@ def insert_gene_alignment(
     )
 
 
-def insert_result(
-    conn: sqlite3.Connection,
-    gene: str,
-    msa_pos: int,
-    position: int,
-    result_obj: Any,
-) -> None:
-    """Insert a single result row into the `results` table.
-
-    The preferred input is a JSON-serializable dict produced by upstream code. As a
-    fallback, objects with a `__dict__` attribute will be shallowly serialized.
-
-    :param conn: Open SQLite connection to use for insertion.
-    :type conn: sqlite3.Connection
-    :param gene: Gene name.
-    :type gene: str
-    :param msa_pos: Zero-based integer position in the MSA.
-    :type msa_pos: int
-    :param position: One-based position (or -1 if unknown).
-    :type position: int
-    :param result_obj: JSON-serializable data structure or object with __dict__.
-    :type result_obj: Any
-    :returns: None
-    :rtype: None
-    :raises TypeError: If result_obj is not serializable and no __dict__ can be obtained.
-    """
-    cur = conn.cursor()
-
-    def _extract_pair_count(r: Any) -> int:
-        try:
-            if isinstance(r, dict):
-                if r.get("pair_details"):
-                    return int(len(r.get("pair_details") or []))
-                ns = r.get("node_state_details") or {}
-                if isinstance(ns, dict) and ns.get("focal_states") is not None:
-                    return int(len(ns.get("focal_states") or []))
-                nm = r.get("node_mapping") or {}
-                if isinstance(nm, dict):
-                    focal_nodes = nm.get("focal_nodes")
-                    if isinstance(focal_nodes, (list, tuple)):
-                        return int(len(focal_nodes))
-                    count = sum(1 for k in nm.keys() if str(k).startswith("focal_"))
-                    return int(count) if count else 1
-                return 1
-
-            if getattr(r, "pair_details", None):
-                return int(len(getattr(r, "pair_details") or [])) or 1
-            if getattr(r, "node_state_details", None):
-                ns = getattr(r, "node_state_details") or {}
-                if isinstance(ns, dict):
-                    return int(len(ns.get("focal_states") or [])) or 1
-            if getattr(r, "node_mapping", None):
-                nm = getattr(r, "node_mapping") or {}
-                if isinstance(nm, dict):
-                    focal_nodes = nm.get("focal_nodes")
-                    if isinstance(focal_nodes, (list, tuple)):
-                        return int(len(focal_nodes))
-                    count = sum(1 for k in nm.keys() if str(k).startswith("focal_"))
-                    return int(count) if count else 1
-            return 1
-        except Exception:
-            return 1
-
-    pair_count = _extract_pair_count(result_obj)
-
-    if not isinstance(result_obj, dict):
-        try:
-            result_obj = dict(getattr(result_obj, "__dict__", {}) or {})
-        except Exception as e:
-            raise TypeError(
-                "insert_result expects a dict or an object with a __dict__. "
-                "Upstream code should pre-convert results before DB insertion."
-            ) from e
-
-    result_json = json.dumps(_sanitize_for_json(result_obj))
-
-    cur.execute(
-        "INSERT INTO results (gene, msa_pos, position, pair_count, result_json) VALUES (?, ?, ?, ?, ?)",
-        (
-            gene,
-            int(msa_pos),
-            int(position) if position is not None else -1,
-            int(pair_count),
-            result_json,
-        ),
-    )
-
-
 def fetch_alignment_for_gene(
     conn: sqlite3.Connection, gene: str, load_posteriors: bool = False
 ) -> Optional[Dict[str, Any]]:
@@ -369,8 +910,9 @@ def fetch_alignment_for_gene(
     :type conn: sqlite3.Connection
     :param gene: Gene name to fetch metadata for.
     :type gene: str
-    :param load_posteriors: If True and `alignment_extras` includes a `posterior_dump_jsonl` path,
-        attempt to load those posteriors into `alignment_extras['posterior_data']`.
+    :param load_posteriors: If True and `alignment_extras` includes a `posterior_dump` (binary)
+        or legacy `posterior_dump_jsonl` path, attempt to load those posteriors into
+        `alignment_extras['posterior_data']`.
     :type load_posteriors: bool
     :returns: A dict of alignment metadata or None if the row is not found.
     :rtype: Optional[Dict[str, Any]]
@@ -406,20 +948,26 @@ def fetch_alignment_for_gene(
         json.loads(alignment_extras_json) if alignment_extras_json else None
     )
 
-    # Optionally load posteriors from JSONL if caller asks for it
+    # Optionally load posteriors from the node dump if caller asks for it
     if (
         load_posteriors
         and alignment_extras
         and not alignment_extras.get("posterior_data")
     ):
-        dump_path = alignment_extras.get("posterior_dump_jsonl")
-        if dump_path:
-            try:
-                posteriors = _load_posteriors_from_jsonl(Path(dump_path))
-                if posteriors:
-                    alignment_extras["posterior_data"] = posteriors
-            except Exception:
-                pass
+        dump_path = alignment_extras.get("posterior_dump")
+        jsonl_path = alignment_extras.get("posterior_dump_jsonl")
+        try:
+            posteriors = None
+            if dump_path and Path(dump_path).exists():
+                from src.asr.node_dump import NodePosteriorDump
+
+                posteriors = NodePosteriorDump.open(Path(dump_path)).node_posteriors()
+            elif jsonl_path:
+                posteriors = _load_posteriors_from_jsonl(Path(jsonl_path))
+            if posteriors:
+                alignment_extras["posterior_data"] = posteriors
+        except Exception:
+            pass
 
     return {
         "seq_by_id": json.loads(seq_by_id_json) if seq_by_id_json else None,
@@ -454,6 +1002,31 @@ def iter_group_keys(conn: sqlite3.Connection) -> Iterator[Tuple[str, int]]:
         yield gene, msa_pos
 
 
+def iter_results(
+    conn: sqlite3.Connection, batch_size: int = BATCH_SIZE
+) -> Iterator[Tuple[str, int, Optional[Dict[str, Any]]]]:
+    """Stream every result ordered by (gene, msa_pos, insertion order).
+
+    Rows are read with ``fetchmany`` and decoded one batch at a time, so memory stays
+    bounded by ``batch_size`` regardless of the number of results.
+
+    :param conn: SQLite connection to query.
+    :type conn: sqlite3.Connection
+    :param batch_size: Rows fetched and decoded per batch.
+    :type batch_size: int
+    :returns: Yields (gene, msa_pos, result dict or None when it cannot be decoded).
+    :rtype: Iterator[Tuple[str, int, Optional[Dict[str, Any]]]]
+    """
+    cur = conn.cursor()
+    cur.execute(f"SELECT {_RESULT_SELECT} FROM results ORDER BY gene, msa_pos, id")
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        for row, result in zip(rows, _decode_rows(conn, rows)):
+            yield row[1], row[2], result
+
+
 def iter_results_for_group(
     conn: sqlite3.Connection, gene: str, msa_pos: int
 ) -> Iterator[Optional[Dict[str, Any]]]:
@@ -473,33 +1046,112 @@ def iter_results_for_group(
     :rtype: Iterator[Optional[Dict[str, Any]]]
     """
     cur = conn.cursor()
-    for (result_json,) in cur.execute(
-        "SELECT result_json FROM results WHERE gene=? AND msa_pos=? ORDER BY id",
+    cur.execute(
+        f"SELECT {_RESULT_SELECT} FROM results WHERE gene=? AND msa_pos=? ORDER BY id",
         (gene, msa_pos),
-    ):
-        if not result_json:
-            yield None
-            continue
+    )
+    while True:
+        rows = cur.fetchmany(BATCH_SIZE)
+        if not rows:
+            break
+        yield from _decode_rows(conn, rows)
 
-        try:
-            obj = json.loads(result_json)
-        except Exception as e:
-            logger.warning(
-                f"Failed to parse JSON result for gene {gene} at msa_pos {msa_pos}: {e}"
-            )
-            yield None
-            continue
 
-        if isinstance(obj, dict) and obj.get("__pickled") and obj.get("blob"):
-            try:
-                return_obj = pickle.loads(bytes.fromhex(obj["blob"]))
-                if isinstance(return_obj, dict):
-                    yield return_obj
-                else:
-                    yield dict(getattr(return_obj, "__dict__", {}) or {})
-                continue
-            except Exception:
-                yield obj
-                continue
+def fetch_gene_fingerprints(
+    conn: sqlite3.Connection,
+) -> Dict[str, Tuple[str, Dict[str, str]]]:
+    """Return the stored input fingerprint of every gene.
+
+    :param conn: SQLite connection to query.
+    :type conn: sqlite3.Connection
+    :returns: Dict gene -> (fingerprint digest, per-input component digests).
+    :rtype: Dict[str, Tuple[str, Dict[str, str]]]
+    """
+    return {
+        gene: (fingerprint, json.loads(components_json) if components_json else {})
+        for gene, fingerprint, components_json in conn.execute(
+            "SELECT gene, fingerprint, components_json FROM gene_fingerprints"
+        )
+    }
+
+
+def store_gene_fingerprints(
+    conn: sqlite3.Connection, items: Iterable[Tuple[str, str, Dict[str, str]]]
+) -> None:
+    """Insert or replace gene fingerprints (the caller commits).
+
+    :param conn: Open SQLite connection.
+    :type conn: sqlite3.Connection
+    :param items: ``(gene, fingerprint, components)`` tuples; components are stored as JSON
+        so a changed input can be reported.
+    :type items: Iterable[Tuple[str, str, Dict[str, str]]]
+    :returns: None
+    :rtype: None
+    """
+    conn.executemany(
+        "INSERT OR REPLACE INTO gene_fingerprints (gene, fingerprint, components_json) "
+        "VALUES (?, ?, ?)",
+        (
+            (gene, fingerprint, json.dumps(components, sort_keys=True))
+            for gene, fingerprint, components in items
+        ),
+    )
+
+
+def fetch_file_digests(conn: sqlite3.Connection) -> Dict[str, Tuple[str, str]]:
+    """Return the cached file digests as path -> (``size:mtime_ns`` stamp, digest).
+
+    :param conn: SQLite connection to query.
+    :type conn: sqlite3.Connection
+    :returns: Dict path -> (stamp, digest).
+    :rtype: Dict[str, Tuple[str, str]]
+    """
+    return {
+        path: (stamp, digest)
+        for path, stamp, digest in conn.execute("SELECT path, stamp, digest FROM file_digests")
+    }
+
 
-        yield obj
+def store_file_digests(
+    conn: sqlite3.Connection, items: Iterable[Tuple[str, str, str]]
+) -> None:
+    """Insert or replace cached file digests (the caller commits).
+
+    :param conn: Open SQLite connection.
+    :type conn: sqlite3.Connection
+    :param items: ``(path, stamp, digest)`` tuples.
+    :type items: Iterable[Tuple[str, str, str]]
+    :returns: None
+    :rtype: None
+    """
+    conn.executemany(
+        "INSERT OR REPLACE INTO file_digests (path, stamp, digest) VALUES (?, ?, ?)", items
+    )
+
+
+def delete_gene_results(conn: sqlite3.Connection, genes: Iterable[str]) -> int:
+    """Delete the results, pairs, alignment metadata and fingerprints of ``genes``.
+
+    :param conn: Open SQLite connection (the caller commits).
+    :type conn: sqlite3.Connection
+    :param genes: Genes to drop.
+    :type genes: Iterable[str]
+    :returns: Number of result rows deleted.
+    :rtype: int
+    """
+    genes = list(genes)
+    deleted = 0
+    cur = conn.cursor()
+    for start in range(0, len(genes), BATCH_SIZE):
+        chunk = genes[start : start + BATCH_SIZE]
+        marks = ", ".join("?" * len(chunk))
+        cur.execute(
+            f"DELETE FROM result_pairs WHERE result_id IN "
+            f"(SELECT id FROM results WHERE gene IN ({marks}))",
+            chunk,
+        )
+        cur.execute(f"DELETE FROM results WHERE gene IN ({marks})", chunk)
+        deleted += cur.rowcount
+        cur.execute(f"DELETE FROM gene_alignment WHERE gene IN ({marks})", chunk)
+        cur.execute(f"DELETE FROM gene_fingerprints WHERE gene IN ({marks})", chunk)
+    return deleted
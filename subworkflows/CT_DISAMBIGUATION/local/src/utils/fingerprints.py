@@ -0,0 +1,228 @@
+"""Per-Gene Input Fingerprints for Incremental Runs
+================================================
+
+An incremental disambiguation run reuses the stored results of every gene whose
+inputs did not change since the previous run into the same output directory. A
+gene's fingerprint is the SHA-256 of its input components:
+
+- ``alignment``: content digest of the gene's alignment file;
+- ``metadata``: digest of the gene's parsed CAAS metadata rows;
+- ``rst``: content digest of the gene's codeml ``rst`` (precomputed/compute modes);
+- ``tree``, ``traits``, ``taxids``: content digests of the run-wide inputs;
+- ``params``: digest of the CLI parameters that change results
+  (:data:`FINGERPRINT_PARAMS`);
+- ``version``: :data:`FINGERPRINT_VERSION`, bumped when result-affecting code changes.
+
+File contents are hashed at most once per change: digests are cached by the
+``size:mtime_ns`` stamp of the file (as the posterior cache stamps its sources).
+
+Usage Example
+-------------
+::
+
+    digests = FileDigests(fetch_file_digests(conn))
+    fingerprinter = GeneFingerprinter.for_run(
+        digests, entries_by_gene, params, tree_file=tree, trait_file=traits,
+        asr_root=asr_cache_dir,
+    )
+    digest, components = fingerprinter.fingerprint("BRCA2", alignment_path)
+
+Author
+------
+Miguel Ramon Alonso
+Evolutionary Genomics Lab - IBE-UPF
+
+Date
+----
+2026-10
+"""
+
+import dataclasses
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+# Bump when a code change alters results for unchanged inputs
+FINGERPRINT_VERSION = 1
+
+# process_all_genes parameters that change a gene's results
+FINGERPRINT_PARAMS = (
+    "asr_mode",
+    "asr_model",
+    "posterior_threshold",
+    "convergence_mode",
+    "include_non_significant",
+    "run_diagnostics",
+)
+
+_CHUNK = 1 << 20
+
+
+def _sha256(payload: Any) -> str:
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+class FileDigests:
+    """SHA-256 of file contents, cached by the file's ``size:mtime_ns`` stamp."""
+
+    def __init__(self, known: Optional[Mapping[str, Tuple[str, str]]] = None):
+        self._known: Dict[str, Tuple[str, str]] = dict(known or {})
+        self._updated: Dict[str, Tuple[str, str]] = {}
+
+    def digest(self, path: Optional[Path]) -> str:
+        """Return the content digest of ``path`` ("-" for None or a missing file).
+
+        :param path: File to hash.
+        :type path: Optional[Path]
+        :returns: Hex SHA-256 digest, or "-".
+        :rtype: str
+        """
+        if path is None:
+            return "-"
+        key = str(Path(path).resolve())
+        try:
+            st = os.stat(key)
+        except OSError:
+            return "-"
+        stamp = f"{st.st_size}:{st.st_mtime_ns}"
+        cached = self._known.get(key)
+        if cached and cached[0] == stamp:
+            return cached[1]
+
+        sha = hashlib.sha256()
+        with open(key, "rb") as handle:
+            for chunk in iter(lambda: handle.read(_CHUNK), b""):
+                sha.update(chunk)
+        self._known[key] = self._updated[key] = (stamp, sha.hexdigest())
+        return self._known[key][1]
+
+    def updated(self) -> List[Tuple[str, str, str]]:
+        """Digests computed since construction, as ``(path, stamp, digest)`` rows."""
+        return [(path, stamp, digest) for path, (stamp, digest) in self._updated.items()]
+
+
+def find_gene_rst(gene: str, asr_root: Optional[Path]) -> Optional[Path]:
+    """Locate the codeml ``rst`` of ``gene`` (canonical ``asr_{GENE}/rst``, then legacy).
+
+    :param gene: Gene name.
+    :type gene: str
+    :param asr_root: ASR output/cache directory, or None (no rst).
+    :type asr_root: Optional[Path]
+    :returns: Path of the rst file or None.
+    :rtype: Optional[Path]
+    """
+    if asr_root is None:
+        return None
+    for rst_file in (
+        Path(asr_root) / f"asr_{gene}" / "rst",
+        Path(asr_root) / gene / f"asr_{gene}" / "rst",
+    ):
+        if rst_file.exists():
+            return rst_file
+    return None
+
+
+def metadata_digest(entries: Sequence[Any]) -> str:
+    """Digest of a gene's parsed CAAS metadata rows (dataclasses or dicts), order-sensitive.
+
+    :param entries: Metadata rows of one gene (e.g. ``CAASPosition`` entries).
+    :type entries: Sequence[Any]
+    :returns: Hex SHA-256 digest.
+    :rtype: str
+    """
+    return _sha256(
+        [
+            dataclasses.asdict(entry) if dataclasses.is_dataclass(entry) else entry
+            for entry in entries
+        ]
+    )
+
+
+class GeneFingerprinter:
+    """Fingerprint genes of one run: run-wide components plus per-gene file digests."""
+
+    def __init__(
+        self,
+        digests: FileDigests,
+        entries_by_gene: Mapping[str, Sequence[Any]],
+        run_components: Dict[str, str],
+        asr_root: Optional[Path] = None,
+    ):
+        self.digests = digests
+        self.entries_by_gene = entries_by_gene
+        self.run_components = run_components
+        self.asr_root = asr_root
+
+    @classmethod
+    def for_run(
+        cls,
+        digests: FileDigests,
+        entries_by_gene: Mapping[str, Sequence[Any]],
+        params: Mapping[str, Any],
+        tree_file: Optional[Path] = None,
+        trait_file: Optional[Path] = None,
+        taxid_mapping: Optional[Path] = None,
+        asr_root: Optional[Path] = None,
+    ) -> "GeneFingerprinter":
+        """Build a fingerprinter, hashing the run-wide inputs once.
+
+        :param digests: File digest cache.
+        :type digests: FileDigests
+        :param entries_by_gene: Parsed CAAS metadata rows per gene.
+        :type entries_by_gene: Mapping[str, Sequence[Any]]
+        :param params: Run parameters; only :data:`FINGERPRINT_PARAMS` are used.
+        :type params: Mapping[str, Any]
+        :param tree_file: Species tree.
+        :type tree_file: Optional[Path]
+        :param trait_file: Trait file.
+        :type trait_file: Optional[Path]
+        :param taxid_mapping: Taxid mapping file.
+        :type taxid_mapping: Optional[Path]
+        :param asr_root: Directory holding ``asr_{GENE}/rst`` (None when ASR has no rst).
+        :type asr_root: Optional[Path]
+        :returns: GeneFingerprinter
+        :rtype: GeneFingerprinter
+        """
+        run_components = {
+            "version": str(FINGERPRINT_VERSION),
+            "tree": digests.digest(tree_file),
+            "traits": digests.digest(trait_file),
+            "taxids": digests.digest(taxid_mapping),
+            "params": _sha256({key: params.get(key) for key in FINGERPRINT_PARAMS}),
+        }
+        return cls(digests, entries_by_gene, run_components, asr_root)
+
+    def fingerprint(
+        self, gene: str, alignment_path: Optional[Path]
+    ) -> Tuple[str, Dict[str, str]]:
+        """Return ``(digest, components)`` of ``gene``.
+
+        :param gene: Gene name.
+        :type gene: str
+        :param alignment_path: The gene's alignment file.
+        :type alignment_path: Optional[Path]
+        :returns: Tuple (fingerprint digest, component digests).
+        :rtype: Tuple[str, Dict[str, str]]
+        """
+        components = dict(self.run_components)
+        components["alignment"] = self.digests.digest(alignment_path)
+        components["metadata"] = metadata_digest(self.entries_by_gene.get(gene, []))
+        components["rst"] = self.digests.digest(find_gene_rst(gene, self.asr_root))
+        return _sha256(components), components
+
+
+def changed_components(old: Mapping[str, str], new: Mapping[str, str]) -> List[str]:
+    """Names of the components that differ between two fingerprints (sorted).
+
+    :param old: Stored components.
+    :type old: Mapping[str, str]
+    :param new: Current components.
+    :type new: Mapping[str, str]
+    :returns: Changed component names.
+    :rtype: List[str]
+    """
+    return sorted(key for key in set(old) | set(new) if old.get(key) != new.get(key))
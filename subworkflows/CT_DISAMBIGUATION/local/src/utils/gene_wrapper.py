@@ -33,17 +33,45 @@ from src.asr.asr_single import (
 from src.phylo.tree_utils import build_tree_node_mapping, extract_tip_labels
 from src.utils.concurrency import plan_concurrency, init_worker, codeml_slot
 from src.data.loaders import list_gene_caas_positions
-from src.utils.io_utils import find_gene_alignment
+from src.data.context import DisambiguationContext, build_disambiguation_context
+from src.utils.io_utils import find_gene_alignment, index_gene_alignments
+from src.utils.scheduling import (
+    RUNTIME_HISTORY_NAME,
+    RuntimeHistory,
+    dispatch_by_cost,
+    plan_gene_jobs,
+)
 
 from src.utils.disambiguation_db import (
     init_db,
     get_connection,
+    BATCH_SIZE as DB_BATCH_SIZE,
+    delete_gene_results,
+    fetch_file_digests,
+    fetch_gene_fingerprints,
     insert_gene_alignment,
-    insert_result,
+    insert_results,
+    store_file_digests,
+    store_gene_fingerprints,
 )
+from src.utils.fingerprints import FileDigests, GeneFingerprinter, changed_components
 
 logger = logging.getLogger(__name__)
 
+# Run-wide context of the current worker process (set by _init_gene_worker)
+_WORKER_CONTEXT: Optional[DisambiguationContext] = None
+
+
+def _init_gene_worker(
+    threads_per_gene: int,
+    codeml_sem=None,
+    context: Optional[DisambiguationContext] = None,
+) -> None:
+    """Pool initializer: thread/codeml setup plus the shared disambiguation context."""
+    init_worker(threads_per_gene, codeml_sem)
+    global _WORKER_CONTEXT
+    _WORKER_CONTEXT = context
+
 
 def convert_convergence_result_to_dict(
     result,
@@ -313,15 +341,22 @@ def process_single_gene(
     output_dir: Path,
     db_queue: Optional[Any] = None,
     ensembl_genes: Optional[Set[str]] = None,
+    context: Optional[DisambiguationContext] = None,
 ) -> Tuple[str, Optional[Path]]:
 
+    # Preloaded metadata/trait/tree/taxid inputs; None falls back to per-gene file reads
+    ctx = context if context is not None else _WORKER_CONTEXT
+
     try:
         alignment_path = find_gene_alignment(Path(alignment_dir), gene, ensembl_genes)
         if not alignment_path:
             logger.warning(f"No alignment found for {gene}, skipping")
             return (gene, None)
 
-        caas_positions = list_gene_caas_positions(Path(caas_metadata_path), gene)
+        if ctx is not None:
+            caas_positions = ctx.gene_positions(gene)
+        else:
+            caas_positions = list_gene_caas_positions(Path(caas_metadata_path), gene)
         if not caas_positions:
             logger.debug(f"No CAAS positions for {gene}")
             return (gene, None)
@@ -332,17 +367,24 @@ def process_single_gene(
             alignment_path,
             Path(taxid_mapping_path) if taxid_mapping_path else None,
             gene_name=gene,
+            taxid_mapping=ctx.taxid_mapping if ctx is not None else None,
         )
 
         tree_data = load_and_match_tree(
             Path(tree_file),
             alignment_data,
             Path(taxid_mapping_path) if taxid_mapping_path else None,
+            tree=ctx.tree if ctx is not None else None,
+            taxid_mapping=ctx.taxid_mapping if ctx is not None else None,
+            tree_cache=ctx.tree_cache if ctx is not None else None,
         )
 
         node_posteriors = None
         rst_file = None
         paml_tree_file = None
+        # Only CAAS sites are needed downstream; the diagnostics dump needs all of them
+        positions_1_based = {int(p) + 1 for p in caas_positions}
+        asr_positions = None if run_diagnostics else positions_1_based
 
         if asr_mode == "precomputed" and asr_cache_dir:
             from src.asr.asr_single import SingleGeneASRConfig
@@ -353,6 +395,7 @@ def process_single_gene(
                 model=asr_model,
                 posterior_threshold=posterior_threshold,
                 output_dir=Path(asr_cache_dir),
+                posterior_positions=asr_positions,
             )
             try:
                 node_posteriors = load_precomputed_asr(gene, asr_config, alignment_data)
@@ -375,6 +418,7 @@ def process_single_gene(
                 posterior_threshold=posterior_threshold,
                 output_dir=gene_output_dir,
                 threads=threads_per_gene,
+                posterior_positions=asr_positions,
             )
 
             with codeml_slot():
@@ -389,6 +433,22 @@ def process_single_gene(
                 rst_file = getattr(node_posteriors, "rst_file", None)
                 paml_tree_file = getattr(node_posteriors, "tree_file", None)
 
+        elif asr_mode == "native":
+            from src.asr.asr_single import SingleGeneASRConfig, run_native_asr
+
+            asr_config = SingleGeneASRConfig(
+                alignment_path=alignment_path,
+                tree_path=Path(tree_file),
+                model=asr_model,
+                posterior_threshold=posterior_threshold,
+                # Never under asr_cache_dir: partial rst files must not replace codeml ones
+                output_dir=output_dir / "asr",
+                posterior_positions=asr_positions,
+            )
+            node_posteriors = run_native_asr(gene, asr_config, alignment_data, tree_data)
+            rst_file = node_posteriors.rst_file
+            paml_tree_file = node_posteriors.tree_file
+
         # Rebuild tree_data with PAML-labeled tree to align node IDs
         if rst_file and paml_tree_file and Path(paml_tree_file).exists():
             try:
@@ -412,51 +472,60 @@ def process_single_gene(
                 logger.warning(f"Could not rebuild tree_data from PAML tree: {e}")
 
         diag_root = output_dir / "diagnostics" if run_diagnostics else None
-        posterior_dump_jsonl = None
+        posterior_dump = None
 
-        if (
-            run_diagnostics
-            and node_posteriors
-            and getattr(node_posteriors, "posteriors_node", None)
-        ):
+        if run_diagnostics:
             try:
-                from src.asr.posterior import export_posteriors_to_jsonl
+                from src.asr.node_dump import export_posteriors_to_dump, node_dump_path
 
                 effective_diag_root = (
                     diag_root if diag_root is not None else (output_dir / "diagnostics")
                 )
                 posterior_dump_dir = effective_diag_root / "node_dumps"
-                posterior_dump_dir.mkdir(parents=True, exist_ok=True)
-                posterior_dump_jsonl = (
-                    posterior_dump_dir / f"{gene.lower()}_posteriors.jsonl"
+                # Site-indexed binary dump; `python -m src.asr.node_dump` prints it as JSONL
+                posterior_dump = node_dump_path(posterior_dump_dir, gene)
+                posteriors_node = (
+                    getattr(node_posteriors, "posteriors_node", None) or {}
+                    if node_posteriors
+                    else {}
                 )
 
-                if not posterior_dump_jsonl.exists():
-                    posteriors_node = (
-                        getattr(node_posteriors, "posteriors_node", {}) or {}
-                    )
+                # The gene is being (re)computed: always rewrite its dump, so an
+                # incremental rerun never keeps the dump of the previous inputs
+                if posteriors_node:
+                    posterior_dump_dir.mkdir(parents=True, exist_ok=True)
                     posteriors_mapping = {int(k): v for k, v in posteriors_node.items()}
-                    export_posteriors_to_jsonl(
+                    export_posteriors_to_dump(
                         posteriors_mapping,
-                        posterior_dump_jsonl,
+                        posterior_dump,
                         (
                             node_posteriors.node_id_map
                             if hasattr(node_posteriors, "node_id_map")
                             else None
                         ),
                     )
-                    logger.debug(f"Wrote posterior JSONL to {posterior_dump_jsonl}")
+                    logger.debug(f"Wrote node posterior dump to {posterior_dump}")
+                else:
+                    if posterior_dump.exists():
+                        posterior_dump.unlink()
+                        logger.debug(f"Removed stale node posterior dump {posterior_dump}")
+                    posterior_dump = None
             except Exception as e:
-                logger.warning(f"Failed to export posterior JSONL for {gene}: {e}")
+                posterior_dump = None
+                logger.warning(f"Failed to export node posterior dump for {gene}: {e}")
 
         # Filter posteriors to CAAS positions
         filtered_posteriors = None
         if node_posteriors and getattr(node_posteriors, "posteriors_node", None):
-            positions_1_based = {int(p) + 1 for p in caas_positions}
             try:
                 from src.asr.posterior import parse_paml_rst_node_level
 
-                if getattr(node_posteriors, "rst_file", None) and getattr(
+                store = getattr(node_posteriors, "posterior_store", None)
+                if store is not None and store.node_ids:
+                    filtered_posteriors, _ = store.node_posteriors(
+                        threshold=posterior_threshold, positions=positions_1_based
+                    )
+                elif getattr(node_posteriors, "rst_file", None) and getattr(
                     node_posteriors, "tree_file", None
                 ):
                     parsed = parse_paml_rst_node_level(
@@ -492,8 +561,10 @@ def process_single_gene(
             alignment_data=alignment_data,
             tree_data=tree_data,
             caas_positions=caas_positions,
-            caas_metadata_path=Path(caas_metadata_path),
+            caas_entries=(ctx.gene_entries(gene) or None) if ctx is not None else None,
+            caas_metadata_path=None if ctx is not None else Path(caas_metadata_path),
             trait_file_path=Path(trait_file_path),
+            trait_pairs=ctx.trait_pairs if ctx is not None else None,
             taxid_mapping=alignment_data.species_to_taxid,
             posterior_data=(
                 filtered_posteriors
@@ -542,9 +613,7 @@ def process_single_gene(
             "species_to_taxid": getattr(alignment_data, "species_to_taxid", None),
             "alignment_extras": {
                 "paml_tree_file": paml_tree_file,
-                "posterior_dump_jsonl": (
-                    str(posterior_dump_jsonl) if posterior_dump_jsonl else None
-                ),
+                "posterior_dump": str(posterior_dump) if posterior_dump else None,
                 "node_id_map": (
                     node_posteriors.node_id_map
                     if node_posteriors and hasattr(node_posteriors, "node_id_map")
@@ -614,13 +683,33 @@ def process_single_gene(
         return (gene, None)
 
     except FileNotFoundError:
+        _report_gene_failure(db_queue, gene)
         return (gene, None)
 
     except Exception as e:
         logger.error(f"Failed to process {gene}: {e}", exc_info=True)
+        _report_gene_failure(db_queue, gene)
         return (gene, None)
 
 
+def _report_gene_failure(db_queue: Optional[Any], gene: str) -> None:
+    """Tell the DB writer that ``gene`` did not complete (no fingerprint is stored for it)."""
+    if db_queue is not None:
+        try:
+            db_queue.put({"type": "failed", "gene": gene})
+        except Exception:
+            pass
+
+
+def _remove_db(db_path: Path) -> None:
+    """Delete an aggregation DB and its WAL/shared-memory files."""
+    for path in (db_path, Path(f"{db_path}-wal"), Path(f"{db_path}-shm")):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
 def process_all_genes(
     genes: List[str],
     alignment_dir: str,
@@ -641,7 +730,17 @@ def process_all_genes(
     ensembl_genes_file: Optional[str] = None,
     max_tasks_per_child: Optional[int] = None,
     max_codeml: Optional[int] = None,
+    adaptive_threads: bool = True,
+    max_threads_per_gene: Optional[int] = None,
+    incremental: bool = False,
 ) -> Tuple[List[Dict], Optional[Dict]]:
+    """Process genes in a worker pool, stream results into the aggregation DB and export.
+
+    Every run stores a fingerprint of each completed gene's inputs (see
+    :mod:`src.utils.fingerprints`). Without ``incremental`` the DB is rebuilt from
+    scratch; with it, genes whose fingerprint is unchanged keep their stored rows and
+    only new or stale genes are recomputed (genes no longer listed are dropped).
+    """
 
     effective_workers, threads_per_gene = plan_concurrency(
         workers, threads_per_gene, logger
@@ -665,6 +764,20 @@ def process_all_genes(
     except Exception as exc:  # pragma: no cover - defensive
         logger.warning(f"Failed to load Ensembl genes from {ensembl_genes_file}: {exc}")
 
+    # Metadata, trait pairs, taxids and tree are read once and shared with the workers
+    context: Optional[DisambiguationContext] = None
+    try:
+        context = build_disambiguation_context(
+            Path(caas_metadata_path),
+            Path(trait_file_path) if trait_file_path else None,
+            Path(tree_file) if tree_file else None,
+            Path(taxid_mapping_path) if taxid_mapping_path else None,
+        )
+    except Exception as exc:
+        logger.warning(
+            f"Could not preload disambiguation context ({exc}); genes will read inputs individually"
+        )
+
     # Optional gate to limit concurrent codeml runs
     codeml_sem = None
     if max_codeml is not None:
@@ -672,14 +785,17 @@ def process_all_genes(
         codeml_sem = manager.Semaphore(max(1, int(max_codeml)))
 
     # Init DB + queue + writer
+    if not incremental:
+        _remove_db(db_path)
     init_db(db_path)
     manager = mp.Manager()
     db_queue = manager.Queue()
+    failed_genes: Set[str] = set()
 
     def _db_writer(db_path_local, queue):
         conn = get_connection(db_path_local)
         genes_seen = set()
-        insert_count = 0
+        pending = []
         try:
             while True:
                 item = queue.get()
@@ -695,76 +811,189 @@ def process_all_genes(
                             genes_seen.add(gene_name)
 
                     elif item.get("type") == "result":
-                        insert_result(
-                            conn,
-                            item.get("gene"),
-                            item.get("msa_pos"),
-                            item.get("position"),
-                            item.get("result") or {},
+                        pending.append(
+                            (
+                                item.get("gene"),
+                                item.get("msa_pos"),
+                                item.get("position"),
+                                item.get("result") or {},
+                            )
                         )
-                        insert_count += 1
-                        if insert_count % 100 == 0:
+                        if len(pending) >= DB_BATCH_SIZE:
+                            insert_results(conn, pending)
                             conn.commit()
+                            pending = []
+
+                    elif item.get("type") == "failed":
+                        failed_genes.add(item.get("gene"))
 
                 except Exception:
                     conn.rollback()
                     raise
+            if pending:
+                insert_results(conn, pending)
         finally:
             conn.commit()
             conn.close()
 
+    if max_tasks_per_child is not None:
+        maxtasks = int(max_tasks_per_child)
+    else:
+        maxtasks = int(os.environ.get("CAAS_MAX_TASKS_PER_CHILD", "50"))
+
+    # Longest-expected-first dispatch; codeml genes also get threads sized by expected cost
+    cpu_budget = effective_workers * threads_per_gene
+    adaptive = adaptive_threads and asr_mode == "compute"
+    alignment_paths = {
+        gene: path
+        for gene, path in index_gene_alignments(Path(alignment_dir)).items()
+        if (ensembl_genes is None or gene in ensembl_genes)
+        and (context is None or context.gene_positions(gene))
+    }
+    # Fingerprint every gene with an alignment; unchanged genes keep their stored rows
+    if asr_mode == "compute":
+        rst_root: Optional[Path] = Path(asr_cache_dir) if asr_cache_dir else output_dir / "asr"
+    elif asr_mode == "precomputed" and asr_cache_dir:
+        rst_root = Path(asr_cache_dir)
+    else:
+        rst_root = None
+    params = {
+        "asr_mode": asr_mode,
+        "asr_model": asr_model,
+        "posterior_threshold": posterior_threshold,
+        "convergence_mode": convergence_mode,
+        "include_non_significant": include_non_significant,
+        "run_diagnostics": run_diagnostics,
+    }
+    conn = get_connection(db_path)
+    try:
+        digests = FileDigests(fetch_file_digests(conn))
+        stored_fingerprints = fetch_gene_fingerprints(conn)
+    finally:
+        conn.close()
+    if context is not None:
+        entries_by_gene = context.entries_by_gene
+    else:
+        from src.data.loaders import index_caas_metadata
+
+        entries_by_gene = index_caas_metadata(Path(caas_metadata_path))[1]
+    fingerprinter = GeneFingerprinter.for_run(
+        digests,
+        entries_by_gene,
+        params,
+        tree_file=Path(tree_file) if tree_file else None,
+        trait_file=Path(trait_file_path) if trait_file_path else None,
+        taxid_mapping=Path(taxid_mapping_path) if taxid_mapping_path else None,
+        asr_root=rst_root,
+    )
+
+    genes_to_run = list(genes)
+    if incremental:
+        reused, changed = [], {}
+        for gene in genes:
+            if gene not in alignment_paths or gene not in stored_fingerprints:
+                continue
+            digest, components = fingerprinter.fingerprint(gene, alignment_paths[gene])
+            stored_digest, stored_components = stored_fingerprints[gene]
+            if digest == stored_digest:
+                reused.append(gene)
+            else:
+                changed[gene] = changed_components(stored_components, components)
+        reused_set = set(reused)
+        genes_to_run = [g for g in genes if g not in reused_set]
+        listed = set(genes)
+        dropped = [g for g in stored_fingerprints if g not in listed]
+
+        conn = get_connection(db_path)
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT DISTINCT gene FROM results")
+            dropped += [row[0] for row in cur.fetchall() if row[0] not in listed]
+            deleted = delete_gene_results(conn, set(genes_to_run) | set(dropped))
+            conn.commit()
+        finally:
+            conn.close()
+
+        by_input: Dict[str, int] = {}
+        for names in changed.values():
+            for name in names:
+                by_input[name] = by_input.get(name, 0) + 1
+        logger.info(
+            f"Incremental run: reusing {len(reused)} unchanged genes, recomputing "
+            f"{len(genes_to_run)} ({len(changed)} changed, "
+            f"{len(genes_to_run) - len(changed)} new or unfinished), dropping "
+            f"{len(set(dropped))} unlisted genes ({deleted} stale result rows deleted)"
+        )
+        if by_input:
+            logger.info(
+                "Changed inputs: "
+                + ", ".join(f"{name}={count}" for name, count in sorted(by_input.items()))
+            )
+
     writer_thread = threading.Thread(
         target=_db_writer, args=(db_path, db_queue), daemon=True
     )
     writer_thread.start()
 
-    if max_tasks_per_child is not None:
-        maxtasks = int(max_tasks_per_child)
-    else:
-        maxtasks = int(os.environ.get("CAAS_MAX_TASKS_PER_CHILD", "50"))
+    history = None
+    if asr_mode == "compute":
+        asr_root = Path(asr_cache_dir) if asr_cache_dir else output_dir / "asr"
+        history = RuntimeHistory.load(asr_root / RUNTIME_HISTORY_NAME)
+    jobs = plan_gene_jobs(
+        genes_to_run,
+        alignment_paths,
+        history,
+        cpu_budget=cpu_budget,
+        base_threads=threads_per_gene,
+        max_threads=max_threads_per_gene,
+        adaptive_threads=adaptive,
+    )
 
     pool = mp.Pool(
-        processes=effective_workers,
-        initializer=init_worker,
-        initargs=(threads_per_gene, codeml_sem),
+        # Small genes may run on fewer threads than requested, so more of them fit the budget
+        processes=max(1, min(cpu_budget, len(jobs))) if adaptive else effective_workers,
+        initializer=_init_gene_worker,
+        initargs=(threads_per_gene, codeml_sem, context),
         maxtasksperchild=maxtasks,
     )
 
-    async_results = []
+    def _submit(job, job_threads, on_done):
+        return pool.apply_async(
+            process_single_gene,
+            (
+                job.gene,
+                alignment_dir,
+                tree_file,
+                caas_metadata_path,
+                trait_file_path,
+                taxid_mapping_path,
+                asr_mode,
+                asr_model,
+                asr_cache_dir,
+                posterior_threshold,
+                convergence_mode,
+                job_threads,
+                include_non_significant,
+                run_diagnostics,
+                output_dir,
+                db_queue,
+                ensembl_genes,
+            ),
+            callback=lambda _res: on_done(),
+            error_callback=lambda _exc: on_done(),
+        )
+
     try:
-        for gene in genes:
-            async_results.append(
-                pool.apply_async(
-                    process_single_gene,
-                    (
-                        gene,
-                        alignment_dir,
-                        tree_file,
-                        caas_metadata_path,
-                        trait_file_path,
-                        taxid_mapping_path,
-                        asr_mode,
-                        asr_model,
-                        asr_cache_dir,
-                        posterior_threshold,
-                        convergence_mode,
-                        threads_per_gene,
-                        include_non_significant,
-                        run_diagnostics,
-                        output_dir,
-                        db_queue,
-                        ensembl_genes,
-                    ),
-                )
-            )
+        handles = dispatch_by_cost(jobs, _submit, cpu_budget, max_threads_per_gene, logger)
 
         # Force retrieval to surface errors early
-        for idx, async_res in enumerate(async_results):
-            gene = genes[idx]
+        for job in jobs:
+            async_res, _ = handles[job.index]
             try:
                 async_res.get()
             except Exception as e:
-                logger.error(f"Gene {gene} failed: {e}", exc_info=True)
+                failed_genes.add(job.gene)
+                logger.error(f"Gene {job.gene} failed: {e}", exc_info=True)
 
     finally:
         pool.close()
@@ -774,6 +1003,22 @@ def process_all_genes(
     db_queue.put(None)
     writer_thread.join()
 
+    # Fingerprint the completed genes after the run (compute mode has written their rst)
+    conn = get_connection(db_path)
+    try:
+        store_gene_fingerprints(
+            conn,
+            (
+                (gene, *fingerprinter.fingerprint(gene, alignment_paths[gene]))
+                for gene in genes_to_run
+                if gene in alignment_paths and gene not in failed_genes
+            ),
+        )
+        store_file_digests(conn, digests.updated())
+        conn.commit()
+    finally:
+        conn.close()
+
     # Determine processed genes
     conn = get_connection(db_path)
     try:
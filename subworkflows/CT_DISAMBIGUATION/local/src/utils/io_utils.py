@@ -15,7 +15,7 @@ Date
 """
 
 from pathlib import Path
-from typing import Optional, Set
+from typing import Dict, Optional, Set
 import logging
 
 from Bio import AlignIO
@@ -77,6 +77,25 @@ def find_gene_alignment(
     raise FileNotFoundError(f"No alignment file found for gene {gene}")
 
 
+def index_gene_alignments(alignment_dir: Optional[Path]) -> Dict[str, Path]:
+    """Map every gene prefix of ``alignment_dir`` to its alignment file in one scan.
+
+    Same matching rule as :func:`find_gene_alignment` (first sorted candidate whose name
+    before the first dot equals the gene), without re-globbing the tree once per gene.
+
+    :param alignment_dir: Directory containing alignment files (searched recursively).
+    :type alignment_dir: Optional[Path]
+    :returns: Dict gene -> alignment path (empty if the directory does not exist).
+    :rtype: Dict[str, Path]
+    """
+    index: Dict[str, Path] = {}
+    if alignment_dir and alignment_dir.exists():
+        for path in sorted(alignment_dir.glob("**/*")):
+            if _is_supported_alignment_path(path):
+                index.setdefault(path.name.split(".", 1)[0], path)
+    return index
+
+
 def read_alignment(
     alignment_file: Path,
     format: str = "auto",
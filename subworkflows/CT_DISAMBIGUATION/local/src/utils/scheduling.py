@@ -0,0 +1,332 @@
+"""Cost-Aware Scheduling of Per-Gene ASR Jobs
+==========================================
+
+codeml runtimes span orders of magnitude across genes, so submitting genes in input
+order leaves a long tail where one large alignment runs alone while the remaining
+CPUs idle. This module orders genes longest-expected-first and sizes each gene's
+OMP thread count from its expected cost within a fixed CPU budget.
+
+Expected cost comes from two sources:
+
+- the alignment shape (taxa x columns), read cheaply from the file header/records;
+- wall-clock runtimes of previous runs, kept in a small JSON history file
+  (:data:`RUNTIME_HISTORY_NAME`) next to the ASR outputs. Shape estimates are
+  converted to seconds with the median seconds-per-cell ratio of recorded genes.
+
+Usage Example
+-------------
+::
+
+    history = RuntimeHistory.load(output_dir / RUNTIME_HISTORY_NAME)
+    jobs = plan_gene_jobs(genes, alignment_paths, history, cpu_budget=16, base_threads=2)
+    handles = dispatch_by_cost(jobs, submit, cpu_budget=16)
+
+Author
+------
+Miguel Ramon Alonso
+Evolutionary Genomics Lab - IBE-UPF
+
+Date
+----
+2026-10
+"""
+
+import json
+import os
+import queue
+import statistics
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+RUNTIME_HISTORY_NAME = "asr_runtime_history.json"
+
+# Default cap of planned threads, as a multiple of the requested threads per gene
+# (codeml's OMP speedup flattens well before a whole node's cores)
+MAX_THREAD_FACTOR = 4
+
+
+def alignment_shape(alignment_path: Path) -> Tuple[int, int]:
+    """Return ``(taxa, columns)`` of an alignment without parsing it with BioPython.
+
+    PHYLIP files are read from their header line; FASTA files by counting records and
+    the length of the first sequence. Unreadable files yield ``(0, 0)``.
+
+    :param alignment_path: FASTA or PHYLIP alignment file.
+    :type alignment_path: Path
+    :returns: Tuple (number of sequences, alignment length).
+    :rtype: Tuple[int, int]
+    """
+    try:
+        with open(alignment_path, "r") as handle:
+            first = handle.readline()
+            if not first.startswith(">"):
+                parts = first.split()
+                if len(parts) >= 2 and parts[0].isdigit() and parts[1].isdigit():
+                    return int(parts[0]), int(parts[1])
+                return 0, 0
+
+            taxa, columns, in_first = 1, 0, True
+            for line in handle:
+                if line.startswith(">"):
+                    taxa += 1
+                    in_first = False
+                elif in_first:
+                    columns += len(line.strip())
+            return taxa, columns
+    except (OSError, UnicodeDecodeError):
+        return 0, 0
+
+
+def estimate_alignment_cost(alignment_path: Optional[Path]) -> float:
+    """Estimate relative ASR cost of an alignment as taxa x columns.
+
+    Falls back to the file size in bytes (roughly proportional to taxa x columns for
+    aligned files) when the shape cannot be read.
+
+    :param alignment_path: Alignment file or None.
+    :type alignment_path: Optional[Path]
+    :returns: Non-negative cost in alignment cells.
+    :rtype: float
+    """
+    if alignment_path is None:
+        return 0.0
+    taxa, columns = alignment_shape(alignment_path)
+    if taxa and columns:
+        return float(taxa * columns)
+    try:
+        return float(os.path.getsize(alignment_path))
+    except OSError:
+        return 0.0
+
+
+@dataclass
+class RuntimeHistory:
+    """Per-gene runtimes of previous ASR runs, persisted as JSON.
+
+    Each entry stores the wall-clock ``seconds`` of the run, the ``threads`` it used
+    and the alignment ``cost`` (taxa x columns) at the time.
+    """
+
+    path: Optional[Path] = None
+    entries: Dict[str, Dict[str, float]] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: Optional[Path]) -> "RuntimeHistory":
+        """Read a history file; a missing or unreadable file gives an empty history."""
+        entries: Dict[str, Dict[str, float]] = {}
+        if path is not None and Path(path).exists():
+            try:
+                raw = json.loads(Path(path).read_text())
+                entries = {
+                    str(gene): rec
+                    for gene, rec in raw.get("genes", {}).items()
+                    if isinstance(rec, dict) and float(rec.get("seconds", 0)) > 0
+                }
+            except (OSError, ValueError, TypeError, AttributeError):
+                entries = {}
+        return cls(path=Path(path) if path is not None else None, entries=entries)
+
+    def record(self, gene: str, seconds: float, threads: int, cost: float) -> None:
+        """Store (or replace) the runtime of ``gene``."""
+        self.entries[gene] = {
+            "seconds": round(float(seconds), 3),
+            "threads": int(max(1, threads)),
+            "cost": float(cost),
+        }
+
+    def save(self) -> None:
+        """Write the history atomically (temporary file + rename)."""
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps({"version": 1, "genes": self.entries}, indent=1, sort_keys=True))
+        os.replace(tmp, self.path)
+
+    def work_seconds(self, gene: str) -> Optional[float]:
+        """Recorded single-thread work of ``gene`` (seconds x threads), if any.
+
+        Scaling seconds by the thread count overestimates work for genes that did not
+        scale linearly, which only errs towards scheduling them earlier.
+        """
+        rec = self.entries.get(gene)
+        if not rec:
+            return None
+        return float(rec["seconds"]) * max(1, int(rec.get("threads", 1)))
+
+    def seconds_per_cost(self) -> Optional[float]:
+        """Median work seconds per alignment cell over recorded genes (None if unknown)."""
+        ratios = [
+            float(rec["seconds"]) * max(1, int(rec.get("threads", 1))) / float(rec["cost"])
+            for rec in self.entries.values()
+            if float(rec.get("cost", 0)) > 0
+        ]
+        return statistics.median(ratios) if ratios else None
+
+
+@dataclass
+class GeneJob:
+    """One gene to dispatch, with its expected work and planned thread count."""
+
+    gene: str
+    index: int
+    cost: float
+    expected: float
+    threads: int
+    alignment_path: Optional[Path] = None
+
+
+def plan_gene_jobs(
+    genes: Sequence[str],
+    alignment_paths: Mapping[str, Path],
+    history: Optional[RuntimeHistory],
+    cpu_budget: int,
+    base_threads: int,
+    max_threads: Optional[int] = None,
+    adaptive_threads: bool = True,
+) -> List[GeneJob]:
+    """Order genes longest-expected-first and plan their OMP thread counts.
+
+    Expected work is the recorded runtime when the history has the gene, otherwise
+    the alignment cost converted with the history's seconds-per-cell ratio (or the raw
+    cost when no gene of the history can calibrate it, in which case recorded
+    runtimes are ignored so all genes share one unit).
+
+    With ``adaptive_threads`` a gene of median expected work gets ``base_threads``;
+    larger genes get proportionally more (up to ``max_threads``, by default
+    ``MAX_THREAD_FACTOR x base_threads``) and smaller ones
+    fewer (down to 1). Otherwise every gene gets ``base_threads``.
+
+    :param genes: Genes in input order (``GeneJob.index`` refers to this order).
+    :type genes: Sequence[str]
+    :param alignment_paths: Gene -> alignment file (missing genes get zero cost).
+    :type alignment_paths: Mapping[str, Path]
+    :param history: Runtime history of previous runs, or None.
+    :type history: Optional[RuntimeHistory]
+    :param cpu_budget: CPUs shared by all concurrent jobs.
+    :type cpu_budget: int
+    :param base_threads: Threads of a median gene (the user's threads-per-gene).
+    :type base_threads: int
+    :param max_threads: Upper bound of threads for a single gene.
+    :type max_threads: Optional[int]
+    :param adaptive_threads: Whether to retune threads per gene.
+    :type adaptive_threads: bool
+    :returns: Jobs sorted by decreasing expected work (ties keep input order).
+    :rtype: List[GeneJob]
+    """
+    base_threads = max(1, int(base_threads or 1))
+    cap = max(1, min(int(max_threads or MAX_THREAD_FACTOR * base_threads), int(cpu_budget)))
+    ratio = history.seconds_per_cost() if history is not None else None
+
+    jobs: List[GeneJob] = []
+    for index, gene in enumerate(genes):
+        path = alignment_paths.get(gene)
+        cost = estimate_alignment_cost(path)
+        expected = cost * ratio if ratio is not None else cost
+        if ratio is not None:
+            recorded = history.work_seconds(gene)
+            if recorded is not None:
+                expected = recorded
+        jobs.append(
+            GeneJob(
+                gene=gene,
+                index=index,
+                cost=cost,
+                expected=expected,
+                threads=min(base_threads, cap),
+                alignment_path=path,
+            )
+        )
+
+    jobs.sort(key=lambda job: (-job.expected, job.index))
+
+    positive = [job.expected for job in jobs if job.expected > 0]
+    if adaptive_threads and positive:
+        median = statistics.median(positive)
+        for job in jobs:
+            scaled = base_threads * job.expected / median if median > 0 else base_threads
+            job.threads = max(1, min(cap, int(round(scaled))))
+    return jobs
+
+
+def dispatch_threads(planned: int, free_cpus: int, queued: int, max_threads: int) -> int:
+    """Threads for the next job given the CPUs currently free.
+
+    A job never takes more than the free CPUs; at the tail of the queue (fewer jobs
+    left than free CPUs) the free CPUs are shared among the remaining jobs instead of
+    idling.
+
+    :param planned: Planned threads of the job.
+    :type planned: int
+    :param free_cpus: CPUs not used by running jobs.
+    :type free_cpus: int
+    :param queued: Jobs not yet dispatched, including this one.
+    :type queued: int
+    :param max_threads: Upper bound for a single job.
+    :type max_threads: int
+    :returns: Threads to run the job with (at least 1).
+    :rtype: int
+    """
+    threads = min(planned, free_cpus)
+    if queued < free_cpus:
+        threads = max(threads, min(max_threads, free_cpus // max(1, queued)))
+    return max(1, threads)
+
+
+def dispatch_by_cost(
+    jobs: Sequence[GeneJob],
+    submit: Callable[[GeneJob, int, Callable[[], None]], Any],
+    cpu_budget: int,
+    max_threads: Optional[int] = None,
+    logger=None,
+) -> Dict[int, Tuple[Any, int]]:
+    """Submit jobs in order while keeping the sum of running threads within budget.
+
+    ``submit(job, threads, on_done)`` must start the job asynchronously and arrange
+    for ``on_done()`` to be called once it finishes, successfully or not (e.g. via
+    ``Future.add_done_callback`` or ``Pool.apply_async(callback=..., error_callback=...)``).
+    The call blocks until the last job has been submitted; it does not wait for it.
+
+    :param jobs: Jobs in dispatch order (see :func:`plan_gene_jobs`).
+    :type jobs: Sequence[GeneJob]
+    :param submit: Callback that starts one job and returns a handle.
+    :type submit: Callable[[GeneJob, int, Callable[[], None]], Any]
+    :param cpu_budget: CPUs shared by all concurrent jobs.
+    :type cpu_budget: int
+    :param max_threads: Upper bound of threads for a single job (default: cpu_budget).
+    :type max_threads: Optional[int]
+    :param logger: Optional logger for per-job dispatch diagnostics.
+    :type logger: Optional[logging.Logger]
+    :returns: Dict job index -> (handle returned by submit, threads used).
+    :rtype: Dict[int, Tuple[Any, int]]
+    """
+    cpu_budget = max(1, int(cpu_budget))
+    cap = max(1, min(int(max_threads or cpu_budget), cpu_budget))
+    finished: "queue.Queue[int]" = queue.Queue()
+    running: Dict[int, int] = {}
+    handles: Dict[int, Tuple[Any, int]] = {}
+    free = cpu_budget
+
+    for position, job in enumerate(jobs):
+        # Free CPUs of finished jobs; block until at least one CPU is available
+        while running and (free < 1 or not finished.empty()):
+            free += running.pop(finished.get())
+
+        threads = dispatch_threads(job.threads, free, len(jobs) - position, cap)
+        free -= threads
+        running[job.index] = threads
+        if logger:
+            logger.debug(
+                "Dispatching %s (expected=%.3g, planned=%d, threads=%d, free=%d)",
+                job.gene,
+                job.expected,
+                job.threads,
+                threads,
+                free,
+            )
+        handles[job.index] = (
+            submit(job, threads, lambda index=job.index: finished.put(index)),
+            threads,
+        )
+    return handles
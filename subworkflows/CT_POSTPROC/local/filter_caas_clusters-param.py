@@ -111,22 +111,72 @@ def setup_logger(input_path: Path, maxcaas: float, minlen: int, verbose: bool):
 # CAAS Clustering Detection Algorithm
 # ============================================================================
 
+# Slack on the rearranged density test used to find candidate interval ends;
+# candidates are then checked with the exact count / span >= maxcaas test
+_DENSITY_SLACK = 1e-7
+
+
+def train_reach(unique, maxcaas, minlen):
+    """
+    For each start index l, the largest end index r of a dense interval [l, r].
+
+    An interval of sorted unique positions p[l..r] is dense when its span
+    p[r] - p[l] + 1 is >= minlen and (r - l + 1) / span >= maxcaas. Rearranged,
+    density >= maxcaas is g[r] >= g[l] - 1 + maxcaas with g[i] = i - maxcaas * p[i],
+    so the largest candidate r is found by binary search on the suffix maximum of g.
+    Candidates are confirmed with the exact floating-point density test; the rare
+    borderline ones that fail it fall back to a downward scan.
+
+    Args:
+        unique: Sorted unique integer positions (NumPy array)
+        maxcaas: Density threshold
+        minlen: Minimum interval span
+
+    Returns:
+        int64 array: largest dense end index per start index (-1 if none)
+    """
+    unique = np.asarray(unique, dtype=np.int64)
+    n = len(unique)
+    idx = np.arange(n)
+    g = idx - maxcaas * unique.astype(np.float64)
+    suffix_max = np.maximum.accumulate(g[::-1])[::-1]
+    threshold = g - 1.0 + maxcaas - _DENSITY_SLACK
+    # suffix_max is non-increasing: count the ends whose suffix reaches the threshold
+    reach = np.searchsorted(-suffix_max, -threshold, side="right") - 1
+    # Smallest end index whose span reaches minlen
+    first_end = np.searchsorted(unique, unique + (minlen - 1), side="left")
+
+    candidate = reach >= first_end
+    exact = np.zeros(n, dtype=bool)
+    ends, starts = reach[candidate], idx[candidate]
+    exact[candidate] = (ends - starts + 1) / (unique[ends] - unique[starts] + 1) >= maxcaas
+    dense_end = np.where(exact, reach, -1)
+
+    for l in np.flatnonzero(candidate & ~exact).tolist():
+        for r in range(int(reach[l]) - 1, int(first_end[l]) - 1, -1):
+            if (r - l + 1) / (unique[r] - unique[l] + 1) >= maxcaas:
+                dense_end[l] = r
+                break
+    return dense_end
+
+
 def ctrain(position_list, maxcaas=0.5, minlen=10, logger=None):
     """
     Identify CAAS positions within high-density clusters ("trains").
     
-    This function evaluates all possible intervals of CAAS positions within a gene,
-    identifying those where the density (positions per span) exceeds the threshold.
-    Positions in any high-density interval are marked for removal.
+    A position is discarded when it lies in any interval of CAAS positions whose
+    density (positions per span) reaches the threshold. Instead of testing every
+    (l, r) pair, the largest dense interval starting at each position is found
+    with :func:`train_reach` (O(n log n)), and a prefix-max sweep over those ends
+    marks the covered positions; the discard set is identical.
     
     Algorithm:
     ----------
     1. Sort and extract unique positions
-    2. For each pair of positions (l, r):
-       - Calculate interval span: end - start + 1
-       - Calculate density: position_count / span
-       - If density ≥ maxcaas and span ≥ minlen, mark all positions in [l, r] as bad
-    3. Return sorted list of bad positions
+    2. For each start l, find the largest r such that [l, r] has
+       span = end - start + 1 >= minlen and density = count / span >= maxcaas
+    3. Position k is discarded if max(reach[0..k]) >= k
+    4. Return sorted list of bad positions
     
     Args:
         position_list: List of integer positions for a single gene
@@ -143,39 +193,26 @@ def ctrain(position_list, maxcaas=0.5, minlen=10, logger=None):
         - Interval [10, 12]: span=3, count=3, density=1.0 > 0.7 → discard [10, 11, 12]
         - Interval [10, 50]: span=41, count=4, density=0.098 < 0.7 → keep
     """
-    unique = np.sort(np.unique(position_list))
+    unique = np.unique(np.asarray(position_list, dtype=np.int64))
     n = len(unique)
     
     # Early exit if not enough positions to form a cluster
     if n < minlen:
         return []
     
-    bad_positions = set()
+    reach = train_reach(unique, maxcaas, minlen)
+    covered = np.maximum.accumulate(reach) >= np.arange(n)
     
-    # Evaluate all position pairs (l, r) where l ≤ r
-    for r in range(n):
-        for l in range(r + 1):
-            start, end = unique[l], unique[r]
-            span = end - start + 1
-            
-            # Skip intervals shorter than minimum length
-            if span < minlen:
-                continue
-            
-            count = r - l + 1
-            density = count / span
-            
-            if logger:
-                logger.debug(
-                    f"Interval [{start}, {end}]: "
-                    f"count={count}, span={span}, density={density:.3f}"
-                )
-            
-            # Flag positions in high-density intervals
-            if density >= maxcaas:
-                bad_positions.update(unique[l:r+1].tolist())
+    if logger and logger.isEnabledFor(logging.DEBUG):
+        for l in np.flatnonzero(reach >= 0).tolist():
+            r = int(reach[l])
+            span = int(unique[r] - unique[l] + 1)
+            logger.debug(
+                f"Dense interval [{unique[l]}, {unique[r]}]: "
+                f"count={r - l + 1}, span={span}, density={(r - l + 1) / span:.3f}"
+            )
     
-    return sorted(bad_positions)
+    return unique[covered].tolist()
 
 # ============================================================================
 # Main Filtering Function
@@ -251,30 +288,31 @@ def filterCAAS(infile, maxcaas, minlen, logger):
             f"maxcaas={maxcaas}, minlen={minlen}"
         )
     
-    # Cache column access for performance
-    position_col = df["Position"]
-    gene_col = df["Gene"]
-    caap_group_col = df["CAAP_Group"] if has_caap_group else None
+    # Unique positions of every gene (or gene/CAAP group) in one groupby pass,
+    # in order of first appearance
+    keys = ["Gene", "CAAP_Group"] if has_caap_group else ["Gene"]
+    grouped_positions = df.groupby(keys, sort=False)["Position"].unique()
+    groups_by_gene = {}
+    for key, positions in grouped_positions.items():
+        gene, group = key if has_caap_group else (key, None)
+        groups_by_gene.setdefault(gene, []).append((group, np.sort(positions)))
     
     # Process each gene independently
     for i, gene in enumerate(genes, 1):
-        gene_df = df[gene_col == gene]
+        gene_groups = groups_by_gene.get(gene, [])
         
         if has_caap_group:
             # Process each CAAP group within the gene independently
-            groups_in_gene = gene_df["CAAP_Group"].unique()
+            groups_in_gene = [group for group, _ in gene_groups]
             logger.info(f"Gene [{i}/{total_genes}]: {gene} (Groups: {', '.join(groups_in_gene)})")
             
-            for group in groups_in_gene:
-                group_df = gene_df[gene_df["CAAP_Group"] == group]
-                positions = sorted(group_df["Position"].unique())
-                
+            for group, positions in gene_groups:
                 if len(positions) < minlen:
                     continue
                 
                 logger.debug(
                     f"  Group {group}: {len(positions)} positions: "
-                    f"{positions[:5]}{'...' if len(positions) > 5 else ''}"
+                    f"{positions[:5].tolist()}{'...' if len(positions) > 5 else ''}"
                 )
                 
                 # Find discarded positions for this gene-group combination
@@ -291,14 +329,14 @@ def filterCAAS(infile, maxcaas, minlen, logger):
         else:
             # CAAS mode: process all positions for the gene together
             logger.info(f"Gene [{i}/{total_genes}]: {gene}")
-            positions = sorted(gene_df["Position"].unique())
+            positions = gene_groups[0][1] if gene_groups else np.array([], dtype=np.int64)
             
             if len(positions) < minlen:
                 continue
             
             logger.debug(
                 f"  {len(positions)} positions: "
-                f"{positions[:5]}{'...' if len(positions) > 5 else ''}"
+                f"{positions[:5].tolist()}{'...' if len(positions) > 5 else ''}"
             )
             
             # Find discarded positions
@@ -316,20 +354,18 @@ def filterCAAS(infile, maxcaas, minlen, logger):
     # Create output dataframe with flagging
     out = df.copy()
     
-    # Mark positions as Good/Discarded based on gene-group-position tuple
+    # Mark positions as Good/Discarded based on the gene-(group-)position key
     if has_caap_group:
-        # For CAAP mode, check gene + position + group
-        out["ClusteringFlag"] = out.apply(
-            lambda row: "Discarded" if (row["Gene"], row["Position"], row["CAAP_Group"]) in discarded else "Good",
-            axis=1
-        )
+        row_keys = pd.MultiIndex.from_frame(out[["Gene", "Position", "CAAP_Group"]])
+        discarded_keys = pd.MultiIndex.from_tuples(
+            discarded, names=["Gene", "Position", "CAAP_Group"]
+        ) if discarded else []
     else:
-        # For CAAS mode, check gene + position only
-        discarded_set = {(gene, pos) for gene, pos, _ in discarded}
-        out["ClusteringFlag"] = out.apply(
-            lambda row: "Discarded" if (row["Gene"], row["Position"]) in discarded_set else "Good",
-            axis=1
-        )
+        row_keys = pd.MultiIndex.from_frame(out[["Gene", "Position"]])
+        discarded_keys = pd.MultiIndex.from_tuples(
+            [(gene, pos) for gene, pos, _ in discarded], names=["Gene", "Position"]
+        ) if discarded else []
+    out["ClusteringFlag"] = np.where(row_keys.isin(discarded_keys), "Discarded", "Good")
     
     # Output essential columns (preserve CAAP_Group if present)
     output_cols = ["Gene", "Position", "ClusteringFlag"]
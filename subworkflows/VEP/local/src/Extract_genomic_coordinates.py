@@ -5,242 +5,150 @@
 ######################################################################
 
 
-import pandas as pd
-import numpy as np
 import sys
-from itertools import combinations
-#import seaborn as sns
-#from scipy import stats
-#import pickle
-from collections import Counter
-import copy
-#from scipy.stats import sem, t, chi2_contingency, norm
-#from scipy import mean
-import re
-import os
-import gzip
-import time
-from Bio import AlignIO
+import argparse
+
+from caas_coordinates import (
+    load_cds_sequences,
+    load_gff_cds,
+    parse_tracking,
+    read_aligned_human_cds,
+    read_caas_rows,
+    read_gene_equivalences,
+    run_batch,
+)
 
 
 """
-Here we create the function for checking the input parameters and saving
-them in different variables, error if the usage is not good
-"""
+Two modes:
 
-if len(sys.argv) == 9:
-    alignment_path = sys.argv[1]
-    fasta_path = sys.argv[2]
-    tracking_file = sys.argv[3]
-    gff_file = sys.argv[4]
-    caas_file = sys.argv[5]
-    output_coordinates = sys.argv[6]
-    gene_equivalences = sys.argv[7]
-    gene_name = sys.argv[8]
-else:
-    sys.exit("The usage shoud be: length 8 files")
-
-
-#align = AlignIO.read(alignment_path, "fasta")
-selected_positions = []
-removed_positions = []
-
-
-#FUNCTION A) --> GET INDEX OF FILTERED POSITIONS IN ALIGNMENTS (html files)
-with open(tracking_file, "r") as in_fh:
-    for line in in_fh:
-        line=line.rstrip()
-        if "selected:" in line:
-            # print(line)
-            intervals = line.split(" ")
-            for i in range(4,len(intervals)):
-                if "-" in intervals[i]:
-                    init = int(intervals[i].split("-")[0])
-                    end = int(intervals[i].split("-")[1])
-                    nums = list(range(init, end+1))
-                    for num in nums:
-                        selected_positions.append(num)
-                else:
-                    selected_positions.append(int(intervals[i]))
-        elif "removed:" in line:
-            # print(line)
-            intervals = line.split(" ")
-            for i in range(5,len(intervals)):
-                if "-" in intervals[i]:
-                    init = int(intervals[i].split("-")[0])
-                    end = int(intervals[i].split("-")[1])
-                    nums = list(range(init, end+1))
-                    for num in nums:
-                        removed_positions.append(num)
-                else:
-                    removed_positions.append(int(intervals[i]))
-
-
-
-#FUNCTION B.1) --> GET INFORMATION FROM EQUIVALENCE BETWEEN GENE NAMES AND PROTEINS
-protein_id = None
-with open(gene_equivalences, "r") as in_fh2a:
-    print(f"gene_name '{gene_name}' found in {gene_equivalences}")
-    target_sequence = False
-    aligned_CDS = ""
-    for line in in_fh2a:
-        line = line.rstrip()
-        parts = line.split()
-        if parts and parts[0] == gene_name:
-            protein_id = parts[1]
-            break
-
-if protein_id is None:
-    # Gracefully skip when the gene is absent from the equivalence table
-    print(f"gene_name '{gene_name}' not found in {gene_equivalences}; skipping", file=sys.stderr)
-    sys.exit(0)
-
-#print(transcript_name)
-
-#FUNCTION B) --> GET CORRESPONDING HUMAN CDS POSITIONS ALIGNED
-
-with open(alignment_path, "r") as in_fh2:
-    target_sequence = False
-    aligned_CDS = ""
-    for line in in_fh2:
-        line = line.rstrip()
-        if line.startswith(">Homo"):
-            target_sequence = True
-        elif line.startswith(">") and not line.startswith(">Homo"):
-                target_sequence = False
-        elif not line.startswith(">") and target_sequence:
-            aligned_CDS += line
-
-#FUNCTION C) read fasta sequence
-
-#print(fasta_path)
-with gzip.open(fasta_path, "rt") as in_fh3:
-    fasta_header = protein_id
-    #print(fasta_header)
-    real_CDS = ""
-    for line in in_fh3:
-        line = line.rstrip()
-        if line.startswith(">"+fasta_header):
-            target_sequence = True
-        elif line.startswith(">") and not line.startswith(">"+fasta_header):
-            target_sequence = False
-        elif not line.startswith(">") and target_sequence:
-            real_CDS += line
-
-#print(aligned_CDS)
-#print(real_CDS)
+* single gene (legacy, 8 positional arguments): appends the gene's rows to the
+  output file.
+
+      Extract_genomic_coordinates.py alignment cds_fasta_gz tracking gff caas output gene_equivalences gene
 
+* batch: loads the CDS FASTA, the GFF and the CAAS file once and writes the
+  rows of every gene to one table (aa2nuc_global.csv).
+
+      Extract_genomic_coordinates.py --batch --caas caas.tsv --cds-dir cds/ --track-dir track/ \\
+          --hs-cds Homo_sapiens.cds.fa.gz --gff Homo_sapiens.sorted.gff \\
+          --gene-equiv equivalences.txt --output aa2nuc_global.csv --workers 4
+
+Output columns: Gene | Position | tag | chr | current_coord | real_coord
+"""
 
 
 #FUNCTION D) Get indexes of human sequence based on alignment
+# Alignment codon (1-based) -> nucleotides of the human CDS up to that codon (0 for gaps)
+
+def codon_nt_indexes(aligned_CDS, real_CDS, gene_name):
+    counter_nt = 3
+    counter_codons = 0
+
+    ref_aligned_position = 0
+    indexes = {}
+    warned_N = False
+    warned_mismatch = False
+    for real_position in range(0, len(real_CDS), 3):
+        codon = real_CDS[real_position:real_position+3]
+        for aligned_position in range(ref_aligned_position, len(aligned_CDS), 3):
+            aligned_codon = aligned_CDS[aligned_position:aligned_position+3]
+            if aligned_CDS[aligned_position] == "-":
+                counter_codons += 1
+                indexes[counter_codons] = 0
+            else:
+                if "N" in aligned_codon.upper() and not warned_N:
+                    warned_N = True
+                    print(f"WARN {gene_name}: masked codon (N) in aligned human CDS; position {aligned_position//3}", file=sys.stderr)
+                if aligned_codon != codon and not warned_mismatch:
+                    warned_mismatch = True
+                    print(f"WARN {gene_name}: mismatch aligned {aligned_codon} vs CDS {codon} at codon {aligned_position//3}", file=sys.stderr)
+                # Accept mismatches/unknowns: advance counters even if codons differ
+                counter_nt += 3
+                counter_codons += 1
+                break
+        ref_aligned_position = 3*counter_codons
+        indexes[counter_codons] = counter_nt-3
+    return indexes
 
-counter_nt = 3
-counter_codons = 0
-
-prev_ambiguity=False
-n_ambiguities=0
-ref_aligned_position = 0
-indexes = {}
-warned_N = False
-warned_mismatch = False
-for real_position in range(0,len(real_CDS),3):
-    codon = real_CDS[real_position:real_position+3]
-    # print(codon, "real")
-    for aligned_position in range(ref_aligned_position,len(aligned_CDS),3):
-        aligned_codon = aligned_CDS[aligned_position:aligned_position +3]
-        # print(aligned_codon, "aligned")
-        if aligned_CDS[aligned_position] == "-":
-            counter_codons += 1
-            indexes[counter_codons] = 0
-        else:
-            if "N" in aligned_codon.upper() and not warned_N:
-                warned_N = True
-                print(f"WARN {gene_name}: masked codon (N) in aligned human CDS; position {aligned_position//3}", file=sys.stderr)
-            if aligned_codon != codon and not warned_mismatch:
-                warned_mismatch = True
-                print(f"WARN {gene_name}: mismatch aligned {aligned_codon} vs CDS {codon} at codon {aligned_position//3}", file=sys.stderr)
-            # Accept mismatches/unknowns: advance counters even if codons differ
-            counter_nt += 3
-            counter_codons += 1
-            break
-    ref_aligned_position = 3*counter_codons
-    indexes[counter_codons] = counter_nt-3
-
-
-selected_positions_filt = selected_positions
-# Write selected_positions_filt to a file
-with open("selected_positions_filt.txt", "w") as in_fh7:
-    for i in selected_positions_filt:
-        print(i, file=in_fh7)
-
-selected_indexes = indexes
-
-#FUNCTION F) GET coordinate info from gff gff_file
-
-starts = []
-ends = []
-CDS_positions = []
-with open(gff_file, "r") as in_fh4:
-    fasta_header = protein_id
-    real_CDS = ""
-    for line in in_fh4:
-        line = line.rstrip()
-        if fasta_header in line and line.split("\t")[2] == "CDS":
-            #print(line)
-            fields = line.split("\t")
-            chrom = fields[0]
-            start = int(fields[3])
-            starts.append(start)
-            end = int(fields[4])
-            ends.append(end)
-            strand = fields[6]
-            # print(strand)
-    if strand == "+":
-        init_coord = starts[0]
-        for i in range(0, len(starts)):
-            for j in range(starts[i], ends[i]+1):
-                #print(j)
-                CDS_positions.append(j)
-    elif strand == "-":
-        init_coord = ends[-1]
-        for i in range(0, len(starts)):
-            curr_end = ends[-(i+1)]
-            curr_start = starts[-(i+1)]
-            for j in range(curr_end, curr_start-1, -1):
-                #print(j)
-                CDS_positions.append(j)
 
 #####################################################
 #Translate selected positions to output_coordinates##
 #####################################################
 
-#print(CDS_positions)
-#print(strand)
+def map_gene(gene_name, alignment_path, tracking_file, real_CDS, gff_cds, caas_rows, out_lines):
+    if gff_cds is None:
+        raise ValueError("protein has no CDS lines in the GFF")
+
+    #FUNCTION A) --> GET INDEX OF FILTERED POSITIONS IN ALIGNMENTS (html files)
+    selected_positions_filt = parse_tracking(tracking_file)
+    #FUNCTION B) --> GET CORRESPONDING HUMAN CDS POSITIONS ALIGNED
+    aligned_CDS = read_aligned_human_cds(alignment_path)
+    selected_indexes = codon_nt_indexes(aligned_CDS, real_CDS, gene_name)
 
-with open(caas_file, "r") as in_fh5:
-    for line in in_fh5:
-        fields=line.rstrip().split("\t")
+    chrom = gff_cds.chrom
+    n_cds = gff_cds.length
+
+    for fields in caas_rows:
         if fields[0] == gene_name and int(fields[1]) < len(selected_positions_filt):
             caas_position = int(fields[1])
-            print(caas_position)
             prefiltered_position = selected_positions_filt[caas_position]
             if prefiltered_position <= len(selected_indexes):
                 prefiltered_nt = selected_indexes[prefiltered_position]
 #LAST ELEMENT ADDING
-                if prefiltered_nt == len(CDS_positions):
-                    if strand == "+":
-                        current_coord = CDS_positions[-1]+1
-                        real_coord = CDS_positions[-1]
-                    elif strand == "-":
-                            current_coord = CDS_positions[-1]-1
-                            real_coord = CDS_positions[-1]
-                    with open(output_coordinates, "a") as in_fh6:
-                            print("{}\t{}\t{}\t{}\t{}\t{}".format(fields[0], fields[1], fields[2], chrom, current_coord, real_coord), file=in_fh6)
-                            # Change fields from number to column name, note that fields[0] is named as gene_name
+                if prefiltered_nt == n_cds:
+                    real_coord = gff_cds.coordinate(-1)
+                    current_coord = real_coord + 1 if gff_cds.strand == "+" else real_coord - 1
 #NON-GAPPY filtered positions in reference
                 elif prefiltered_nt != 0:
-                    #print(prefiltered_nt, type(prefiltered_nt), "NON-O")
-                    current_coord = CDS_positions[prefiltered_nt]
-                    real_coord = CDS_positions[prefiltered_nt-1]
-                    with open(output_coordinates, "a") as in_fh6:
-                            print("{}\t{}\t{}\t{}\t{}\t{}".format(fields[0], fields[1], fields[2], chrom, current_coord, real_coord), file=in_fh6)
+                    current_coord = gff_cds.coordinate(prefiltered_nt)
+                    real_coord = gff_cds.coordinate(prefiltered_nt-1)
+                else:
+                    continue
+                out_lines.append("{}\t{}\t{}\t{}\t{}\t{}".format(fields[0], fields[1], fields[2], chrom, current_coord, real_coord))
+
+
+def main():
+    if len(sys.argv) == 9 and not sys.argv[1].startswith("-"):
+        alignment_path, fasta_path, tracking_file, gff_file, caas_file, output_coordinates, gene_equivalences, gene_name = sys.argv[1:]
+
+        #FUNCTION B.1) --> GET INFORMATION FROM EQUIVALENCE BETWEEN GENE NAMES AND PROTEINS
+        protein_id = read_gene_equivalences(gene_equivalences).get(gene_name)
+        if protein_id is None:
+            # Gracefully skip when the gene is absent from the equivalence table
+            print(f"gene_name '{gene_name}' not found in {gene_equivalences}; skipping", file=sys.stderr)
+            sys.exit(0)
+
+        #FUNCTION C) read fasta sequence, F) GET coordinate info from gff gff_file
+        real_CDS = load_cds_sequences(fasta_path, [protein_id]).get(protein_id, "")
+        gff_cds = load_gff_cds(gff_file, [protein_id]).get(protein_id)
+        _, caas_rows = read_caas_rows(caas_file)
+
+        out_lines = []
+        try:
+            map_gene(gene_name, alignment_path, tracking_file, real_CDS, gff_cds, caas_rows.get(gene_name, []), out_lines)
+        finally:
+            if out_lines:
+                with open(output_coordinates, "a") as in_fh6:
+                    for line in out_lines:
+                        print(line, file=in_fh6)
+        return
+
+    parser = argparse.ArgumentParser(description="Map CAAS protein positions to genomic coordinates (batch mode)")
+    parser.add_argument("--batch", action="store_true", help="Map every gene of the CAAS file in one process")
+    parser.add_argument("--caas", required=True, help="CAAS discovery TSV (header with a Gene column)")
+    parser.add_argument("--cds-dir", required=True, help="Directory with the per-gene CDS alignments (GENE.*.fasta|fa|fna)")
+    parser.add_argument("--track-dir", required=True, help="Directory with the codon-filtering TRACK files (GENE.html, GENE.*.html)")
+    parser.add_argument("--hs-cds", required=True, help="Human CDS FASTA (.gz)")
+    parser.add_argument("--gff", required=True, help="GFF annotation")
+    parser.add_argument("--gene-equiv", required=True, help="Gene name to protein ID table")
+    parser.add_argument("--output", default="aa2nuc_global.csv", help="Output table (default: aa2nuc_global.csv)")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (default: 1)")
+    args = parser.parse_args()
+
+    run_batch(map_gene, "prot2coord", args.caas, args.cds_dir, args.track_dir, args.hs_cds,
+              args.gff, args.gene_equiv, args.output, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
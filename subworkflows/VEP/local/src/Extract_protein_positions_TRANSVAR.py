@@ -4,224 +4,141 @@
 #ALEJANDRO VALENZUELA - RETRIEVAL CAAS PROTEIN SEQUENCE POS TEMPLATE SCRIPT#
 ############################################################################
 
-import pandas as pd
-import numpy as np
 import sys
-from itertools import combinations
-#import seaborn as sns
-#from scipy import stats
-import pickle
-#from collections import Counter
-import copy
-#from scipy.stats import sem, t, chi2_contingency, norm
-#from scipy import mean
-import re
-import os
-import gzip
-import time
-from Bio import AlignIO
+import argparse
+
+from caas_coordinates import (
+    load_cds_sequences,
+    load_gff_cds,
+    parse_tracking,
+    read_aligned_human_cds,
+    read_caas_rows,
+    read_gene_equivalences,
+    run_batch,
+)
 
 
 """
-Here we create the function for checking the input parameters and saving
-them in different variables, error if the usage is not good
-"""
+Two modes:
 
-if len(sys.argv) == 9:
-    alignment_path = sys.argv[1]
-    fasta_path = sys.argv[2]
-    tracking_file = sys.argv[3]
-    gff_file = sys.argv[4]
-    caas_file = sys.argv[5]
-    output_coordinates = sys.argv[6]
-    gene_equivalences = sys.argv[7]
-    gene_name = sys.argv[8]
-else:
-    sys.exit("The usage shoud be: ortho_path tags_file pep_fasta_path out_file")
-
-
-#align = AlignIO.read(alignment_path, "fasta")
-selected_positions = []
-removed_positions = []
-
-
-#FUNCTION A) --> GET INDEX OF FILTERED POSITIONS (CODONS)
-with open(tracking_file, "r") as in_fh:
-    for line in in_fh:
-        line=line.rstrip()
-        if "selected:" in line:
-            #print(line)
-            intervals = line.split(" ")
-            for i in range(4,len(intervals)):
-                if "-" in intervals[i]:
-                    init = int(intervals[i].split("-")[0])
-                    end = int(intervals[i].split("-")[1])
-                    nums = list(range(init, end+1))
-                    for num in nums:
-                        selected_positions.append(num)
-                else:
-                    selected_positions.append(int(intervals[i]))
-        elif "removed:" in line:
-            #print(line)
-            intervals = line.split(" ")
-            for i in range(5,len(intervals)):
-                if "-" in intervals[i]:
-                    init = int(intervals[i].split("-")[0])
-                    end = int(intervals[i].split("-")[1])
-                    nums = list(range(init, end+1))
-                    for num in nums:
-                        removed_positions.append(num)
-                else:
-                    removed_positions.append(int(intervals[i]))
-
-
-
-#FUNCTION B.1) --> GET INFORMATION FROM EQUIVALENCE BETWEEN GENE NAMES AND TRANSCRIPTS
-protein_id = None
-with open(gene_equivalences, "r") as in_fh2a:
-    target_sequence = False
-    aligned_CDS = ""
-    for line in in_fh2a:
-        line = line.rstrip()
-        parts = line.split()
-        if parts and parts[0] == gene_name:
-            protein_id = parts[1]
-            break
-
-if protein_id is None:
-    print(f"gene_name '{gene_name}' not found in {gene_equivalences}; skipping", file=sys.stderr)
-    sys.exit(0)
-
-#FUNCTION B) --> GET CORRESPONDING HUMAN CDS POSITIONS ALIGNED
-
-with open(alignment_path, "r") as in_fh2:
-    target_sequence = False
-    aligned_CDS = ""
-    for line in in_fh2:
-        line = line.rstrip()
-        if line.startswith(">Homo"):
-            target_sequence = True
-        elif line.startswith(">") and not line.startswith(">Homo"):
-                target_sequence = False
-        elif not line.startswith(">") and target_sequence:
-            aligned_CDS += line
-
-#FUNCTION C) read fasta sequence
-
-#print(fasta_path)
-with gzip.open(fasta_path, "rt") as in_fh3:
-    fasta_header = protein_id
-    #print(fasta_header)
-    real_CDS = ""
-    for line in in_fh3:
-        line = line.rstrip()
-        if line.startswith(">"+fasta_header):
-            target_sequence = True
-        elif line.startswith(">") and not line.startswith(">"+fasta_header):
-            target_sequence = False
-        elif not line.startswith(">") and target_sequence:
-            real_CDS += line
-
-#print(aligned_CDS)
-#print(real_CDS)
+* single gene (legacy, 8 positional arguments): appends the gene's rows to the
+  output file.
 
+      Extract_protein_positions_TRANSVAR.py alignment cds_fasta_gz tracking gff caas output gene_equivalences gene
 
+* batch: loads the CDS FASTA, the GFF and the CAAS file once and writes the
+  rows of every gene to one table (aa2prot_global.csv).
 
-#FUNCTION D) Get indexes of human sequence based on alignment
+      Extract_protein_positions_TRANSVAR.py --batch --caas caas.tsv --cds-dir cds/ --track-dir track/ \\
+          --hs-cds Homo_sapiens.cds.fa.gz --gff Homo_sapiens.sorted.gff \\
+          --gene-equiv equivalences.txt --output aa2prot_global.csv --workers 4
+
+Output columns: Gene | Position | tag | GENE:p.N
+"""
 
-counter_nt = 3
-counter_codons = 0
-
-prev_ambiguity=False
-n_ambiguities=0
-ref_aligned_position = 0
-indexes = {}
-warned_N = False
-warned_mismatch = False
-for real_position in range(0,len(real_CDS),3):
-    codon = real_CDS[real_position:real_position+3]
-    #print(codon, "real")
-    for aligned_position in range(ref_aligned_position,len(aligned_CDS),3):
-        aligned_codon = aligned_CDS[aligned_position:aligned_position+3]
-        #print(aligned_codon, "aligned")
-        if aligned_CDS[aligned_position] == "-":
-            counter_nt += 0
-            counter_codons += 1
-            indexes[counter_codons] = 0
-        elif "N" in aligned_codon.upper():
-            if not warned_N:
-                warned_N = True
-                print(f"WARN {gene_name}: masked codon (N) in aligned human CDS; position {aligned_position//3}", file=sys.stderr)
-            counter_codons += 1
-            indexes[counter_codons] = 0
-        else:
-            if aligned_codon != codon and not warned_mismatch:
-                warned_mismatch = True
-                print(f"WARN {gene_name}: mismatch aligned {aligned_codon} vs CDS {codon} at codon {aligned_position//3}", file=sys.stderr)
-            # Accept mismatches: advance counters even if codons differ
-            counter_nt += 3
-            counter_codons += 1
-            break
-    ref_aligned_position = 3*counter_codons
-    indexes[counter_codons] = counter_nt-3
-
-
-selected_positions_filt = selected_positions
-selected_indexes = indexes
-print(selected_positions_filt)
-#print(indexes)
-print(selected_indexes)
-
-#FUNCTION F) GET coordinate info from gff gff_file
-
-starts = []
-ends = []
-CDS_positions = []
-with open(gff_file, "r") as in_fh4:
-    fasta_header = protein_id
-    real_CDS = ""
-    for line in in_fh4:
-        line = line.rstrip()
-        if fasta_header in line and line.split("\t")[2] == "CDS":
-            #print(line)
-            fields = line.split("\t")
-            chrom = fields[0]
-            start = int(fields[3])
-            starts.append(start)
-            end = int(fields[4])
-            ends.append(end)
-            strand = fields[6]
-    if strand == "+":
-        init_coord = starts[0]
-        for i in range(0, len(starts)):
-            for j in range(starts[i], ends[i]+1):
-                #print(j)
-                CDS_positions.append(j)
-    elif strand == "-":
-        init_coord = ends[-1]
-        for i in range(0, len(starts)):
-            curr_end = ends[-(i+1)]
-            curr_start = starts[-(i+1)]
-            for j in range(curr_end, curr_start-1, -1):
-                #print(j)
-                CDS_positions.append(j)
+
+#FUNCTION D) Get indexes of human sequence based on alignment
+# Alignment codon (1-based) -> nucleotides of the human CDS up to that codon (0 for gaps and masked codons)
+
+def codon_nt_indexes(aligned_CDS, real_CDS, gene_name):
+    counter_nt = 3
+    counter_codons = 0
+
+    ref_aligned_position = 0
+    indexes = {}
+    warned_N = False
+    warned_mismatch = False
+    for real_position in range(0, len(real_CDS), 3):
+        codon = real_CDS[real_position:real_position+3]
+        for aligned_position in range(ref_aligned_position, len(aligned_CDS), 3):
+            aligned_codon = aligned_CDS[aligned_position:aligned_position+3]
+            if aligned_CDS[aligned_position] == "-":
+                counter_codons += 1
+                indexes[counter_codons] = 0
+            elif "N" in aligned_codon.upper():
+                if not warned_N:
+                    warned_N = True
+                    print(f"WARN {gene_name}: masked codon (N) in aligned human CDS; position {aligned_position//3}", file=sys.stderr)
+                counter_codons += 1
+                indexes[counter_codons] = 0
+            else:
+                if aligned_codon != codon and not warned_mismatch:
+                    warned_mismatch = True
+                    print(f"WARN {gene_name}: mismatch aligned {aligned_codon} vs CDS {codon} at codon {aligned_position//3}", file=sys.stderr)
+                # Accept mismatches: advance counters even if codons differ
+                counter_nt += 3
+                counter_codons += 1
+                break
+        ref_aligned_position = 3*counter_codons
+        indexes[counter_codons] = counter_nt-3
+    return indexes
 
 
 #Translate selected positions to output_coordinates
-with open(caas_file, "r") as in_fh5:
-    for line in in_fh5:
-        fields=line.rstrip().split("\t")
+
+def map_gene(gene_name, alignment_path, tracking_file, real_CDS, gff_cds, caas_rows, out_lines):
+    # Genes without a GFF CDS annotation are skipped, as in the per-gene script
+    if gff_cds is None:
+        raise ValueError("protein has no CDS lines in the GFF")
+
+    #FUNCTION A) --> GET INDEX OF FILTERED POSITIONS (CODONS)
+    selected_positions_filt = parse_tracking(tracking_file)
+    #FUNCTION B) --> GET CORRESPONDING HUMAN CDS POSITIONS ALIGNED
+    aligned_CDS = read_aligned_human_cds(alignment_path)
+    selected_indexes = codon_nt_indexes(aligned_CDS, real_CDS, gene_name)
+
+    for fields in caas_rows:
         if fields[0] == gene_name and int(fields[1]) < len(selected_positions_filt):
             caas_position = int(fields[1])
-            #print(str(caas_position)+"caas_pos")
             prefiltered_position = selected_positions_filt[caas_position]
-            #print(CDS_positions)
             if prefiltered_position <= len(selected_indexes):
                 prefiltered_nt = selected_indexes[prefiltered_position]
-                #print(prefiltered_nt)
                 if prefiltered_nt != 0:
-            	    prot_coord = int(prefiltered_nt/3)
-            	    mutation = gene_name + ":p." + str(prot_coord)
-            	    print(mutation)
-            	    with open(output_coordinates, "a") as in_fh6:
-                	    print("{}\t{}\t{}\t{}".format(fields[0], fields[1], fields[2], mutation), file=in_fh6)
+                    prot_coord = int(prefiltered_nt/3)
+                    mutation = gene_name + ":p." + str(prot_coord)
+                    out_lines.append("{}\t{}\t{}\t{}".format(fields[0], fields[1], fields[2], mutation))
+
+
+def main():
+    if len(sys.argv) == 9 and not sys.argv[1].startswith("-"):
+        alignment_path, fasta_path, tracking_file, gff_file, caas_file, output_coordinates, gene_equivalences, gene_name = sys.argv[1:]
+
+        #FUNCTION B.1) --> GET INFORMATION FROM EQUIVALENCE BETWEEN GENE NAMES AND TRANSCRIPTS
+        protein_id = read_gene_equivalences(gene_equivalences).get(gene_name)
+        if protein_id is None:
+            print(f"gene_name '{gene_name}' not found in {gene_equivalences}; skipping", file=sys.stderr)
+            sys.exit(0)
+
+        #FUNCTION C) read fasta sequence, F) GET coordinate info from gff gff_file
+        real_CDS = load_cds_sequences(fasta_path, [protein_id]).get(protein_id, "")
+        gff_cds = load_gff_cds(gff_file, [protein_id]).get(protein_id)
+        _, caas_rows = read_caas_rows(caas_file)
+
+        out_lines = []
+        try:
+            map_gene(gene_name, alignment_path, tracking_file, real_CDS, gff_cds, caas_rows.get(gene_name, []), out_lines)
+        finally:
+            if out_lines:
+                with open(output_coordinates, "a") as in_fh6:
+                    for line in out_lines:
+                        print(line, file=in_fh6)
+        return
+
+    parser = argparse.ArgumentParser(description="Map CAAS positions to GENE:p.N protein positions for TransVar (batch mode)")
+    parser.add_argument("--batch", action="store_true", help="Map every gene of the CAAS file in one process")
+    parser.add_argument("--caas", required=True, help="CAAS discovery TSV (header with a Gene column)")
+    parser.add_argument("--cds-dir", required=True, help="Directory with the per-gene CDS alignments (GENE.*.fasta|fa|fna)")
+    parser.add_argument("--track-dir", required=True, help="Directory with the codon-filtering TRACK files (GENE.html, GENE.*.html)")
+    parser.add_argument("--hs-cds", required=True, help="Human CDS FASTA (.gz)")
+    parser.add_argument("--gff", required=True, help="GFF annotation")
+    parser.add_argument("--gene-equiv", required=True, help="Gene name to protein ID table")
+    parser.add_argument("--output", default="aa2prot_global.csv", help="Output table (default: aa2prot_global.csv)")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (default: 1)")
+    args = parser.parse_args()
+
+    run_batch(map_gene, "prot2aa", args.caas, args.cds_dir, args.track_dir, args.hs_cds,
+              args.gff, args.gene_equiv, args.output, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
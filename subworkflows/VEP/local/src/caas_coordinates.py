@@ -0,0 +1,287 @@
+#!/usr/bin/python3
+"""Shared inputs and batch driver of the CAAS position mappers.
+
+``Extract_genomic_coordinates.py`` (PROT2COORD) and
+``Extract_protein_positions_TRANSVAR.py`` (PROT2AA) map the CAAS positions of
+a gene through the same inputs: the codon-filtering TRACK file, the human
+aligned CDS, the genome-wide human CDS FASTA and the GFF CDS annotation.
+
+In batch mode every run-wide input is read once into indexed structures:
+
+* gene name → protein ID (first row of the equivalence table wins);
+* protein ID → human CDS sequence (records whose header starts with the ID,
+  concatenated in file order, as the per-gene scan did);
+* protein ID → ``GffCds`` (chromosome, strand and exon intervals sorted by
+  start), indexed by the identifiers of the GFF attribute column;
+* gene → CAAS rows, and gene → TRACK / CDS alignment file (one directory walk).
+
+All genes are then mapped in one process (or a pool of forked workers) and
+the global table is written once.
+"""
+
+import gzip
+import os
+import re
+import sys
+from bisect import bisect_right
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+TRACK_EXTENSIONS = (".html",)
+CDS_EXTENSIONS = (".fasta", ".fa", ".fna")
+
+_ATTRIBUTE_SEPARATORS = re.compile(r"[;=,:\s]+")
+
+
+# ---------------------------------------------------------------------------
+# Per-gene inputs
+# ---------------------------------------------------------------------------
+
+def parse_tracking(tracking_file):
+    """Alignment codon indices kept by the codon filter ("selected:" lines of the TRACK file)."""
+    selected_positions = []
+    with open(tracking_file, "r") as in_fh:
+        for line in in_fh:
+            line = line.rstrip()
+            if "selected:" in line:
+                intervals = line.split(" ")
+                for i in range(4, len(intervals)):
+                    if "-" in intervals[i]:
+                        init = int(intervals[i].split("-")[0])
+                        end = int(intervals[i].split("-")[1])
+                        selected_positions.extend(range(init, end + 1))
+                    else:
+                        selected_positions.append(int(intervals[i]))
+    return selected_positions
+
+
+def read_aligned_human_cds(alignment_path):
+    """Concatenated sequence of the ``>Homo*`` records of a CDS alignment."""
+    target_sequence = False
+    aligned_cds = []
+    with open(alignment_path, "r") as in_fh:
+        for line in in_fh:
+            line = line.rstrip()
+            if line.startswith(">"):
+                target_sequence = line.startswith(">Homo")
+            elif target_sequence:
+                aligned_cds.append(line)
+    return "".join(aligned_cds)
+
+
+# ---------------------------------------------------------------------------
+# Run-wide indexes
+# ---------------------------------------------------------------------------
+
+def read_gene_equivalences(gene_equivalences):
+    """Gene name → protein ID (first matching row wins)."""
+    protein_ids = {}
+    with open(gene_equivalences, "r") as in_fh:
+        for line in in_fh:
+            parts = line.split()
+            if len(parts) >= 2:
+                protein_ids.setdefault(parts[0], parts[1])
+    return protein_ids
+
+
+def load_cds_sequences(fasta_path, protein_ids):
+    """Protein ID → human CDS from the gzipped FASTA, in a single pass.
+
+    A record belongs to every requested ID its header starts with; several
+    matching records are concatenated in file order.
+    """
+    wanted = set(protein_ids)
+    lengths = sorted({len(pid) for pid in wanted})
+    chunks = defaultdict(list)
+    targets = ()
+    with gzip.open(fasta_path, "rt") as in_fh:
+        for line in in_fh:
+            line = line.rstrip()
+            if line.startswith(">"):
+                header = line[1:]
+                targets = [header[:n] for n in lengths if header[:n] in wanted]
+            elif targets:
+                for pid in targets:
+                    chunks[pid].append(line)
+    return {pid: "".join(parts) for pid, parts in chunks.items()}
+
+
+class GffCds:
+    """CDS annotation of one protein: chromosome, strand and exons sorted by start."""
+
+    def __init__(self, chrom, strand, exons):
+        self.chrom = chrom
+        self.strand = strand
+        self.exons = sorted(exons) if strand in ("+", "-") else []
+        if strand == "-":
+            self.exons.reverse()
+        # Cumulative CDS length before each exon, in transcription order
+        self._offsets = []
+        total = 0
+        for start, end in self.exons:
+            self._offsets.append(total)
+            total += end - start + 1
+        self.length = total
+
+    def coordinate(self, index):
+        """Genomic coordinate of the ``index``-th CDS base (0-based, negative from the end)."""
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError(f"CDS index {index} out of range ({self.length} bases)")
+        exon = bisect_right(self._offsets, index) - 1
+        start, end = self.exons[exon]
+        offset = index - self._offsets[exon]
+        return start + offset if self.strand == "+" else end - offset
+
+
+def load_gff_cds(gff_file, protein_ids):
+    """Protein ID → ``GffCds`` for the requested IDs, in a single pass over the GFF.
+
+    CDS lines are indexed by the identifiers of their attribute column (and the
+    same identifiers without a ``.version`` suffix). IDs not found that way fall
+    back to the substring match of the per-gene scan, over the CDS lines only.
+    Chromosome and strand are those of the last matching line.
+    """
+    wanted = set(protein_ids)
+    found = defaultdict(list)
+    cds_lines = []
+    with open(gff_file, "r") as in_fh:
+        for line in in_fh:
+            fields = line.rstrip().split("\t")
+            if len(fields) < 9 or fields[2] != "CDS":
+                continue
+            cds_lines.append(fields)
+            tokens = set(_ATTRIBUTE_SEPARATORS.split(fields[8]))
+            tokens.update([token.split(".")[0] for token in tokens])
+            for pid in tokens & wanted:
+                found[pid].append(fields)
+
+    for pid in wanted - set(found):
+        matches = [fields for fields in cds_lines if pid in "\t".join(fields)]
+        if matches:
+            found[pid] = matches
+
+    return {
+        pid: GffCds(
+            lines[-1][0],
+            lines[-1][6],
+            [(int(fields[3]), int(fields[4])) for fields in lines],
+        )
+        for pid, lines in found.items()
+    }
+
+
+def read_caas_rows(caas_file):
+    """CAAS genes (the header's ``gene`` column, sorted) and rows per gene (first column)."""
+    genes = set()
+    rows = defaultdict(list)
+    with open(caas_file, "r") as in_fh:
+        header = in_fh.readline().rstrip("\n").split("\t")
+        gene_col = next((i for i, name in enumerate(header) if name.lower() == "gene"), None)
+        for line in in_fh:
+            fields = line.rstrip().split("\t")
+            rows[fields[0]].append(fields)
+            if gene_col is not None and gene_col < len(fields) and fields[gene_col]:
+                genes.add(fields[gene_col])
+    return sorted(genes), rows
+
+
+def index_gene_files(root, genes, extensions, allow_plain=False):
+    """Gene → first file named ``GENE.*<ext>`` (or ``GENE<ext>`` with allow_plain) under root."""
+    genes = set(genes)
+    files = {}
+    for dirpath, _, filenames in os.walk(root, followlinks=True):
+        for name in filenames:
+            ext = next((e for e in extensions if name.endswith(e)), None)
+            if ext is None:
+                continue
+            stem = name[: -len(ext)]
+            candidates = [stem[:i] for i, char in enumerate(stem) if char == "."]
+            if allow_plain:
+                candidates.append(stem)
+            for gene in candidates:
+                if gene in genes:
+                    files.setdefault(gene, os.path.join(dirpath, name))
+    return files
+
+
+# ---------------------------------------------------------------------------
+# Batch driver
+# ---------------------------------------------------------------------------
+
+_batch_state = {}
+
+
+def _map_batch_gene(gene):
+    """Worker: output lines of one gene (lines written before a failure are kept)."""
+    state = _batch_state
+    lines = []
+    protein_id = state["protein_ids"][gene]
+    try:
+        state["map_gene"](
+            gene,
+            state["cds_files"][gene],
+            state["track_files"][gene],
+            state["cds_sequences"].get(protein_id, ""),
+            state["gff_cds"].get(protein_id),
+            state["caas_rows"].get(gene, []),
+            lines,
+        )
+    except Exception as exc:
+        print(f"WARN {state['label']}: mapping failed for {gene} ({exc!r}), skipping", file=sys.stderr)
+    return lines
+
+
+def run_batch(map_gene, label, caas_file, cds_dir, track_dir, fasta_path, gff_file, gene_equivalences, output_file, workers=1):
+    """Map every CAAS gene with ``map_gene`` and write one global table.
+
+    ``map_gene(gene, alignment_path, tracking_file, real_cds, gff_cds, caas_rows, out_lines)``
+    appends the gene's output lines to ``out_lines``.
+    """
+    genes, caas_rows = read_caas_rows(caas_file)
+    track_files = index_gene_files(track_dir, genes, TRACK_EXTENSIONS, allow_plain=True)
+    cds_files = index_gene_files(cds_dir, genes, CDS_EXTENSIONS)
+    protein_ids = read_gene_equivalences(gene_equivalences)
+
+    jobs = []
+    for gene in genes:
+        if gene not in track_files:
+            print(f"SKIP {label} {gene}: tracking file not found", file=sys.stderr)
+        if gene not in cds_files:
+            print(f"SKIP {label} {gene}: CDS fasta not found", file=sys.stderr)
+        if gene not in track_files or gene not in cds_files:
+            continue
+        if gene not in protein_ids:
+            print(f"gene_name '{gene}' not found in {gene_equivalences}; skipping", file=sys.stderr)
+            continue
+        jobs.append(gene)
+
+    needed = {protein_ids[gene] for gene in jobs}
+    _batch_state.update({
+        "label": label,
+        "map_gene": map_gene,
+        "protein_ids": protein_ids,
+        "track_files": track_files,
+        "cds_files": cds_files,
+        "caas_rows": caas_rows,
+        "cds_sequences": load_cds_sequences(fasta_path, needed),
+        "gff_cds": load_gff_cds(gff_file, needed),
+    })
+    print(f"{label}: mapping {len(jobs)} of {len(genes)} genes with {workers} worker(s)", file=sys.stderr)
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as executor:
+            results = list(executor.map(_map_batch_gene, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+    else:
+        results = [_map_batch_gene(gene) for gene in jobs]
+
+    n_lines = 0
+    with open(output_file, "w") as out_fh:
+        for lines in results:
+            for line in lines:
+                out_fh.write(line + "\n")
+            n_lines += len(lines)
+    print(f"{label}: {n_lines} rows written to {output_file}", file=sys.stderr)
+    return n_lines
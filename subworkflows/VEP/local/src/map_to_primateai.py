@@ -17,8 +17,12 @@ For each protein position query (GENE:p.N):
 
    ``alt_aas = changing_group_aas − {ref_aa_hg38}``
 
-3. **PrimateAI lookup**: stream through the gz file and keep variants where
-   ``ref_aa == ref_aa_hg38  AND  alt_aa ∈ alt_aas``
+3. **PrimateAI lookup**: read the PrimateAI rows at the codon positions and
+   keep variants where ``ref_aa == ref_aa_hg38  AND  alt_aa ∈ alt_aas``
+
+   When ``primateai_gz`` has a block index (``<primateai_gz>.idx``, built once
+   with ``primateai_index.py``), only the blocks covering the TransVar codon
+   ranges are decompressed. Otherwise the whole gz file is streamed.
 
    * Convergent CAAS (one changing AA)  → single PrimateAI entry per codon pos.
    * Divergent CAAS  (multiple alt AAs) → multiple entries (one per alt AA).
@@ -37,7 +41,8 @@ aa2prot_csv    Stage 2 output (AA2prot global.csv)
                Columns: gene | caas_pos | tag | GENE:p.N
 caas_file      Original CAAS discovery TSV
                Columns: Gene | Position | tag | caas | ... | change_side | ...
-primateai_gz   PrimateAI-3D.hg38.txt.gz
+primateai_gz   PrimateAI-3D.hg38.txt.gz, or its block-compressed copy with
+               the index next to it (PrimateAI-3D.hg38.blocks.txt.gz + .idx)
 output_tsv     Output path for the merged results table
 """
 
@@ -45,6 +50,8 @@ import sys
 import gzip
 import re
 
+from primateai_index import iter_block_lines, read_index, select_blocks
+
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
@@ -336,9 +343,13 @@ for query, (chrom, start, end, transcript, ref_aa_hg38) in query_coords.items():
 print(f"  {len(pos_lookup)} genomic positions to scan.", file=sys.stderr)
 
 # ---------------------------------------------------------------------------
-# Step 5: Stream PrimateAI-3D and emit matching rows
+# Step 5: Read PrimateAI-3D at the lookup positions and emit matching rows
+#
+# With a block index only the blocks overlapping pos_lookup are read (in file
+# order, so the output order is that of a full scan); without one the whole
+# table is streamed.
 # ---------------------------------------------------------------------------
-print("Streaming PrimateAI-3D database ...", file=sys.stderr)
+pai_blocks = read_index(primateai_gz)
 
 matched = 0
 scanned = 0
@@ -347,6 +358,15 @@ with gzip.open(primateai_gz, 'rt') as gz_in, open(output_tsv, 'w') as out:
     pai_header = gz_in.readline().rstrip('\n')
     pai_cols   = pai_header.split('\t')
 
+    if pai_blocks is not None:
+        selected = select_blocks(pai_blocks, pos_lookup)
+        print(f"Reading {len(selected):,} of {sum(map(len, pai_blocks.values())):,} "
+              "indexed PrimateAI-3D blocks ...", file=sys.stderr)
+        pai_rows = iter_block_lines(primateai_gz, selected)
+    else:
+        print("Streaming PrimateAI-3D database (no block index) ...", file=sys.stderr)
+        pai_rows = gz_in
+
     try:
         ref_aa_col = pai_cols.index('ref_aa')
         alt_aa_col = pai_cols.index('alt_aa')
@@ -363,7 +383,7 @@ with gzip.open(primateai_gz, 'rt') as gz_in, open(output_tsv, 'w') as out:
         + pai_header + "\n"
     )
 
-    for line in gz_in:
+    for line in pai_rows:
         scanned += 1
         if scanned % 5_000_000 == 0:
             print(f"  ... scanned {scanned:,} PrimateAI rows, {matched} matched",
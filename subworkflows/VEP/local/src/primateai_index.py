@@ -0,0 +1,194 @@
+#!/usr/bin/python3
+"""Block index of the PrimateAI-3D table for position lookups.
+
+``map_to_primateai.py`` only needs the PrimateAI rows at a few thousand codon
+positions, but a plain ``PrimateAI-3D.hg38.txt.gz`` can only be read from the
+start. This module rewrites the table once as a block-compressed copy:
+
+* every block is an independent gzip member holding consecutive rows of one
+  chromosome (``--block-rows`` rows at most), so the copy is still a valid
+  gzip file (``zcat`` / ``gzip.open`` read it like the original);
+* the header line is a member of its own;
+* ``<blocks>.idx`` lists, for every block, the chromosome, the first and last
+  position it covers, its byte offset and its compressed size.
+
+A lookup then decompresses only the blocks whose range overlaps a query
+position, in file order, so the rows come out in the same order as a full
+scan. The table does not have to be sorted (rows are never reordered); a
+position-sorted table just gives tighter block ranges. Rows whose position is
+not an integer are left out of the copy, since no lookup can match them.
+
+The index depends only on the PrimateAI table, so it is built once and reused
+by every run and phenotype:
+
+    primateai_index.py PrimateAI-3D.hg38.txt.gz PrimateAI-3D.hg38.blocks.txt.gz
+
+and ``vep_primateai_db`` is pointed at ``PrimateAI-3D.hg38.blocks.txt.gz``.
+"""
+
+import argparse
+import gzip
+import os
+import sys
+import zlib
+from bisect import bisect_left
+from collections import defaultdict
+
+INDEX_SUFFIX = ".idx"
+INDEX_MAGIC = "##primateai_blocks"
+INDEX_VERSION = "1"
+BLOCK_ROWS = 2000
+
+
+def index_path(blocks_gz):
+    """Index of a block-compressed table: ``<blocks_gz>.idx`` next to the file or to its symlink target."""
+    for candidate in (blocks_gz, os.path.realpath(blocks_gz)):
+        if os.path.exists(candidate + INDEX_SUFFIX):
+            return candidate + INDEX_SUFFIX
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Index builder
+# ---------------------------------------------------------------------------
+
+def build_index(primateai_gz, blocks_gz, block_rows=BLOCK_ROWS):
+    """Write the block-compressed copy of ``primateai_gz`` and its index. Returns the number of blocks."""
+    blocks = []
+    skipped = 0
+    tmp_blocks = blocks_gz + ".tmp"
+
+    with gzip.open(primateai_gz, "rt") as gz_in, open(tmp_blocks, "wb") as out:
+        header = gz_in.readline().rstrip("\n")
+        pai_cols = header.split("\t")
+        try:
+            chr_col = pai_cols.index("chr")
+            pos_col = pai_cols.index("pos")
+        except ValueError as exc:
+            sys.exit(f"Missing expected column in PrimateAI header: {exc}")
+        out.write(gzip.compress((header + "\n").encode(), mtime=0))
+
+        rows = []
+        block_chrom = None
+        first = last = None
+
+        def flush():
+            offset = out.tell()
+            out.write(gzip.compress("".join(rows).encode(), mtime=0))
+            blocks.append((block_chrom, first, last, offset, out.tell() - offset, len(rows)))
+            rows.clear()
+            if len(blocks) % 5_000 == 0:
+                print(f"  ... {len(blocks):,} blocks written", file=sys.stderr)
+
+        for line in gz_in:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) <= max(chr_col, pos_col):
+                skipped += 1
+                continue
+            try:
+                pos = int(fields[pos_col])
+            except ValueError:
+                skipped += 1
+                continue
+            chrom = fields[chr_col]
+
+            if rows and (chrom != block_chrom or len(rows) >= block_rows):
+                flush()
+            if not rows:
+                block_chrom, first, last = chrom, pos, pos
+            first = min(first, pos)
+            last = max(last, pos)
+            rows.append(line if line.endswith("\n") else line + "\n")
+
+        if rows:
+            flush()
+
+    tmp_index = blocks_gz + INDEX_SUFFIX + ".tmp"
+    with open(tmp_index, "w") as idx:
+        idx.write(f"{INDEX_MAGIC}\tversion={INDEX_VERSION}\tsize={os.path.getsize(tmp_blocks)}\n")
+        idx.write("#chrom\tfirst_pos\tlast_pos\toffset\tsize\trows\n")
+        for block in blocks:
+            idx.write("\t".join(str(v) for v in block) + "\n")
+
+    os.replace(tmp_blocks, blocks_gz)
+    os.replace(tmp_index, blocks_gz + INDEX_SUFFIX)
+
+    n_rows = sum(block[5] for block in blocks)
+    print(f"Indexed {n_rows:,} PrimateAI rows in {len(blocks):,} blocks → {blocks_gz}"
+          + (f" ({skipped:,} rows without a valid position left out)" if skipped else ""),
+          file=sys.stderr)
+    return len(blocks)
+
+
+# ---------------------------------------------------------------------------
+# Lookup
+# ---------------------------------------------------------------------------
+
+def read_index(blocks_gz):
+    """chrom → list of (first_pos, last_pos, offset, size) blocks, or None if the index is missing or stale."""
+    idx_file = index_path(blocks_gz)
+    if idx_file is None:
+        return None
+
+    with open(idx_file) as idx:
+        meta = idx.readline().rstrip("\n").split("\t")
+        if not meta or meta[0] != INDEX_MAGIC:
+            print(f"WARN {idx_file} is not a PrimateAI block index; ignoring it", file=sys.stderr)
+            return None
+        meta = dict(item.split("=", 1) for item in meta[1:] if "=" in item)
+        if meta.get("version") != INDEX_VERSION or meta.get("size") != str(os.path.getsize(blocks_gz)):
+            print(f"WARN {idx_file} does not match {blocks_gz}; ignoring it", file=sys.stderr)
+            return None
+
+        blocks = defaultdict(list)
+        for line in idx:
+            if line.startswith("#"):
+                continue
+            chrom, first, last, offset, size, _ = line.rstrip("\n").split("\t")
+            blocks[chrom].append((int(first), int(last), int(offset), int(size)))
+    return blocks
+
+
+def select_blocks(blocks, positions):
+    """(offset, size) of the blocks covering any of the (chrom, pos) positions, in file order."""
+    by_chrom = defaultdict(list)
+    for chrom, pos in positions:
+        by_chrom[chrom].append(pos)
+
+    selected = []
+    for chrom, chrom_positions in by_chrom.items():
+        chrom_positions.sort()
+        for first, last, offset, size in blocks.get(chrom, ()):
+            i = bisect_left(chrom_positions, first)
+            if i < len(chrom_positions) and chrom_positions[i] <= last:
+                selected.append((offset, size))
+    selected.sort()
+    return selected
+
+
+def iter_block_lines(blocks_gz, selected):
+    """Lines (without newline) of the selected blocks."""
+    with open(blocks_gz, "rb") as fh:
+        for offset, size in selected:
+            fh.seek(offset)
+            text = zlib.decompress(fh.read(size), 16 + zlib.MAX_WBITS).decode()
+            yield from text.split("\n")[:-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build the block-compressed, position-indexed copy of PrimateAI-3D.hg38.txt.gz"
+    )
+    parser.add_argument("primateai_gz", help="PrimateAI-3D table (gzip)")
+    parser.add_argument("blocks_gz", help="Output block-compressed table (its index is written to <blocks_gz>.idx)")
+    parser.add_argument("--block-rows", type=int, default=BLOCK_ROWS,
+                        help=f"Maximum rows per block (default: {BLOCK_ROWS})")
+    args = parser.parse_args()
+
+    if os.path.abspath(args.primateai_gz) == os.path.abspath(args.blocks_gz):
+        sys.exit("The block-compressed table must be written to a new file")
+    build_index(args.primateai_gz, args.blocks_gz, block_rows=max(1, args.block_rows))
+
+
+if __name__ == "__main__":
+    main()
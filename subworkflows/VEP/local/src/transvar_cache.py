@@ -0,0 +1,248 @@
+#!/usr/bin/python3
+"""Persistent query cache in front of ``transvar panno``.
+
+TRANSVAR_ANNO annotates every unique ``GENE:p.N`` query of a run, but the
+same protein positions recur across phenotypes and reruns. This wrapper keeps
+the TransVar output lines of every annotated query in a SQLite database keyed
+by ``(refversion, db, query)``:
+
+* ``refversion`` is the TransVar reference version (``--refversion``);
+* ``db`` identifies everything else the annotation depends on: the CCDS
+  database content (SHA-1 of the transvardb file), the ``--reference`` FASTA
+  (name, size and mtime) and the other panno flags. Rebuilding the database,
+  changing the reference or running without one never reuses stale
+  annotations;
+* ``query`` is the ``GENE:p.N`` string, as passed to TransVar.
+
+Only cache misses are sent to TransVar, split into ``--workers`` chunks that
+run in parallel. Their output is stored in the cache and the annotation table
+is written in query order, in the layout ``map_to_primateai.py`` reads (the
+TransVar ``--noheader`` columns, one or more lines per query).
+
+Usage:
+
+    transvar_cache.py --queries positions_input.txt --cache transvar_cache.sqlite \\
+        --refversion hg38 --db hg38.ccds.txt.transvardb --output transvar.tsv --workers 4 \\
+        -- transvar panno --ccds hg38.ccds.txt.transvardb --refversion hg38 --noheader --longest
+
+The TransVar command follows ``--``; ``-l <chunk file>`` is appended to it.
+With ``--cache ''`` every query is annotated and nothing is stored.
+
+Exit status is 0 when every chunk succeeded and 1 otherwise; the output then
+holds the queries that were annotated (cached chunks are kept for the next run).
+A cache that cannot be opened, read or written (read-only directory, lock
+timeout on a shared filesystem, ...) only logs a warning: the run continues
+without it.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+MIN_CHUNK_QUERIES = 50
+SQL_BATCH = 500
+CACHE_TIMEOUT = 60
+
+
+def read_queries(queries_file):
+    """Unique non-empty queries, in file order."""
+    with open(queries_file) as fh:
+        return list(dict.fromkeys(line.strip() for line in fh if line.strip()))
+
+
+def db_fingerprint(db_file):
+    """SHA-1 of the TransVar database file."""
+    digest = hashlib.sha1()
+    with open(db_file, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_db_key(command, db_file):
+    """The ``db`` part of the cache key: database content, reference FASTA and panno flags.
+
+    The executable path is left out, and so are the directories of file
+    arguments (the staged database moves with every task work dir). The database
+    is identified by its content, other files (``--reference``) by name, size
+    and mtime.
+    """
+    db_real = os.path.realpath(db_file)
+    db_digest = db_fingerprint(db_file)
+    parts = []
+    for token in command[1:]:
+        if os.path.isfile(token):
+            real = os.path.realpath(token)
+            if real == db_real:
+                token = f"db:{db_digest}"
+            else:
+                st = os.stat(real)
+                token = f"file:{os.path.basename(real)}:{st.st_size}:{st.st_mtime_ns}"
+        parts.append(token)
+    return hashlib.sha1(json.dumps([db_digest, parts]).encode()).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# SQLite cache
+# ---------------------------------------------------------------------------
+
+def open_cache(cache_file):
+    """Open (and create if needed) the annotation cache."""
+    cache_dir = os.path.dirname(os.path.abspath(cache_file))
+    os.makedirs(cache_dir, exist_ok=True)
+    conn = sqlite3.connect(cache_file, timeout=CACHE_TIMEOUT)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS transvar_cache ("
+        " refversion TEXT NOT NULL,"
+        " db TEXT NOT NULL,"
+        " query TEXT NOT NULL,"
+        " annotation TEXT NOT NULL,"
+        " PRIMARY KEY (refversion, db, query)"
+        ") WITHOUT ROWID"
+    )
+    conn.commit()
+    return conn
+
+
+def cache_lookup(conn, refversion, db, queries):
+    """query → cached TransVar lines (joined with newlines) for the cached queries."""
+    found = {}
+    for start in range(0, len(queries), SQL_BATCH):
+        batch = queries[start:start + SQL_BATCH]
+        placeholders = ",".join("?" * len(batch))
+        rows = conn.execute(
+            f"SELECT query, annotation FROM transvar_cache "
+            f"WHERE refversion = ? AND db = ? AND query IN ({placeholders})",
+            [refversion, db] + batch,
+        )
+        found.update(rows)
+    return found
+
+
+def cache_store(conn, refversion, db, annotations):
+    """Store query → TransVar lines in one transaction."""
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO transvar_cache (refversion, db, query, annotation) VALUES (?, ?, ?, ?)",
+            [(refversion, db, query, text) for query, text in annotations.items()],
+        )
+
+
+# ---------------------------------------------------------------------------
+# TransVar
+# ---------------------------------------------------------------------------
+
+def split_chunks(queries, workers):
+    """At most ``workers`` contiguous chunks of at least MIN_CHUNK_QUERIES queries."""
+    n_chunks = max(1, min(workers, len(queries) // MIN_CHUNK_QUERIES))
+    size = -(-len(queries) // n_chunks)
+    return [queries[i:i + size] for i in range(0, len(queries), size)]
+
+
+def run_transvar_chunk(command, chunk, workdir, number):
+    """Run TransVar on one chunk. Returns (query → output lines, ok)."""
+    list_file = os.path.join(workdir, f"chunk_{number:03d}.txt")
+    with open(list_file, "w") as fh:
+        fh.write("\n".join(chunk) + "\n")
+
+    result = subprocess.run(command + ["-l", list_file], stdout=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        print(f"WARN TransVar chunk {number} ({len(chunk)} queries) failed with exit status {result.returncode}",
+              file=sys.stderr)
+        return {}, False
+
+    wanted = set(chunk)
+    lines = {}
+    for line in result.stdout.splitlines():
+        query = line.split("\t", 1)[0]
+        if query in wanted:
+            lines.setdefault(query, []).append(line)
+        elif line:
+            print(f"WARN TransVar output line for an unknown query ignored: {line[:80]}", file=sys.stderr)
+    return lines, True
+
+
+def annotate(command, queries, workers):
+    """query → TransVar lines for the queries, with chunks run in parallel. Returns (annotations, ok)."""
+    annotations = {}
+    if not queries:
+        return annotations, True
+
+    chunks = split_chunks(queries, workers)
+    print(f"transvar: annotating {len(queries)} queries in {len(chunks)} chunk(s)", file=sys.stderr)
+    with tempfile.TemporaryDirectory(prefix="transvar_chunks_", dir=".") as workdir:
+        with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+            results = list(executor.map(
+                lambda job: run_transvar_chunk(command, job[1], workdir, job[0]),
+                enumerate(chunks, start=1),
+            ))
+
+    ok = True
+    for lines, chunk_ok in results:
+        ok = ok and chunk_ok
+        annotations.update({query: "\n".join(query_lines) for query, query_lines in lines.items()})
+    return annotations, ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run transvar panno through a persistent SQLite query cache")
+    parser.add_argument("--queries", required=True, help="GENE:p.N queries, one per line")
+    parser.add_argument("--cache", default="", help="SQLite cache file ('' disables the cache)")
+    parser.add_argument("--refversion", required=True, help="TransVar reference version (cache key)")
+    parser.add_argument("--db", required=True, help="TransVar CCDS database file (fingerprinted for the cache key)")
+    parser.add_argument("--output", default="transvar.tsv", help="Annotation table (default: transvar.tsv)")
+    parser.add_argument("--workers", type=int, default=1, help="Parallel TransVar chunks (default: 1)")
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="-- transvar panno ... (without -l)")
+    args = parser.parse_args()
+
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    if not command:
+        parser.error("the TransVar command must follow --")
+
+    queries = read_queries(args.queries)
+    db = cache_db_key(command, args.db)
+
+    conn = None
+    cached = {}
+    if args.cache:
+        try:
+            conn = open_cache(args.cache)
+            cached = cache_lookup(conn, args.refversion, db, queries)
+        except (sqlite3.Error, OSError) as exc:
+            print(f"WARN TransVar cache {args.cache} unavailable ({exc}); annotating without it", file=sys.stderr)
+            if conn is not None:
+                conn.close()
+            conn = None
+            cached = {}
+    misses = [query for query in queries if query not in cached]
+    print(f"transvar: {len(queries)} queries, {len(cached)} cached, {len(misses)} to annotate", file=sys.stderr)
+
+    annotations, ok = annotate(command, misses, max(1, args.workers))
+    if conn:
+        try:
+            cache_store(conn, args.refversion, db, annotations)
+        except (sqlite3.Error, OSError) as exc:
+            print(f"WARN Could not update TransVar cache {args.cache} ({exc})", file=sys.stderr)
+        finally:
+            conn.close()
+    annotations.update(cached)
+
+    with open(args.output, "w") as out:
+        for query in queries:
+            if query in annotations:
+                out.write(annotations[query] + "\n")
+
+    missing = len(queries) - sum(query in annotations for query in queries)
+    if missing:
+        print(f"transvar: {missing} queries without TransVar output", file=sys.stderr)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,8 +10,11 @@
  *   2. Load AA2prot output → query → union of changing-side amino acids
  *   3. Load TransVar output → query → (chrom, start, end, transcript, hg38_ref_aa)
  *   4. Build a genomic-position lookup table
- *   5. Stream PrimateAI-3D.hg38.txt.gz and emit rows where:
+ *   5. Read PrimateAI-3D at those positions and emit rows where:
  *        ref_aa == hg38_ref_aa  AND  alt_aa ∈ changing_aas
+ *      With a block index next to the database (<db>.idx, built once with
+ *      primateai_index.py) only the covering blocks are decompressed;
+ *      otherwise the whole gz file is streamed.
  *
  * Output columns:
  *   transvar_query | transvar_transcript | hg38_ref_aa | caas_alt_aas |
@@ -45,15 +48,13 @@ process PRIMATEAI_MAP {
     script:
     def local_dir = "${baseDir}/subworkflows/VEP/local/src"
     """
-    cp ${local_dir}/map_to_primateai.py .
-
     if [[ ! -f "${primateai_db}" ]]; then
         echo "WARN Missing PrimateAI database: ${primateai_db}. Skipping PrimateAI mapping." >&2
         touch primateai_mapped.tsv
         exit 0
     fi
 
-    python3 map_to_primateai.py \\
+    python3 ${local_dir}/map_to_primateai.py \\
         "${transvar_tsv}" \\
         "${aa2prot_csv}" \\
         "${caas_file}" \\
@@ -11,6 +11,13 @@
  *   --longest    return one annotation per query (canonical/longest CDS)
  *   --noheader   skip the header line in the output
  *
+ * Queries go through a persistent SQLite cache keyed by refversion, query and
+ * the CCDS database, reference FASTA and panno flags — params.vep_transvar_cache,
+ * 'none' to disable; an unusable cache only logs a warning. Only cache misses
+ * are sent to TransVar, in task.cpus parallel chunks, and the merged table
+ * keeps the layout read by map_to_primateai.py. Sweeps of many phenotypes over
+ * the same proteome annotate each position once.
+ *
  * Output columns (tab-separated, no header):
  *   input | transcript | gene | strand | coordinates(gDNA/cDNA/protein) | region | info
  *
@@ -44,6 +51,8 @@ process TRANSVAR_ANNO {
     def transvarBin = params.vep_transvar_bin ?: ''
     def transvarCfg = params.vep_transvar_cfg ?: ''
     def transvarReference = params.vep_transvar_reference ?: ''
+    def transvarCache = params.vep_transvar_cache && params.vep_transvar_cache != 'none' ? params.vep_transvar_cache : ''
+    def local_dir = "${baseDir}/subworkflows/VEP/local/src"
     """
     # Extract unique GENE:p.N query strings from column 4 of the AA2prot table
     cut -f4 "${aa2prot_csv}" | sort -u > positions_input.txt
@@ -118,14 +127,19 @@ process TRANSVAR_ANNO {
 
     export TRANSVAR_DOWNLOAD_DIR="\${staged_db_dir}"
 
-    if ! "\${tv_bin}" panno \\
-        -l positions_input.txt \\
+    if ! python3 ${local_dir}/transvar_cache.py \\
+        --queries positions_input.txt \\
+        --cache "${transvarCache}" \\
+        --refversion "${refver}" \\
+        --db "\${ccds_db}" \\
+        --output transvar.tsv \\
+        --workers ${task.cpus} \\
+        -- "\${tv_bin}" panno \\
         --ccds "\${ccds_db}" \\
         --refversion "${refver}" \\
         "\${ref_args[@]}" \\
         --noheader \\
-        --longest \\
-        > transvar.tsv; then
+        --longest; then
         echo "WARN TransVar panno failed for refversion ${refver}. Skipping TransVar annotation." >&2
         touch transvar.tsv
         exit 0